@@ -26,6 +26,16 @@ from dataactbroker.handlers.submission_handler import (
     get_submissions_in_period,
 )
 from dataactbroker.helpers.fabs_derivations_helper import fabs_derivations, log_derivation
+from dataactbroker.helpers.fabs_publish_helper import (
+    create_tmp_fabs,
+    derive_fabs_partitions,
+    drop_fabs_partitions,
+    insert_published_fabs,
+    publishable_fabs_columns,
+    FABS_PARTITION_MIN_ROWS,
+    FABS_PUBLISH_PARTITIONS,
+    PARALLEL_FABS_PUBLISH,
+)
 from dataactbroker.helpers.filters_helper import permissions_filter, agency_filter
 from dataactbroker.helpers.generic_helper import zip_dir
 from dataactbroker.permissions import active_user_can_on_submission
@@ -874,132 +884,26 @@ class FileHandler:
                 "Starting derivations for FABS submission (total count: {})".format(total_count), submission_id
             )
 
-            # Insert all non-error, non-delete rows into published table
-            column_list = [col.key for col in FABS.__table__.columns]
-            remove_cols = ["created_at", "updated_at", "fabs_id", "job_id", "row_number", "is_valid"]
-            for remove_col in remove_cols:
-                column_list.remove(remove_col)
-            detached_col_string = ", ".join(column_list)
-
-            column_list = [col.key for col in PublishedFABS.__table__.columns]
-            remove_cols = ["created_at", "updated_at", "modified_at", "is_active", "published_fabs_id"]
-            for remove_col in remove_cols:
-                column_list.remove(remove_col)
-            published_col_string = ", ".join(column_list)
-
-            log_derivation("Beginning transfer of publishable records to temp table", submission_id)
-            create_table_sql = """
-                CREATE TEMP TABLE tmp_fabs_{submission_id}
-                ON COMMIT DROP
-                AS
-                    SELECT {cols}
-                    FROM published_fabs
-                    WHERE false;
-
-                ALTER TABLE tmp_fabs_{submission_id} ADD COLUMN published_fabs_id
-                    SERIAL PRIMARY KEY;
-            """.format(
-                submission_id=submission_id, cols=published_col_string
-            )
-            sess.execute(create_table_sql)
-
-            create_indexes_sql = """
-                CREATE INDEX ix_tmp_fabs_{submission_id}_funding_office_code_upper ON
-                    tmp_fabs_{submission_id} (upper(funding_office_code));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_awarding_office_code_upper ON
-                    tmp_fabs_{submission_id} (upper(awarding_office_code));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_business_funds_indicator_upper ON
-                    tmp_fabs_{submission_id} (upper(business_funds_indicator));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_country_code_upper ON
-                    tmp_fabs_{submission_id} (upper(legal_entity_country_code));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_state_code_upper ON
-                    tmp_fabs_{submission_id} (upper(legal_entity_state_code));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_city_name_upper ON
-                    tmp_fabs_{submission_id} (upper(legal_entity_city_name));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_business_types ON tmp_fabs_{submission_id} (business_types);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_award_mod ON
-                    tmp_fabs_{submission_id} (award_modification_amendme);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_zip_last4 ON
-                    tmp_fabs_{submission_id} (legal_entity_zip_last4);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_zip5 ON tmp_fabs_{submission_id} (legal_entity_zip5);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_state_code ON
-                    tmp_fabs_{submission_id} (legal_entity_state_code);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_county_code ON
-                    tmp_fabs_{submission_id} (legal_entity_county_code);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_le_congressional ON
-                    tmp_fabs_{submission_id} (legal_entity_congressional);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_state_code ON
-                    tmp_fabs_{submission_id} (place_of_perfor_state_code);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_zip5 ON
-                    tmp_fabs_{submission_id} (place_of_performance_zip5);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_county_code ON
-                    tmp_fabs_{submission_id} (place_of_perform_county_co);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_zip_last4 ON
-                    tmp_fabs_{submission_id} (place_of_perform_zip_last4);
-
-                CREATE INDEX ix_tmp_fabs_{submission_id}_uri_awarding_sub_tier_upper ON
-                    tmp_fabs_{submission_id} (UPPER(uri), UPPER(awarding_sub_tier_agency_c));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_fain_awarding_sub_tier_upper ON
-                    tmp_fabs_{submission_id} (UPPER(fain), UPPER(awarding_sub_tier_agency_c));
-
-                CREATE INDEX ix_tmp_fabs_{submission_id}_awarding_sub_tier_upper ON
-                    tmp_fabs_{submission_id} (upper(awarding_sub_tier_agency_c));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_uri_upper ON
-                    tmp_fabs_{submission_id} (upper(uri));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_fain_upper ON
-                    tmp_fabs_{submission_id} (upper(fain));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_cdi_upper ON
-                    tmp_fabs_{submission_id} (upper(correction_delete_indicatr));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_cast_action_date_as_date ON
-                    tmp_fabs_{submission_id} (cast_as_date(action_date));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_record_type ON
-                    tmp_fabs_{submission_id} (record_type);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_congr ON
-                    tmp_fabs_{submission_id} (place_of_performance_congr);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_ppop_country_upper ON
-                    tmp_fabs_{submission_id} (UPPER(place_of_perform_country_c));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_funding_sub_tier_upper ON
-                    tmp_fabs_{submission_id} (UPPER(funding_sub_tier_agency_co));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_assistance_listing_num ON
-                    tmp_fabs_{submission_id} (UPPER(assistance_listing_number));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_awardee_unique ON
-                    tmp_fabs_{submission_id} (awardee_or_recipient_uniqu);
-                CREATE INDEX ix_tmp_fabs_{submission_id}_assistance_type_upper ON
-                    tmp_fabs_{submission_id} (upper(assistance_type));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_action_type_upper ON
-                    tmp_fabs_{submission_id} (upper(action_type));
-                CREATE INDEX ix_tmp_fabs_{submission_id}_uei_upper ON
-                    tmp_fabs_{submission_id} (upper(uei));
-            """.format(
-                submission_id=submission_id
-            )
-            sess.execute(create_indexes_sql)
-
-            insert_query = """
-                INSERT INTO tmp_fabs_{submission_id} ({cols})
-                SELECT {cols}
-                FROM fabs
-                WHERE fabs.submission_id = {submission_id}
-                    AND fabs.is_valid IS TRUE
-                    AND UPPER(COALESCE(correction_delete_indicatr, '')) <> 'D';
-            """
-            sess.execute(insert_query.format(cols=detached_col_string, submission_id=submission_id))
-            log_derivation("Completed transfer of publishable records to temp table", submission_id)
-
+            # Large submissions can be derived in partitions on separate connections, the publish itself (inserting
+            # them all and deactivating the old records) still happens in this session's transaction
+            partitioned = PARALLEL_FABS_PUBLISH and total_count >= FABS_PARTITION_MIN_ROWS
             fabs_start = datetime.now()
             log_derivation("Beginning main FABS derivations", submission_id)
-            fabs_derivations(sess, submission_id)
+            if partitioned:
+                source_tables = derive_fabs_partitions(sess, submission_id, FABS_PUBLISH_PARTITIONS)
+            else:
+                # The temp table's indexes are only built by the derivations that use them, after the records are loaded
+                create_tmp_fabs(sess, submission_id)
+                fabs_derivations(sess, submission_id)
+                source_tables = ["tmp_fabs_{}".format(submission_id)]
             log_derivation("Completed main FABS derivations", submission_id, fabs_start)
 
             log_derivation("Beginning transfer of records from temp table to published table", submission_id)
 
             # Inserting non-delete records
-            insert_query = """
-                INSERT INTO published_fabs (created_at, updated_at, {cols}, modified_at, is_active)
-                SELECT NOW() AS created_at, NOW() AS updated_at, {cols}, NOW() AS modified_at, TRUE AS is_active
-                FROM tmp_fabs_{submission_id} AS tmp_fabs;
-            """
-            sess.execute(insert_query.format(cols=published_col_string, submission_id=submission_id))
+            insert_published_fabs(sess, submission_id, source_tables)
+            if partitioned:
+                drop_fabs_partitions(sess, submission_id, FABS_PUBLISH_PARTITIONS)
 
             # Inserting delete records, we didn't have to process these
             insert_query = """
@@ -1010,7 +914,7 @@ class FileHandler:
                     AND fabs.is_valid IS TRUE
                     AND UPPER(COALESCE(correction_delete_indicatr, '')) = 'D';
             """
-            sess.execute(insert_query.format(cols=detached_col_string, submission_id=submission_id))
+            sess.execute(insert_query.format(cols=", ".join(publishable_fabs_columns()), submission_id=submission_id))
 
             log_derivation("Completed transfer of records from temp table to published table", submission_id)
 
@@ -1077,6 +981,8 @@ class FileHandler:
 
             # rollback the changes if there are any errors. We want to submit everything together
             sess.rollback()
+            if PARALLEL_FABS_PUBLISH:
+                drop_fabs_partitions(sess, submission_id, FABS_PUBLISH_PARTITIONS)
 
             sess.query(Submission).filter_by(submission_id=submission_id).update(
                 {"publish_status_id": PUBLISH_STATUS_DICT["unpublished"], "updated_at": get_utc_now()},
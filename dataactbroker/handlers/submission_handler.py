@@ -66,6 +66,7 @@ from dataactcore.models.errorModels import File
 
 from dataactcore.utils.jsonResponse import JsonResponse
 from dataactcore.utils.ResponseError import ResponseError
+from dataactcore.utils.staging_snapshot import get_staging_snapshots, load_staging_snapshot, staging_snapshot_path
 from dataactcore.utils.statusCode import StatusCode
 from dataactcore.utils.stringCleaner import StringCleaner
 
@@ -823,6 +824,9 @@ def move_published_data(sess, submission_id, direction="publish"):
     job_list = sess.query(Job.job_id).filter_by(submission_id=submission_id).all()
     job_list = [item[0] for item in job_list]
 
+    # Staging rows that were snapshotted when they were validated are published from the snapshots
+    snapshots = get_staging_snapshots(sess, submission_id) if direction == "publish" else {}
+
     for table_type, table_object in table_types.items():
         if direction == "publish":
             source_table = table_object[0]
@@ -855,6 +859,12 @@ def move_published_data(sess, submission_id, direction="publish"):
             }
         )
 
+        snapshot = snapshots.get(source_table.__table__.name)
+        if snapshot:
+            with staging_snapshot_path(snapshot) as snapshot_path:
+                load_staging_snapshot(sess.connection(), snapshot_path, target_table.__table__.name)
+            continue
+
         column_list = [col.key for col in table_object[0].__table__.columns]
         column_list.remove("created_at")
         column_list.remove("updated_at")
@@ -1300,7 +1310,9 @@ def revert_to_published(submission, file_manager):
     )
     submission.publishable = True
 
-    # Set default numbers/status/last validation date for jobs then update warnings
+    # Set default numbers/status/last validation date for jobs then update warnings. The reverted data and errors
+    # replace the ones the fingerprints and snapshots were recorded for, so those are cleared and the next validation
+    # reruns all of it
     sess.query(Job).filter_by(submission_id=submission.submission_id).update(
         {
             "number_of_errors": 0,
@@ -1309,6 +1321,10 @@ def revert_to_published(submission, file_manager):
             "last_validated": max_pub_history[1],
             "error_message": None,
             "file_generation_id": None,
+            "file_fingerprint": None,
+            "rules_fingerprint": None,
+            "cross_file_fingerprint": None,
+            "staging_snapshot": None,
         }
     )
 
@@ -1,7 +1,16 @@
 import logging
+import re
 
 from datetime import datetime
+from io import BytesIO
 
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from sqlalchemy.dialects import postgresql
+
+from dataactbroker.helpers.fabs_reference_cache import CACHED_DERIVATIONS, get_fabs_reference_cache
+from dataactcore.config import CONFIG_BROKER
 from dataactcore.models.lookups import (
     ACTION_TYPE_DICT,
     ASSISTANCE_TYPE_DICT,
@@ -10,1362 +19,1338 @@ from dataactcore.models.lookups import (
     BUSINESS_TYPE_DICT,
     BUSINESS_FUNDS_IND_DICT,
 )
-from dataactcore.utils.business_categories import derive_fabs_business_categories
+from dataactcore.models.stagingModels import PublishedFABS
 
 logger = logging.getLogger(__name__)
 ZIP_DATE_CHANGE = "2023/01/03"
 
-
-def log_derivation(message, submission_id, start_time=None):
-    """Just logging the time taken to run whatever derivation is being run.
-
-    Args:
-        message: the message to log
-        submission_id: the ID of the submission
-        start_time: If provided, use it to calculate the duration.
-    """
-    log_message = {"message": message, "message_type": "BrokerDebug", "submission_id": submission_id}
-
-    if start_time:
-        log_message["duration"] = (datetime.now() - start_time).total_seconds()
-    logger.info(log_message)
-
-
-def derive_total_funding_amount(sess, submission_id):
-    """Deriving the total funding amounts
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning total_funding_amount derivation", submission_id)
-
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET total_funding_amount = COALESCE(federal_action_obligation, 0) + COALESCE(non_federal_funding_amount, 0);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    log_derivation(
-        "Completed total_funding_amount derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
+# Whether the location and office derivations are computed in the worker from its in-memory reference cache instead of
+# by joining the reference tables in the database
+FABS_REFERENCE_CACHE = CONFIG_BROKER["fabs_reference_cache"]
+# How many tmp_fabs rows the reference cache derives at a time
+REFERENCE_CACHE_BATCH_SIZE = 100000
+
+# The columns of the tmp_fabs table derivations can read and write, the same ones publish_fabs_submission copies, and
+# their types
+TMP_FABS_COLUMN_TYPES = {
+    col.key: col.type.compile(dialect=postgresql.dialect())
+    for col in PublishedFABS.__table__.columns
+    if col.key not in ["created_at", "updated_at", "modified_at", "is_active", "published_fabs_id"]
+}
+TMP_FABS_COLUMNS = set(TMP_FABS_COLUMN_TYPES)
+
+# The indexes on tmp_fabs derivations can declare they match rows by. Each one is only built once the rows are loaded,
+# just before the first pass with a derivation declaring it, and dropped after the last one.
+TMP_FABS_INDEXES = {
+    "action_type_upper": "UPPER(action_type)",
+    "assistance_listing_num_upper": "UPPER(assistance_listing_number)",
+    "assistance_type_upper": "UPPER(assistance_type)",
+    "awarding_office_code_upper": "UPPER(awarding_office_code)",
+    "awarding_sub_tier_upper": "UPPER(awarding_sub_tier_agency_c)",
+    "business_funds_indicator_upper": "UPPER(business_funds_indicator)",
+    "cdi_upper": "UPPER(correction_delete_indicatr)",
+    "fain_awarding_sub_tier_upper": "UPPER(fain), UPPER(awarding_sub_tier_agency_c)",
+    "funding_office_code_upper": "UPPER(funding_office_code)",
+    "funding_sub_tier_upper": "UPPER(funding_sub_tier_agency_co)",
+    "le_country_code_upper": "UPPER(legal_entity_country_code)",
+    "le_county_code": "legal_entity_county_code",
+    "le_state_code": "legal_entity_state_code",
+    "le_zip5": "legal_entity_zip5",
+    "ppop_country_upper": "UPPER(place_of_perform_country_c)",
+    "ppop_county_code": "place_of_perform_county_co",
+    "ppop_zip5": "place_of_performance_zip5",
+    "record_type": "record_type",
+    "uei_upper": "UPPER(uei)",
+    "uri_awarding_sub_tier_upper": "UPPER(uri), UPPER(awarding_sub_tier_agency_c)",
+}
+
+
+class FABSDerivation:
+    """A derivation of one or more columns of the tmp_fabs table, declaring the columns it reads and writes so
+    derivations that don't depend on each other can be run in the same pass over the table.
+
+    A derivation sets its columns on every row matching its where clause, like an UPDATE ... FROM would. Rows are
+    referred to as pf, and if the derivation has a source each row is joined to it with the where clause. When the
+    where clause matches more than one row of the source, any one of them is used, as in an UPDATE ... FROM.
+
+    Attributes:
+        name: the name of the derivation, used when logging
+        columns: dict of each column the derivation sets to the SQL expression it's set to
+        inputs: set of the tmp_fabs columns the derivation's SQL reads
+        outputs: set of the tmp_fabs columns the derivation sets
+        where: the SQL condition a row (joined to its source) has to meet to be derived, None for every row
+        source: the tables each row is joined to, None if the derivation only uses the row's own values
+        ctes: the common table expressions the source refers to, None if there are none
+        indexes: list of the names of the TMP_FABS_INDEXES the derivation matches rows by
+    """
+
+    def __init__(self, name, columns, inputs, where=None, source=None, ctes=None, indexes=None):
+        """Declares a derivation
+
+        Args:
+            name: the name of the derivation
+            columns: dict of each column the derivation sets to the SQL expression it's set to
+            inputs: list of the tmp_fabs columns the derivation's SQL reads
+            where: the SQL condition a row has to meet to be derived
+            source: the tables each row is joined to
+            ctes: the common table expressions the source refers to
+            indexes: list of the names of the TMP_FABS_INDEXES the derivation matches rows by
+        """
+        self.name = name
+        self.columns = columns
+        self.inputs = set(inputs)
+        self.outputs = set(columns)
+        self.where = where
+        self.source = source
+        self.ctes = ctes
+        self.indexes = indexes or []
+
+    def referenced_columns(self):
+        """Find the tmp_fabs columns the derivation's SQL refers to
+
+        Returns:
+            set of the names of tmp_fabs columns appearing in the derivation's SQL
+        """
+        sql = " ".join(
+            part for part in [*self.columns.values(), self.where, self.source, self.ctes] if part is not None
+        )
+        # Leave out the placeholders that are filled in when the SQL is run
+        sql = re.sub(r"\{\w+\}", "", sql)
+        return set(re.findall(r"\w+", sql)) & TMP_FABS_COLUMNS
 
 
-def derive_assistance_listing(sess, submission_id):
-    """Deriving assistance listing title from assistance listing number using assistance listing table.
+def label_values(label_dict, quote_keys=True):
+    """Format a dict of codes to their labels as the rows of a VALUES list
 
     Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
+        label_dict: the dict of codes to their labels
+        quote_keys: whether the codes are strings that need quoting
+
+    Returns:
+        the rows of the VALUES list, without the outer parentheses
+    """
+    key_format = "'{}'" if quote_keys else "{}"
+    return "), (".join((key_format + ", '{}'").format(code, label) for code, label in label_dict.items())
+
+
+AGENCY_LIST_CTE = """
+    agency_list AS
+        (SELECT (CASE WHEN sta.is_frec
+                    THEN frec.frec_code
+                    ELSE cgac.cgac_code
+                    END) AS agency_code,
+            (CASE WHEN sta.is_frec
+                THEN frec.agency_name
+                ELSE cgac.agency_name
+                END) AS agency_name,
+            sta.sub_tier_agency_code AS sub_tier_code,
+            sta.sub_tier_agency_name AS sub_tier_name
+        FROM sub_tier_agency AS sta
+            INNER JOIN cgac
+                ON cgac.cgac_id = sta.cgac_id
+            INNER JOIN frec
+                ON frec.frec_id = sta.frec_id)
+"""
+
+# The earliest active published records of the awards in the submission and the offices they were given, valid as of
+# their action dates. Formatted with the column identifying the awards (fain or uri) and the record type comparison.
+OFFICE_CTES = """
+    awards AS
+        (SELECT DISTINCT UPPER({award_id}) AS upper_award_id,
+            UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
+        FROM tmp_fabs_{{submission_id}}
+        WHERE record_type {record_type}),
+    min_date AS
+        (SELECT CAST(MIN(action_date) AS DATE) AS min_date,
+            UPPER({award_id}) AS upper_award_id,
+            UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
+        FROM published_fabs
+        WHERE is_active IS TRUE
+            AND record_type {record_type}
+            AND EXISTS (
+                SELECT 1
+                FROM awards
+                WHERE upper_award_id = UPPER({award_id})
+                    AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
+            )
+        GROUP BY UPPER({award_id}), UPPER(awarding_sub_tier_agency_c)),
+    office_info AS
+        (SELECT awarding_office_code AS awarding_office_code,
+            funding_office_code AS funding_office_code,
+            award_modification_amendme,
+            UPPER({award_id}) AS upper_award_id,
+            UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier,
+            cast_as_date(pf.action_date) AS action_date
+        FROM published_fabs AS pf
+        WHERE is_active IS TRUE
+            AND record_type {record_type}
+            AND EXISTS (
+                SELECT 1
+                FROM min_date AS md
+                WHERE upper_award_id = UPPER({award_id})
+                    AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
+                    AND cast_as_date(pf.action_date) = min_date
+            )),
+    filtered_offices AS
+        (SELECT award_modification_amendme,
+            upper_award_id,
+            upper_sub_tier,
+            aw_office.office_code AS awarding_office_code,
+            fund_office.office_code AS funding_office_code
+        FROM office_info AS oi
+        LEFT JOIN office AS aw_office
+            ON aw_office.office_code = UPPER(oi.awarding_office_code)
+            AND aw_office.financial_assistance_awards_office IS TRUE
+            AND aw_office.effective_start_date <= oi.action_date
+            AND COALESCE(aw_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date
+        LEFT JOIN office AS fund_office
+            ON fund_office.office_code = UPPER(oi.funding_office_code)
+            AND (fund_office.contract_funding_office IS TRUE
+                OR fund_office.financial_assistance_funding_office IS TRUE)
+            AND fund_office.effective_start_date <= oi.action_date
+            AND COALESCE(fund_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date)
+"""
+OFFICE_COLUMNS = {
+    "awarding_office_code": """CASE WHEN pf.awarding_office_code IS NULL
+                                    THEN fo.awarding_office_code
+                                    ELSE pf.awarding_office_code
+                               END""",
+    "funding_office_code": """CASE WHEN pf.funding_office_code IS NULL
+                                   THEN fo.funding_office_code
+                                   ELSE pf.funding_office_code
+                              END""",
+}
+OFFICE_INPUTS = [
+    "action_date",
+    "award_modification_amendme",
+    "awarding_office_code",
+    "awarding_sub_tier_agency_c",
+    "funding_office_code",
+    "record_type",
+]
+
+# The ppop code formats of a city, county, and state
+PPOP_CITY_FORMAT = r"""(UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\d\d\d\d[\dRT]$'
+                        OR UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]TS\d\d\d$')"""
+PPOP_COUNTY_FORMAT = r"UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\d\d\d$'"
+PPOP_STATE_FORMAT = r"UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\*\*\*$'"
+
+# All the FABS derivations in the order they're applied in. Derivations can be run in the same pass (and in any
+# order within it) as long as none of them reads a column an earlier one in the pass sets. When two derivations in a
+# pass set the same column, the later one's value is kept for the rows they both derive.
+FABS_DERIVATIONS = [
+    FABSDerivation(
+        "total funding amount",
+        {"total_funding_amount": "COALESCE(federal_action_obligation, 0) + COALESCE(non_federal_funding_amount, 0)"},
+        inputs=["federal_action_obligation", "non_federal_funding_amount"],
+    ),
     # TODO: Put the warning back in somehow, maybe do a distinct select of all empty assistance listing titles
-    start_time = datetime.now()
-    log_derivation("Beginning assistance_listing_title derivation", submission_id)
-
-    query = """
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET assistance_listing_title = al.program_title
-        FROM assistance_listing AS al
-        WHERE UPPER(pf.assistance_listing_number) = UPPER(al.program_number);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    log_derivation(
-        "Completed assistance_listing_title derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
-
-
-def derive_awarding_agency_data(sess, submission_id):
-    """Deriving awarding sub tier agency name, awarding agency name, and awarding agency code
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning awarding agency data derivation", submission_id)
-    # Deriving awarding agency code/name and sub tier name
-    query = """
-        WITH agency_list AS
-            (SELECT (CASE WHEN sta.is_frec
-                    THEN frec.agency_name
-                    ELSE cgac.agency_name
-                    END) AS agency_name,
-                sta.sub_tier_agency_code AS sub_tier_code,
-                sta.sub_tier_agency_name AS sub_tier_name
-            FROM sub_tier_agency AS sta
-                INNER JOIN cgac
-                    ON cgac.cgac_id = sta.cgac_id
-                INNER JOIN frec
-                    ON frec.frec_id = sta.frec_id)
-        UPDATE tmp_fabs_{submission_id}
-        SET awarding_agency_name = agency_name,
-            awarding_sub_tier_agency_n = sub_tier_name
-        FROM agency_list
-        WHERE UPPER(awarding_sub_tier_agency_c) = sub_tier_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed awarding agency info derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
-
-
-def derive_funding_agency_data(sess, submission_id):
-    """Deriving funding sub tier agency name, funding agency name, and funding agency code
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning funding_agency data derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning funding sub tier code derivation", submission_id)
-    # Deriving funding sub tier agency code
-    query = """
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET funding_sub_tier_agency_co = office.sub_tier_code
-        FROM office
-        WHERE UPPER(COALESCE(funding_sub_tier_agency_co, '')) = ''
-            AND UPPER(pf.funding_office_code) = office.office_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed funding sub tier code derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning funding agency info derivation", submission_id)
-    # Deriving funding agency code/name and sub tier name
-    query = """
-        WITH agency_list AS
-            (SELECT (CASE WHEN sta.is_frec
-                        THEN frec.frec_code
-                        ELSE cgac.cgac_code
-                        END) AS agency_code,
-                (CASE WHEN sta.is_frec
-                    THEN frec.agency_name
-                    ELSE cgac.agency_name
-                    END) AS agency_name,
-                sta.sub_tier_agency_code AS sub_tier_code,
-                sta.sub_tier_agency_name AS sub_tier_name
-            FROM sub_tier_agency AS sta
-                INNER JOIN cgac
-                    ON cgac.cgac_id = sta.cgac_id
-                INNER JOIN frec
-                    ON frec.frec_id = sta.frec_id)
-        UPDATE tmp_fabs_{submission_id}
-        SET funding_agency_code = agency_code,
-            funding_agency_name = agency_name,
-            funding_sub_tier_agency_na = sub_tier_name
-        FROM agency_list
-        WHERE UPPER(funding_sub_tier_agency_co) = sub_tier_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed funding agency info derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    log_derivation("Completed funding_agency data derivation", submission_id, start_time)
-
-
-def derive_ppop_state(sess, submission_id):
-    """Deriving ppop code and ppop state name
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning place of performance state derivation", submission_id)
-
-    # Deriving office codes for record type not 1
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perfor_state_code = CASE WHEN UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]'
-                                              THEN state_code
-                                              ELSE NULL
-                                         END,
-            place_of_perform_state_nam = CASE WHEN place_of_performance_code = '00*****'
-                                              THEN 'Multi-state'
-                                              ELSE state_name
-                                         END
-        FROM states
-        WHERE UPPER(SUBSTRING(place_of_performance_code, 1, 2)) = state_code
-            OR place_of_performance_code = '00*****';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    log_derivation(
-        "Completed place of performance state derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        start_time,
-    )
-
-
-def split_ppop_zip(sess, submission_id):
-    """Splitting ppop zip code into 5 and 4 digit codes for ease of website access
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning place of performance zip5 and zip last4 derivation", submission_id)
-
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_zip5 = SUBSTRING(place_of_performance_zip4a, 1, 5),
-            place_of_perform_zip_last4 = CASE WHEN LENGTH(place_of_performance_zip4a) = 5
-                                              THEN NULL
-                                              ELSE RIGHT(place_of_performance_zip4a, 4)
-                                         END
-        WHERE place_of_performance_zip4a ~ '^\d\d\d\d\d(-?\d\d\d\d)?$';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    log_derivation(
-        "Completed place of performance zip5 and zip last4 derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        start_time,
-    )
-
-
-def derive_ppop_location_data(sess, submission_id):
-    """Deriving place of performance location values from zip4
-    See historical_location.md for information on zips_historical and zips_grouped_historical.
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for.
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning place of performance location derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr/county info for 9 digit historical zips derivation", submission_id)
-    # Deriving congressional and county info for records with a 9 digit zip
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = CASE WHEN place_of_performance_congr IS NULL
-                                              THEN congressional_district_no
-                                              ELSE place_of_performance_congr
-                                         END,
-            place_of_perform_county_co = county_number
-        FROM zips_historical
-        WHERE place_of_perform_zip_last4 IS NOT NULL
+    FABSDerivation(
+        "assistance listing title",
+        {"assistance_listing_title": "al.program_title"},
+        inputs=["assistance_listing_number"],
+        source="assistance_listing AS al",
+        where="UPPER(pf.assistance_listing_number) = UPPER(al.program_number)",
+        indexes=["assistance_listing_num_upper"],
+    ),
+    FABSDerivation(
+        "awarding agency info",
+        {"awarding_agency_name": "agency_name", "awarding_sub_tier_agency_n": "sub_tier_name"},
+        inputs=["awarding_sub_tier_agency_c"],
+        ctes=AGENCY_LIST_CTE,
+        source="agency_list",
+        where="UPPER(awarding_sub_tier_agency_c) = sub_tier_code",
+        indexes=["awarding_sub_tier_upper"],
+    ),
+    FABSDerivation(
+        "funding sub tier code",
+        {"funding_sub_tier_agency_co": "office.sub_tier_code"},
+        inputs=["funding_sub_tier_agency_co", "funding_office_code"],
+        source="office",
+        where="""UPPER(COALESCE(funding_sub_tier_agency_co, '')) = ''
+            AND UPPER(pf.funding_office_code) = office.office_code""",
+        indexes=["funding_office_code_upper"],
+    ),
+    FABSDerivation(
+        "funding agency info",
+        {
+            "funding_agency_code": "agency_code",
+            "funding_agency_name": "agency_name",
+            "funding_sub_tier_agency_na": "sub_tier_name",
+        },
+        inputs=["funding_sub_tier_agency_co"],
+        ctes=AGENCY_LIST_CTE,
+        source="agency_list",
+        where="UPPER(funding_sub_tier_agency_co) = sub_tier_code",
+        indexes=["funding_sub_tier_upper"],
+    ),
+    FABSDerivation(
+        "place of performance state",
+        {
+            "place_of_perfor_state_code": """CASE WHEN UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]'
+                                                  THEN state_code
+                                                  ELSE NULL
+                                             END""",
+            "place_of_perform_state_nam": """CASE WHEN place_of_performance_code = '00*****'
+                                                  THEN 'Multi-state'
+                                                  ELSE state_name
+                                             END""",
+        },
+        inputs=["place_of_performance_code"],
+        source="states",
+        where="""UPPER(SUBSTRING(place_of_performance_code, 1, 2)) = state_code
+            OR place_of_performance_code = '00*****'""",
+    ),
+    # Splitting ppop zip code into 5 and 4 digit codes for ease of website access
+    FABSDerivation(
+        "place of performance zip5 and zip last4",
+        {
+            "place_of_performance_zip5": "SUBSTRING(place_of_performance_zip4a, 1, 5)",
+            "place_of_perform_zip_last4": """CASE WHEN LENGTH(place_of_performance_zip4a) = 5
+                                                  THEN NULL
+                                                  ELSE RIGHT(place_of_performance_zip4a, 4)
+                                             END""",
+        },
+        inputs=["place_of_performance_zip4a"],
+        where=r"place_of_performance_zip4a ~ '^\d\d\d\d\d(-?\d\d\d\d)?$'",
+    ),
+    # Place of performance location, see historical_location.md for information on zips_historical and
+    # zips_grouped_historical.
+    FABSDerivation(
+        "ppop congr/county info for 9 digit historical zips",
+        {
+            "place_of_performance_congr": """CASE WHEN place_of_performance_congr IS NULL
+                                                  THEN congressional_district_no
+                                                  ELSE place_of_performance_congr
+                                             END""",
+            "place_of_perform_county_co": "county_number",
+        },
+        inputs=["place_of_performance_congr", "place_of_perform_zip_last4", "place_of_performance_zip5", "action_date"],
+        source="zips_historical",
+        where="""place_of_perform_zip_last4 IS NOT NULL
             AND place_of_perform_zip_last4 = zip_last4
             AND place_of_performance_zip5 = zip5
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop congr/county info for 9 digit historical zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr/county info for 9 digit zips derivation", submission_id)
-    # Deriving congressional and county info for records with a 9 digit zip
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = CASE WHEN place_of_performance_congr IS NULL
-                                              THEN congressional_district_no
-                                              ELSE place_of_performance_congr
-                                         END,
-            place_of_perform_county_co = county_number
-        FROM zips
-        WHERE place_of_perform_zip_last4 IS NOT NULL
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    FABSDerivation(
+        "ppop congr/county info for 9 digit zips",
+        {
+            "place_of_performance_congr": """CASE WHEN place_of_performance_congr IS NULL
+                                                  THEN congressional_district_no
+                                                  ELSE place_of_performance_congr
+                                             END""",
+            "place_of_perform_county_co": "county_number",
+        },
+        inputs=["place_of_performance_congr", "place_of_perform_zip_last4", "place_of_performance_zip5", "action_date"],
+        source="zips",
+        where="""place_of_perform_zip_last4 IS NOT NULL
             AND place_of_perform_zip_last4 = zip_last4
             AND place_of_performance_zip5 = zip5
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop congr/county info for 9 digit zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr info for 5-digit historical zip derivation", submission_id)
-    # Deriving historical congressional info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = congressional_district_no
-        FROM cd_zips_grouped_historical
-        WHERE place_of_performance_zip5 = zip5
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    # Deriving congressional info for remaining blanks (with zip code)
+    FABSDerivation(
+        "ppop congr info for 5-digit historical zip",
+        {"place_of_performance_congr": "congressional_district_no"},
+        inputs=["place_of_performance_congr", "place_of_performance_zip5", "place_of_perfor_state_code", "action_date"],
+        source="cd_zips_grouped_historical",
+        where="""place_of_performance_zip5 = zip5
             AND place_of_perfor_state_code = state_abbreviation
             AND place_of_performance_congr IS NULL
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop congr info for 5-digit historical zip derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr info for 5-digit zip derivation", submission_id)
-    # Deriving congressional info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = congressional_district_no
-        FROM cd_zips_grouped
-        WHERE place_of_performance_zip5 = zip5
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    FABSDerivation(
+        "ppop congr info for 5-digit zip",
+        {"place_of_performance_congr": "congressional_district_no"},
+        inputs=["place_of_performance_congr", "place_of_performance_zip5", "place_of_perfor_state_code", "action_date"],
+        source="cd_zips_grouped",
+        where="""place_of_performance_zip5 = zip5
             AND place_of_perfor_state_code = state_abbreviation
             AND place_of_performance_congr IS NULL
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop congr info for 5-digit zip derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr info by county derivation", submission_id)
-    # Deriving congressional info for remaining blanks (with county code)
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = congressional_district_no
-        FROM cd_county_grouped
-        WHERE place_of_performance_congr IS NULL
-            AND UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\d\d\d$'
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    # Deriving congressional info for remaining blanks (with county, city, or state code)
+    FABSDerivation(
+        "ppop congr info by county",
+        {"place_of_performance_congr": "congressional_district_no"},
+        inputs=["place_of_performance_congr", "place_of_performance_code"],
+        source="cd_county_grouped",
+        where="""place_of_performance_congr IS NULL
+            AND {county_format}
             AND LEFT(UPPER(place_of_performance_code), 2) = state_abbreviation
-            AND RIGHT(UPPER(place_of_performance_code), 3) = county_number;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop congr info for county derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr info by city derivation", submission_id)
-    # Deriving congressional info for remaining blanks (with city code)
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = congressional_district_no
-        FROM cd_city_grouped
-        WHERE place_of_performance_congr IS NULL
-            AND (UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\d\d\d\d[\dRT]$'
-                 OR UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]TS\d\d\d$')
+            AND RIGHT(UPPER(place_of_performance_code), 3) = county_number""".format(
+            county_format=PPOP_COUNTY_FORMAT
+        ),
+    ),
+    FABSDerivation(
+        "ppop congr info by city",
+        {"place_of_performance_congr": "congressional_district_no"},
+        inputs=["place_of_performance_congr", "place_of_performance_code"],
+        source="cd_city_grouped",
+        where="""place_of_performance_congr IS NULL
+            AND {city_format}
             AND LEFT(UPPER(place_of_performance_code), 2) = state_abbreviation
-            AND RIGHT(UPPER(place_of_performance_code), 5) = city_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop congr info by city derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop congr info by state derivation", submission_id)
-    # Deriving congressional info for remaining blanks (with state code)
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_congr = congressional_district_no
-        FROM cd_state_grouped
-        WHERE place_of_performance_congr IS NULL
-            AND UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\*\*\*$'
-            AND LEFT(UPPER(place_of_performance_code), 2) = state_abbreviation;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop congr info by state derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop historical county info derivation", submission_id)
-    # Deriving historical county code info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_county_co = county_number
-        FROM zips_grouped_historical
-        WHERE place_of_performance_zip5 = zip5
+            AND RIGHT(UPPER(place_of_performance_code), 5) = city_code""".format(
+            city_format=PPOP_CITY_FORMAT
+        ),
+    ),
+    FABSDerivation(
+        "ppop congr info by state",
+        {"place_of_performance_congr": "congressional_district_no"},
+        inputs=["place_of_performance_congr", "place_of_performance_code"],
+        source="cd_state_grouped",
+        where="""place_of_performance_congr IS NULL
+            AND {state_format}
+            AND LEFT(UPPER(place_of_performance_code), 2) = state_abbreviation""".format(
+            state_format=PPOP_STATE_FORMAT
+        ),
+    ),
+    # Deriving county code info for remaining blanks (with zip code)
+    FABSDerivation(
+        "ppop historical county info",
+        {"place_of_perform_county_co": "county_number"},
+        inputs=["place_of_perform_county_co", "place_of_performance_zip5", "place_of_perfor_state_code", "action_date"],
+        source="zips_grouped_historical",
+        where="""place_of_performance_zip5 = zip5
             AND place_of_perfor_state_code = state_abbreviation
             AND place_of_perform_county_co IS NULL
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop historical county info derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop county info derivation", submission_id)
-    # Deriving county code info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_county_co = county_number
-        FROM zips_grouped
-        WHERE place_of_performance_zip5 = zip5
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    FABSDerivation(
+        "ppop county info",
+        {"place_of_perform_county_co": "county_number"},
+        inputs=["place_of_perform_county_co", "place_of_performance_zip5", "place_of_perfor_state_code", "action_date"],
+        source="zips_grouped",
+        where="""place_of_performance_zip5 = zip5
             AND place_of_perfor_state_code = state_abbreviation
             AND place_of_perform_county_co IS NULL
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed ppop county info derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop city info for transactions with zips derivation", submission_id)
-    # Deriving city info for transactions with zips
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_city = preferred_city_name
-        FROM zip_city
-        WHERE place_of_performance_zip5 IS NOT NULL
-            AND zip_city.zip_code = place_of_performance_zip5;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop city info for transactions with zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop county info for county ppop derivation", submission_id)
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["ppop_zip5"],
+    ),
+    FABSDerivation(
+        "ppop city info for transactions with zips",
+        {"place_of_performance_city": "preferred_city_name"},
+        inputs=["place_of_performance_zip5"],
+        source="zip_city",
+        where="""place_of_performance_zip5 IS NOT NULL
+            AND zip_city.zip_code = place_of_performance_zip5""",
+        indexes=["ppop_zip5"],
+    ),
     # Deriving county code info for transactions with ppop code XX**###
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_county_co = RIGHT(place_of_performance_code, 3)
-        WHERE place_of_performance_zip5 IS NULL
-            AND UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\d\d\d$';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop county info for county ppop derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop city info for city ppop derivation", submission_id)
+    FABSDerivation(
+        "ppop county info for county ppop",
+        {"place_of_perform_county_co": "RIGHT(place_of_performance_code, 3)"},
+        inputs=["place_of_performance_zip5", "place_of_performance_code"],
+        where="place_of_performance_zip5 IS NULL AND {county_format}".format(county_format=PPOP_COUNTY_FORMAT),
+    ),
     # Deriving county/city info for transactions with ppop code XX#####
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_county_co = county_number,
-            place_of_perform_county_na = county_name,
-            place_of_performance_city = feature_name
-        FROM city_code AS cc
-        WHERE place_of_performance_zip5 IS NULL
-            AND (UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\d\d\d\d[\dRT]$'
-                  OR UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]TS\d\d\d$')
+    FABSDerivation(
+        "ppop city info for city ppop",
+        {
+            "place_of_perform_county_co": "county_number",
+            "place_of_perform_county_na": "county_name",
+            "place_of_performance_city": "feature_name",
+        },
+        inputs=["place_of_performance_zip5", "place_of_performance_code", "place_of_perfor_state_code"],
+        source="city_code AS cc",
+        where="""place_of_performance_zip5 IS NULL
+            AND {city_format}
             AND cc.city_code = UPPER(RIGHT(place_of_performance_code, 5))
-            AND cc.state_code = place_of_perfor_state_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop city info for city ppop derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning remaining county name derivation", submission_id)
-    # Deriving remaining county names
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_county_na = county_name
-        FROM county_code AS cc
-        WHERE place_of_perform_county_na IS NULL
+            AND cc.state_code = place_of_perfor_state_code""".format(
+            city_format=PPOP_CITY_FORMAT
+        ),
+    ),
+    FABSDerivation(
+        "remaining ppop county name",
+        {"place_of_perform_county_na": "county_name"},
+        inputs=["place_of_perform_county_na", "place_of_perform_county_co", "place_of_perfor_state_code"],
+        source="county_code AS cc",
+        where="""place_of_perform_county_na IS NULL
             AND place_of_perform_county_co IS NOT NULL
             AND cc.county_number = place_of_perform_county_co
-            AND cc.state_code = place_of_perfor_state_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed remaining county name derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    log_derivation(
-        "Completed place of performance location derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        start_time,
-    )
-
-
-def derive_ppop_scope(sess, submission_id):
-    """Deriving place of performance scope values from zip4 and place of performance code
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning place of performance scope derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop scope with non-null zip derivation", submission_id)
-    # When zip is not null
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_scope = CASE WHEN UPPER(place_of_performance_zip4a) = 'CITY-WIDE'
-                                              THEN 'City-wide'
-                                              WHEN place_of_performance_zip4a ~ '^\d\d\d\d\d(\-?\d\d\d\d)?$'
-                                              THEN 'Single ZIP Code'
-                                              ELSE NULL
-                                         END
-        WHERE COALESCE(place_of_performance_zip4a, '') <> ''
-            AND (UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\d\d\d\d[\dRT]$'
-                  OR UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]TS\d\d\d$');
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop scope with non-null zip derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning ppop scope with null zip derivation", submission_id)
-    # When zip is null
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_scope = CASE WHEN (UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\d\d\d\d[\dRT]$'
-                                                      OR UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]TS\d\d\d$')
-                                              THEN 'City-wide'
-                                              WHEN UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\d\d\d$'
-                                              THEN 'County-wide'
-                                              WHEN UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\*\*\*$'
-                                              THEN 'State-wide'
-                                              WHEN UPPER(place_of_performance_code) ~ '^00\*\*\*\*\*$'
-                                              THEN 'Multi-state'
-                                              WHEN UPPER(place_of_performance_code) ~ '^00FORGN$'
-                                              THEN 'Foreign'
-                                              ELSE NULL
-                                         END
-        WHERE COALESCE(place_of_performance_zip4a, '') = '';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed ppop scope with null zip derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    log_derivation("Completed place of performance scope derivation", submission_id, start_time)
-
-
-def derive_le_location_data(sess, submission_id):
-    """Deriving place of performance location values
-    See historical_location.md for information on zips_historical and zips_grouped_historical.
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning legal entity location derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity location with 9 digit historical zip derivation derivation", submission_id)
-    # Deriving historical congressional, county, and state info for records with a 9 digit zip
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_congressional = CASE WHEN legal_entity_congressional IS NULL
-                                              THEN congressional_district_no
-                                              ELSE legal_entity_congressional
-                                         END,
-            legal_entity_county_code = county_number,
-            legal_entity_state_code = state_abbreviation
-        FROM zips_historical
-        WHERE legal_entity_zip_last4 IS NOT NULL
+            AND cc.state_code = place_of_perfor_state_code""",
+        indexes=["ppop_county_code"],
+    ),
+    # Legal entity location, see historical_location.md for information on zips_historical and zips_grouped_historical.
+    FABSDerivation(
+        "legal entity location with 9 digit historical zip",
+        {
+            "legal_entity_congressional": """CASE WHEN legal_entity_congressional IS NULL
+                                                  THEN congressional_district_no
+                                                  ELSE legal_entity_congressional
+                                             END""",
+            "legal_entity_county_code": "county_number",
+            "legal_entity_state_code": "state_abbreviation",
+        },
+        inputs=["legal_entity_congressional", "legal_entity_zip_last4", "legal_entity_zip5", "action_date"],
+        source="zips_historical",
+        where="""legal_entity_zip_last4 IS NOT NULL
             AND legal_entity_zip_last4 = zip_last4
             AND legal_entity_zip5 = zip5
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed legal entity location with 9 digit historical zip derivation derivation, "
-        "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity location with 9 digit zip derivation derivation", submission_id)
-    # Deriving congressional, county, and state info for records with a 9 digit zip
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_congressional = CASE WHEN legal_entity_congressional IS NULL
-                                              THEN congressional_district_no
-                                              ELSE legal_entity_congressional
-                                         END,
-            legal_entity_county_code = county_number,
-            legal_entity_state_code = state_abbreviation
-        FROM zips
-        WHERE legal_entity_zip_last4 IS NOT NULL
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
+    FABSDerivation(
+        "legal entity location with 9 digit zip",
+        {
+            "legal_entity_congressional": """CASE WHEN legal_entity_congressional IS NULL
+                                                  THEN congressional_district_no
+                                                  ELSE legal_entity_congressional
+                                             END""",
+            "legal_entity_county_code": "county_number",
+            "legal_entity_state_code": "state_abbreviation",
+        },
+        inputs=["legal_entity_congressional", "legal_entity_zip_last4", "legal_entity_zip5", "action_date"],
+        source="zips",
+        where="""legal_entity_zip_last4 IS NOT NULL
             AND legal_entity_zip_last4 = zip_last4
             AND legal_entity_zip5 = zip5
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed legal entity location with 9 digit zip derivation derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity state derivation", submission_id)
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
     # Deriving state info for remaining blanks (with zip code)
-    query = """
-            UPDATE tmp_fabs_{submission_id}
-            SET legal_entity_state_code = state_code
-            FROM zip_city
-            WHERE legal_entity_zip5 = zip_code
-                AND legal_entity_state_code IS NULL;
-        """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity state derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning historical legal entity congressional for 5-digit zip derivation", submission_id)
-    # Deriving historical congressional info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_congressional = congressional_district_no
-        FROM cd_zips_grouped_historical
-        WHERE legal_entity_zip5 = zip5
+    FABSDerivation(
+        "legal entity state",
+        {"legal_entity_state_code": "state_code"},
+        inputs=["legal_entity_zip5", "legal_entity_state_code"],
+        source="zip_city",
+        where="legal_entity_zip5 = zip_code AND legal_entity_state_code IS NULL",
+        indexes=["le_zip5"],
+    ),
+    # Deriving congressional info for remaining blanks (with zip code)
+    FABSDerivation(
+        "historical legal entity congressional for 5-digit zip",
+        {"legal_entity_congressional": "congressional_district_no"},
+        inputs=["legal_entity_congressional", "legal_entity_zip5", "legal_entity_state_code", "action_date"],
+        source="cd_zips_grouped_historical",
+        where="""legal_entity_zip5 = zip5
             AND legal_entity_state_code = state_abbreviation
             AND legal_entity_congressional IS NULL
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed historical legal entity congressional for 5-digit zip derivation, "
-        "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity congressional for 5-digit zip derivation", submission_id)
-    # Deriving congressional info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_congressional = congressional_district_no
-        FROM cd_zips_grouped
-        WHERE legal_entity_zip5 = zip5
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
+    FABSDerivation(
+        "legal entity congressional for 5-digit zip",
+        {"legal_entity_congressional": "congressional_district_no"},
+        inputs=["legal_entity_congressional", "legal_entity_zip5", "legal_entity_state_code", "action_date"],
+        source="cd_zips_grouped",
+        where="""legal_entity_zip5 = zip5
             AND legal_entity_state_code = state_abbreviation
             AND legal_entity_congressional IS NULL
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed legal entity congressional for 5-digit zip derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning historical legal entity county", submission_id)
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
     # Deriving county info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_county_code = county_number
-        FROM zips_grouped_historical
-        WHERE legal_entity_zip5 = zip5
+    FABSDerivation(
+        "historical legal entity county",
+        {"legal_entity_county_code": "county_number"},
+        inputs=["legal_entity_county_code", "legal_entity_zip5", "legal_entity_state_code", "action_date"],
+        source="zips_grouped_historical",
+        where="""legal_entity_zip5 = zip5
             AND legal_entity_state_code = state_abbreviation
             AND legal_entity_county_code IS NULL
-            AND cast_as_date(action_date) < '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed legal entity county and state derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning historical legal entity county", submission_id)
-    # Deriving county info for remaining blanks (with zip code)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_county_code = county_number
-        FROM zips_grouped
-        WHERE legal_entity_zip5 = zip5
+            AND cast_as_date(action_date) < '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
+    FABSDerivation(
+        "legal entity county",
+        {"legal_entity_county_code": "county_number"},
+        inputs=["legal_entity_county_code", "legal_entity_zip5", "legal_entity_state_code", "action_date"],
+        source="zips_grouped",
+        where="""legal_entity_zip5 = zip5
             AND legal_entity_state_code = state_abbreviation
             AND legal_entity_county_code IS NULL
-            AND cast_as_date(action_date) >= '{zip_date}';
-    """
-    res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
-    log_derivation(
-        "Completed legal entity county and state derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity county names with zips derivation", submission_id)
-    # Deriving county names for records with zips (type 2 and 3)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_county_name = county_name
-        FROM county_code AS cc
-        WHERE legal_entity_zip5 IS NOT NULL
+            AND cast_as_date(action_date) >= '{zip_date}'""",
+        indexes=["le_zip5"],
+    ),
+    # Deriving county names, state names, and cities for records with zips (type 2 and 3)
+    FABSDerivation(
+        "legal entity county names with zips",
+        {"legal_entity_county_name": "county_name"},
+        inputs=["legal_entity_zip5", "legal_entity_county_code", "legal_entity_state_code"],
+        source="county_code AS cc",
+        where="""legal_entity_zip5 IS NOT NULL
             AND cc.county_number = legal_entity_county_code
-            AND cc.state_code = legal_entity_state_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity county names with zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+            AND cc.state_code = legal_entity_state_code""",
+        indexes=["le_county_code"],
+    ),
+    FABSDerivation(
+        "legal entity state names with zips",
+        {"legal_entity_state_name": "state_name"},
+        inputs=["legal_entity_zip5", "legal_entity_state_code"],
+        source="states",
+        where="legal_entity_zip5 IS NOT NULL AND states.state_code = legal_entity_state_code",
+        indexes=["le_state_code"],
+    ),
+    FABSDerivation(
+        "legal entity city info with zips",
+        {"legal_entity_city_name": "preferred_city_name"},
+        inputs=["legal_entity_zip5"],
+        source="zip_city",
+        where="legal_entity_zip5 IS NOT NULL AND zip_city.zip_code = legal_entity_zip5",
+        indexes=["le_zip5"],
+    ),
+    # Deriving county, state, and congressional info for county and state format ppop codes in record type 1
+    FABSDerivation(
+        "legal entity location info record type 1 county format",
+        {
+            "legal_entity_county_code": "place_of_perform_county_co",
+            "legal_entity_county_name": "place_of_perform_county_na",
+            "legal_entity_state_code": "place_of_perfor_state_code",
+            "legal_entity_state_name": "place_of_perform_state_nam",
+            "legal_entity_congressional": "place_of_performance_congr",
+        },
+        inputs=[
+            "place_of_perform_county_co",
+            "place_of_perform_county_na",
+            "place_of_perfor_state_code",
+            "place_of_perform_state_nam",
+            "place_of_performance_congr",
+            "record_type",
+            "place_of_performance_code",
+        ],
+        where="record_type = 1 AND {county_format}".format(county_format=PPOP_COUNTY_FORMAT),
+        indexes=["record_type"],
+    ),
+    FABSDerivation(
+        "legal entity location info record type 1 state format",
+        {
+            "legal_entity_state_code": "place_of_perfor_state_code",
+            "legal_entity_state_name": "place_of_perform_state_nam",
+            "legal_entity_congressional": "place_of_performance_congr",
+        },
+        inputs=[
+            "place_of_perfor_state_code",
+            "place_of_perform_state_nam",
+            "place_of_performance_congr",
+            "record_type",
+            "place_of_performance_code",
+        ],
+        where="record_type = 1 AND {state_format}".format(state_format=PPOP_STATE_FORMAT),
+        indexes=["record_type"],
+    ),
+    # Deriving office codes from the earliest published record of the award
+    FABSDerivation(
+        "office data record type not 1",
+        OFFICE_COLUMNS,
+        inputs=OFFICE_INPUTS + ["fain"],
+        ctes=OFFICE_CTES.format(award_id="fain", record_type="<> '1'"),
+        source="filtered_offices AS fo",
+        where="""COALESCE(pf.award_modification_amendme, '') <> COALESCE(fo.award_modification_amendme, '')
+            AND upper_award_id = UPPER(fain)
+            AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
+            AND record_type <> '1'""",
+        indexes=["fain_awarding_sub_tier_upper"],
+    ),
+    FABSDerivation(
+        "office data record type 1",
+        OFFICE_COLUMNS,
+        inputs=OFFICE_INPUTS + ["uri"],
+        ctes=OFFICE_CTES.format(award_id="uri", record_type="= '1'"),
+        source="filtered_offices AS fo",
+        where="""COALESCE(pf.award_modification_amendme, '') <> COALESCE(fo.award_modification_amendme, '')
+            AND upper_award_id = UPPER(uri)
+            AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
+            AND record_type = '1'""",
+        indexes=["uri_awarding_sub_tier_upper"],
+    ),
+    FABSDerivation(
+        "awarding office name",
+        {"awarding_office_name": "office_name"},
+        inputs=["awarding_office_code"],
+        source="office",
+        where="office_code = UPPER(awarding_office_code)",
+        indexes=["awarding_office_code_upper"],
+    ),
+    FABSDerivation(
+        "funding office name",
+        {"funding_office_name": "office_name"},
+        inputs=["funding_office_code"],
+        source="office",
+        where="office_code = UPPER(funding_office_code)",
+        indexes=["funding_office_code_upper"],
+    ),
+    FABSDerivation(
+        "legal entity city code",
+        {"legal_entity_city_code": "city_code"},
+        inputs=["legal_entity_city_name", "legal_entity_state_code"],
+        source="city_code",
+        where="""UPPER(TRIM(legal_entity_city_name)) = UPPER(feature_name)
+            AND UPPER(TRIM(legal_entity_state_code)) = UPPER(state_code)""",
+    ),
+    FABSDerivation(
+        "place of performance country name",
+        {"place_of_perform_country_n": "country_name"},
+        inputs=["place_of_perform_country_c"],
+        source="country_code",
+        where="country_code.country_code = UPPER(place_of_perform_country_c)",
+        indexes=["ppop_country_upper"],
+    ),
+    FABSDerivation(
+        "legal entity country name",
+        {"legal_entity_country_name": "country_name"},
+        inputs=["legal_entity_country_code"],
+        source="country_code",
+        where="country_code.country_code = UPPER(legal_entity_country_code)",
+        indexes=["le_country_code_upper"],
+    ),
+    # Deriving ppop code and location data for PII-redacted records
+    FABSDerivation(
+        "PII redacted USA records",
+        {
+            "place_of_performance_code": """CASE WHEN legal_entity_state_code IS NOT NULL
+                                                 THEN CASE WHEN legal_entity_city_code IS NOT NULL
+                                                           THEN UPPER(legal_entity_state_code) || legal_entity_city_code
+                                                           ELSE UPPER(legal_entity_state_code) || '00000'
+                                                      END
+                                                 ELSE NULL
+                                            END""",
+            "place_of_perform_country_c": "legal_entity_country_code",
+            "place_of_perform_country_n": "legal_entity_country_name",
+            "place_of_performance_city": "legal_entity_city_name",
+            "place_of_perform_county_co": "legal_entity_county_code",
+            "place_of_perform_county_na": "legal_entity_county_name",
+            "place_of_perfor_state_code": "legal_entity_state_code",
+            "place_of_perform_state_nam": "legal_entity_state_name",
+            "place_of_performance_zip4a": "legal_entity_zip5",
+            "place_of_performance_zip5": "legal_entity_zip5",
+            "place_of_performance_congr": "legal_entity_congressional",
+        },
+        inputs=[
+            "legal_entity_state_code",
+            "legal_entity_city_code",
+            "legal_entity_country_code",
+            "legal_entity_country_name",
+            "legal_entity_city_name",
+            "legal_entity_county_code",
+            "legal_entity_county_name",
+            "legal_entity_state_name",
+            "legal_entity_zip5",
+            "legal_entity_congressional",
+            "record_type",
+        ],
+        where="record_type = 3 AND UPPER(legal_entity_country_code) = 'USA'",
+        indexes=["record_type"],
+    ),
+    FABSDerivation(
+        "PII redacted non-USA records",
+        {
+            "place_of_performance_code": "'00FORGN'",
+            "place_of_perform_country_c": "legal_entity_country_code",
+            "place_of_perform_country_n": "legal_entity_country_name",
+            "place_of_performance_city": "legal_entity_foreign_city",
+            "place_of_performance_forei": "legal_entity_foreign_city",
+        },
+        inputs=["legal_entity_country_code", "legal_entity_country_name", "legal_entity_foreign_city", "record_type"],
+        where="record_type = 3 AND UPPER(legal_entity_country_code) <> 'USA'",
+        indexes=["record_type"],
+    ),
+    FABSDerivation(
+        "parent UEI",
+        {
+            "ultimate_parent_legal_enti": "sam_recipient.ultimate_parent_legal_enti",
+            "ultimate_parent_uei": "sam_recipient.ultimate_parent_uei",
+        },
+        inputs=["uei", "ultimate_parent_legal_enti", "ultimate_parent_uei"],
+        source="sam_recipient",
+        where="""UPPER(pf.uei) = UPPER(sam_recipient.uei)
+            AND (sam_recipient.ultimate_parent_legal_enti IS NOT NULL
+                OR sam_recipient.ultimate_parent_uei IS NOT NULL)""",
+        indexes=["uei_upper"],
+    ),
+    FABSDerivation(
+        "executive compensation",
+        {
+            "high_comp_officer{}_{}".format(officer, field): "sam_recipient.high_comp_officer{}_{}".format(
+                officer, field
+            )
+            for officer in range(1, 6)
+            for field in ["full_na", "amount"]
+        },
+        inputs=["uei"]
+        + [
+            "high_comp_officer{}_{}".format(officer, field)
+            for officer in range(1, 6)
+            for field in ["full_na", "amount"]
+        ],
+        source="sam_recipient",
+        where="UPPER(pf.uei) = UPPER(sam_recipient.uei) AND sam_recipient.high_comp_officer1_full_na IS NOT NULL",
+        indexes=["uei_upper"],
+    ),
+    # Deriving labels for codes entered by the user
+    FABSDerivation(
+        "action type label",
+        {"action_type_description": "description"},
+        inputs=["action_type"],
+        ctes="action_type_desc AS (SELECT * FROM (VALUES ({})) AS action_type_desc(letter, description))".format(
+            label_values(ACTION_TYPE_DICT)
+        ),
+        source="action_type_desc AS atd",
+        where="atd.letter = UPPER(pf.action_type)",
+        indexes=["action_type_upper"],
+    ),
+    FABSDerivation(
+        "assistance type label",
+        {"assistance_type_desc": "description"},
+        inputs=["assistance_type"],
+        ctes="assistance_type_description AS (SELECT * FROM (VALUES ({})) AS assistance_type_description(letter, "
+        "description))".format(label_values(ASSISTANCE_TYPE_DICT)),
+        source="assistance_type_description AS atd",
+        where="atd.letter = UPPER(pf.assistance_type)",
+        indexes=["assistance_type_upper"],
+    ),
+    FABSDerivation(
+        "cdi label",
+        {"correction_delete_ind_desc": "description"},
+        inputs=["correction_delete_indicatr"],
+        ctes="cdi_desc AS (SELECT * FROM (VALUES ({})) AS cdi_desc(letter, description))".format(
+            label_values(CORRECTION_DELETE_IND_DICT)
+        ),
+        source="cdi_desc",
+        where="cdi_desc.letter = UPPER(pf.correction_delete_indicatr)",
+        indexes=["cdi_upper"],
+    ),
+    FABSDerivation(
+        "record type label",
+        {"record_type_description": "description"},
+        inputs=["record_type"],
+        ctes="record_type_desc AS (SELECT * FROM (VALUES ({})) AS record_type_desc(letter, description))".format(
+            label_values(RECORD_TYPE_DICT, quote_keys=False)
+        ),
+        source="record_type_desc AS rtd",
+        where="rtd.letter = pf.record_type",
+        indexes=["record_type"],
+    ),
+    FABSDerivation(
+        "business funds ind label",
+        {"business_funds_ind_desc": "description"},
+        inputs=["business_funds_indicator"],
+        ctes="business_funds_ind_description AS (SELECT * FROM (VALUES ({})) AS business_funds_ind_description(letter, "
+        "description))".format(label_values(BUSINESS_FUNDS_IND_DICT)),
+        source="business_funds_ind_description AS bfid",
+        where="bfid.letter = UPPER(pf.business_funds_indicator)",
+        indexes=["business_funds_indicator_upper"],
+    ),
+    FABSDerivation(
+        "business type label",
+        {"business_types_desc": "abt.aggregated"},
+        inputs=["business_types"],
+        ctes="""
+            business_type_desc AS
+                (SELECT *
+                FROM (VALUES ({business_types})) AS business_type_desc(letter, description)),
+            aggregated_business_types AS
+                (SELECT published_fabs_id,
+                    string_agg(btd.description, ';' order by ordinality) AS aggregated
+                FROM tmp_fabs_{{submission_id}} AS pf,
+                    unnest(string_to_array(pf.business_types, NULL)) WITH ORDINALITY AS u(business_type_id, ordinality)
+                LEFT JOIN business_type_desc AS btd
+                    ON btd.letter = UPPER(business_type_id)
+                GROUP BY published_fabs_id)
+        """.format(
+            business_types=label_values(BUSINESS_TYPE_DICT)
+        ),
+        source="aggregated_business_types AS abt",
+        where="abt.published_fabs_id = pf.published_fabs_id",
+    ),
+    # Deriving place of performance scope values from zip4 and place of performance code
+    FABSDerivation(
+        "ppop scope with non-null zip",
+        {
+            "place_of_performance_scope": r"""CASE WHEN UPPER(place_of_performance_zip4a) = 'CITY-WIDE'
+                                                   THEN 'City-wide'
+                                                   WHEN place_of_performance_zip4a ~ '^\d\d\d\d\d(\-?\d\d\d\d)?$'
+                                                   THEN 'Single ZIP Code'
+                                                   ELSE NULL
+                                              END"""
+        },
+        inputs=["place_of_performance_zip4a", "place_of_performance_code"],
+        where="COALESCE(place_of_performance_zip4a, '') <> '' AND {city_format}".format(city_format=PPOP_CITY_FORMAT),
+    ),
+    FABSDerivation(
+        "ppop scope with null zip",
+        {
+            "place_of_performance_scope": r"""CASE WHEN {city_format}
+                                                   THEN 'City-wide'
+                                                   WHEN {county_format}
+                                                   THEN 'County-wide'
+                                                   WHEN {state_format}
+                                                   THEN 'State-wide'
+                                                   WHEN UPPER(place_of_performance_code) ~ '^00\*\*\*\*\*$'
+                                                   THEN 'Multi-state'
+                                                   WHEN UPPER(place_of_performance_code) ~ '^00FORGN$'
+                                                   THEN 'Foreign'
+                                                   ELSE NULL
+                                              END""".format(
+                city_format=PPOP_CITY_FORMAT, county_format=PPOP_COUNTY_FORMAT, state_format=PPOP_STATE_FORMAT
+            )
+        },
+        inputs=["place_of_performance_zip4a", "place_of_performance_code"],
+        where="COALESCE(place_of_performance_zip4a, '') = ''",
+    ),
+    FABSDerivation(
+        "business categories",
+        {"business_categories": "compile_fabs_business_categories(UPPER(business_types))"},
+        inputs=["business_types"],
+    ),
+]
+
+
+def schedule_derivations(derivations):
+    """Group derivations into passes over the tmp_fabs table, putting each derivation in the earliest pass it can run
+    in without changing what the derivations would derive if they were run one at a time in the order given.
+
+    A derivation runs in a later pass than every earlier derivation setting a column it reads, and no earlier than any
+    earlier derivation setting or reading a column it sets. Within a pass every derivation reads the values the table
+    had before the pass.
 
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity state names with zips derivation", submission_id)
-    # Deriving state names for records with zips (type 2 and 3)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_state_name = state_name
-        FROM states
-        WHERE legal_entity_zip5 IS NOT NULL
-            AND states.state_code = legal_entity_state_code;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity state names with zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+    Args:
+        derivations: list of FABSDerivation in the order their results have to match
+
+    Returns:
+        list of the passes to run in order, each a list of FABSDerivation in the order given
+
+    Raises:
+        ValueError: if a derivation's name isn't unique, it sets or reads columns tmp_fabs doesn't have, its
+            declared inputs don't match the columns its SQL reads, or it declares an index that isn't in
+            TMP_FABS_INDEXES
+    """
+    names = set()
+    for derivation in derivations:
+        if derivation.name in names:
+            raise ValueError("Derivation {} is declared more than once".format(derivation.name))
+        names.add(derivation.name)
+
+        unknown_columns = (derivation.inputs | derivation.outputs) - TMP_FABS_COLUMNS
+        if unknown_columns:
+            raise ValueError(
+                "Derivation {} uses columns tmp_fabs doesn't have: {}".format(
+                    derivation.name, ", ".join(sorted(unknown_columns))
+                )
+            )
+
+        unknown_indexes = set(derivation.indexes) - set(TMP_FABS_INDEXES)
+        if unknown_indexes:
+            raise ValueError(
+                "Derivation {} declares unknown indexes: {}".format(derivation.name, ", ".join(sorted(unknown_indexes)))
+            )
+
+        referenced_columns = derivation.referenced_columns()
+        if referenced_columns != derivation.inputs:
+            raise ValueError(
+                "Derivation {} reads undeclared columns: {}; declares unused inputs: {}".format(
+                    derivation.name,
+                    ", ".join(sorted(referenced_columns - derivation.inputs)) or "none",
+                    ", ".join(sorted(derivation.inputs - referenced_columns)) or "none",
+                )
+            )
 
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity city info with zips derivation", submission_id)
-    # Deriving city info for records with zips (type 2 and 3)
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_city_name = preferred_city_name
-        FROM zip_city
-        WHERE legal_entity_zip5 IS NOT NULL
-            AND zip_city.zip_code = legal_entity_zip5;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity city info with zips derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+    levels = []
+    for derivation in derivations:
+        level = 0
+        for earlier_derivation, earlier_level in zip(derivations, levels):
+            if earlier_derivation.outputs & derivation.inputs:
+                level = max(level, earlier_level + 1)
+            elif derivation.outputs & (earlier_derivation.outputs | earlier_derivation.inputs):
+                level = max(level, earlier_level)
+        levels.append(level)
 
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity location info record type 1 county format derivation", submission_id)
-    # Deriving county, state, and congressional info for county format ppop codes in record type 1
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_county_code = place_of_perform_county_co,
-            legal_entity_county_name = place_of_perform_county_na,
-            legal_entity_state_code = place_of_perfor_state_code,
-            legal_entity_state_name = place_of_perform_state_nam,
-            legal_entity_congressional = place_of_performance_congr
-        WHERE record_type = 1
-            AND UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\d\d\d$';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity location info record type 1 county format derivation, "
-        "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+    passes = [[] for _ in range(max(levels, default=-1) + 1)]
+    for derivation, level in zip(derivations, levels):
+        passes[level].append(derivation)
+    return passes
 
-    query_start = datetime.now()
-    log_derivation("Beginning legal entity location info record type 1 state format derivation", submission_id)
-    # Deriving county, state, and congressional info for state format ppop codes in record type 1
-    query = r"""
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_state_code = place_of_perfor_state_code,
-            legal_entity_state_name = place_of_perform_state_nam,
-            legal_entity_congressional = place_of_performance_congr
-        WHERE record_type = 1
-            AND UPPER(place_of_performance_code) ~ '^[A-Z][A-Z]\*\*\*\*\*$';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed legal entity location info record type 1 state format derivation, "
-        "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
 
-    log_derivation("Completed legal entity location derivation", submission_id, start_time)
+FABS_DERIVATION_PASSES = schedule_derivations(FABS_DERIVATIONS)
 
 
-def derive_office_data(sess, submission_id):
-    """Deriving office data
+def split_derivations(derivations, cached_names):
+    """Split derivations into the ones to run in SQL before the derivations computed from the reference cache, the
+    cached ones, and the ones to run in SQL after them, without changing what the derivations would derive if they were
+    run one at a time in the order given.
 
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning office data derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning office data record type not 1 derivation", submission_id)
-    # Deriving office codes for record type not 1
-    query = """
-        WITH awards AS
-            (SELECT DISTINCT UPPER(fain) AS upper_fain,
-                UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
-            FROM tmp_fabs_{submission_id}
-            WHERE record_type <> '1'),
-        min_date AS
-            (SELECT CAST(MIN(action_date) AS DATE) AS min_date,
-                UPPER(fain) AS upper_fain,
-                UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
-            FROM published_fabs
-            WHERE is_active IS TRUE
-                AND record_type <> '1'
-                AND EXISTS (
-                    SELECT 1
-                    FROM awards
-                    WHERE upper_fain = UPPER(fain)
-                        AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
-                )
-            GROUP BY UPPER(fain), UPPER(awarding_sub_tier_agency_c)),
-        office_info AS
-            (SELECT awarding_office_code AS awarding_office_code,
-                funding_office_code AS funding_office_code,
-                award_modification_amendme,
-                UPPER(fain) AS upper_fain,
-                UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier,
-                cast_as_date(pf.action_date) AS action_date
-            FROM published_fabs AS pf
-            WHERE is_active IS TRUE
-                AND record_type <> '1'
-                AND EXISTS (
-                    SELECT 1
-                    FROM min_date AS md
-                    WHERE upper_fain = UPPER(fain)
-                        AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
-                        AND cast_as_date(pf.action_date) = min_date
-                )),
-        filtered_offices AS
-            (SELECT award_modification_amendme,
-                upper_fain,
-                upper_sub_tier,
-                aw_office.office_code AS awarding_office_code,
-                fund_office.office_code AS funding_office_code
-            FROM office_info AS oi
-            LEFT JOIN office AS aw_office
-                ON aw_office.office_code = UPPER(oi.awarding_office_code)
-                AND aw_office.financial_assistance_awards_office IS TRUE
-                AND aw_office.effective_start_date <= oi.action_date
-                AND COALESCE(aw_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date
-            LEFT JOIN office AS fund_office
-                ON fund_office.office_code = UPPER(oi.funding_office_code)
-                AND (fund_office.contract_funding_office IS TRUE
-                    OR fund_office.financial_assistance_funding_office IS TRUE)
-                AND fund_office.effective_start_date <= oi.action_date
-                AND COALESCE(fund_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date)
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET awarding_office_code = CASE WHEN pf.awarding_office_code IS NULL
-                                        THEN fo.awarding_office_code
-                                        ELSE pf.awarding_office_code
-                                   END,
-            funding_office_code = CASE WHEN pf.funding_office_code IS NULL
-                                       THEN fo.funding_office_code
-                                       ELSE pf.funding_office_code
-                                  END
-        FROM filtered_offices AS fo
-        WHERE COALESCE(pf.award_modification_amendme, '') <> COALESCE(fo.award_modification_amendme, '')
-            AND upper_fain = UPPER(fain)
-            AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
-            AND record_type <> '1';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Beginning office data record type not 1 derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+    The cached derivations run together, in their order, at one point. A derivation runs after them if it depends on
+    (or is depended on by) an earlier cached derivation or one already running after them, and before them otherwise.
 
-    query_start = datetime.now()
-    log_derivation("Beginning office data record type 1 derivation", submission_id)
-    # Deriving office codes for record type 1
-    query = """
-        WITH awards AS
-            (SELECT DISTINCT UPPER(uri) AS upper_uri,
-            UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
-            FROM tmp_fabs_{submission_id}
-            WHERE record_type = '1'),
-        min_date AS
-            (SELECT CAST(MIN(action_date) AS DATE) AS min_date,
-            UPPER(uri) AS upper_uri, UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier
-            FROM published_fabs
-            WHERE is_active IS TRUE
-                AND record_type = '1'
-                AND EXISTS (
-                    SELECT 1
-                    FROM awards
-                    WHERE upper_uri = UPPER(uri)
-                        AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
+    Args:
+        derivations: list of FABSDerivation in the order their results have to match
+        cached_names: collection of the names of the derivations computed from the reference cache
+
+    Returns:
+        a tuple of the list of FABSDerivation to run before the cached ones, the list of cached ones, and the list to
+        run after them, each in the order given
+
+    Raises:
+        ValueError: if a cached name isn't one of the derivations, or a derivation has to run both before and after the
+            cached ones
+    """
+    unknown_names = set(cached_names) - {derivation.name for derivation in derivations}
+    if unknown_names:
+        raise ValueError("Unknown cached derivations: {}".format(", ".join(sorted(unknown_names))))
+
+    def conflicts(derivation, other):
+        return derivation.outputs & (other.inputs | other.outputs) or derivation.inputs & other.outputs
+
+    before, cached, after = [], [], []
+    for position, derivation in enumerate(derivations):
+        if derivation.name in cached_names:
+            cached.append(derivation)
+        elif any(conflicts(derivation, other) for other in cached + after):
+            later_cached = [other for other in derivations[position + 1 :] if other.name in cached_names]
+            if any(conflicts(derivation, other) for other in later_cached):
+                raise ValueError(
+                    "Derivation {} has to run both before and after the cached derivations".format(derivation.name)
                 )
-            GROUP BY UPPER(uri), UPPER(awarding_sub_tier_agency_c)),
-        office_info AS
-            (SELECT awarding_office_code AS awarding_office_code,
-                funding_office_code AS funding_office_code,
-                award_modification_amendme,
-                UPPER(uri) AS upper_uri,
-                UPPER(awarding_sub_tier_agency_c) AS upper_sub_tier,
-                cast_as_date(pf.action_date) AS action_date
-            FROM published_fabs AS pf
-            WHERE is_active IS TRUE
-                AND record_type = '1'
-                AND EXISTS (
-                    SELECT 1
-                    FROM min_date AS md
-                    WHERE upper_uri = UPPER(uri)
-                        AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
-                        AND cast_as_date(pf.action_date) = min_date
-                )),
-        filtered_offices AS
-            (SELECT award_modification_amendme,
-                upper_uri,
-                upper_sub_tier,
-                aw_office.office_code AS awarding_office_code,
-                fund_office.office_code AS funding_office_code
-            FROM office_info AS oi
-            LEFT JOIN office AS aw_office
-                ON aw_office.office_code = UPPER(oi.awarding_office_code)
-                AND aw_office.financial_assistance_awards_office IS TRUE
-                AND aw_office.effective_start_date <= oi.action_date
-                AND COALESCE(aw_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date
-            LEFT JOIN office AS fund_office
-                ON fund_office.office_code = UPPER(oi.funding_office_code)
-                AND (fund_office.contract_funding_office IS TRUE
-                    OR fund_office.financial_assistance_funding_office IS TRUE)
-                AND fund_office.effective_start_date <= oi.action_date
-                AND COALESCE(fund_office.effective_end_date, NOW() + INTERVAL '1 year') > oi.action_date)
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET awarding_office_code = CASE WHEN pf.awarding_office_code IS NULL
-                                        THEN fo.awarding_office_code
-                                        ELSE pf.awarding_office_code
-                                   END,
-            funding_office_code = CASE WHEN pf.funding_office_code IS NULL
-                                       THEN fo.funding_office_code
-                                       ELSE pf.funding_office_code
-                                  END
-        FROM filtered_offices AS fo
-        WHERE COALESCE(pf.award_modification_amendme, '') <> COALESCE(fo.award_modification_amendme, '')
-            AND upper_uri = UPPER(uri)
-            AND upper_sub_tier = UPPER(awarding_sub_tier_agency_c)
-            AND record_type = '1';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed office data record type 1 derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning awarding office name derivation", submission_id)
-    # Deriving awarding office name
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET awarding_office_name = office_name
-        FROM office
-        WHERE office_code = UPPER(awarding_office_code);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed awarding office name derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
+            after.append(derivation)
+        else:
+            before.append(derivation)
+    return before, cached, after
 
-    query_start = datetime.now()
-    log_derivation("Beginning funding office name derivation", submission_id)
-    # Deriving funding office name
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET funding_office_name = office_name
-        FROM office
-        WHERE office_code = UPPER(funding_office_code);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed funding office name derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
 
-    log_derivation("Completed office data derivation", submission_id, start_time)
+FABS_SQL_DERIVATIONS_BEFORE_CACHE, FABS_CACHED_DERIVATIONS, FABS_SQL_DERIVATIONS_AFTER_CACHE = split_derivations(
+    FABS_DERIVATIONS, CACHED_DERIVATIONS
+)
+FABS_DERIVATION_PASSES_BEFORE_CACHE = schedule_derivations(FABS_SQL_DERIVATIONS_BEFORE_CACHE)
+FABS_DERIVATION_PASSES_AFTER_CACHE = schedule_derivations(FABS_SQL_DERIVATIONS_AFTER_CACHE)
 
 
-def derive_le_city_code(sess, submission_id):
-    """Deriving legal entity city code
+def schedule_indexes(passes):
+    """Work out when each index declared by the derivations in the passes is needed. An index only exists (and has to be
+    kept up to date by the passes' updates) while consecutive passes use it, and is built again if a later pass needs
+    it after that.
 
     Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning legal entity city code derivation", submission_id)
-
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_city_code = city_code
-        FROM city_code
-        WHERE UPPER(TRIM(legal_entity_city_name)) = UPPER(feature_name)
-            AND UPPER(TRIM(legal_entity_state_code)) = UPPER(state_code);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
+        passes: list of the passes of FABSDerivation to run, as returned by schedule_derivations
 
-    log_derivation(
-        "Completed legal entity city code derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
+    Returns:
+        a tuple of two lists with an entry for each pass: the names of the indexes to build before the pass and the
+        names of the indexes to drop after it
+    """
+    pass_indexes = [
+        sorted({name for derivation in derivations for name in derivation.indexes}) for derivations in passes
+    ]
+    builds = []
+    drops = []
+    for pass_index, index_names in enumerate(pass_indexes):
+        previous_indexes = pass_indexes[pass_index - 1] if pass_index > 0 else []
+        next_indexes = pass_indexes[pass_index + 1] if pass_index + 1 < len(pass_indexes) else []
+        builds.append([name for name in index_names if name not in previous_indexes])
+        drops.append([name for name in index_names if name not in next_indexes])
+    return builds, drops
 
 
-def derive_ppop_country_name(sess, submission_id):
-    """Deriving place of performance country name
+def create_tmp_fabs_index(sess, submission_id, index_name):
+    """Build one of the TMP_FABS_INDEXES on the submission's tmp_fabs table
 
     Args:
         sess: the current DB session
         submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning place of performance country name derivation", submission_id)
+        index_name: the name of the index in TMP_FABS_INDEXES
 
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_perform_country_n = country_name
-        FROM country_code
-        WHERE country_code.country_code = UPPER(place_of_perform_country_c);
+    Returns:
+        how many seconds the index took to build
     """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    log_derivation(
-        "Completed place of performance country name derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        start_time,
+    start_time = datetime.now()
+    query = "CREATE INDEX ix_tmp_fabs_{submission_id}_{index_name} ON tmp_fabs_{submission_id} ({expression});"
+    sess.execute(
+        query.format(submission_id=submission_id, index_name=index_name, expression=TMP_FABS_INDEXES[index_name])
     )
+    log_derivation("Built tmp_fabs index {}".format(index_name), submission_id, start_time)
+    return (datetime.now() - start_time).total_seconds()
 
 
-def derive_le_country_name(sess, submission_id):
-    """Deriving legal entity country name
+def drop_tmp_fabs_index(sess, submission_id, index_name):
+    """Drop one of the TMP_FABS_INDEXES from the submission's tmp_fabs table, reporting how often it was used
 
     Args:
         sess: the current DB session
         submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning legal entity country name derivation", submission_id)
+        index_name: the name of the index in TMP_FABS_INDEXES
 
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET legal_entity_country_name = country_name
-        FROM country_code
-        WHERE country_code.country_code = UPPER(legal_entity_country_code);
+    Returns:
+        how many index scans used the index in the current transaction
     """
-    res = sess.execute(query.format(submission_id=submission_id))
+    full_name = "ix_tmp_fabs_{}_{}".format(submission_id, index_name)
+    scans = sess.execute("SELECT pg_stat_get_xact_numscans('{}'::regclass);".format(full_name)).scalar()
+    sess.execute("DROP INDEX {};".format(full_name))
+    log_derivation("Dropped tmp_fabs index {}, used in {} scans".format(index_name, scans), submission_id)
+    return scans
 
-    log_derivation(
-        "Completed legal entity country name derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
 
+def derivation_pass_query(derivations):
+    """Build the query running a pass of derivations over the tmp_fabs table with a single UPDATE, so each row they
+    derive is only rewritten once.
 
-def derive_pii_redacted_ppop_data(sess, submission_id):
-    """Deriving ppop code and location data for PII-redacted records
+    Every derivation's values are computed for each row first: derivations with a source in a subquery of the rows
+    they match, picking one match per row, and the rest from the row itself. The rows matched by any derivation are
+    then updated, taking each column from the last derivation in the pass that matched the row.
 
     Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning PII redacted information derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning PII redacted USA records derivation", submission_id)
-    # Deriving information for USA records
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_code = CASE WHEN legal_entity_state_code IS NOT NULL
-                                            THEN CASE WHEN legal_entity_city_code IS NOT NULL
-                                                    THEN UPPER(legal_entity_state_code) || legal_entity_city_code
-                                                    ELSE UPPER(legal_entity_state_code) || '00000'
-                                                    END
-                                            ELSE NULL
-                                            END,
-            place_of_perform_country_c = legal_entity_country_code,
-            place_of_perform_country_n = legal_entity_country_name,
-            place_of_performance_city = legal_entity_city_name,
-            place_of_perform_county_co = legal_entity_county_code,
-            place_of_perform_county_na = legal_entity_county_name,
-            place_of_perfor_state_code = legal_entity_state_code,
-            place_of_perform_state_nam = legal_entity_state_name,
-            place_of_performance_zip4a = legal_entity_zip5,
-            place_of_performance_zip5 = legal_entity_zip5,
-            place_of_performance_congr = legal_entity_congressional
-        WHERE record_type = 3
-            AND UPPER(legal_entity_country_code) = 'USA';
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed PII redacted USA records derivation, " "updated {}".format(res.rowcount), submission_id, query_start
+        derivations: list of FABSDerivation making up the pass
+
+    Returns:
+        the query, to be formatted with the submission_id and zip_date
+    """
+    derived_columns = []
+    joins = []
+    matched = []
+    for index, derivation in enumerate(derivations):
+        alias = "d{}".format(index)
+        matched.append("derived.{}_matched".format(alias))
+        if derivation.source is None:
+            derived_columns.append("COALESCE({}, FALSE) AS {}_matched".format(derivation.where or "TRUE", alias))
+            derived_columns.extend(
+                "{} AS {}_{}".format(expression, alias, column) for column, expression in derivation.columns.items()
+            )
+            continue
+
+        derived_columns.append("{alias}.published_fabs_id IS NOT NULL AS {alias}_matched".format(alias=alias))
+        derived_columns.extend(
+            "{alias}.{alias}_{column}".format(alias=alias, column=column) for column in derivation.columns
+        )
+        joins.append(
+            """
+            LEFT JOIN ({with_clause}
+                SELECT DISTINCT ON (pf.published_fabs_id) pf.published_fabs_id, {values}
+                FROM tmp_fabs_{{submission_id}} AS pf, {source}
+                WHERE {where}) AS {alias}
+                ON {alias}.published_fabs_id = pf.published_fabs_id""".format(
+                with_clause="WITH {}".format(derivation.ctes) if derivation.ctes else "",
+                values=", ".join(
+                    "{} AS {}_{}".format(expression, alias, column) for column, expression in derivation.columns.items()
+                ),
+                source=derivation.source,
+                where=derivation.where,
+                alias=alias,
+            )
+        )
+
+    set_columns = []
+    for column in sorted(set().union(*[derivation.outputs for derivation in derivations])):
+        # The last derivation setting the column takes precedence, as it would if they were run one at a time. The
+        # values are cast to the column's type like an UPDATE would when assigning them.
+        cases = [
+            "WHEN derived.d{index}_matched THEN CAST(derived.d{index}_{column} AS {type})".format(
+                index=index, column=column, type=TMP_FABS_COLUMN_TYPES[column]
+            )
+            for index, derivation in reversed(list(enumerate(derivations)))
+            if column in derivation.outputs
+        ]
+        set_columns.append("{column} = CASE {cases} ELSE tf.{column} END".format(column=column, cases=" ".join(cases)))
+
+    return """
+        UPDATE tmp_fabs_{{submission_id}} AS tf
+        SET {set_columns}
+        FROM (
+            SELECT pf.published_fabs_id, {derived_columns}
+            FROM tmp_fabs_{{submission_id}} AS pf{joins}
+        ) AS derived
+        WHERE derived.published_fabs_id = tf.published_fabs_id
+            AND ({matched});
+    """.format(
+        set_columns=",\n            ".join(set_columns),
+        derived_columns=",\n                ".join(derived_columns),
+        joins="".join(joins),
+        matched=" OR ".join(matched),
     )
 
-    query_start = datetime.now()
-    log_derivation("Beginning PII redacted non-USA records derivation", submission_id)
-    # Deriving information for non-USA records
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET place_of_performance_code = '00FORGN',
-            place_of_perform_country_c = legal_entity_country_code,
-            place_of_perform_country_n = legal_entity_country_name,
-            place_of_performance_city = legal_entity_foreign_city,
-            place_of_performance_forei = legal_entity_foreign_city
-        WHERE record_type = 3
-            AND UPPER(legal_entity_country_code) <> 'USA';
+
+def log_derivation(message, submission_id, start_time=None):
+    """Just logging the time taken to run whatever derivation is being run.
+
+    Args:
+        message: the message to log
+        submission_id: the ID of the submission
+        start_time: If provided, use it to calculate the duration.
     """
-    res = sess.execute(query.format(submission_id=submission_id))
-    log_derivation(
-        "Completed PII redacted non-USA records derivation, " "updated {}".format(res.rowcount),
-        submission_id,
-        query_start,
-    )
+    log_message = {"message": message, "message_type": "BrokerDebug", "submission_id": submission_id}
 
-    log_derivation("Completed PII redacted information derivation", submission_id, start_time)
+    if start_time:
+        log_message["duration"] = (datetime.now() - start_time).total_seconds()
+    logger.info(log_message)
 
 
-def derive_parent_uei(sess, submission_id):
-    """Deriving parent UEI name and number from SAM API
+def run_derivation_passes(sess, submission_id, passes, index_report):
+    """Run passes of derivations over the submission's tmp_fabs table. The tmp_fabs indexes the derivations declare are
+    built right before the pass needing them and dropped once it's done, along with refreshing the table's statistics
+    since temporary tables are never analyzed automatically.
 
     Args:
         sess: the current DB session
         submission_id: The ID of the submission derivations are being run for
+        passes: list of the passes of FABSDerivation to run, as returned by schedule_derivations
+        index_report: dict of the name of each index built to a dict of how many times it was built, how many seconds
+            building it took, and how many scans used it, updated with the indexes these passes build
     """
-    start_time = datetime.now()
-    log_derivation("Beginning parent UEI derivation", submission_id)
-
-    query = """
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET ultimate_parent_legal_enti = sam_recipient.ultimate_parent_legal_enti,
-            ultimate_parent_uei = sam_recipient.ultimate_parent_uei
-        FROM sam_recipient
-        WHERE UPPER(pf.uei) = UPPER(sam_recipient.uei)
-            AND (sam_recipient.ultimate_parent_legal_enti IS NOT NULL
-                OR sam_recipient.ultimate_parent_uei IS NOT NULL);
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
+    index_builds, index_drops = schedule_indexes(passes)
+    for pass_number, derivations in enumerate(passes, start=1):
+        for index_name in index_builds[pass_number - 1]:
+            usage = index_report.setdefault(index_name, {"builds": 0, "build_seconds": 0, "scans": 0})
+            usage["builds"] += 1
+            usage["build_seconds"] += create_tmp_fabs_index(sess, submission_id, index_name)
+        if index_builds[pass_number - 1]:
+            sess.execute("ANALYZE tmp_fabs_{submission_id};".format(submission_id=submission_id))
 
-    log_derivation("Completed parent UEI derivation, updated {}".format(res.rowcount), submission_id, start_time)
+        pass_start = datetime.now()
+        derivation_names = ", ".join(derivation.name for derivation in derivations)
+        log_derivation("Beginning derivation pass {}: {}".format(pass_number, derivation_names), submission_id)
 
+        query = derivation_pass_query(derivations)
+        res = sess.execute(query.format(submission_id=submission_id, zip_date=ZIP_DATE_CHANGE))
 
-def derive_executive_compensation(sess, submission_id):
-    """Deriving Executive Compensation information from UEI.
+        log_derivation(
+            "Completed derivation pass {}, updated {}".format(pass_number, res.rowcount), submission_id, pass_start
+        )
 
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning executive compensation derivation", submission_id)
-
-    query = """
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET high_comp_officer1_full_na = sam_recipient.high_comp_officer1_full_na,
-            high_comp_officer1_amount = sam_recipient.high_comp_officer1_amount,
-            high_comp_officer2_full_na = sam_recipient.high_comp_officer2_full_na,
-            high_comp_officer2_amount = sam_recipient.high_comp_officer2_amount,
-            high_comp_officer3_full_na = sam_recipient.high_comp_officer3_full_na,
-            high_comp_officer3_amount = sam_recipient.high_comp_officer3_amount,
-            high_comp_officer4_full_na = sam_recipient.high_comp_officer4_full_na,
-            high_comp_officer4_amount = sam_recipient.high_comp_officer4_amount,
-            high_comp_officer5_full_na = sam_recipient.high_comp_officer5_full_na,
-            high_comp_officer5_amount = sam_recipient.high_comp_officer5_amount
-        FROM sam_recipient
-        WHERE UPPER(pf.uei) = UPPER(sam_recipient.uei)
-            AND sam_recipient.high_comp_officer1_full_na IS NOT NULL;
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
+        for index_name in index_drops[pass_number - 1]:
+            index_report[index_name]["scans"] += drop_tmp_fabs_index(sess, submission_id, index_name)
 
-    log_derivation(
-        "Completed executive compensation derivation, " "updated {}".format(res.rowcount), submission_id, start_time
-    )
 
+def derive_from_reference_cache(sess, submission_id, derivations, reference_cache):
+    """Run derivations over the submission's tmp_fabs table in the worker, matching rows against its reference cache
+    instead of joining the reference tables in the database. The rows are read in batches, each derivation is applied to
+    the batch in order, and the rows any of them changed are copied to a temporary table that's applied to tmp_fabs
+    with a single UPDATE at the end.
 
-def derive_labels(sess, submission_id):
-    """Deriving labels for codes entered by the user
+    Derivations whose source is built from the submission's own data (the offices of its awards' earliest records) have
+    their source rows read from the database once before the batches.
 
     Args:
         sess: the current DB session
         submission_id: The ID of the submission derivations are being run for
-    """
-    start_time = datetime.now()
-    log_derivation("Beginning label derivation", submission_id)
-
-    query_start = datetime.now()
-    log_derivation("Beginning action type label derivation", submission_id)
-    # Action type description derivation
-    action_type_values = "), (".join("'{}', '{}'".format(name, desc) for name, desc in ACTION_TYPE_DICT.items())
-    query = """
-        WITH action_type_desc AS
-            (SELECT *
-            FROM (VALUES ({action_types})) as action_type_desc(letter, description))
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET action_type_description = description
-        FROM action_type_desc AS atd
-        WHERE atd.letter = UPPER(pf.action_type);
-    """
-    res = sess.execute(query.format(submission_id=submission_id, action_types=action_type_values))
-    log_derivation(
-        "Completed action type label derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning assistance type label derivation", submission_id)
-    # Assistance type description derivation
-    assistance_type_values = "), (".join("'{}', '{}'".format(name, desc) for name, desc in ASSISTANCE_TYPE_DICT.items())
-    query = """
-        WITH assistance_type_description AS
-            (SELECT *
-            FROM (VALUES ({assistance_types})) as assistance_type_description(letter, description))
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET assistance_type_desc = description
-        FROM assistance_type_description AS atd
-        WHERE atd.letter = UPPER(pf.assistance_type);
-    """
-    res = sess.execute(query.format(submission_id=submission_id, assistance_types=assistance_type_values))
-    log_derivation(
-        "Completed assistance type label derivation, " "updated {}".format(res.rowcount), submission_id, query_start
-    )
-
-    query_start = datetime.now()
-    log_derivation("Beginning cdi label derivation", submission_id)
-    # CorrectionDeleteIndicator description derivation
-    cdi_values = "), (".join("'{}', '{}'".format(name, desc) for name, desc in CORRECTION_DELETE_IND_DICT.items())
-    query = """
-        WITH cdi_desc AS
-            (SELECT *
-            FROM (VALUES ({cdi_types})) as cdi_desc(letter, description))
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET correction_delete_ind_desc = description
-        FROM cdi_desc
-        WHERE cdi_desc.letter = UPPER(pf.correction_delete_indicatr);
-    """
-    res = sess.execute(query.format(submission_id=submission_id, cdi_types=cdi_values))
-    log_derivation("Completed cdi label derivation, " "updated {}".format(res.rowcount), submission_id, query_start)
-
-    query_start = datetime.now()
-    log_derivation("Beginning record type label derivation", submission_id)
-    # Record Type description derivation
-    record_type_values = "), (".join("{}, '{}'".format(name, desc) for name, desc in RECORD_TYPE_DICT.items())
-    query = """
-        WITH record_type_desc AS
-            (SELECT *
-            FROM (VALUES ({record_types})) as record_type_desc(letter, description))
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET record_type_description = description
-        FROM record_type_desc AS rtd
-        WHERE rtd.letter = pf.record_type;
-    """
-    res = sess.execute(query.format(submission_id=submission_id, record_types=record_type_values))
-    log_derivation(
-        "Completed record type label derivation, " "updated {}".format(res.rowcount), submission_id, query_start
+        derivations: list of FABSDerivation to run, in order, each with an implementation in CACHED_DERIVATIONS
+        reference_cache: the FABSReferenceCache to match rows against
+
+    Returns:
+        the number of tmp_fabs rows updated
+    """
+    conn = sess.connection()
+    source_rows = {
+        derivation.name: pd.read_sql(
+            "WITH {} SELECT * FROM filtered_offices".format(derivation.ctes.format(submission_id=submission_id)), conn
+        )
+        for derivation in derivations
+        if derivation.source == "filtered_offices AS fo"
+    }
+
+    outputs = sorted(set().union(*[derivation.outputs for derivation in derivations]))
+    columns = sorted(set().union(*[derivation.inputs | derivation.outputs for derivation in derivations]))
+    sess.execute(
+        """
+        CREATE TEMP TABLE tmp_fabs_{submission_id}_cached
+        ON COMMIT DROP
+        AS
+            SELECT published_fabs_id, {outputs}
+            FROM tmp_fabs_{submission_id}
+            WHERE false;
+    """.format(
+            submission_id=submission_id, outputs=", ".join(outputs)
+        )
     )
-
-    query_start = datetime.now()
-    log_derivation("Beginning business funds ind label derivation", submission_id)
-    # Business Funds Indicator description derivation
-    business_funds_values = "), (".join(
-        "'{}', '{}'".format(name, desc) for name, desc in BUSINESS_FUNDS_IND_DICT.items()
+    batch_query = """
+        SELECT published_fabs_id, {columns}, cast_as_date(action_date) < '{zip_date}' AS before_zip_date_change
+        FROM tmp_fabs_{submission_id}
+        WHERE published_fabs_id > {{last_id}}
+        ORDER BY published_fabs_id
+        LIMIT {batch_size};
+    """.format(
+        columns=", ".join(columns),
+        zip_date=ZIP_DATE_CHANGE,
+        submission_id=submission_id,
+        batch_size=REFERENCE_CACHE_BATCH_SIZE,
     )
-    query = """
-        WITH business_funds_ind_description AS
-            (SELECT *
-            FROM (VALUES ({business_funds_ind})) as business_funds_ind_description(letter, description))
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET business_funds_ind_desc = description
-        FROM business_funds_ind_description AS bfid
-        WHERE bfid.letter = UPPER(pf.business_funds_indicator);
-    """
-    res = sess.execute(query.format(submission_id=submission_id, business_funds_ind=business_funds_values))
-    log_derivation(
-        "Completed business funds ind label derivation, " "updated {}".format(res.rowcount), submission_id, query_start
+    copy_sql = "COPY tmp_fabs_{}_cached (published_fabs_id, {}) FROM STDIN WITH CSV".format(
+        submission_id, ", ".join(outputs)
     )
-
-    query_start = datetime.now()
-    log_derivation("Beginning business type label derivation", submission_id)
-    # Business types description derivation
-    business_types_values = "), (".join("'{}', '{}'".format(name, desc) for name, desc in BUSINESS_TYPE_DICT.items())
-    query = """
-        WITH business_type_desc AS
-            (SELECT *
-            FROM(VALUES ({business_types})) as business_type_desc(letter, description)),
-        aggregated_business_types AS
-            (SELECT published_fabs_id,
-                string_agg(btd.description, ';' order by ordinality) AS aggregated
-            FROM tmp_fabs_{submission_id} AS pf,
-                unnest(string_to_array(pf.business_types, NULL)) WITH ORDINALITY AS u(business_type_id, ordinality)
-            LEFT JOIN business_type_desc AS btd
-                ON btd.letter = UPPER(business_type_id)
-            GROUP BY published_fabs_id)
-        UPDATE tmp_fabs_{submission_id} AS pf
-        SET business_types_desc = abt.aggregated
-        FROM aggregated_business_types AS abt
-        WHERE
-            abt.published_fabs_id = pf.published_fabs_id;
-    """
-    res = sess.execute(query.format(submission_id=submission_id, business_types=business_types_values))
-    log_derivation(
-        "Completed business type label derivation, " "updated {}".format(res.rowcount), submission_id, query_start
+    schema = pa.schema([("published_fabs_id", pa.int64())] + [(column, pa.string()) for column in outputs])
+    # Quoting every value keeps empty strings apart from NULLs, which are left unquoted
+    write_options = pa_csv.WriteOptions(include_header=False, quoting_style="all_valid")
+
+    last_id = 0
+    with conn.connection.cursor() as cursor:
+        while True:
+            frame = pd.read_sql(batch_query.format(last_id=last_id), conn)
+            if frame.empty:
+                break
+            last_id = frame["published_fabs_id"].iloc[-1]
+            frame[columns] = frame[columns].astype(object)
+            original = frame[outputs].copy()
+            for derivation in derivations:
+                CACHED_DERIVATIONS[derivation.name](reference_cache, frame, source_rows.get(derivation.name))
+
+            unchanged = frame[outputs].eq(original) | (frame[outputs].isna() & original.isna())
+            changed_rows = frame.loc[~unchanged.all(axis=1), ["published_fabs_id"] + outputs]
+            copy_buffer = BytesIO()
+            pa_csv.write_csv(
+                pa.Table.from_pandas(changed_rows, schema=schema, preserve_index=False),
+                copy_buffer,
+                write_options=write_options,
+            )
+            copy_buffer.seek(0)
+            cursor.copy_expert(copy_sql, copy_buffer)
+
+    res = sess.execute(
+        """
+        UPDATE tmp_fabs_{submission_id} AS tf
+        SET {set_columns}
+        FROM tmp_fabs_{submission_id}_cached AS cached
+        WHERE cached.published_fabs_id = tf.published_fabs_id;
+    """.format(
+            submission_id=submission_id,
+            set_columns=", ".join("{column} = cached.{column}".format(column=column) for column in outputs),
+        )
     )
-
-    log_derivation("Completed label derivation", submission_id, start_time)
+    return res.rowcount
 
 
 def fabs_derivations(sess, submission_id):
-    """Performs derivations related to publishing a FABS submission
+    """Performs derivations related to publishing a FABS submission, either all of them in SQL passes or, with the
+    reference cache on, the location and office derivations in the worker between the SQL passes of the rest.
 
     Args:
         sess: the current DB session
         submission_id: The ID of the submission derivations are being run for
-    """
-    # TODO: Decide if we want to include the job in the logs
-    # TODO: Decide if we want to log each SQL query (including start/end or just the end) or just each function
-    derive_total_funding_amount(sess, submission_id)
-
-    derive_assistance_listing(sess, submission_id)
-
-    derive_awarding_agency_data(sess, submission_id)
-
-    derive_funding_agency_data(sess, submission_id)
-
-    derive_ppop_state(sess, submission_id)
-
-    split_ppop_zip(sess, submission_id)
-
-    derive_ppop_location_data(sess, submission_id)
-
-    derive_le_location_data(sess, submission_id)
-
-    derive_office_data(sess, submission_id)
-
-    derive_le_city_code(sess, submission_id)
-
-    derive_ppop_country_name(sess, submission_id)
 
-    derive_le_country_name(sess, submission_id)
-
-    derive_pii_redacted_ppop_data(sess, submission_id)
-
-    derive_parent_uei(sess, submission_id)
-
-    derive_executive_compensation(sess, submission_id)
-
-    derive_labels(sess, submission_id)
-
-    derive_ppop_scope(sess, submission_id)
-
-    derive_fabs_business_categories(sess, submission_id)
+    Returns:
+        dict of the name of each index built to a dict of how many times it was built, how many seconds building it
+        took, and how many scans used it
+    """
+    start_time = datetime.now()
+    index_report = {}
+    if FABS_REFERENCE_CACHE:
+        reference_cache = get_fabs_reference_cache(sess)
+        log_derivation(
+            "Beginning FABS derivations ({} derivations, {} from the reference cache)".format(
+                len(FABS_DERIVATIONS), len(FABS_CACHED_DERIVATIONS)
+            ),
+            submission_id,
+        )
+        run_derivation_passes(sess, submission_id, FABS_DERIVATION_PASSES_BEFORE_CACHE, index_report)
+
+        cache_start = datetime.now()
+        log_derivation("Beginning reference cache derivations", submission_id)
+        updated = derive_from_reference_cache(sess, submission_id, FABS_CACHED_DERIVATIONS, reference_cache)
+        log_derivation("Completed reference cache derivations, updated {}".format(updated), submission_id, cache_start)
+
+        run_derivation_passes(sess, submission_id, FABS_DERIVATION_PASSES_AFTER_CACHE, index_report)
+    else:
+        log_derivation(
+            "Beginning FABS derivations ({} derivations in {} passes)".format(
+                len(FABS_DERIVATIONS), len(FABS_DERIVATION_PASSES)
+            ),
+            submission_id,
+        )
+        run_derivation_passes(sess, submission_id, FABS_DERIVATION_PASSES, index_report)
+
+    unused_indexes = sorted(name for name, usage in index_report.items() if usage["scans"] == 0)
+    log_derivation(
+        "Completed FABS derivations, unused tmp_fabs indexes: {}".format(", ".join(unused_indexes) or "none"),
+        submission_id,
+        start_time,
+    )
+    return index_report
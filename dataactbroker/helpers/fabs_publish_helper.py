@@ -0,0 +1,236 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from dataactbroker.helpers.fabs_derivations_helper import fabs_derivations, log_derivation
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.stagingModels import FABS, PublishedFABS
+
+# Set to publish large FABS submissions by deriving hash partitions of their rows at the same time, each on its own
+# database connection
+PARALLEL_FABS_PUBLISH = CONFIG_BROKER["parallel_fabs_publish"]
+# How many partitions the rows are split into, and so how many connections derive them at once
+FABS_PUBLISH_PARTITIONS = CONFIG_BROKER["fabs_publish_partitions"]
+# Submissions with fewer valid rows than this are derived on one connection even when partitioning is on, splitting
+# them up costs more than it saves
+FABS_PARTITION_MIN_ROWS = 100000
+
+
+def tmp_fabs_columns():
+    """The columns copied from the fabs table to the tmp_fabs table and from there to published_fabs
+
+    Returns:
+        list of the names of the columns shared by the fabs and published_fabs tables that are copied over
+    """
+    return [
+        col.key
+        for col in PublishedFABS.__table__.columns
+        if col.key not in ["created_at", "updated_at", "modified_at", "is_active", "published_fabs_id"]
+    ]
+
+
+def publishable_fabs_columns():
+    """The columns of the fabs table copied to the tmp_fabs table
+
+    Returns:
+        list of the names of the columns of the fabs table other than its keys, timestamps and validation details
+    """
+    return [
+        col.key
+        for col in FABS.__table__.columns
+        if col.key not in ["created_at", "updated_at", "fabs_id", "job_id", "row_number", "is_valid"]
+    ]
+
+
+def partition_filter(partition, partition_count):
+    """The condition selecting the fabs rows in one hash partition, by their case-insensitive afa_generated_unique
+
+    Args:
+        partition: the number of the partition, from 0
+        partition_count: how many partitions the rows are split into
+
+    Returns:
+        the SQL condition
+    """
+    return "ABS(MOD(HASHTEXT(UPPER(COALESCE(fabs.afa_generated_unique, ''))), {})) = {}".format(
+        partition_count, partition
+    )
+
+
+def create_tmp_fabs(sess, submission_id, partition=None, partition_count=None):
+    """Create the submission's tmp_fabs temporary table and copy its publishable (valid, non-delete) records into it
+
+    Args:
+        sess: the DB session to create the table in, the only one it's visible to
+        submission_id: the ID of the submission being published
+        partition: the number of the hash partition of the records to copy, all of them if None
+        partition_count: how many partitions the records are split into
+
+    Returns:
+        the number of records copied
+    """
+    log_derivation("Beginning transfer of publishable records to temp table", submission_id)
+    create_table_sql = """
+        CREATE TEMP TABLE tmp_fabs_{submission_id}
+        ON COMMIT DROP
+        AS
+            SELECT {cols}
+            FROM published_fabs
+            WHERE false;
+
+        ALTER TABLE tmp_fabs_{submission_id} ADD COLUMN published_fabs_id
+            SERIAL PRIMARY KEY;
+    """.format(
+        submission_id=submission_id, cols=", ".join(tmp_fabs_columns())
+    )
+    sess.execute(create_table_sql)
+
+    insert_query = """
+        INSERT INTO tmp_fabs_{submission_id} ({cols})
+        SELECT {cols}
+        FROM fabs
+        WHERE fabs.submission_id = {submission_id}
+            AND fabs.is_valid IS TRUE
+            AND UPPER(COALESCE(correction_delete_indicatr, '')) <> 'D'{partition_filter};
+    """
+    res = sess.execute(
+        insert_query.format(
+            cols=", ".join(publishable_fabs_columns()),
+            submission_id=submission_id,
+            partition_filter=(
+                "\n            AND {}".format(partition_filter(partition, partition_count))
+                if partition is not None
+                else ""
+            ),
+        )
+    )
+    log_derivation("Completed transfer of publishable records to temp table", submission_id)
+    return res.rowcount
+
+
+def partition_table_name(submission_id, partition):
+    """The name of the table holding a derived partition of a submission's records until they're published"""
+    return "fabs_publish_{}_part_{}".format(submission_id, partition)
+
+
+def derive_fabs_partition(sess, submission_id, partition, partition_count):
+    """Derive one hash partition of a submission's publishable records in a tmp_fabs table of its own, then keep the
+    derived records in an unlogged table so the session publishing the submission can read them
+
+    Args:
+        sess: the DB session to derive the partition on
+        submission_id: the ID of the submission being published
+        partition: the number of the partition, from 0
+        partition_count: how many partitions the records are split into
+
+    Returns:
+        the number of records in the partition
+    """
+    partition_start = datetime.now()
+    row_count = create_tmp_fabs(sess, submission_id, partition, partition_count)
+    fabs_derivations(sess, submission_id)
+
+    table_name = partition_table_name(submission_id, partition)
+    # Left behind if a worker publishing the submission before was stopped before cleaning up
+    sess.execute("DROP TABLE IF EXISTS {};".format(table_name))
+    sess.execute(
+        "CREATE UNLOGGED TABLE {table_name} AS SELECT {cols} FROM tmp_fabs_{submission_id};".format(
+            table_name=table_name, cols=", ".join(tmp_fabs_columns()), submission_id=submission_id
+        )
+    )
+    sess.commit()
+    log_derivation(
+        "Completed derivations for partition {} of {} ({} records)".format(partition + 1, partition_count, row_count),
+        submission_id,
+        partition_start,
+    )
+    return row_count
+
+
+def derive_fabs_partitions(sess, submission_id, partition_count):
+    """Derive a submission's publishable records in hash partitions at the same time, each on its own connection. The
+    derived partitions are left in unlogged tables for the publishing session to insert from and drop, with
+    drop_fabs_partitions, in the same transaction as the rest of the publish.
+
+    Args:
+        sess: the DB session publishing the submission, used to check every record was derived
+        submission_id: the ID of the submission being published
+        partition_count: how many partitions to split the records into
+
+    Returns:
+        list of the names of the tables holding the derived partitions
+
+    Raises:
+        ValueError: if the partitions don't add up to all the publishable records
+    """
+    # Scoped sessions are thread-local, each worker gets its own session/connection from the shared engine
+    worker_sessions = scoped_session(sessionmaker(bind=GlobalDB.db().engine))
+
+    def run_partition(partition):
+        worker_sess = worker_sessions()
+        try:
+            return derive_fabs_partition(worker_sess, submission_id, partition, partition_count)
+        except Exception:
+            worker_sess.rollback()
+            raise
+        finally:
+            worker_sessions.remove()
+
+    with ThreadPoolExecutor(max_workers=partition_count, thread_name_prefix="fabs_publish") as executor:
+        futures = [executor.submit(run_partition, partition) for partition in range(partition_count)]
+        # Every partition finishes before any error is raised, so no worker is still writing its table once the
+        # publishing session drops them
+        partition_counts = [future.result() for future in futures]
+
+    expected_count = sess.execute(
+        """
+        SELECT COUNT(*)
+        FROM fabs
+        WHERE fabs.submission_id = {submission_id}
+            AND fabs.is_valid IS TRUE
+            AND UPPER(COALESCE(correction_delete_indicatr, '')) <> 'D';
+    """.format(
+            submission_id=submission_id
+        )
+    ).scalar()
+    if sum(partition_counts) != expected_count:
+        raise ValueError(
+            "The FABS partitions of submission {} have {} records instead of {}".format(
+                submission_id, sum(partition_counts), expected_count
+            )
+        )
+    return [partition_table_name(submission_id, partition) for partition in range(partition_count)]
+
+
+def drop_fabs_partitions(sess, submission_id, partition_count):
+    """Drop the tables holding the derived partitions of a submission, if they exist. Run in the publishing transaction
+    so they're only gone once the publish is committed, and again after rolling it back.
+
+    Args:
+        sess: the DB session publishing the submission
+        submission_id: the ID of the submission being published
+        partition_count: how many partitions the records were split into
+    """
+    for partition in range(partition_count):
+        sess.execute("DROP TABLE IF EXISTS {};".format(partition_table_name(submission_id, partition)))
+
+
+def insert_published_fabs(sess, submission_id, source_tables):
+    """Insert the derived non-delete records of a submission into published_fabs
+
+    Args:
+        sess: the DB session publishing the submission
+        submission_id: the ID of the submission being published
+        source_tables: list of the tables holding the derived records, the submission's tmp_fabs or its partitions
+    """
+    cols = ", ".join(tmp_fabs_columns())
+    insert_query = """
+        INSERT INTO published_fabs (created_at, updated_at, {cols}, modified_at, is_active)
+        SELECT NOW() AS created_at, NOW() AS updated_at, {cols}, NOW() AS modified_at, TRUE AS is_active
+        FROM ({source}) AS tmp_fabs;
+    """
+    source = " UNION ALL ".join("SELECT {} FROM {}".format(cols, table) for table in source_tables)
+    sess.execute(insert_query.format(cols=cols, source=source))
+    log_derivation("Inserted derived records of submission into published table", submission_id)
@@ -0,0 +1,704 @@
+import logging
+import threading
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import case, func, select
+
+from dataactcore.models.domainModels import (
+    CDCityGrouped,
+    CDCountyGrouped,
+    CDStateGrouped,
+    CDZipsGrouped,
+    CDZipsGroupedHistorical,
+    CGAC,
+    CityCode,
+    CountryCode,
+    CountyCode,
+    FREC,
+    Office,
+    States,
+    SubTierAgency,
+    ZipCity,
+    Zips,
+    ZipsGrouped,
+    ZipsGroupedHistorical,
+    ZipsHistorical,
+)
+
+logger = logging.getLogger(__name__)
+
+# How long a worker keeps using the reference tables it loaded before loading them again, so it picks up the nightly
+# reference data loads
+REFERENCE_CACHE_TTL = timedelta(hours=6)
+# How many rows of a reference table are read at a time while loading it
+REFERENCE_CHUNK_SIZE = 500000
+
+# The ppop code formats of a city, county, and state, matching the ones the SQL derivations use
+PPOP_CITY_FORMAT = r"[A-Z][A-Z][0-9]{4}[0-9RT]|[A-Z][A-Z]TS[0-9]{3}"
+PPOP_COUNTY_FORMAT = r"[A-Z][A-Z]\*\*[0-9]{3}"
+PPOP_STATE_FORMAT = r"[A-Z][A-Z]\*{5}"
+
+
+def reference_table_queries():
+    """The queries loading each cached reference table and the columns its rows are matched by. Tables matched on
+    normalized values (like UPPER(feature_name)) are loaded already normalized.
+
+    Returns:
+        dict of the name of each cached table to a tuple of the query loading it and the list of its key columns
+    """
+    agency_code = case((SubTierAgency.is_frec, FREC.frec_code), else_=CGAC.cgac_code)
+    agency_name = case((SubTierAgency.is_frec, FREC.agency_name), else_=CGAC.agency_name)
+    zip_columns = ["zip5", "zip_last4", "state_abbreviation", "county_number", "congressional_district_no"]
+    return {
+        "agencies": (
+            select(
+                agency_code.label("agency_code"),
+                agency_name.label("agency_name"),
+                SubTierAgency.sub_tier_agency_code.label("sub_tier_code"),
+                SubTierAgency.sub_tier_agency_name.label("sub_tier_name"),
+            )
+            .join(CGAC, CGAC.cgac_id == SubTierAgency.cgac_id)
+            .join(FREC, FREC.frec_id == SubTierAgency.frec_id),
+            ["sub_tier_code"],
+        ),
+        "offices": (select(Office.office_code, Office.office_name, Office.sub_tier_code), ["office_code"]),
+        "states": (select(States.state_code, States.state_name), ["state_code"]),
+        "zips": (select(*[getattr(Zips, column) for column in zip_columns]), ["zip5", "zip_last4"]),
+        "zips_historical": (
+            select(*[getattr(ZipsHistorical, column) for column in zip_columns]),
+            ["zip5", "zip_last4"],
+        ),
+        "zips_grouped": (
+            select(ZipsGrouped.zip5, ZipsGrouped.state_abbreviation, ZipsGrouped.county_number),
+            ["zip5", "state_abbreviation"],
+        ),
+        "zips_grouped_historical": (
+            select(
+                ZipsGroupedHistorical.zip5,
+                ZipsGroupedHistorical.state_abbreviation,
+                ZipsGroupedHistorical.county_number,
+            ),
+            ["zip5", "state_abbreviation"],
+        ),
+        "cd_zips_grouped": (
+            select(CDZipsGrouped.zip5, CDZipsGrouped.state_abbreviation, CDZipsGrouped.congressional_district_no),
+            ["zip5", "state_abbreviation"],
+        ),
+        "cd_zips_grouped_historical": (
+            select(
+                CDZipsGroupedHistorical.zip5,
+                CDZipsGroupedHistorical.state_abbreviation,
+                CDZipsGroupedHistorical.congressional_district_no,
+            ),
+            ["zip5", "state_abbreviation"],
+        ),
+        "cd_county_grouped": (
+            select(
+                CDCountyGrouped.state_abbreviation,
+                CDCountyGrouped.county_number,
+                CDCountyGrouped.congressional_district_no,
+            ),
+            ["state_abbreviation", "county_number"],
+        ),
+        "cd_city_grouped": (
+            select(CDCityGrouped.state_abbreviation, CDCityGrouped.city_code, CDCityGrouped.congressional_district_no),
+            ["state_abbreviation", "city_code"],
+        ),
+        "cd_state_grouped": (
+            select(CDStateGrouped.state_abbreviation, CDStateGrouped.congressional_district_no),
+            ["state_abbreviation"],
+        ),
+        "zip_city": (select(ZipCity.zip_code, ZipCity.preferred_city_name, ZipCity.state_code), ["zip_code"]),
+        "city_codes": (
+            select(
+                CityCode.city_code,
+                CityCode.state_code,
+                CityCode.county_number,
+                CityCode.county_name,
+                CityCode.feature_name,
+            ),
+            ["city_code", "state_code"],
+        ),
+        "city_names": (
+            select(
+                func.upper(CityCode.feature_name).label("feature_name"),
+                func.upper(CityCode.state_code).label("state_code"),
+                CityCode.city_code,
+            ),
+            ["feature_name", "state_code"],
+        ),
+        "county_codes": (
+            select(CountyCode.county_number, CountyCode.state_code, CountyCode.county_name),
+            ["county_number", "state_code"],
+        ),
+        "country_codes": (select(CountryCode.country_code, CountryCode.country_name), ["country_code"]),
+    }
+
+
+class ReferenceTable:
+    """A reference table held in memory column by column. Every column is a Categorical, so a value repeated across
+    rows (a state, a county number, a zip5 shared by thousands of zip+4s) is only stored once and each row only takes
+    a small integer code per column.
+
+    Rows are found by their key columns, keeping the first row loaded for each key. Rows with a NULL key are left out
+    since they'd never match in SQL either.
+
+    Attributes:
+        index: MultiIndex of the key of each row
+        columns: dict of the name of each column to its Categorical values
+    """
+
+    __slots__ = ("index", "columns")
+
+    def __init__(self, columns, key_columns):
+        """Index the rows of a table by their keys
+
+        Args:
+            columns: dict of the name of each column of the table to its Categorical values
+            key_columns: list of the names of the columns rows are found by
+        """
+        index = pd.MultiIndex.from_arrays([columns[column] for column in key_columns])
+        keep = ~index.duplicated()
+        for column in key_columns:
+            keep &= columns[column].notna()
+        self.index = index[keep]
+        self.columns = {name: values[keep] for name, values in columns.items()}
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, *keys):
+        """Find the row matching each set of key values
+
+        Args:
+            keys: a Series for each key column, in order, of the values to match
+
+        Returns:
+            numpy array of the position of the row each set of values matches, -1 where none does
+        """
+        return self.index.get_indexer(pd.MultiIndex.from_arrays(keys))
+
+    def values(self, column, positions):
+        """Get a column's values at the positions found by lookup
+
+        Args:
+            column: the name of the column
+            positions: numpy array of row positions, -1 for no row
+
+        Returns:
+            numpy object array of the values, NaN where there's no row
+        """
+        return np.asarray(self.columns[column].take(positions, allow_fill=True), dtype=object)
+
+
+def load_reference_table(conn, query, key_columns):
+    """Load a reference table a chunk at a time, turning each chunk into Categoricals before reading the next so the
+    table's rows are never all held as Python strings at once
+
+    Args:
+        conn: the database connection to read the table with
+        query: the query selecting the table's columns
+        key_columns: list of the names of the columns rows are found by
+
+    Returns:
+        the ReferenceTable
+    """
+    column_names = [column.name for column in query.selected_columns]
+    chunks = {name: [] for name in column_names}
+    stream = conn.execution_options(stream_results=True)
+    for chunk in pd.read_sql(query, stream, chunksize=REFERENCE_CHUNK_SIZE):
+        for name in column_names:
+            chunks[name].append(pd.Categorical(chunk[name].astype(object)))
+    columns = {
+        name: union_categoricals(values) if values else pd.Categorical([], categories=pd.Index([], dtype=object))
+        for name, values in chunks.items()
+    }
+    return ReferenceTable(columns, key_columns)
+
+
+class FABSReferenceCache:
+    """The location and office reference tables the FABS location and office derivations match rows against, loaded
+    once per worker so those derivations can be computed for batches of tmp_fabs rows without joining the tables in
+    the database.
+
+    Attributes:
+        tables: dict of the name of each table in reference_table_queries to its ReferenceTable
+        loaded_at: when the tables were loaded
+    """
+
+    __slots__ = ("tables", "loaded_at")
+
+    def __init__(self, sess):
+        """Load all the reference tables
+
+        Args:
+            sess: the current DB session
+        """
+        start_time = datetime.now()
+        conn = sess.connection()
+        self.tables = {
+            name: load_reference_table(conn, query, key_columns)
+            for name, (query, key_columns) in reference_table_queries().items()
+        }
+        self.loaded_at = datetime.now()
+        logger.info(
+            {
+                "message": "Loaded FABS reference cache",
+                "message_type": "BrokerInfo",
+                "rows": {name: len(table) for name, table in self.tables.items()},
+                "duration": (self.loaded_at - start_time).total_seconds(),
+            }
+        )
+
+    def is_stale(self):
+        """Whether the tables were loaded longer than REFERENCE_CACHE_TTL ago"""
+        return datetime.now() - self.loaded_at >= REFERENCE_CACHE_TTL
+
+
+_reference_cache = None
+# Partitions of a submission are derived at the same time, only one of them loads the cache
+_reference_cache_lock = threading.Lock()
+
+
+def get_fabs_reference_cache(sess):
+    """Get the worker's FABS reference cache, loading it the first time and once it's stale
+
+    Args:
+        sess: the current DB session
+
+    Returns:
+        the FABSReferenceCache
+    """
+    global _reference_cache
+    with _reference_cache_lock:
+        if _reference_cache is None or _reference_cache.is_stale():
+            _reference_cache = FABSReferenceCache(sess)
+        return _reference_cache
+
+
+def upper(series):
+    """UPPER() a text column, keeping its NULLs"""
+    return series.str.upper()
+
+
+def is_format(series, pattern):
+    """Whether each value of a text column matches the whole of a pattern, False for NULLs"""
+    return series.str.fullmatch(pattern).eq(True).to_numpy()
+
+
+def set_values(frame, rows, column, values):
+    """Set a column of the rows selected by a mask to the values at the same positions
+
+    Args:
+        frame: the DataFrame of tmp_fabs rows
+        rows: numpy boolean array of the rows to set
+        column: the name of the column to set
+        values: numpy array or Series of a value for every row of the frame
+    """
+    if rows.any():
+        frame.loc[rows, column] = np.asarray(values, dtype=object)[rows]
+
+
+def derive_from_table(frame, table, keys, columns, where=None):
+    """Set columns of the rows matching a reference table to the values of their matching row
+
+    Args:
+        frame: the DataFrame of tmp_fabs rows
+        table: the ReferenceTable to match rows against
+        keys: list of a Series for each of the table's key columns, of the values rows are matched by
+        columns: dict of each column set to the table column it's set to
+        where: numpy boolean array of the rows to derive, all of them if None
+
+    Returns:
+        numpy boolean array of the rows derived
+    """
+    positions = table.lookup(*keys)
+    rows = positions >= 0
+    if where is not None:
+        rows &= where
+    values = {column: table.values(table_column, positions) for column, table_column in columns.items()}
+    for column, column_values in values.items():
+        set_values(frame, rows, column, column_values)
+    return rows
+
+
+def zip_date_rows(frame, historical):
+    """The rows whose action dates are before (historical) or on/after ZIP_DATE_CHANGE, neither when NULL"""
+    return frame["before_zip_date_change"].eq(historical).to_numpy()
+
+
+def derive_congressional(frame, rows, column, congressional_districts):
+    """Set a congressional district column of the rows that don't have one yet"""
+    current = frame[column]
+    set_values(frame, rows, column, np.where(current.isna(), congressional_districts, current.to_numpy(dtype=object)))
+
+
+def derive_awarding_agency(cache, frame, source_rows):
+    """Awarding agency and sub tier names from the awarding sub tier code"""
+    derive_from_table(
+        frame,
+        cache.tables["agencies"],
+        [upper(frame["awarding_sub_tier_agency_c"])],
+        {"awarding_agency_name": "agency_name", "awarding_sub_tier_agency_n": "sub_tier_name"},
+    )
+
+
+def derive_funding_sub_tier_code(cache, frame, source_rows):
+    """Funding sub tier codes missing from rows, from their funding office"""
+    missing = frame["funding_sub_tier_agency_co"].fillna("").str.upper().eq("").to_numpy()
+    derive_from_table(
+        frame,
+        cache.tables["offices"],
+        [upper(frame["funding_office_code"])],
+        {"funding_sub_tier_agency_co": "sub_tier_code"},
+        where=missing,
+    )
+
+
+def derive_funding_agency(cache, frame, source_rows):
+    """Funding agency code and names from the funding sub tier code"""
+    derive_from_table(
+        frame,
+        cache.tables["agencies"],
+        [upper(frame["funding_sub_tier_agency_co"])],
+        {
+            "funding_agency_code": "agency_code",
+            "funding_agency_name": "agency_name",
+            "funding_sub_tier_agency_na": "sub_tier_name",
+        },
+    )
+
+
+def derive_ppop_state(cache, frame, source_rows):
+    """Place of performance state code and name from the start of the ppop code"""
+    states = cache.tables["states"]
+    ppop_code = frame["place_of_performance_code"]
+    positions = states.lookup(upper(ppop_code.str[:2]))
+    multi_state = ppop_code.eq("00*****").to_numpy()
+    # Multi-state codes match every state, so they're only derived when there are states
+    rows = (positions >= 0) | (multi_state & (len(states) > 0))
+    state_codes = np.where(
+        upper(ppop_code).str.match("[A-Z][A-Z]").eq(True), states.values("state_code", positions), None
+    )
+    state_names = np.where(multi_state, "Multi-state", states.values("state_name", positions))
+    set_values(frame, rows, "place_of_perfor_state_code", state_codes)
+    set_values(frame, rows, "place_of_perform_state_nam", state_names)
+
+
+def derive_ppop_zip(cache, frame, source_rows):
+    """Split valid ppop zips into their zip5 and zip last4"""
+    zip4a = frame["place_of_performance_zip4a"]
+    rows = is_format(zip4a, "[0-9]{5}(-?[0-9]{4})?")
+    set_values(frame, rows, "place_of_performance_zip5", zip4a.str[:5])
+    set_values(frame, rows, "place_of_perform_zip_last4", zip4a.str[-4:].where(zip4a.str.len() != 5, None))
+
+
+def derive_ppop_nine_digit_zip(table_name, historical):
+    """Ppop congressional district and county from 9 digit zips in a zips table"""
+
+    def derive(cache, frame, source_rows):
+        table = cache.tables[table_name]
+        positions = table.lookup(frame["place_of_performance_zip5"], frame["place_of_perform_zip_last4"])
+        rows = (positions >= 0) & frame["place_of_perform_zip_last4"].notna().to_numpy()
+        rows &= zip_date_rows(frame, historical)
+        county_numbers = table.values("county_number", positions)
+        derive_congressional(
+            frame, rows, "place_of_performance_congr", table.values("congressional_district_no", positions)
+        )
+        set_values(frame, rows, "place_of_perform_county_co", county_numbers)
+
+    return derive
+
+
+def derive_ppop_zip_grouped(table_name, historical, column, table_column):
+    """A missing ppop column from the zip5 and state in a grouped zips table"""
+
+    def derive(cache, frame, source_rows):
+        derive_from_table(
+            frame,
+            cache.tables[table_name],
+            [frame["place_of_performance_zip5"], frame["place_of_perfor_state_code"]],
+            {column: table_column},
+            where=frame[column].isna().to_numpy() & zip_date_rows(frame, historical),
+        )
+
+    return derive
+
+
+def derive_ppop_congressional_by_code(table_name, code_format, code_length):
+    """Missing ppop congressional districts from county, city, or state ppop codes"""
+
+    def derive(cache, frame, source_rows):
+        ppop_code = upper(frame["place_of_performance_code"])
+        keys = [ppop_code.str[:2]] + ([ppop_code.str[-code_length:]] if code_length else [])
+        derive_from_table(
+            frame,
+            cache.tables[table_name],
+            keys,
+            {"place_of_performance_congr": "congressional_district_no"},
+            where=frame["place_of_performance_congr"].isna().to_numpy() & is_format(ppop_code, code_format),
+        )
+
+    return derive
+
+
+def derive_ppop_city_with_zip(cache, frame, source_rows):
+    """Ppop city from the ppop zip5"""
+    derive_from_table(
+        frame,
+        cache.tables["zip_city"],
+        [frame["place_of_performance_zip5"]],
+        {"place_of_performance_city": "preferred_city_name"},
+    )
+
+
+def derive_ppop_county_for_county_code(cache, frame, source_rows):
+    """Ppop county code from county ppop codes of rows without a zip"""
+    ppop_code = frame["place_of_performance_code"]
+    rows = frame["place_of_performance_zip5"].isna().to_numpy() & is_format(upper(ppop_code), PPOP_COUNTY_FORMAT)
+    set_values(frame, rows, "place_of_perform_county_co", ppop_code.str[-3:])
+
+
+def derive_ppop_city_for_city_code(cache, frame, source_rows):
+    """Ppop county and city from city ppop codes of rows without a zip"""
+    ppop_code = frame["place_of_performance_code"]
+    derive_from_table(
+        frame,
+        cache.tables["city_codes"],
+        [upper(ppop_code.str[-5:]), frame["place_of_perfor_state_code"]],
+        {
+            "place_of_perform_county_co": "county_number",
+            "place_of_perform_county_na": "county_name",
+            "place_of_performance_city": "feature_name",
+        },
+        where=frame["place_of_performance_zip5"].isna().to_numpy() & is_format(upper(ppop_code), PPOP_CITY_FORMAT),
+    )
+
+
+def derive_ppop_county_name(cache, frame, source_rows):
+    """Missing ppop county names from the ppop county code and state"""
+    derive_from_table(
+        frame,
+        cache.tables["county_codes"],
+        [frame["place_of_perform_county_co"], frame["place_of_perfor_state_code"]],
+        {"place_of_perform_county_na": "county_name"},
+        where=frame["place_of_perform_county_na"].isna().to_numpy(),
+    )
+
+
+def derive_le_nine_digit_zip(table_name, historical):
+    """Legal entity congressional district, county and state from 9 digit zips in a zips table"""
+
+    def derive(cache, frame, source_rows):
+        table = cache.tables[table_name]
+        positions = table.lookup(frame["legal_entity_zip5"], frame["legal_entity_zip_last4"])
+        rows = (positions >= 0) & frame["legal_entity_zip_last4"].notna().to_numpy()
+        rows &= zip_date_rows(frame, historical)
+        derive_congressional(
+            frame, rows, "legal_entity_congressional", table.values("congressional_district_no", positions)
+        )
+        set_values(frame, rows, "legal_entity_county_code", table.values("county_number", positions))
+        set_values(frame, rows, "legal_entity_state_code", table.values("state_abbreviation", positions))
+
+    return derive
+
+
+def derive_le_state(cache, frame, source_rows):
+    """Missing legal entity state codes from the legal entity zip5"""
+    derive_from_table(
+        frame,
+        cache.tables["zip_city"],
+        [frame["legal_entity_zip5"]],
+        {"legal_entity_state_code": "state_code"},
+        where=frame["legal_entity_state_code"].isna().to_numpy(),
+    )
+
+
+def derive_le_zip_grouped(table_name, historical, column, table_column):
+    """A missing legal entity column from the zip5 and state in a grouped zips table"""
+
+    def derive(cache, frame, source_rows):
+        derive_from_table(
+            frame,
+            cache.tables[table_name],
+            [frame["legal_entity_zip5"], frame["legal_entity_state_code"]],
+            {column: table_column},
+            where=frame[column].isna().to_numpy() & zip_date_rows(frame, historical),
+        )
+
+    return derive
+
+
+def derive_le_with_zip(table_name, key_columns, column, table_column):
+    """A legal entity column of rows with a zip5 from a reference table"""
+
+    def derive(cache, frame, source_rows):
+        derive_from_table(
+            frame,
+            cache.tables[table_name],
+            [frame[key_column] for key_column in key_columns],
+            {column: table_column},
+            where=frame["legal_entity_zip5"].notna().to_numpy(),
+        )
+
+    return derive
+
+
+def derive_le_from_ppop(code_format, columns):
+    """Copy ppop location columns to the legal entity ones of record type 1 rows with a ppop code format"""
+
+    def derive(cache, frame, source_rows):
+        rows = frame["record_type"].eq(1).to_numpy() & is_format(upper(frame["place_of_performance_code"]), code_format)
+        values = {column: frame[ppop_column].to_numpy(dtype=object) for column, ppop_column in columns.items()}
+        for column, column_values in values.items():
+            set_values(frame, rows, column, column_values)
+
+    return derive
+
+
+def derive_office_data(award_id, record_type_one):
+    """Missing office codes from the earliest published records of the award with a different amendment number"""
+
+    def derive(cache, frame, source_rows):
+        record_type = frame["record_type"]
+        rows = (record_type.eq(1) if record_type_one else record_type.ne(1) & record_type.notna()).to_numpy()
+        awards = pd.DataFrame(
+            {
+                "row": np.flatnonzero(rows),
+                "upper_award_id": upper(frame[award_id])[rows].to_numpy(dtype=object),
+                "upper_sub_tier": upper(frame["awarding_sub_tier_agency_c"])[rows].to_numpy(dtype=object),
+                "amendment": frame["award_modification_amendme"][rows].fillna("").to_numpy(dtype=object),
+            }
+        ).dropna(subset=["upper_award_id", "upper_sub_tier"])
+        matches = awards.merge(
+            source_rows.dropna(subset=["upper_award_id", "upper_sub_tier"]),
+            on=["upper_award_id", "upper_sub_tier"],
+        )
+        matches = matches[matches["amendment"] != matches["award_modification_amendme"].fillna("")]
+        matches = matches.drop_duplicates(subset="row")
+
+        derived = np.zeros(len(frame), dtype=bool)
+        derived[matches["row"].to_numpy()] = True
+        for column in ["awarding_office_code", "funding_office_code"]:
+            office_codes = np.full(len(frame), None, dtype=object)
+            office_codes[matches["row"].to_numpy()] = matches[column].to_numpy(dtype=object)
+            current = frame[column]
+            set_values(frame, derived, column, np.where(current.isna(), office_codes, current.to_numpy(dtype=object)))
+
+    return derive
+
+
+def derive_office_name(column, code_column):
+    """An office name from its office code"""
+
+    def derive(cache, frame, source_rows):
+        derive_from_table(frame, cache.tables["offices"], [upper(frame[code_column])], {column: "office_name"})
+
+    return derive
+
+
+def derive_le_city_code(cache, frame, source_rows):
+    """Legal entity city code from the legal entity city name and state"""
+    derive_from_table(
+        frame,
+        cache.tables["city_names"],
+        [upper(frame["legal_entity_city_name"].str.strip(" ")), upper(frame["legal_entity_state_code"].str.strip(" "))],
+        {"legal_entity_city_code": "city_code"},
+    )
+
+
+def derive_country_name(column, code_column):
+    """A country name from its country code"""
+
+    def derive(cache, frame, source_rows):
+        derive_from_table(frame, cache.tables["country_codes"], [upper(frame[code_column])], {column: "country_name"})
+
+    return derive
+
+
+# The FABS derivations that can be computed from the reference cache, by the name of the derivation in FABS_DERIVATIONS
+# they match the results of. Each is called with the cache, a DataFrame of tmp_fabs rows to derive in place, and the
+# rows of the derivation's source when it's built from the submission's own data rather than reference tables (the
+# filtered offices of the office derivations), None otherwise.
+CACHED_DERIVATIONS = {
+    "awarding agency info": derive_awarding_agency,
+    "funding sub tier code": derive_funding_sub_tier_code,
+    "funding agency info": derive_funding_agency,
+    "place of performance state": derive_ppop_state,
+    "place of performance zip5 and zip last4": derive_ppop_zip,
+    "ppop congr/county info for 9 digit historical zips": derive_ppop_nine_digit_zip("zips_historical", True),
+    "ppop congr/county info for 9 digit zips": derive_ppop_nine_digit_zip("zips", False),
+    "ppop congr info for 5-digit historical zip": derive_ppop_zip_grouped(
+        "cd_zips_grouped_historical", True, "place_of_performance_congr", "congressional_district_no"
+    ),
+    "ppop congr info for 5-digit zip": derive_ppop_zip_grouped(
+        "cd_zips_grouped", False, "place_of_performance_congr", "congressional_district_no"
+    ),
+    "ppop congr info by county": derive_ppop_congressional_by_code("cd_county_grouped", PPOP_COUNTY_FORMAT, 3),
+    "ppop congr info by city": derive_ppop_congressional_by_code("cd_city_grouped", PPOP_CITY_FORMAT, 5),
+    "ppop congr info by state": derive_ppop_congressional_by_code("cd_state_grouped", PPOP_STATE_FORMAT, 0),
+    "ppop historical county info": derive_ppop_zip_grouped(
+        "zips_grouped_historical", True, "place_of_perform_county_co", "county_number"
+    ),
+    "ppop county info": derive_ppop_zip_grouped("zips_grouped", False, "place_of_perform_county_co", "county_number"),
+    "ppop city info for transactions with zips": derive_ppop_city_with_zip,
+    "ppop county info for county ppop": derive_ppop_county_for_county_code,
+    "ppop city info for city ppop": derive_ppop_city_for_city_code,
+    "remaining ppop county name": derive_ppop_county_name,
+    "legal entity location with 9 digit historical zip": derive_le_nine_digit_zip("zips_historical", True),
+    "legal entity location with 9 digit zip": derive_le_nine_digit_zip("zips", False),
+    "legal entity state": derive_le_state,
+    "historical legal entity congressional for 5-digit zip": derive_le_zip_grouped(
+        "cd_zips_grouped_historical", True, "legal_entity_congressional", "congressional_district_no"
+    ),
+    "legal entity congressional for 5-digit zip": derive_le_zip_grouped(
+        "cd_zips_grouped", False, "legal_entity_congressional", "congressional_district_no"
+    ),
+    "historical legal entity county": derive_le_zip_grouped(
+        "zips_grouped_historical", True, "legal_entity_county_code", "county_number"
+    ),
+    "legal entity county": derive_le_zip_grouped("zips_grouped", False, "legal_entity_county_code", "county_number"),
+    "legal entity county names with zips": derive_le_with_zip(
+        "county_codes",
+        ["legal_entity_county_code", "legal_entity_state_code"],
+        "legal_entity_county_name",
+        "county_name",
+    ),
+    "legal entity state names with zips": derive_le_with_zip(
+        "states", ["legal_entity_state_code"], "legal_entity_state_name", "state_name"
+    ),
+    "legal entity city info with zips": derive_le_with_zip(
+        "zip_city", ["legal_entity_zip5"], "legal_entity_city_name", "preferred_city_name"
+    ),
+    "legal entity location info record type 1 county format": derive_le_from_ppop(
+        PPOP_COUNTY_FORMAT,
+        {
+            "legal_entity_county_code": "place_of_perform_county_co",
+            "legal_entity_county_name": "place_of_perform_county_na",
+            "legal_entity_state_code": "place_of_perfor_state_code",
+            "legal_entity_state_name": "place_of_perform_state_nam",
+            "legal_entity_congressional": "place_of_performance_congr",
+        },
+    ),
+    "legal entity location info record type 1 state format": derive_le_from_ppop(
+        PPOP_STATE_FORMAT,
+        {
+            "legal_entity_state_code": "place_of_perfor_state_code",
+            "legal_entity_state_name": "place_of_perform_state_nam",
+            "legal_entity_congressional": "place_of_performance_congr",
+        },
+    ),
+    "office data record type not 1": derive_office_data("fain", False),
+    "office data record type 1": derive_office_data("uri", True),
+    "awarding office name": derive_office_name("awarding_office_name", "awarding_office_code"),
+    "funding office name": derive_office_name("funding_office_name", "funding_office_code"),
+    "legal entity city code": derive_le_city_code,
+    "place of performance country name": derive_country_name(
+        "place_of_perform_country_n", "place_of_perform_country_c"
+    ),
+    "legal entity country name": derive_country_name("legal_entity_country_name", "legal_entity_country_code"),
+}
@@ -1,12 +1,18 @@
+import hashlib
+import os
+
 import numpy as np
 import pandas as pd
-import csv
 
 from decimal import Decimal, DecimalException
 from datetime import datetime
 from pandas import isnull
 
+from dataactcore.aws.s3Handler import S3Handler
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.models.jobModels import RevalidationThreshold, Submission, SubmissionWindowSchedule, ValidationTiming
 from dataactcore.models.lookups import FIELD_TYPE_DICT_ID, FIELD_TYPE_DICT, FILE_TYPE_DICT_ID
+from dataactcore.models.validationModels import FileColumn, RuleSql, ValidationLabel
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
@@ -267,6 +273,46 @@ def derive_fabs_afa_generated_unique(row):
     )
 
 
+def derive_fabs_awarding_sub_tier_vectorized(frame: pd.DataFrame, office_list):
+    """Derives the awarding sub tier agency code for each row that didn't provide one, matching
+    derive_fabs_awarding_sub_tier for each row.
+
+    Args:
+        frame: the pd.DataFrame to derive the awarding sub tier agency codes for
+        office_list: A dictionary of sub tier codes keyed by their office codes
+
+    Returns:
+        A Series of the provided awarding sub tier agency codes, derived from the office code where none was provided
+    """
+    sub_tier = frame["awarding_sub_tier_agency_c"]
+    derived = frame["awarding_office_code"].map(office_list).astype(object).replace({np.NaN: None})
+    return sub_tier.mask(sub_tier.isnull() | (sub_tier == ""), derived)
+
+
+def derive_fabs_afa_generated_unique_vectorized(frame: pd.DataFrame):
+    """Derives the afa_generated_unique for each row, matching derive_fabs_afa_generated_unique for each row.
+
+    Args:
+        frame: the pd.DataFrame to derive the unique keys for
+
+    Returns:
+        A Series of the afa_generated_unique for each row
+    """
+    key_parts = []
+    for col in [
+        "awarding_sub_tier_agency_c",
+        "fain",
+        "uri",
+        "assistance_listing_number",
+        "award_modification_amendme",
+    ]:
+        key_parts.append(frame[col].mask(frame[col].isnull() | (frame[col] == ""), "-none-"))
+    afa_generated_unique = key_parts[0]
+    for key_part in key_parts[1:]:
+        afa_generated_unique = afa_generated_unique + "_" + key_part
+    return afa_generated_unique
+
+
 def derive_fabs_unique_award_key(df):
     """Derives the unique award key for a row.
 
@@ -300,6 +346,23 @@ def apply_label(row, labels, is_fabs):
     return ""
 
 
+def apply_label_vectorized(field_names: pd.Series, labels, is_fabs):
+    """Get special rule labels for required or type checks for FABS submissions, matching apply_label for each row.
+
+    Args:
+        field_names: the pd.Series of headers to get the labels for
+        labels: the list of labels that could be applied in this rule
+        is_fabs: a boolean indicating if the submission is a FABS submission or not
+
+    Returns:
+        A Series of the labels if it's a FABS submission and the header matches one of the ones there are labels
+        for, empty strings otherwise
+    """
+    if is_fabs and labels:
+        return field_names.map(labels).fillna("")
+    return pd.Series("", index=field_names.index)
+
+
 def gather_flex_fields(row, flex_data):
     """Getting the flex data, formatted for the error and warning report, for a row.
 
@@ -315,6 +378,23 @@ def gather_flex_fields(row, flex_data):
     return ""
 
 
+def gather_flex_fields_vectorized(row_numbers: pd.Series, flex_data):
+    """Getting the flex data, formatted for the error and warning report, for every row number at once, matching
+    gather_flex_fields for each row.
+
+    Args:
+        row_numbers: the pd.Series of row numbers to get the flex data for
+        flex_data: the dataframe containing flex fields for the file
+
+    Returns:
+        A Series of the concatenated flex data for each row if there is any, empty strings otherwise.
+    """
+    if flex_data is not None:
+        flex_by_row = flex_data.drop_duplicates("row_number").set_index("row_number")["concatted"]
+        return row_numbers.map(flex_by_row).fillna("")
+    return pd.Series("", index=row_numbers.index)
+
+
 def valid_type(row, csv_schema):
     """Checks if the value provided is of a valid type.
 
@@ -393,6 +473,23 @@ def expected_type(row, csv_schema):
     return "This field must be a {}".format(FIELD_TYPE_DICT_ID[current_field.field_types_id].lower())
 
 
+def expected_type_vectorized(field_names: pd.Series, csv_schema):
+    """Formats the expected type error message for every header at once, matching expected_type for each row.
+
+    Args:
+        field_names: the pd.Series of headers to get the messages for
+        csv_schema: the schema containing the details about the columns for this file
+
+    Returns:
+        A Series of formatted messages explaining what type each field should be
+    """
+    messages = {
+        field: "This field must be a {}".format(FIELD_TYPE_DICT_ID[csv_schema[field].field_types_id].lower())
+        for field in field_names.unique()
+    }
+    return field_names.map(messages)
+
+
 def valid_length(row, csv_schema):
     """Checks if the value provided is longer than the maximum allowed length for a particular field.
 
@@ -473,6 +570,20 @@ def expected_length(row, csv_schema):
     return "Max length: {}".format(current_field.length)
 
 
+def expected_length_vectorized(field_names: pd.Series, csv_schema):
+    """Formats the maximum length error message for every header at once, matching expected_length for each row.
+
+    Args:
+        field_names: the pd.Series of headers to get the messages for
+        csv_schema: the schema containing the details about the columns for this file
+
+    Returns:
+        A Series of formatted messages explaining what the maximum length of each field is
+    """
+    messages = {field: "Max length: {}".format(csv_schema[field].length) for field in field_names.unique()}
+    return field_names.map(messages)
+
+
 def valid_format(row):
     """Checks if the value provided is formatted correctly (dates must be YYYYMMDD format).
 
@@ -509,6 +620,21 @@ def update_field_name(row, short_cols):
     return row["Field Name"]
 
 
+def update_field_name_vectorized(field_names: pd.Series, short_cols):
+    """Update all field names provided to match the lowercased GSDM headers rather than the database names, matching
+    update_field_name for each row.
+
+    Args:
+        field_names: the pd.Series of headers to update
+        short_cols: A dictionary of lowercased GSDM headers keyed by database column names
+
+    Returns:
+        A Series of the GSDM version of each header if it can be derived from the column list, otherwise the header
+        provided
+    """
+    return field_names.map(short_cols).fillna(field_names)
+
+
 def add_field_name_to_value(row):
     """Combine the field name and value provided into one string.
 
@@ -521,6 +647,19 @@ def add_field_name_to_value(row):
     return row["Field Name"] + ": " + row["Value Provided"]
 
 
+def add_field_name_to_value_vectorized(errors: pd.DataFrame):
+    """Combine the field name and value provided into one string for every row, matching add_field_name_to_value
+    for each row.
+
+    Args:
+        errors: the dataframe containing information about the cells, including the headers and contents
+
+    Returns:
+        A Series of the field names and values provided combined into one string
+    """
+    return errors["Field Name"] + ": " + errors["Value Provided"]
+
+
 def check_required(data, required, required_labels, report_headers, short_cols, flex_data, is_fabs):
     """Check if all fields that are required to have content in the file have content.
 
@@ -555,9 +694,9 @@ def check_required(data, required, required_labels, report_headers, short_cols,
     errors["Expected Value"] = "(not blank)"
     errors["Difference"] = ""
     if not errors.empty:
-        errors["Rule Label"] = errors.apply(lambda x: apply_label(x, required_labels, is_fabs), axis=1)
-        errors["Flex Field"] = errors.apply(lambda x: gather_flex_fields(x, flex_data), axis=1)
-        errors["Field Name"] = errors.apply(lambda x: update_field_name(x, short_cols), axis=1)
+        errors["Rule Label"] = apply_label_vectorized(errors["Field Name"], required_labels, is_fabs)
+        errors["Flex Field"] = gather_flex_fields_vectorized(errors["Row Number"], flex_data)
+        errors["Field Name"] = update_field_name_vectorized(errors["Field Name"], short_cols)
     else:
         errors["Rule Label"] = ""
         errors["Flex Field"] = ""
@@ -606,11 +745,11 @@ def check_type(data, type_fields, type_labels, report_headers, csv_schema, short
     errors["Rule Message"] = ValidationError.type_error_msg
     errors["Difference"] = ""
     if not errors.empty:
-        errors["Expected Value"] = errors.apply(lambda x: expected_type(x, csv_schema), axis=1)
-        errors["Rule Label"] = errors.apply(lambda x: apply_label(x, type_labels, is_fabs), axis=1)
-        errors["Flex Field"] = errors.apply(lambda x: gather_flex_fields(x, flex_data), axis=1)
-        errors["Field Name"] = errors.apply(lambda x: update_field_name(x, short_cols), axis=1)
-        errors["Value Provided"] = errors.apply(lambda x: add_field_name_to_value(x), axis=1)
+        errors["Expected Value"] = expected_type_vectorized(errors["Field Name"], csv_schema)
+        errors["Rule Label"] = apply_label_vectorized(errors["Field Name"], type_labels, is_fabs)
+        errors["Flex Field"] = gather_flex_fields_vectorized(errors["Row Number"], flex_data)
+        errors["Field Name"] = update_field_name_vectorized(errors["Field Name"], short_cols)
+        errors["Value Provided"] = add_field_name_to_value_vectorized(errors)
     else:
         errors["Expected Value"] = ""
         errors["Rule Label"] = ""
@@ -663,10 +802,10 @@ def check_length(data, length_fields, report_headers, csv_schema, short_cols, fl
     errors["Difference"] = ""
     errors["Rule Label"] = ""
     if not errors.empty:
-        errors["Expected Value"] = errors.apply(lambda x: expected_length(x, csv_schema), axis=1)
-        errors["Flex Field"] = errors.apply(lambda x: gather_flex_fields(x, flex_data), axis=1)
-        errors["Field Name"] = errors.apply(lambda x: update_field_name(x, short_cols), axis=1)
-        errors["Value Provided"] = errors.apply(lambda x: add_field_name_to_value(x), axis=1)
+        errors["Expected Value"] = expected_length_vectorized(errors["Field Name"], csv_schema)
+        errors["Flex Field"] = gather_flex_fields_vectorized(errors["Row Number"], flex_data)
+        errors["Field Name"] = update_field_name_vectorized(errors["Field Name"], short_cols)
+        errors["Value Provided"] = add_field_name_to_value_vectorized(errors)
     else:
         errors["Expected Value"] = ""
         errors["Flex Field"] = ""
@@ -713,9 +852,9 @@ def check_field_format(data, format_fields, report_headers, short_cols, flex_dat
     errors["Rule Label"] = "DABSDATETIME"
     errors["Expected Value"] = "A date in the YYYYMMDD format."
     if not errors.empty:
-        errors["Flex Field"] = errors.apply(lambda x: gather_flex_fields(x, flex_data), axis=1)
-        errors["Field Name"] = errors.apply(lambda x: update_field_name(x, short_cols), axis=1)
-        errors["Value Provided"] = errors.apply(lambda x: add_field_name_to_value(x), axis=1)
+        errors["Flex Field"] = gather_flex_fields_vectorized(errors["Row Number"], flex_data)
+        errors["Field Name"] = update_field_name_vectorized(errors["Field Name"], short_cols)
+        errors["Value Provided"] = add_field_name_to_value_vectorized(errors)
     else:
         errors["Flex Field"] = ""
     # sorting the headers after all the moving around
@@ -791,62 +930,6 @@ def process_formatting_errors(short_rows, long_rows, report_headers):
     return pd.DataFrame(format_error_list, columns=list(report_headers + ["error_type"]))
 
 
-def simple_file_scan(reader, bucket_name, region_name, file_name):
-    """Does an initial scan of the file, figuring out the file row count and which rows are too long/short
-
-    Args:
-        reader: the csv reader
-        bucket_name: the bucket to pull from
-        region_name: the region to pull from
-        file_name: name of the file to pull
-
-    Returns:
-        file_row_count: the number of lines in the file
-        short_rows: a list of row numbers that have too few fields
-        long_rows: a list of rows that have too many fields
-    """
-    # Count file rows: throws a File Level Error for non-UTF8 characters
-    # Also getting short and long rows for formatting errors and pandas processing
-    temp_file = open(reader.get_filename(region_name, bucket_name, file_name), encoding="utf-8")
-    file_row_count = 0
-    header_length = 0
-    short_pop_rows = []
-    long_pop_rows = []
-    short_null_rows = []
-    long_null_rows = []
-    # Getting the delimiter
-    header_line = temp_file.readline()
-    delimiter = "|" if header_line.count("|") > header_line.count(",") else ","
-    temp_file.seek(0)
-    for line in csv.reader(temp_file, delimiter=delimiter):
-        if line:
-            file_row_count += 1
-            line_length = len(line)
-            # Setting the expected length for the file
-            if header_length == 0:
-                header_length = line_length
-            # All lines that are shorter than they should be
-            elif line_length < header_length:
-                # do not add short row if there's no data in the row
-                if len("".join(line)) > 0:
-                    short_pop_rows.append(file_row_count)
-                else:
-                    short_null_rows.append(file_row_count)
-            # All lines that are longer than they should be
-            elif line_length > header_length:
-                # do not add short row if there's no data in the row
-                if len("".join(line)) > 0:
-                    long_pop_rows.append(file_row_count)
-                else:
-                    long_null_rows.append(file_row_count)
-    try:
-        temp_file.close()
-    except AttributeError:
-        # File does not exist, and so does not need to be closed
-        pass
-    return file_row_count, short_pop_rows, long_pop_rows, short_null_rows, long_null_rows
-
-
 def update_val_progress(sess, job, validation_progress, tas_progress, sql_progress, final_progress):
     """Updates the progress value of the job based on the type of validation it is.
 
@@ -885,3 +968,157 @@ def update_cross_val_progress(sess, job, pairs_finished, set_length, completed_i
     # Multiplying by 25 because there are 4 total sets of cross-file so we want each to count as 25%
     job.progress = pairs_finished * 25 + (completed_in_set / set_length) * 25
     sess.commit()
+
+
+def record_validation_timing(
+    sess,
+    phase,
+    start_time,
+    job_id,
+    submission_id,
+    file_type_id,
+    rule=None,
+    row_count=None,
+    target_file_type_id=None,
+):
+    """Adds how long a phase or rule of a validation took to the job's timing profile. The timing is written with the
+    session's next commit.
+
+    Args:
+        sess: the database session
+        phase: the part of the validation that was timed, such as data_loading, chunk_load, tas_linking, sql_rule,
+            sql_validations, staging_snapshot, cross_file_staging, cross_file_rule or cross_file_validations
+        start_time: when the phase or rule started
+        job_id: the ID of the job being timed
+        submission_id: the ID of the job's submission
+        file_type_id: the ID of the file type being validated, for cross-file rules the file type the rule is for
+        rule: the query name of the rule that was timed, if it was a rule
+        row_count: how many rows were loaded or returned by the rule
+        target_file_type_id: the ID of the file type a cross-file rule compares against
+
+    Returns:
+        how many seconds the phase or rule took
+    """
+    duration = (datetime.now() - start_time).total_seconds()
+    sess.add(
+        ValidationTiming(
+            job_id=job_id,
+            submission_id=submission_id,
+            file_type_id=file_type_id,
+            target_file_type_id=target_file_type_id,
+            phase=phase,
+            rule=rule,
+            start_time=start_time,
+            duration=duration,
+            row_count=row_count,
+        )
+    )
+    return duration
+
+
+def get_file_fingerprint(file_name):
+    """Gets a fingerprint of a submitted file's content, which only matches another file's if they have the same content
+
+    Args:
+        file_name: the path of the file, or its name in the submission bucket when using AWS
+
+    Returns:
+        the S3 ETag of the file when using AWS, otherwise the SHA-256 hash of the file. None if the file doesn't exist
+    """
+    if CONFIG_BROKER["use_aws"]:
+        return S3Handler.get_file_etag(file_name)
+    if not os.path.exists(file_name):
+        return None
+    file_hash = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_rules_fingerprint(sess, file_type_id=None):
+    """Gets a fingerprint of the rules a validation runs, which changes whenever any of them are changed or reloaded
+    with different content
+
+    Args:
+        sess: the database session
+        file_type_id: the ID of the file type to fingerprint the columns, labels and single-file SQL rules of, the
+            cross-file SQL rules are fingerprinted if not provided
+
+    Returns:
+        the SHA-256 hash of the rules
+    """
+    rule_query = sess.query(
+        RuleSql.query_name,
+        RuleSql.rule_label,
+        RuleSql.rule_sql,
+        RuleSql.rule_error_message,
+        RuleSql.file_id,
+        RuleSql.target_file_id,
+        RuleSql.rule_severity_id,
+        RuleSql.expected_value,
+        RuleSql.sensitive,
+    )
+    if file_type_id is None:
+        rules = rule_query.filter(RuleSql.rule_cross_file_flag.is_(True)).all()
+    else:
+        rules = rule_query.filter(RuleSql.rule_cross_file_flag.is_(False), RuleSql.file_id == file_type_id).all()
+        rules += (
+            sess.query(
+                FileColumn.name,
+                FileColumn.name_short,
+                FileColumn.gsdm_name,
+                FileColumn.field_types_id,
+                FileColumn.required,
+                FileColumn.padded_flag,
+                FileColumn.length,
+            )
+            .filter(FileColumn.file_id == file_type_id)
+            .all()
+        )
+        rules += (
+            sess.query(
+                ValidationLabel.label,
+                ValidationLabel.error_message,
+                ValidationLabel.column_name,
+                ValidationLabel.label_type,
+            )
+            .filter(ValidationLabel.file_id == file_type_id)
+            .all()
+        )
+    # The rules are reloaded with new IDs, so they're sorted by their content to get the same fingerprint every time
+    rules_hash = hashlib.sha256()
+    for rule in sorted(repr(tuple(rule)) for rule in rules):
+        rules_hash.update(rule.encode("utf-8"))
+    return rules_hash.hexdigest()
+
+
+def validation_results_current(sess, job):
+    """Checks whether the stored results of a job's last validation can still stand in for a new validation, they
+    can't once the submission has to be revalidated for publishing
+
+    Args:
+        sess: the database session
+        job: the validation job to check
+
+    Returns:
+        True if the job was last validated after the revalidation threshold and, for DABS submissions, after the start
+        of the submission's window, False otherwise
+    """
+    if not job.last_validated:
+        return False
+
+    reval_thresh = sess.query(RevalidationThreshold).one_or_none()
+    if reval_thresh and reval_thresh.revalidation_date >= job.last_validated:
+        return False
+
+    submission = sess.query(Submission).filter_by(submission_id=job.submission_id).one()
+    if not submission.is_fabs:
+        sub_schedule = (
+            sess.query(SubmissionWindowSchedule)
+            .filter_by(year=submission.reporting_fiscal_year, period=submission.reporting_fiscal_period)
+            .one_or_none()
+        )
+        if sub_schedule and job.last_validated < sub_schedule.period_start:
+            return False
+    return True
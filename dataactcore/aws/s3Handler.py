@@ -104,6 +104,24 @@ class S3Handler:
             logger.warning("File doesn't exist on AWS: %s", filename)
             return 0
 
+    @staticmethod
+    def get_file_etag(filename):
+        """Get the ETag of the specified file from the submission bucket, which changes whenever its content does
+
+        Args:
+            filename: Name of the file in the submission bucket to get the ETag of
+
+        Returns:
+            The ETag of the specified file, or None if the file doesn't exist
+        """
+        s3_reso = boto3.resource("s3", region_name=CONFIG_BROKER["aws_region"])
+        obj_info = s3_reso.ObjectSummary(CONFIG_BROKER["aws_bucket"], filename)
+        try:
+            return obj_info.e_tag
+        except ClientError:
+            logger.warning("File doesn't exist on AWS: %s", filename)
+            return None
+
     @staticmethod
     def copy_file(original_bucket, new_bucket, original_path, new_path):
         """Copies a file from one bucket to another.
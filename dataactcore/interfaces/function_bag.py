@@ -525,6 +525,10 @@ def add_jobs_for_uploaded_file(upload_file, submission_id, existing_submission):
         # reset file size and number of rows to be set during validation of new file
         val_job.file_size = None
         val_job.number_of_rows = None
+        # the errors are deleted below, so the results of the last validation can't be reused for the new file
+        val_job.file_fingerprint = None
+        val_job.rules_fingerprint = None
+        val_job.staging_snapshot = None
         # delete error metadata this might exist from a previous run of this validation job
         sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == val_job.job_id).delete(synchronize_session="fetch")
         # delete file error information that might exist from a previous run of this validation job
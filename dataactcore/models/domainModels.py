@@ -126,6 +126,31 @@ def concat_display_tas_dict(tas_dict):
     return tas_rendering_label
 
 
+def concat_display_tas_dict_vectorized(frame: pd.DataFrame):
+    """Given a DataFrame containing columns for all TAS components, build a Series of the display TAS string, matching
+    concat_display_tas_dict for each row.
+
+    Arguments:
+        frame: the DataFrame from whose columns to build the display TAS string
+
+    Returns:
+        A series containing display TAS strings
+    """
+    tas_frame = frame[list(TAS_COMPONENTS)].fillna("")
+
+    def join_filled(first, second, separator):
+        # Same as separator.join(filter(None, (first, second))) for each row
+        joined = first + second
+        return joined.mask((first != "") & (second != ""), first + separator + second)
+
+    tas_rendering_label = join_filled(tas_frame["allocation_transfer_agency"], tas_frame["agency_identifier"], "-")
+    poa = join_filled(tas_frame["beginning_period_of_availa"], tas_frame["ending_period_of_availabil"], "/")
+    typecode = tas_frame["availability_type_code"]
+    tas_rendering_label = join_filled(tas_rendering_label, typecode.mask(typecode == "", poa), "-")
+    tas_rendering_label = join_filled(tas_rendering_label, tas_frame["main_account_code"], "-")
+    return join_filled(tas_rendering_label, tas_frame["sub_account_code"], "-")
+
+
 TAS_COMPONENTS = (
     "allocation_transfer_agency",
     "agency_identifier",
@@ -188,6 +213,24 @@ Index(
 )
 
 
+class TASPeriodAccount(Base):
+    """The CARS history entry each TAS links to in each month, precomputed from tas_lookup whenever it's loaded so a
+    submission can link its TAS without aggregating all of tas_lookup
+    """
+
+    __tablename__ = "tas_period_account"
+    tas_period_account_id = Column(Integer, primary_key=True)
+    tas = Column(Text, nullable=False)
+    period_start = Column(Date, nullable=False, index=True)
+    # Linked to by a submission ending this month, whose range stops at the month's last day
+    account_num = Column(Integer, nullable=True)
+    # Linked to by a submission that runs through the whole month into the next one
+    full_period_account_num = Column(Integer, nullable=True)
+
+
+Index("ix_tas_period_account_tas_period_start", TASPeriodAccount.tas, TASPeriodAccount.period_start, unique=True)
+
+
 def is_not_distinct_from(left, right):
     """Postgres' IS NOT DISTINCT FROM is an equality check that accounts for NULLs. Unfortunately, it doesn't make
     use of indexes. Instead, we'll imitate it here
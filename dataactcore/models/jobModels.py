@@ -6,6 +6,7 @@ from sqlalchemy import (
     Column,
     Date,
     DateTime,
+    Float,
     ForeignKey,
     Integer,
     Text,
@@ -168,6 +169,13 @@ class Job(Base):
     )
     file_generation = relationship("FileGeneration", uselist=False)
     progress = Column(Numeric, nullable=False, default=0, server_default="0")
+    # Fingerprints of the file and rules the job's stored results came from, so unchanged files aren't revalidated
+    file_fingerprint = Column(Text, nullable=True)
+    rules_fingerprint = Column(Text, nullable=True)
+    # For validation jobs, the file_fingerprint of the file the last cross-file validation ran against
+    cross_file_fingerprint = Column(Text, nullable=True)
+    # For validation jobs, the name of the Parquet snapshot of the rows it loaded into staging, if one was written
+    staging_snapshot = Column(Text, nullable=True)
 
     @property
     def job_type_name(self):
@@ -192,6 +200,28 @@ class JobDependency(Base):
     prerequisite_job = relationship("Job", foreign_keys=[prerequisite_id], lazy="joined", cascade="delete")
 
 
+class ValidationTiming(Base):
+    __tablename__ = "validation_timing"
+
+    validation_timing_id = Column(Integer, primary_key=True)
+    job_id = Column(
+        Integer,
+        ForeignKey("job.job_id", name="fk_validation_timing_job", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    submission_id = Column(Integer, index=True)
+    file_type_id = Column(Integer, ForeignKey("file_type.file_type_id", name="fk_validation_timing_file_type"))
+    target_file_type_id = Column(
+        Integer, ForeignKey("file_type.file_type_id", name="fk_validation_timing_target_file_type")
+    )
+    phase = Column(Text, nullable=False, index=True)
+    rule = Column(Text, nullable=True)
+    start_time = Column(DateTime, nullable=False)
+    duration = Column(Float, nullable=False)
+    row_count = Column(Integer, nullable=True)
+
+
 class FileType(Base):
     __tablename__ = "file_type"
     FILE_TYPE_DICT = None
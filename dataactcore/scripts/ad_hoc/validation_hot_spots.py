@@ -0,0 +1,98 @@
+import argparse
+import csv
+import datetime
+import logging
+import sys
+
+from dataactcore.broker_logging import configure_logging
+from dataactcore.interfaces.db import GlobalDB
+
+from dataactvalidator.health_check import create_app
+
+logger = logging.getLogger(__name__)
+
+HOT_SPOT_HEADERS = [
+    "file_type",
+    "target_file_type",
+    "rule",
+    "runs",
+    "total_duration",
+    "avg_duration",
+    "max_duration",
+    "avg_rows_returned",
+]
+
+HOT_SPOT_QUERY = """
+    WITH rule_timings AS (
+        SELECT ft.name AS file_type,
+            tft.name AS target_file_type,
+            vt.rule,
+            COUNT(*) AS runs,
+            ROUND(SUM(vt.duration)::NUMERIC, 3) AS total_duration,
+            ROUND(AVG(vt.duration)::NUMERIC, 3) AS avg_duration,
+            ROUND(MAX(vt.duration)::NUMERIC, 3) AS max_duration,
+            ROUND(AVG(vt.row_count), 1) AS avg_rows_returned
+        FROM validation_timing AS vt
+        JOIN file_type AS ft
+            ON ft.file_type_id = vt.file_type_id
+        LEFT JOIN file_type AS tft
+            ON tft.file_type_id = vt.target_file_type_id
+        WHERE vt.phase IN ('sql_rule', 'cross_file_rule')
+            AND vt.start_time >= :start_date
+            AND (CAST(:file_type AS TEXT) IS NULL OR ft.name = :file_type)
+        GROUP BY ft.name, tft.name, vt.rule),
+    ranked_timings AS (
+        SELECT *,
+            ROW_NUMBER() OVER (PARTITION BY file_type ORDER BY total_duration DESC, rule) AS file_type_rank
+        FROM rule_timings)
+    SELECT {headers}
+    FROM ranked_timings
+    WHERE file_type_rank <= :limit
+    ORDER BY file_type, file_type_rank
+""".format(
+    headers=", ".join(HOT_SPOT_HEADERS)
+)
+
+
+def get_validation_hot_spots(sess, days=30, limit=10, file_type=None):
+    """Find the SQL rules that took the most time across the validations run over the past number of days.
+
+    Args:
+        sess: the database session
+        days: how many days back to look at the validation timings
+        limit: how many rules to return for each file type
+        file_type: only return the rules for this file type, all file types if not provided
+
+    Returns:
+        list of the slowest rules for each file type, ordered by file type and then by the total time the rule took
+    """
+    start_date = datetime.datetime.now() - datetime.timedelta(days=days)
+    return sess.execute(HOT_SPOT_QUERY, {"start_date": start_date, "limit": limit, "file_type": file_type}).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the slowest validation rules by file type.")
+    parser.add_argument("-d", "--days", help="How many days of validations to include", type=int, default=30)
+    parser.add_argument("-l", "--limit", help="How many rules to report for each file type", type=int, default=10)
+    parser.add_argument("-f", "--file_type", help="Only report the rules for this file type", type=str)
+    parser.add_argument("-o", "--output", help="The csv file to write the report to, stdout if not provided", type=str)
+    args = parser.parse_args()
+
+    sess = GlobalDB.db().session
+    hot_spots = get_validation_hot_spots(sess, days=args.days, limit=args.limit, file_type=args.file_type)
+    logger.info("Found {} validation hot spots over the past {} days".format(len(hot_spots), args.days))
+
+    report_file = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(report_file, lineterminator="\n")
+        writer.writerow(HOT_SPOT_HEADERS)
+        writer.writerows(hot_spots)
+    finally:
+        if args.output:
+            report_file.close()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    with create_app().app_context():
+        main()
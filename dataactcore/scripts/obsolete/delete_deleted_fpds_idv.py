@@ -15,7 +15,7 @@ from dataactcore.models.userModel import User  # noqa
 
 from dataactvalidator.health_check import create_app
 from dataactcore.utils.loader_utils import trim_item
-from dataactvalidator.filestreaming.csvReader import CsvReader
+from dataactvalidator.filestreaming.s3RangeReader import open_s3_text
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 
 logger = logging.getLogger(__name__)
@@ -27,11 +27,7 @@ def get_delete_file():
     file_name = "IDV_Deletes.csv"
 
     if CONFIG_BROKER["use_aws"]:
-        reader = CsvReader()
-        pa_file = open(
-            reader.get_filename(CONFIG_BROKER["aws_region"], CONFIG_BROKER["sf_133_bucket"], file_name),
-            encoding="utf-8",
-        )
+        pa_file, _ = open_s3_text(CONFIG_BROKER["aws_region"], CONFIG_BROKER["sf_133_bucket"], file_name)
     else:
         base_path = os.path.join(CONFIG_BROKER["path"], "dataactvalidator", "config")
         pa_file = os.path.join(base_path, file_name)
@@ -12,7 +12,12 @@ from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
 from dataactcore.interfaces.function_bag import update_external_data_load_date
 from dataactcore.broker_logging import configure_logging
-from dataactcore.models.domainModels import TASLookup, concat_tas_dict_vectorized, concat_display_tas_dict
+from dataactcore.models.domainModels import (
+    TASLookup,
+    TASPeriodAccount,
+    concat_tas_dict_vectorized,
+    concat_display_tas_dict,
+)
 from dataactvalidator.health_check import create_app
 from dataactcore.utils.loader_utils import clean_data
 
@@ -54,6 +59,52 @@ current = {
 original_mappings = {**unchanged_columns, **original}
 current_mappings = {**unchanged_columns, **current}
 
+# How many months past the current one the TAS links are precomputed for. They start at the earliest submission's
+# first month, submissions outside that range link from tas_lookup
+TAS_PERIOD_MONTHS_AHEAD = 12
+
+# Mirrors the OVERLAPS test update_account_nums runs against tas_lookup for a submission. A submission's range runs
+# from the first of its first month to the last day of its last month, so the months before its last one are
+# overlapped in full and its last month is overlapped up to its last day. Reversed date ranges are matched like
+# OVERLAPS matches them, which is why the join uses LEAST and GREATEST.
+TAS_PERIOD_ACCOUNT_QUERY = """
+    WITH periods AS (
+        SELECT period_start::DATE AS period_start,
+            (period_start + INTERVAL '1 month' - INTERVAL '1 day')::DATE AS period_end,
+            (period_start + INTERVAL '1 month')::DATE AS next_period_start
+        FROM GENERATE_SERIES(
+            GREATEST((SELECT DATE_TRUNC('month', MIN(LEAST(internal_start_date, internal_end_date))) FROM tas_lookup),
+                     (SELECT DATE_TRUNC('month', MIN(reporting_start_date)) FROM submission)),
+            DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '{months_ahead} months',
+            INTERVAL '1 month'
+        ) AS period_start
+    ),
+    period_accounts AS (
+        SELECT tas_lookup.tas,
+            periods.period_start,
+            MIN(tas_lookup.account_num) FILTER (
+                WHERE (periods.period_start, periods.period_end) OVERLAPS
+                    (tas_lookup.internal_start_date, COALESCE(tas_lookup.internal_end_date, periods.next_period_start))
+            ) AS account_num,
+            MIN(tas_lookup.account_num) FILTER (
+                WHERE (periods.period_start, periods.next_period_start) OVERLAPS
+                    (tas_lookup.internal_start_date,
+                     COALESCE(tas_lookup.internal_end_date, periods.next_period_start + 1))
+            ) AS full_period_account_num
+        FROM tas_lookup
+        JOIN periods
+            ON LEAST(tas_lookup.internal_start_date, tas_lookup.internal_end_date) < periods.next_period_start
+            AND GREATEST(tas_lookup.internal_start_date, COALESCE(tas_lookup.internal_end_date,
+                                                                  periods.next_period_start)) >= periods.period_start
+        GROUP BY tas_lookup.tas, periods.period_start
+    )
+    INSERT INTO tas_period_account (created_at, updated_at, tas, period_start, account_num, full_period_account_num)
+    SELECT NOW(), NOW(), tas, period_start, account_num, full_period_account_num
+    FROM period_accounts
+    WHERE account_num IS NOT NULL
+        OR full_period_account_num IS NOT NULL
+"""
+
 
 def clean_tas(csv_path, metrics=None):
     """Read a CSV into a dataframe, then use a configured `clean_data` and return the results
@@ -250,6 +301,9 @@ def load_tas(backfill_historic=False):
         update_tas_lookups(sess, tas_file, update_missing=update_missing, metrics=metrics_json)
         file_loaded = True
 
+    if file_loaded:
+        metrics_json["period_accounts"] = refresh_tas_period_accounts(sess)
+
     metrics_json["duration"] = str(datetime.now() - now)
     if file_loaded:
         update_external_data_load_date(now, datetime.now(), "tas")
@@ -258,6 +312,23 @@ def load_tas(backfill_historic=False):
         json.dump(metrics_json, metrics_file)
 
 
+def refresh_tas_period_accounts(sess):
+    """Rebuild the account number each TAS links to in each month from the current tas_lookup. The old links stay
+    visible to running validations until the new ones are committed.
+
+    Args:
+        sess: connection to database
+
+    Returns:
+        the number of TAS/month links stored
+    """
+    sess.query(TASPeriodAccount).delete(synchronize_session=False)
+    inserted = sess.execute(TAS_PERIOD_ACCOUNT_QUERY.format(months_ahead=TAS_PERIOD_MONTHS_AHEAD)).rowcount
+    sess.commit()
+    logger.info("%s TAS period links stored", inserted)
+    return inserted
+
+
 def add_existing_id(data):
     """Look up the ids of existing TASes. Use account_num as a non-unique identifier to help filter results
 
@@ -1,10 +1,6 @@
-import logging
-
 from distutils.util import strtobool
 from dataactcore.models.lookups import BUSINESS_CATEGORY_FIELDS
 
-logger = logging.getLogger(__name__)
-
 
 def build_legal_entity_booleans_dict(row):
     bool_dict = {}
@@ -434,33 +430,3 @@ def get_business_categories(row, data_type):
             "Invalid object type provided to update_business_categories. "
             "Must be one of the following types: TransactionFPDS, TransactionFABS"
         )
-
-
-def derive_fabs_business_categories(sess, submission_id):
-    """Deriving Business Categories for the FABS submission
-
-    Args:
-        sess: the current DB session
-        submission_id: The ID of the submission derivations are being run for
-    """
-    logger.info(
-        {
-            "message": "Beginning business categories derivation",
-            "message_type": "BrokerDebug",
-            "submission_id": submission_id,
-        }
-    )
-
-    query = """
-        UPDATE tmp_fabs_{submission_id}
-        SET business_categories = compile_fabs_business_categories(UPPER(business_types));
-    """
-    res = sess.execute(query.format(submission_id=submission_id))
-
-    logger.info(
-        {
-            "message": "Completed business categories derivation, updated {}".format(res.rowcount),
-            "message_type": "BrokerDebug",
-            "submission_id": submission_id,
-        }
-    )
@@ -0,0 +1,187 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from io import BytesIO
+
+import boto3
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, BigInteger, Date, DateTime, Float, Integer, Numeric, Text, cast, select
+
+from dataactcore.config import CONFIG_BROKER, CONFIG_SERVICES
+from dataactcore.models.jobModels import Job
+from dataactcore.models.lookups import FILE_TYPE, JOB_TYPE_DICT
+
+# Snapshots are written and loaded this many rows at a time, which is also the size of their row groups
+SNAPSHOT_BATCH_SIZE = 100000
+SNAPSHOT_COMPRESSION = "zstd"
+
+STAGING_MODELS = {file_type.id: file_type.model for file_type in FILE_TYPE if file_type.model is not None}
+
+
+def snapshot_file_name(submission_id, job_id, table_name):
+    """Format the name of the staging snapshot of a job, which is stored alongside the job's error reports
+
+    Args:
+        submission_id: the ID of the submission the job is part of
+        job_id: the ID of the job whose rows are in the snapshot
+        table_name: the name of the staging table the rows are from
+
+    Returns:
+        string of the snapshot's file name
+    """
+    return "submission_{}_job_{}_{}.parquet".format(submission_id, job_id, table_name)
+
+
+def snapshot_columns(model):
+    """The columns of a staging table that are stored in its snapshots, the same ones move_published_data copies
+
+    Args:
+        model: the staging model to get the columns of
+
+    Returns:
+        list of the model's columns other than its primary key and timestamps
+    """
+    excluded_columns = {"created_at", "updated_at"} | {column.name for column in model.__table__.primary_key}
+    return [column for column in model.__table__.columns if column.name not in excluded_columns]
+
+
+def arrow_type(column_type):
+    """The Arrow type a staging column is stored as. Numeric columns are kept as text so no value is rounded to fit a
+    fixed scale.
+
+    Args:
+        column_type: the SQLAlchemy type of the column
+
+    Returns:
+        the pyarrow DataType to store the column as
+    """
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, (Integer, BigInteger)):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def write_staging_snapshot(conn, model, submission_id, file_path):
+    """Write a submission's rows in a staging table to a zstd-compressed Parquet file, reading them in batches so the
+    whole table is never held in memory
+
+    Args:
+        conn: the database connection to read the rows with
+        model: the staging model to read the rows of
+        submission_id: the ID of the submission whose rows are written
+        file_path: the local path to write the snapshot to
+
+    Returns:
+        the number of rows written
+    """
+    columns = snapshot_columns(model)
+    schema = pa.schema([(column.name, arrow_type(column.type)) for column in columns])
+    query = select(
+        *[
+            (
+                cast(column, Text).label(column.name)
+                if isinstance(column.type, Numeric) and not isinstance(column.type, Float)
+                else column
+            )
+            for column in columns
+        ]
+    ).where(model.submission_id == submission_id)
+
+    row_count = 0
+    result = conn.execution_options(stream_results=True).execute(query)
+    with pq.ParquetWriter(file_path, schema, compression=SNAPSHOT_COMPRESSION) as writer:
+        for rows in result.partitions(SNAPSHOT_BATCH_SIZE):
+            writer.write_table(pa.Table.from_pylist([dict(row._mapping) for row in rows], schema=schema))
+            row_count += len(rows)
+    return row_count
+
+
+def load_staging_snapshot(conn, file_path, table_name):
+    """Bulk load a staging snapshot into a table with the same columns, a row group at a time
+
+    Args:
+        conn: the database connection to load the rows with
+        file_path: the local path of the snapshot
+        table_name: the name of the table to load the rows into
+
+    Returns:
+        the number of rows loaded
+    """
+    snapshot = pq.ParquetFile(file_path)
+    columns = ["created_at", "updated_at"] + snapshot.schema_arrow.names
+    copy_sql = "COPY {} ({}) FROM STDIN WITH CSV".format(
+        table_name, ", ".join('"{}"'.format(column) for column in columns)
+    )
+    # Quoting every value keeps empty strings apart from NULLs, which are left unquoted
+    write_options = pa_csv.WriteOptions(include_header=False, quoting_style="all_valid")
+    now = datetime.now(UTC).replace(tzinfo=None)
+
+    row_count = 0
+    with conn.connection.cursor() as cursor:
+        for batch in snapshot.iter_batches(batch_size=SNAPSHOT_BATCH_SIZE):
+            timestamps = pa.array([now] * batch.num_rows, pa.timestamp("us"))
+            batch_table = pa.Table.from_batches([batch]).add_column(0, "created_at", timestamps)
+            batch_table = batch_table.add_column(1, "updated_at", timestamps)
+            copy_buffer = BytesIO()
+            pa_csv.write_csv(batch_table, copy_buffer, write_options=write_options)
+            copy_buffer.seek(0)
+            cursor.copy_expert(copy_sql, copy_buffer)
+            row_count += batch.num_rows
+    return row_count
+
+
+def get_staging_snapshots(sess, submission_id):
+    """Find the staging snapshots written for a submission's validation jobs
+
+    Args:
+        sess: the database session
+        submission_id: the ID of the submission to find the snapshots of
+
+    Returns:
+        dict of staging table name to the name of the snapshot of the submission's rows in it
+    """
+    jobs = sess.query(Job.file_type_id, Job.staging_snapshot).filter(
+        Job.submission_id == submission_id,
+        Job.job_type_id == JOB_TYPE_DICT["csv_record_validation"],
+        Job.staging_snapshot.isnot(None),
+    )
+    return {
+        STAGING_MODELS[job.file_type_id].__table__.name: job.staging_snapshot
+        for job in jobs
+        if job.file_type_id in STAGING_MODELS
+    }
+
+
+@contextmanager
+def staging_snapshot_path(file_name):
+    """Get a local path to read a staging snapshot from, downloading it from the error report location in S3 first
+    when not running locally
+
+    Args:
+        file_name: the name of the snapshot
+
+    Yields:
+        the local path of the snapshot
+    """
+    if CONFIG_BROKER["local"]:
+        yield os.path.join(CONFIG_SERVICES["error_report_path"], file_name)
+        return
+
+    file_handle, file_path = tempfile.mkstemp(suffix=".parquet")
+    os.close(file_handle)
+    try:
+        s3 = boto3.client("s3", region_name=CONFIG_BROKER["aws_region"])
+        s3.download_file(CONFIG_BROKER["aws_bucket"], "errors/" + file_name, file_path)
+        yield file_path
+    finally:
+        os.remove(file_path)
@@ -5,23 +5,18 @@
 -- Note that this only compares award identifiers when the TransactionObligatedAmount is not null.
 -- gather the grouped sum for award financial data
 WITH award_financial_c23_1_{0} AS
-    (SELECT UPPER(piid) AS piid,
-        SUM(transaction_obligated_amou) AS sum_ob_amount
-    FROM award_financial
-    WHERE submission_id = {0}
-        AND COALESCE(parent_award_id, '') = ''
-        AND transaction_obligated_amou IS NOT NULL
-        AND (COALESCE(allocation_transfer_agency, '') = ''
-            OR allocation_transfer_agency = agency_identifier)
-    GROUP BY UPPER(piid)),
+    (SELECT piid,
+        SUM(sum_ob_amount) AS sum_ob_amount
+    FROM award_financial_award_sums_{0}
+    WHERE COALESCE(parent_award_id, '') = ''
+    GROUP BY piid),
 -- gather the grouped sum for award procurement data
 award_procurement_c23_1_{0} AS
-    (SELECT UPPER(piid) AS piid,
-        COALESCE(SUM(federal_action_obligation), 0) AS sum_fed_amount
-    FROM award_procurement
-    WHERE submission_id = {0}
-        AND COALESCE(parent_award_id, '') = ''
-    GROUP BY UPPER(piid))
+    (SELECT piid,
+        SUM(sum_fed_amount) AS sum_fed_amount
+    FROM award_procurement_award_sums_{0}
+    WHERE COALESCE(parent_award_id, '') = ''
+    GROUP BY piid)
 SELECT
     NULL AS "source_row_number",
     af.piid AS "source_value_piid",
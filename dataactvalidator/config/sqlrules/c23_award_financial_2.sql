@@ -6,25 +6,20 @@
 -- award identifiers when the TransactionObligatedAmount is not null.
 -- gather the grouped sum for award financial data
 WITH award_financial_c23_2_{0} AS
-    (SELECT UPPER(piid) AS piid,
-    UPPER(parent_award_id) AS parent_award_id,
-        SUM(transaction_obligated_amou) AS sum_ob_amount
-    FROM award_financial
-    WHERE submission_id = {0}
-        AND transaction_obligated_amou IS NOT NULL
-        AND (COALESCE(allocation_transfer_agency, '') = ''
-            OR allocation_transfer_agency = agency_identifier)
-    GROUP BY UPPER(parent_award_id),
-        UPPER(piid)),
+    (SELECT piid,
+        parent_award_id,
+        SUM(sum_ob_amount) AS sum_ob_amount
+    FROM award_financial_award_sums_{0}
+    GROUP BY parent_award_id,
+        piid),
 -- gather the grouped sum for award procurement data
 award_procurement_c23_2_{0} AS
-    (SELECT UPPER(piid) AS piid,
-    UPPER(parent_award_id) AS parent_award_id,
-        COALESCE(SUM(federal_action_obligation), 0) AS sum_fed_amount
-    FROM award_procurement
-    WHERE submission_id = {0}
-    GROUP BY UPPER(parent_award_id),
-        UPPER(piid))
+    (SELECT piid,
+        parent_award_id,
+        SUM(sum_fed_amount) AS sum_fed_amount
+    FROM award_procurement_award_sums_{0}
+    GROUP BY parent_award_id,
+        piid)
 SELECT
     NULL AS "source_row_number",
     af.piid AS "source_value_piid",
@@ -6,29 +6,18 @@
 -- TransactionObligatedAmount is not null.
 -- gather the grouped sum for award financial data
 WITH award_financial_c23_3_{0} AS
-    (SELECT UPPER(fain) AS fain,
-        SUM(transaction_obligated_amou) AS sum_ob_amount
-    FROM award_financial
-    WHERE submission_id = {0}
-        AND transaction_obligated_amou IS NOT NULL
-        AND (COALESCE(allocation_transfer_agency, '') = ''
-            OR allocation_transfer_agency = agency_identifier)
-    GROUP BY UPPER(fain)),
+    (SELECT fain,
+        SUM(sum_ob_amount) AS sum_ob_amount
+    FROM award_financial_award_sums_{0}
+    GROUP BY fain),
 -- gather the grouped sum for award financial assistance data
 award_financial_assistance_c23_3_{0} AS
-    (SELECT UPPER(fain) AS fain,
-        COALESCE(SUM(CASE WHEN COALESCE(assistance_type, '') IN ('07', '08', 'F003', 'F004')
-                        THEN original_loan_subsidy_cost::NUMERIC
-                        ELSE 0
-                    END), 0) AS sum_orig_loan_sub_amount,
-        COALESCE(SUM(CASE WHEN COALESCE(assistance_type, '') NOT IN ('07', '08', 'F003', 'F004')
-                        THEN federal_action_obligation
-                        ELSE 0
-                    END), 0) AS sum_fed_act_ob_amount
-    FROM award_financial_assistance
-    WHERE submission_id = {0}
-        AND record_type IN ('2', '3')
-    GROUP BY UPPER(fain))
+    (SELECT fain,
+        SUM(sum_orig_loan_sub_amount) AS sum_orig_loan_sub_amount,
+        SUM(sum_fed_act_ob_amount) AS sum_fed_act_ob_amount
+    FROM award_financial_assistance_award_sums_{0}
+    WHERE record_type IN ('2', '3')
+    GROUP BY fain)
 SELECT
     NULL AS "source_row_number",
     af.fain AS "source_value_fain",
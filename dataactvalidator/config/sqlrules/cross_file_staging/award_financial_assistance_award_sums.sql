@@ -0,0 +1,25 @@
+-- Sums of FederalActionObligation and OriginalLoanSubsidyCost in File D2 (award financial assistance) for each record
+-- type and normalized FAIN and URI. Loan assistance types only count towards the OriginalLoanSubsidyCost sum and all
+-- other assistance types only count towards the FederalActionObligation sum. Built once per cross-file job for the
+-- cross-file rules that compare award sums (C23.3, C23.4), each of which regroups it by the identifier it needs.
+DROP TABLE IF EXISTS award_financial_assistance_award_sums_{0};
+CREATE UNLOGGED TABLE award_financial_assistance_award_sums_{0} AS
+    SELECT record_type,
+        UPPER(fain) AS fain,
+        UPPER(uri) AS uri,
+        COALESCE(SUM(CASE WHEN COALESCE(assistance_type, '') IN ('07', '08', 'F003', 'F004')
+                        THEN original_loan_subsidy_cost::NUMERIC
+                        ELSE 0
+                    END), 0) AS sum_orig_loan_sub_amount,
+        COALESCE(SUM(CASE WHEN COALESCE(assistance_type, '') NOT IN ('07', '08', 'F003', 'F004')
+                        THEN federal_action_obligation
+                        ELSE 0
+                    END), 0) AS sum_fed_act_ob_amount
+    FROM award_financial_assistance
+    WHERE submission_id = {0}
+    GROUP BY record_type,
+        UPPER(fain),
+        UPPER(uri);
+CREATE INDEX ON award_financial_assistance_award_sums_{0} (fain);
+CREATE INDEX ON award_financial_assistance_award_sums_{0} (uri);
+ANALYZE award_financial_assistance_award_sums_{0};
@@ -0,0 +1,24 @@
+-- Sums of TransactionObligatedAmount in File C (award financial) for each normalized award identifier combination.
+-- Only rows with a TransactionObligatedAmount where the AllocationTransferAgencyIdentifier (ATA) is blank or matches the
+-- AgencyIdentifier (AID) are included. Built once per cross-file job for the rules that compare award sums
+-- (C23.1, C23.2, C23.3, C23.4), each of which regroups it by the identifiers it needs.
+DROP TABLE IF EXISTS award_financial_award_sums_{0};
+CREATE UNLOGGED TABLE award_financial_award_sums_{0} AS
+    SELECT UPPER(piid) AS piid,
+        UPPER(parent_award_id) AS parent_award_id,
+        UPPER(fain) AS fain,
+        UPPER(uri) AS uri,
+        SUM(transaction_obligated_amou) AS sum_ob_amount
+    FROM award_financial
+    WHERE submission_id = {0}
+        AND transaction_obligated_amou IS NOT NULL
+        AND (COALESCE(allocation_transfer_agency, '') = ''
+            OR allocation_transfer_agency = agency_identifier)
+    GROUP BY UPPER(piid),
+        UPPER(parent_award_id),
+        UPPER(fain),
+        UPPER(uri);
+CREATE INDEX ON award_financial_award_sums_{0} (piid, parent_award_id);
+CREATE INDEX ON award_financial_award_sums_{0} (fain);
+CREATE INDEX ON award_financial_award_sums_{0} (uri);
+ANALYZE award_financial_award_sums_{0};
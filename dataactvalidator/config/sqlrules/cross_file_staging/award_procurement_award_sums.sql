@@ -0,0 +1,14 @@
+-- Sums of FederalActionObligation in File D1 (award procurement) for each normalized PIID and ParentAwardId. Built
+-- once per cross-file job for the rules that compare award sums (C23.1, C23.2), each of which regroups it by the
+-- identifiers it needs.
+DROP TABLE IF EXISTS award_procurement_award_sums_{0};
+CREATE UNLOGGED TABLE award_procurement_award_sums_{0} AS
+    SELECT UPPER(piid) AS piid,
+        UPPER(parent_award_id) AS parent_award_id,
+        COALESCE(SUM(federal_action_obligation), 0) AS sum_fed_amount
+    FROM award_procurement
+    WHERE submission_id = {0}
+    GROUP BY UPPER(piid),
+        UPPER(parent_award_id);
+CREATE INDEX ON award_procurement_award_sums_{0} (piid, parent_award_id);
+ANALYZE award_procurement_award_sums_{0};
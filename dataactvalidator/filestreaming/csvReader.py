@@ -1,21 +1,24 @@
 import csv
 import os
-import tempfile
 import boto3
-from collections import OrderedDict
+import pandas as pd
+from collections import OrderedDict, namedtuple
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.utils.ResponseError import ResponseError
 from dataactcore.utils.statusCode import StatusCode
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.filestreaming.s3RangeReader import open_s3_text
 from dataactcore.utils.stringCleaner import StringCleaner
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
+FileChunk = namedtuple("FileChunk", ["data", "short_rows", "long_rows", "estimated_row_count"])
+
 
 class CsvReader(object):
     """
-    Reads data from local CSV file (first downloading from S3 if necessary)
+    Reads data from local CSV file or streams it from S3 as it's read
     """
 
     header_report_headers = ["Error type", "Header name"]
@@ -24,21 +27,11 @@ class CsvReader(object):
         """Creates a filename based on the file path
         Args:
             region: AWS region where the bucket is located
-            bucket: Optional parameter; if set, file will be retrieved from S3
+            bucket: Optional parameter; if set, file will be streamed from S3 when opened
             filename: The file path for the CSV file (local or in S3)
         """
-        self.has_tempfile = False
         self.filename = filename
-
-        if region and bucket:
-            # If this is a file in S3, download to a local temp file first
-            # Use temp file as local file
-            (file, file_path) = tempfile.mkstemp()
-            self.has_tempfile = True
-
-            s3 = boto3.client("s3", region_name=region)
-            s3.download_file(bucket, filename, file_path)
-            self.filename = file_path
+        self.s3_location = (region, bucket) if region and bucket else None
 
         return self.filename
 
@@ -58,7 +51,7 @@ class CsvReader(object):
 
         Args:
             region: AWS region where the bucket is located
-            bucket: Optional parameter; if set, file will be retrieved from S3
+            bucket: Optional parameter; if set, file will be streamed from S3
             filename: The file path for the CSV file (local or in S3)
             csv_schema: list of FileColumn objects for this file type
             bucket_name: bucket to send errors to
@@ -73,7 +66,13 @@ class CsvReader(object):
 
         self.is_local = is_local
         try:
-            self.file = open(self.filename, "r", newline=None)
+            # Any non-UTF8 characters raise a UnicodeDecodeError when read, which is reported as a file level error
+            if self.s3_location:
+                # Rows are read as their bytes arrive, so there's no local copy and parsing starts with the first range
+                self.file, self.file_size = open_s3_text(*self.s3_location, self.filename)
+            else:
+                self.file = open(self.filename, "r", newline=None, encoding="utf-8")
+                self.file_size = os.path.getsize(self.filename)
         except Exception:
             raise ValueError("".join(["Filename provided not found : ", str(self.filename)]))
 
@@ -96,6 +95,8 @@ class CsvReader(object):
 
         # create the header
         header_row = next(csv.reader([header_line], quotechar='"', dialect="excel", delimiter=self.delimiter))
+        self.file_headers = dedupe_headers(header_row)
+        self.header_size = len(header_line)
         gsdm_headers = use_gsdm_headers(header_row, gsdm_to_short_dict)
         header_row = list(normalize_headers(header_row, gsdm_headers, gsdm_to_short_dict, self.header_dict))
         # Storing the flex fields for easy access
@@ -109,6 +110,89 @@ class CsvReader(object):
 
         return gsdm_headers
 
+    def read_chunks(self, chunk_size):
+        """Reads the rest of the file in a single pass, splitting the rows into chunks of well-formed rows.
+
+        Rows with fewer or more cells than the header are left out of the chunks and recorded in short_pop_rows,
+        short_null_rows, long_pop_rows, and long_null_rows instead. Blank lines are skipped and rows are numbered
+        starting with the header as row 1. Once the file has been read, row_count holds the number of rows in it.
+
+        Args:
+            chunk_size: the number of rows to read into each chunk, including the malformed ones
+
+        Yields:
+            FileChunk containing a dataframe of the well-formed rows (as strings, under the file's own headers with
+            their original row number in row_number), the short and long row numbers found in the chunk, and an
+            estimate of the number of rows in the file based on how much of it has been read
+        """
+        self.row_count = 1
+        self.short_pop_rows, self.short_null_rows, self.long_pop_rows, self.long_null_rows = [], [], [], []
+        file_size = self.file_size
+        chars_read = self.header_size
+
+        def tracked_lines():
+            nonlocal chars_read
+            for line in self.file:
+                chars_read += len(line)
+                yield line
+
+        csv_reader = csv.reader(tracked_lines(), quotechar='"', dialect="excel", delimiter=self.delimiter)
+        header_length = len(self.file_headers)
+        rows, row_numbers, short_rows, long_rows = [], [], [], []
+        rows_in_chunk = 0
+        for line in csv_reader:
+            if not line:
+                continue
+            self.row_count += 1
+            rows_in_chunk += 1
+            line_length = len(line)
+            if line_length == header_length:
+                rows.append(line)
+                row_numbers.append(self.row_count)
+            # All lines that are shorter than they should be
+            elif line_length < header_length:
+                short_rows.append(self.row_count)
+                # track rows with no data in them separately
+                if len("".join(line)) > 0:
+                    self.short_pop_rows.append(self.row_count)
+                else:
+                    self.short_null_rows.append(self.row_count)
+            # All lines that are longer than they should be
+            else:
+                long_rows.append(self.row_count)
+                if len("".join(line)) > 0:
+                    self.long_pop_rows.append(self.row_count)
+                else:
+                    self.long_null_rows.append(self.row_count)
+
+            if rows_in_chunk == chunk_size:
+                yield self.build_chunk(rows, row_numbers, short_rows, long_rows, chars_read, file_size)
+                rows, row_numbers, short_rows, long_rows = [], [], [], []
+                rows_in_chunk = 0
+        if rows_in_chunk:
+            yield self.build_chunk(rows, row_numbers, short_rows, long_rows, chars_read, file_size)
+
+    def build_chunk(self, rows, row_numbers, short_rows, long_rows, chars_read, file_size):
+        """Builds a FileChunk out of the rows read for it
+
+        Args:
+            rows: list of the well-formed rows in the chunk, each a list of cells
+            row_numbers: the original row numbers of the well-formed rows
+            short_rows: the row numbers of rows in the chunk that had too few cells
+            long_rows: the row numbers of rows in the chunk that had too many cells
+            chars_read: how many characters of the file have been read so far
+            file_size: the size of the file in bytes
+
+        Returns:
+            FileChunk for the rows provided
+        """
+        chunk_df = pd.DataFrame(rows, columns=self.file_headers, dtype=str)
+        chunk_df["row_number"] = row_numbers
+        # Multibyte characters make this an overestimate of how much of the file is left but it's close enough to
+        # report progress with
+        estimated_row_count = max(round(self.row_count * file_size / max(chars_read, 1)), self.row_count)
+        return FileChunk(chunk_df, short_rows, long_rows, estimated_row_count)
+
     @staticmethod
     def write_file_level_error(bucket_name, filename, header, error_content, is_local):
         """Writes file-level errors to an error file
@@ -210,13 +294,33 @@ class CsvReader(object):
         """Closes file if it exists"""
         try:
             self.file.close()
-            if self.has_tempfile:
-                os.remove(self.filename)
         except AttributeError:
             # File does not exist, and so does not need to be closed
             pass
 
 
+def dedupe_headers(header_row):
+    """Rename repeated headers the way pandas does when reading a csv, appending .1, .2, etc. to each repeat
+
+    Args:
+        header_row: an array of the file headers given
+
+    Returns:
+        A list of the headers with every repeated header made unique
+    """
+    counts = {}
+    deduped_headers = []
+    for header in header_row:
+        count = counts.get(header, 0)
+        while count > 0:
+            counts[header] = count + 1
+            header = "{}.{}".format(header, count)
+            count = counts.get(header, 0)
+        counts[header] = count + 1
+        deduped_headers.append(header)
+    return deduped_headers
+
+
 def use_gsdm_headers(header_row, gsdm_to_short_dict):
     """Check to see if header contains GSDM or short column names
 
@@ -0,0 +1,135 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import IncompleteReadError, ReadTimeoutError, ResponseStreamingError
+
+logger = logging.getLogger(__name__)
+
+# How many bytes of the file are fetched from S3 with each ranged request
+S3_RANGE_SIZE = 8 * 1024 * 1024
+# How many times a range is requested again after its body fails partway through being read
+S3_RANGE_RETRIES = 3
+
+
+class S3RangeReader(io.RawIOBase):
+    """Reads a file in S3 in ranges of bytes as it's read instead of downloading all of it first. The next range is
+    fetched in the background while the current one is being read so the network transfer overlaps with whatever the
+    file is being read for, and at most two ranges are held in memory at a time.
+
+    Attributes:
+        bucket: the name of the bucket the file is in
+        key: the key of the file in the bucket
+        size: the size of the file in bytes
+        range_size: how many bytes are fetched with each request
+    """
+
+    def __init__(self, client, bucket, key, range_size=S3_RANGE_SIZE):
+        """Looks up the size of the file and starts fetching its first range
+
+        Args:
+            client: the boto3 S3 client to fetch the file with
+            bucket: the name of the bucket the file is in
+            key: the key of the file in the bucket
+            range_size: how many bytes to fetch with each request
+
+        Raises:
+            botocore.exceptions.ClientError: the file doesn't exist or can't be accessed
+        """
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.range_size = range_size
+        self._buffer = memoryview(b"")
+        self._next_range = None
+        self._executor = None
+
+        self.size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self._next_start = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="s3_range_reader")
+        self._next_range = self._fetch_next_range()
+
+    def _fetch_next_range(self):
+        """Start fetching the range after the last one fetched
+
+        Returns:
+            a future of the range's bytes, None if the whole file has been fetched
+        """
+        if self._next_start >= self.size:
+            return None
+        start, end = self._next_start, min(self._next_start + self.range_size, self.size) - 1
+        self._next_start = end + 1
+        return self._executor.submit(self._get_range, start, end)
+
+    def _get_range(self, start, end):
+        """Fetch a range of the file
+
+        Args:
+            start: the first byte of the range
+            end: the last byte of the range
+
+        Returns:
+            the bytes of the range
+        """
+        for attempt in range(1, S3_RANGE_RETRIES + 1):
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+                return response["Body"].read()
+            except (IncompleteReadError, ReadTimeoutError, ResponseStreamingError):
+                if attempt == S3_RANGE_RETRIES:
+                    raise
+                logger.warning(
+                    "Reading bytes %s-%s of %s failed, retrying (attempt %s)", start, end, self.key, attempt + 1
+                )
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """Read the next bytes of the file into the buffer, waiting on the range being fetched if the current one
+        has been read
+
+        Args:
+            buffer: the writable buffer to read into
+
+        Returns:
+            how many bytes were read, 0 once the whole file has been read
+        """
+        if not self._buffer:
+            if self._next_range is None:
+                return 0
+            self._buffer = memoryview(self._next_range.result())
+            self._next_range = self._fetch_next_range()
+        read_size = min(len(buffer), len(self._buffer))
+        buffer[:read_size] = self._buffer[:read_size]
+        self._buffer = self._buffer[read_size:]
+        return read_size
+
+    def close(self):
+        """Stop fetching the file and release the ranges held in memory"""
+        if self._next_range is not None:
+            self._next_range.cancel()
+            self._next_range = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._buffer = memoryview(b"")
+        super().close()
+
+
+def open_s3_text(region, bucket, key, range_size=S3_RANGE_SIZE):
+    """Open a UTF-8 text file in S3 to be read line by line as it's fetched, with universal newlines like open()
+
+    Args:
+        region: AWS region where the bucket is located
+        bucket: the name of the bucket the file is in
+        key: the key of the file in the bucket
+        range_size: how many bytes to fetch with each request
+
+    Returns:
+        a tuple of the text stream and the size of the file in bytes
+    """
+    raw_reader = S3RangeReader(boto3.client("s3", region_name=region), bucket, key, range_size=range_size)
+    text_stream = io.TextIOWrapper(io.BufferedReader(raw_reader, buffer_size=io.DEFAULT_BUFFER_SIZE), encoding="utf-8")
+    return text_stream, raw_reader.size
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from dataactcore.models.errorModels import ErrorMetadata
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
 from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.function_bag import get_utc_now
 
 from dataactcore.models.lookups import ERROR_TYPE_DICT
 
@@ -17,6 +20,7 @@ def record_row_error(
     file_type_id=None,
     target_file_id=None,
     severity_id=None,
+    num_errors=1,
 ):
     """Add this error to running sum of error types
 
@@ -32,20 +36,21 @@ def record_row_error(
         file_type_id: Id of source file type
         target_file_id: Id of target file type
         severity_id: Id of error severity
+        num_errors: how many times this error occurred, starting from row
 
     Returns:
         updated error_list with new/updated record rows
     """
     key = "".join([str(job_id), str(original_label), field_name, str(error_type)])
     if key in error_list:
-        error_list[key]["numErrors"] += 1
+        error_list[key]["numErrors"] += num_errors
     else:
         error_dict = {
             "filename": filename,
             "fieldName": field_name,
             "jobId": job_id,
             "errorType": error_type,
-            "numErrors": 1,
+            "numErrors": num_errors,
             "firstRow": row,
             "originalRuleLabel": original_label,
             "fileTypeId": file_type_id,
@@ -56,6 +61,65 @@ def record_row_error(
     return error_list
 
 
+def merge_error_lists(error_lists):
+    """Combine several error lists into one, summing the errors that were recorded in more than one of them
+
+    Args:
+        error_lists: list of dicts keeping track of error metadata, in the order they should be merged. The first row
+            of an error is kept from the first list that recorded it.
+
+    Returns:
+        a single error_list containing all recorded errors
+    """
+    merged_list = {}
+    for error_list in error_lists:
+        for key, error_dict in error_list.items():
+            if key in merged_list:
+                merged_list[key]["numErrors"] += error_dict["numErrors"]
+            else:
+                merged_list[key] = dict(error_dict)
+    return merged_list
+
+
+def record_row_errors(error_list, job_id, filename, errors, file_type_id=None, target_file_id=None, severity_id=None):
+    """Add a dataframe of errors to running sum of error types, counting each type of error in one grouping instead
+    of one error at a time
+
+    Args:
+        error_list: dict keeping track of error metadata to be updated
+        job_id: ID of job in job tracker
+        filename: name of error report in S3
+        errors: dataframe of the errors, with "Field Name", "error_type", "Row Number" and "Rule Label" columns
+        file_type_id: Id of source file type
+        target_file_id: Id of target file type
+        severity_id: Id of error severity
+
+    Returns:
+        updated error_list with new/updated record rows
+    """
+    if errors.empty:
+        return error_list
+    # Errors are grouped in the order they first appear so they're recorded in the same order as one at a time
+    error_counts = errors.groupby(["Field Name", "error_type", "Rule Label"], sort=False, dropna=False)[
+        "Row Number"
+    ].agg(["size", "first"])
+    for (field_name, error_type, original_label), (num_errors, first_row) in error_counts.iterrows():
+        record_row_error(
+            error_list,
+            job_id,
+            filename,
+            field_name,
+            int(error_type),
+            int(first_row),
+            original_label,
+            file_type_id,
+            target_file_id,
+            severity_id,
+            num_errors=int(num_errors),
+        )
+    return error_list
+
+
 def write_all_row_errors(error_list, job_id):
     """Writes all recorded errors to database
 
@@ -64,6 +128,8 @@ def write_all_row_errors(error_list, job_id):
         job_id: ID to write errors for
     """
     sess = GlobalDB.db().session
+    now = get_utc_now()
+    error_rows = []
     for key in error_list.keys():
         error_dict = error_list[key]
         # Set info for this error
@@ -79,41 +145,68 @@ def write_all_row_errors(error_list, job_id):
             # For rule failures, it will hold the error message
             error_msg = error_dict["errorType"]
             if "Field must be no longer than specified limit" in error_msg:
-                rule_failed_id = ERROR_TYPE_DICT["length_error"]
+                error_type_id = ERROR_TYPE_DICT["length_error"]
             else:
-                rule_failed_id = ERROR_TYPE_DICT["rule_failed"]
-            error_row = ErrorMetadata(
-                job_id=this_job,
-                filename=error_dict["filename"],
-                field_name=field_name,
-                error_type_id=rule_failed_id,
-                rule_failed=error_msg,
-                occurrences=error_dict["numErrors"],
-                first_row=error_dict["firstRow"],
-                original_rule_label=error_dict["originalRuleLabel"],
-                file_type_id=error_dict["fileTypeId"],
-                target_file_type_id=error_dict["targetFileId"],
-                severity_id=error_dict["severity"],
-            )
+                error_type_id = ERROR_TYPE_DICT["rule_failed"]
         else:
             # This happens if cast to int was successful
-            error_string = ValidationError.get_error_type_string(error_type)
-            error_id = ERROR_TYPE_DICT[error_string]
-            # Create error metadata
-            error_row = ErrorMetadata(
-                job_id=this_job,
-                filename=error_dict["filename"],
-                field_name=field_name,
-                error_type_id=error_id,
-                occurrences=error_dict["numErrors"],
-                first_row=error_dict["firstRow"],
-                rule_failed=ValidationError.get_error_message(error_type),
-                original_rule_label=error_dict["originalRuleLabel"],
-                file_type_id=error_dict["fileTypeId"],
-                target_file_type_id=error_dict["targetFileId"],
-                severity_id=error_dict["severity"],
-            )
+            error_type_id = ERROR_TYPE_DICT[ValidationError.get_error_type_string(error_type)]
+            error_msg = ValidationError.get_error_message(error_type)
+        error_rows.append(
+            [
+                now,
+                now,
+                this_job,
+                error_dict["filename"],
+                field_name,
+                error_type_id,
+                error_dict["numErrors"],
+                error_dict["firstRow"],
+                error_msg,
+                error_dict["originalRuleLabel"],
+                error_dict["fileTypeId"],
+                error_dict["targetFileId"],
+                error_dict["severity"],
+            ]
+        )
 
-        sess.add(error_row)
-    # Commit the session to write all rows
+    # Write all rows with a single COPY
+    if error_rows:
+        copy_buffer = StringIO()
+        for error_row in error_rows:
+            copy_buffer.write("\t".join(copy_text_value(value) for value in error_row) + "\n")
+        copy_buffer.seek(0)
+        columns = [
+            "created_at",
+            "updated_at",
+            "job_id",
+            "filename",
+            "field_name",
+            "error_type_id",
+            "occurrences",
+            "first_row",
+            "rule_failed",
+            "original_rule_label",
+            "file_type_id",
+            "target_file_type_id",
+            "severity_id",
+        ]
+        with sess.connection().connection.cursor() as cursor:
+            cursor.copy_expert(
+                "COPY {} ({}) FROM STDIN".format(ErrorMetadata.__table__.name, ", ".join(columns)), copy_buffer
+            )
     sess.commit()
+
+
+def copy_text_value(value):
+    """Formats a value for COPY's text format, which, unlike CSV, keeps empty strings apart from NULLs
+
+    Args:
+        value: the value to format
+
+    Returns:
+        the value as a string, with the characters the text format uses escaped
+    """
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
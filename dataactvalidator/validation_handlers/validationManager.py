@@ -3,19 +3,24 @@ import logging
 import multiprocessing as mp
 import os
 import re
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
+from itertools import repeat
 
 import boto3
 import pandas as pd
 import psutil as ps
-from sqlalchemy import and_, case, or_
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from dataactbroker.handlers.submission_handler import populate_submission_error_info
 from dataactbroker.helpers.validation_helper import (
-    derive_fabs_awarding_sub_tier,
-    derive_fabs_afa_generated_unique,
+    derive_fabs_awarding_sub_tier_vectorized,
+    derive_fabs_afa_generated_unique_vectorized,
     derive_fabs_unique_award_key,
     check_required,
     check_type,
@@ -23,12 +28,15 @@ from dataactbroker.helpers.validation_helper import (
     concat_flex,
     process_formatting_errors,
     parse_fields,
-    simple_file_scan,
     check_field_format,
     clean_numbers_vectorized,
     clean_frame_vectorized,
     derive_unique_id_vectorized,
+    get_file_fingerprint,
+    get_rules_fingerprint,
+    record_validation_timing,
     update_val_progress,
+    validation_results_current,
 )
 
 from dataactcore.aws.s3Handler import S3Handler
@@ -48,32 +56,53 @@ from dataactcore.interfaces.function_bag import (
 from dataactcore.interfaces.db import db_connection
 
 from dataactcore.models.domainModels import (
-    concat_display_tas_dict,
+    concat_display_tas_dict_vectorized,
     concat_tas_dict_vectorized,
     CGAC,
+    ExternalDataLoadDate,
     FREC,
     Office,
     SubTierAgency,
+    TASPeriodAccount,
 )
 from dataactcore.models.jobModels import Submission
-from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactcore.models.lookups import (
+    EXTERNAL_DATA_TYPE_DICT,
+    FILE_TYPE,
+    FILE_TYPE_DICT,
+    FILE_TYPE_DICT_ID,
+    JOB_TYPE_DICT,
+    RULE_SEVERITY_DICT,
+)
 from dataactcore.models.validationModels import FileColumn
 from dataactcore.models.stagingModels import FABS, FlexField, TotalObligations
 from dataactcore.models.errorModels import ErrorMetadata
-from dataactcore.models.jobModels import Job
+from dataactcore.models.jobModels import Job, ValidationTiming
 from dataactcore.models.validationModels import RuleSql, ValidationLabel
 
 from dataactcore.utils.ResponseError import ResponseError
 from dataactcore.utils.jsonResponse import JsonResponse
 from dataactcore.utils.report import report_file_name
 from dataactcore.utils.loader_utils import insert_dataframe
+from dataactcore.utils.staging_snapshot import snapshot_file_name, write_staging_snapshot
 from dataactcore.utils.statusCode import StatusCode
 
 from dataactvalidator.filestreaming.csvReader import CsvReader
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner, StringCleaner
 
-from dataactvalidator.validation_handlers.errorInterface import record_row_error, write_all_row_errors
-from dataactvalidator.validation_handlers.validator import cross_validate_sql, validate_file_by_sql
+from dataactvalidator.validation_handlers.errorInterface import (
+    merge_error_lists,
+    record_row_error,
+    record_row_errors,
+    write_all_row_errors,
+)
+from dataactvalidator.validation_handlers.validator import (
+    CrossFilePairProgress,
+    cross_validate_sql,
+    drop_cross_file_staging,
+    prepare_cross_file_staging,
+    validate_file_by_sql,
+)
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
 logger = logging.getLogger(__name__)
@@ -82,16 +111,84 @@ CHUNK_SIZE = CONFIG_BROKER["validator_batch_size"]
 MULTIPROCESSING_POOLS = CONFIG_BROKER["multiprocessing_pools"] or None
 PARALLEL = CONFIG_BROKER["parallel_loading"]
 BATCH_SQL_VAL_RESULTS = CONFIG_BROKER["batch_sql_validation_results"]
+PARALLEL_SQL_VAL = CONFIG_BROKER["parallel_sql_validation"]
+PARALLEL_CROSS_VAL = CONFIG_BROKER["parallel_cross_validation"]
+SQL_VAL_WORKERS = CONFIG_BROKER["sql_validation_workers"]
+STAGING_SNAPSHOTS = CONFIG_BROKER["staging_snapshots"]
+
+# The database connection of a data loading worker process, made once when the process starts and reused for every
+# chunk it processes
+loading_worker_db = None
+
+
+def init_loading_worker(parent_engine):
+    """Sets up a data loading worker process with its own database engine
+
+    Args:
+        parent_engine: the engine of the process that started the worker
+    """
+    global loading_worker_db
+    # We need to dispose the engine connection when making the child processes in SQLAlchemy 1.4, this ensures the
+    # parent proc's database connections are not touched in the new connection pool
+    # https://docs.sqlalchemy.org/en/14/core/pooling.html#using-connection-pools-with-multiprocessing-or-os-fork
+    parent_engine.dispose(close=False)
+    loading_worker_db = db_connection()
+
 
+# The reference data FABS chunks are checked and derived against, kept for every job run in this process (and shared
+# with the loading workers it forks) until the office or agency loaders record a newer load
+fabs_reference_data = None
 
-class NoLock:
-    """Simple no-op object that bypasses any with statements that'd be used for locking"""
 
-    def __enter__(self):
-        return None
+def get_fabs_reference_data(sess):
+    """Gets the labels, offices, and agency codes used while loading FABS chunks, only reloading them when the office or
+    agency data has been loaded since they were last retrieved. If either load date isn't recorded, they're always
+    reloaded.
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        return False
+    Args:
+        sess: the database connection
+
+    Returns:
+        dict of the requirement and type labels keyed by column name, the sub tier codes keyed by office code, and the
+        awarding agency codes keyed by sub tier code
+    """
+    global fabs_reference_data
+    load_dates = dict(
+        sess.query(ExternalDataLoadDate.external_data_type_id, ExternalDataLoadDate.last_load_date_end).filter(
+            ExternalDataLoadDate.external_data_type_id.in_(
+                [EXTERNAL_DATA_TYPE_DICT["office"], EXTERNAL_DATA_TYPE_DICT["agency"]]
+            )
+        )
+    )
+    load_dates = (load_dates.get(EXTERNAL_DATA_TYPE_DICT["office"]), load_dates.get(EXTERNAL_DATA_TYPE_DICT["agency"]))
+    if fabs_reference_data is not None and None not in load_dates and fabs_reference_data["load_dates"] == load_dates:
+        return fabs_reference_data
+
+    required_labels = {}
+    type_labels = {}
+    for label in sess.query(ValidationLabel).all():
+        if label.label_type == "requirement":
+            required_labels[label.column_name] = label.label
+        else:
+            type_labels[label.column_name] = label.label
+
+    offices = dict(sess.query(Office.office_code, Office.sub_tier_code))
+    agency_codes = dict(
+        sess.query(
+            SubTierAgency.sub_tier_agency_code,
+            case((SubTierAgency.is_frec, FREC.frec_code), else_=CGAC.cgac_code),
+        )
+        .join(CGAC, SubTierAgency.cgac_id == CGAC.cgac_id)
+        .join(FREC, SubTierAgency.frec_id == FREC.frec_id)
+    )
+    fabs_reference_data = {
+        "load_dates": load_dates,
+        "required_labels": required_labels,
+        "type_labels": type_labels,
+        "offices": offices,
+        "agency_codes": agency_codes,
+    }
+    return fabs_reference_data
 
 
 class ValidationManager:
@@ -219,7 +316,8 @@ class ValidationManager:
         # initializing processing metadata vars for a new validation
         self.reader = CsvReader()
         self.error_list = {}
-        self.error_rows = []
+        self.error_row_table = "error_rows_{}".format(job.job_id)
+        self.format_error_list = {}
         self.total_rows = 0
         self.total_data_rows = 0
         self.short_rows = []
@@ -259,8 +357,16 @@ class ValidationManager:
         # Get orm model for this file
         self.model = [ft.model for ft in FILE_TYPE if ft.name == self.file_type.name][0]
 
-        # Delete existing file level errors for this submission
+        # An unchanged file validated against unchanged rules gets the same results, keep the ones already stored
+        file_fingerprint = get_file_fingerprint(self.file_name)
+        rules_fingerprint = get_rules_fingerprint(sess, self.file_type.file_type_id)
+        if self.can_reuse_validation(sess, file_fingerprint, rules_fingerprint):
+            self.reuse_validation(sess)
+            return True
+
+        # Delete existing file level errors and timings for this submission
         sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == self.job.job_id).delete()
+        sess.query(ValidationTiming).filter(ValidationTiming.job_id == self.job.job_id).delete()
         sess.commit()
         # Clear existing records for this submission
         sess.query(self.model).filter_by(submission_id=self.submission_id).delete()
@@ -268,8 +374,11 @@ class ValidationManager:
         # Clear existing flex fields for this job
         sess.query(FlexField).filter_by(job_id=self.job.job_id).delete()
         sess.commit()
-        # Reset progress for this job
+        # Reset progress for this job and forget what its old results came from until the new ones are stored
         self.job.progress = 0
+        self.job.file_fingerprint = None
+        self.job.rules_fingerprint = None
+        self.job.staging_snapshot = None
         sess.commit()
 
         # If local, make the error report directory
@@ -296,6 +405,8 @@ class ValidationManager:
         self.csv_schema = {row.name_short: row for row in self.fields}
 
         try:
+            self.create_error_row_table(sess)
+
             # Loading data and initial validations
             self.load_file_data(sess, bucket_name, region_name)
 
@@ -306,7 +417,17 @@ class ValidationManager:
             )
 
             if self.file_type.name in ("appropriations", "program_activity", "award_financial"):
+                tas_linking_start = datetime.now()
                 update_account_nums(self.model, self.submission_id)
+                record_validation_timing(
+                    sess,
+                    "tas_linking",
+                    tas_linking_start,
+                    self.job.job_id,
+                    self.submission_id,
+                    self.file_type.file_type_id,
+                )
+                sess.commit()
 
                 if self.file_type.name == "award_financial":
                     update_total_obligations(
@@ -358,16 +479,13 @@ class ValidationManager:
                 os.remove(self.warning_file_path)
 
             # Calculate total number of rows in file that passed validations
-            error_rows_unique = set(self.error_rows)
             total_rows_excluding_header = self.total_rows - 1
-            valid_rows = total_rows_excluding_header - len(error_rows_unique)
+            valid_rows = total_rows_excluding_header - self.count_error_rows(sess)
 
             # Update fabs is_valid rows where applicable
             # Update submission to include action dates where applicable
             if self.is_fabs:
-                sess.query(FABS).filter(
-                    FABS.row_number.notin_(error_rows_unique), FABS.submission_id == self.submission_id
-                ).update({"is_valid": True}, synchronize_session=False)
+                self.mark_valid_fabs_rows(sess)
                 sess.commit()
                 min_action_date, max_action_date = get_action_dates(self.submission_id)
                 sess.query(Submission).filter(Submission.submission_id == self.submission_id).update(
@@ -389,6 +507,12 @@ class ValidationManager:
                 # set number of errors and warnings for detached submission
                 populate_submission_error_info(self.submission_id)
 
+            if STAGING_SNAPSHOTS:
+                self.job.staging_snapshot = self.write_staging_snapshot(sess, bucket_name, region_name)
+
+            # Record what the stored results came from so they can be reused while neither changes
+            self.job.file_fingerprint = file_fingerprint
+            self.job.rules_fingerprint = rules_fingerprint
             self.final_progress = 100
             update_val_progress(
                 sess, self.job, self.basic_val_progress, self.tas_progress, self.sql_val_progress, self.final_progress
@@ -417,6 +541,7 @@ class ValidationManager:
                 self.reader.close()
 
             sess.commit()
+            self.drop_error_row_table(sess)
 
             validation_duration = (datetime.now() - validation_start).total_seconds()
             logger.info(
@@ -438,6 +563,113 @@ class ValidationManager:
 
         return True
 
+    def can_reuse_validation(self, sess, file_fingerprint, rules_fingerprint):
+        """Checks whether the results stored by the job's last validation can be used instead of validating the file
+        again
+
+        Args:
+            sess: the database session
+            file_fingerprint: the fingerprint of the file being validated
+            rules_fingerprint: the fingerprint of the rules the file would be validated against
+
+        Returns:
+            True if the last validation was of the same file against the same rules, is still current, and its
+            reports are still there, False otherwise
+        """
+        if not file_fingerprint or file_fingerprint != self.job.file_fingerprint:
+            return False
+        if rules_fingerprint != self.job.rules_fingerprint or not validation_results_current(sess, self.job):
+            return False
+        return self.reports_exist(
+            report_file_name(self.submission_id, False, self.file_type.name),
+            report_file_name(self.submission_id, True, self.file_type.name),
+        )
+
+    def reuse_validation(self, sess):
+        """Marks the job as finished with the results of its last validation, leaving its data, errors and reports as
+        they are
+
+        Args:
+            sess: the database session
+        """
+        logger.info(
+            {
+                "message": "Reusing the results of the last validation {}".format(self.log_str),
+                "message_type": "ValidatorInfo",
+                "submission_id": self.submission_id,
+                "job_id": self.job.job_id,
+                "file_type": self.file_type.name,
+                "action": "run_validation",
+                "status": "reused",
+            }
+        )
+        update_val_progress(sess, self.job, 100, 100, 100, 100)
+        mark_job_status(self.job.job_id, "finished")
+        mark_file_complete(self.job.job_id, self.file_name)
+
+    def reports_exist(self, *report_names):
+        """Checks whether error or warning reports from an earlier validation are still there
+
+        Args:
+            report_names: the names of the reports to check
+
+        Returns:
+            True if all the reports exist, False otherwise
+        """
+        for report_name in report_names:
+            if self.is_local:
+                if not os.path.exists("".join([CONFIG_SERVICES["error_report_path"], report_name])):
+                    return False
+            elif not S3Handler.get_file_size(self.get_file_name(report_name)):
+                return False
+        return True
+
+    def write_staging_snapshot(self, sess, bucket_name, region_name):
+        """Writes the rows loaded for this job to a compressed Parquet snapshot next to its error reports, so they can
+        be published without reading the staging table again. The snapshot is optional, failing to write it is logged
+        rather than failing the validation.
+
+        Args:
+            sess: the database session
+            bucket_name: the bucket the error reports are written to
+            region_name: the region of the bucket
+
+        Returns:
+            the name of the snapshot, None if it couldn't be written
+        """
+        snapshot_start = datetime.now()
+        snapshot_name = snapshot_file_name(self.submission_id, self.job.job_id, self.model.__table__.name)
+        snapshot_path = "".join([CONFIG_SERVICES["error_report_path"], snapshot_name])
+        try:
+            row_count = write_staging_snapshot(sess.connection(), self.model, self.submission_id, snapshot_path)
+            if not self.is_local:
+                s3 = boto3.client("s3", region_name=region_name)
+                s3.upload_file(snapshot_path, bucket_name, self.get_file_name(snapshot_name))
+                os.remove(snapshot_path)
+        except Exception:
+            logger.warning(
+                {
+                    "message": "Could not write the staging snapshot {}".format(self.log_str),
+                    "message_type": "ValidatorWarning",
+                    "submission_id": self.submission_id,
+                    "job_id": self.job.job_id,
+                    "file_type": self.file_type.name,
+                    "traceback": traceback.format_exc(),
+                }
+            )
+            return None
+
+        record_validation_timing(
+            sess,
+            "staging_snapshot",
+            snapshot_start,
+            self.job.job_id,
+            self.submission_id,
+            self.file_type.file_type_id,
+            row_count=row_count,
+        )
+        return snapshot_name
+
     def load_file_data(self, sess, bucket_name, region_name):
         """Loads in the file data and performs initial validations
 
@@ -470,17 +702,6 @@ class ValidationManager:
         if not extension or extension.lower() not in [".csv", ".txt"]:
             raise ResponseError("", StatusCode.CLIENT_ERROR, None, ValidationError.file_type_error)
 
-        # Base file check
-        file_row_count, self.short_pop_rows, self.long_pop_rows, self.short_null_rows, self.long_null_rows = (
-            simple_file_scan(self.reader, bucket_name, region_name, self.file_name)
-        )
-        self.short_rows = self.short_null_rows + self.short_pop_rows
-        self.long_rows = self.long_null_rows + self.long_pop_rows
-        # total_rows = header + long_rows (and will be added on per chunk)
-        # Note: we're adding long_rows here because pandas will exclude long_rows when we're loading the data
-        self.total_rows = 1 + len(self.long_rows)
-        self.total_data_rows = 0
-
         # Making base error/warning files
         self.error_file_name = report_file_name(self.submission_id, False, self.file_type.name)
         self.error_file_path = "".join([CONFIG_SERVICES["error_report_path"], self.error_file_name])
@@ -496,32 +717,8 @@ class ValidationManager:
             error_csv.writerow(self.report_headers)
             warning_csv.writerow(self.report_headers)
 
-        # Adding formatting errors to error file
-        format_error_df = process_formatting_errors(self.short_rows, self.long_rows, self.report_headers)
-        for index, row in format_error_df.iterrows():
-            record_row_error(
-                self.error_list,
-                self.job.job_id,
-                self.file_name,
-                row["Field Name"],
-                row["error_type"],
-                row["Row Number"],
-                row["Rule Label"],
-                self.file_type.file_type_id,
-                None,
-                RULE_SEVERITY_DICT["fatal"],
-            )
-            self.error_rows.append(row["Row Number"])
-        format_error_df.to_csv(
-            self.error_file_path,
-            columns=self.report_headers,
-            index=False,
-            quoting=csv.QUOTE_ALL,
-            mode="a",
-            header=False,
-        )
-
-        # Finally open the file for loading into the database with baseline validations
+        # Open the file for loading into the database with baseline validations
+        self.reader.get_filename(region_name, bucket_name, self.file_name)
         self.reader.open_file(
             region_name,
             bucket_name,
@@ -533,39 +730,39 @@ class ValidationManager:
             self.short_to_gsdm_dict[self.file_type.file_type_id],
             is_local=self.is_local,
         )
-        # Going back to reprocess the header row
-        self.reader.file.seek(0)
-
-        # getting a list of starting rows to skip if they are long rows (causes indexing issues with pandas)
-        skiprows = []
-        # pandas skiprow's is 0-indexed whereas long_rows is 1-indexed
-        # we're starting from 1 since we know the header is fine
-        if len(self.long_rows) > 0:
-            for i in range(1, max(self.long_rows) + 1):
-                if i + 1 not in self.long_rows:
-                    break
-                skiprows.append(i)
-
-        reader_obj = pd.read_csv(
-            self.reader.file,
-            dtype=str,
-            delimiter=self.reader.delimiter,
-            na_filter=False,
-            chunksize=CHUNK_SIZE,
-            on_bad_lines="skip",
-            skiprows=skiprows,
-        )
         # Setting this outside of reader/file type objects which may not be used during processing
         self.flex_fields = self.reader.flex_fields
         self.header_dict = self.reader.header_dict
         self.file_type_name = self.file_type.name
         self.file_type_id = self.file_type.file_type_id
         self.job_id = self.job.job_id
+        # total_rows = header + malformed rows (and will be added on per chunk)
+        self.total_rows = 1
+        self.total_data_rows = 0
+        if self.is_fabs:
+            # Make sure the reference data is ready before any loading workers are started so they all share it
+            get_fabs_reference_data(sess)
 
-        if PARALLEL:
-            self.parallel_data_loading(reader_obj, file_row_count)
-        else:
-            self.iterative_data_loading(reader_obj, file_row_count)
+        # The file is only read once, rows that are too short or long are found as each chunk is read
+        file_chunks = self.scan_file_chunks(self.reader.read_chunks(CHUNK_SIZE))
+        try:
+            if PARALLEL:
+                self.parallel_data_loading(file_chunks)
+            else:
+                self.iterative_data_loading(file_chunks)
+        except UnicodeDecodeError:
+            # Non-UTF8 characters aren't found until the rows containing them are read, by which point earlier chunks
+            # have been loaded. Clear them out so the encoding error is reported against an empty job.
+            self.clear_partial_load(sess)
+            raise
+
+        file_row_count = self.reader.row_count
+        self.short_pop_rows, self.short_null_rows = self.reader.short_pop_rows, self.reader.short_null_rows
+        self.long_pop_rows, self.long_null_rows = self.reader.long_pop_rows, self.reader.long_null_rows
+        self.short_rows = self.short_null_rows + self.short_pop_rows
+        self.long_rows = self.long_null_rows + self.long_pop_rows
+        self.total_rows += len(self.short_rows) + len(self.long_rows)
+        self.error_list = merge_error_lists([self.format_error_list, self.error_list])
 
         # Ensure validated rows match initial row count
         if file_row_count != self.total_rows:
@@ -617,7 +814,16 @@ class ValidationManager:
                 header=False,
             )
 
-        loading_duration = (datetime.now() - loading_start).total_seconds()
+        loading_duration = record_validation_timing(
+            sess,
+            "data_loading",
+            loading_start,
+            self.job.job_id,
+            self.submission_id,
+            self.file_type.file_type_id,
+            row_count=self.total_rows,
+        )
+        sess.commit()
         logger.info(
             {
                 "message": "Completed data loading {}".format(self.log_str),
@@ -638,145 +844,202 @@ class ValidationManager:
 
         return file_row_count
 
-    def parallel_data_loading(self, reader_obj, file_row_count):
+    def scan_file_chunks(self, file_chunks):
+        """Writes the formatting errors found in each chunk of the file to the error file before handing it back
+
+        Args:
+            file_chunks: iterator of the FileChunks read from the file
+
+        Yields:
+            A tuple of each chunk of the well-formed rows in the file as a dataframe and the estimated total number of
+            rows in the file at the time it was read
+        """
+        self.format_error_list = {}
+        for file_chunk in file_chunks:
+            if file_chunk.short_rows or file_chunk.long_rows:
+                self.record_formatting_errors(file_chunk.short_rows, file_chunk.long_rows)
+            if not file_chunk.data.empty:
+                yield file_chunk.data, file_chunk.estimated_row_count
+
+    def record_formatting_errors(self, short_rows, long_rows):
+        """Adds the rows that couldn't be parsed correctly to the formatting error list and the error file. These are
+        kept apart from the error list the chunks record to, which the parallel loading replaces once it's done.
+
+        Args:
+            short_rows: A list of row numbers where there were not enough cells in the row
+            long_rows: A list of row numbers where there were too many cells in the row
+        """
+        format_error_df = process_formatting_errors(short_rows, long_rows, self.report_headers)
+        record_row_errors(
+            self.format_error_list,
+            self.job.job_id,
+            self.file_name,
+            format_error_df,
+            self.file_type.file_type_id,
+            None,
+            RULE_SEVERITY_DICT["fatal"],
+        )
+        self.record_error_rows(GlobalDB.db().session, format_error_df["Row Number"].tolist())
+        format_error_df.to_csv(
+            self.error_file_path,
+            columns=self.report_headers,
+            index=False,
+            quoting=csv.QUOTE_ALL,
+            mode="a",
+            header=False,
+        )
+
+    def clear_partial_load(self, sess):
+        """Removes everything loaded for the job so far after the file couldn't be read all the way through
+
+        Args:
+            sess: the database connection
+        """
+        sess.rollback()
+        sess.query(self.model).filter_by(submission_id=self.submission_id).delete()
+        sess.query(FlexField).filter_by(job_id=self.job.job_id).delete()
+        sess.execute("TRUNCATE TABLE {}".format(self.error_row_table))
+        sess.commit()
+        self.error_list = {}
+        self.format_error_list = {}
+        # Reset the reports back to just their headers
+        for report_path in [self.error_file_path, self.warning_file_path]:
+            with open(report_path, "w", newline="") as report_file:
+                csv.writer(report_file, delimiter=",", quoting=csv.QUOTE_MINIMAL, lineterminator="\n").writerow(
+                    self.report_headers
+                )
+
+    def parallel_data_loading(self, file_chunks):
         """The parallelized version of data loading that processes multiple chunks simultaneously
 
         Args:
-            reader_obj: the iterator reader object to iterate over all the chunks
-            file_row_count: the total number of rows in the file
+            file_chunks: iterator of the chunks of the file and the estimated number of rows in the file for each
         """
-        with mp.Manager() as server_manager:
-            # These variables will need to be shared among the processes and used later overall
-            shared_data = server_manager.dict(
-                total_rows=self.total_rows,
-                total_data_rows=self.total_data_rows,
-                has_data=self.has_data,
-                error_rows=self.error_rows,
-                error_list=self.error_list,
-                errored=False,
-                total_proc_obligations=self.total_proc_obligations,
-                total_asst_obligations=self.total_asst_obligations,
-                total_obligations=self.total_obligations,
-            )
-            # setting reader to none as multiprocess can't pickle it, it'll get reset
-            temp_reader = self.reader
-            self.reader = None
-
-            # We need to dispose the engine connection when making the child processes in SQLAlchemy 1.4
-            # https://docs.sqlalchemy.org/en/14/core/pooling.html#using-connection-pools-with-multiprocessing-or-os-fork
-            conn = db_connection()
-            engine = conn.engine
-
-            def initializer():
-                """ensure the parent proc's database connections are not touched in the new connection pool"""
-                engine.dispose(close=False)
-
-            m_lock = server_manager.Lock()
-            pool = mp.Pool(MULTIPROCESSING_POOLS, initializer=initializer())
-            results = []
-            try:
-                for chunk_df in reader_obj:
-                    result = pool.apply_async(
-                        func=self.parallel_process_data_chunk, args=(chunk_df, shared_data, file_row_count, m_lock)
-                    )
-                    results.append(result)
-                pool.close()
-
-                # Raises any exceptions if such occur
-                for result in results:
-                    result.get()
-            except pd.errors.ParserError as e:
-                # if pandas can't read a later portion after starting,
-                # make sure the pool is closed/joined first
-                raise e
-
-            # Resetting these out here as they are used later in the process
-            self.total_proc_obligations = round(shared_data["total_proc_obligations"], 2)
-            self.total_asst_obligations = round(shared_data["total_asst_obligations"], 2)
-            self.total_obligations = round(shared_data["total_obligations"], 2)
-            self.total_rows = shared_data["total_rows"]
-            self.total_data_rows = shared_data["total_data_rows"]
-            self.has_data = shared_data["has_data"]
-            self.error_rows = shared_data["error_rows"]
-            self.error_list = shared_data["error_list"]
+        # setting reader to none as multiprocess can't pickle it, it'll get reset
+        temp_reader = self.reader
+        self.reader = None
+
+        # The pool's result handler records any failure as soon as it happens so we can stop without waiting for the
+        # chunks ahead of it to finish
+        chunk_failures = []
+        # Each worker sets up its database connection once and keeps it for all the chunks it's given
+        pool = mp.Pool(MULTIPROCESSING_POOLS, initializer=init_loading_worker, initargs=(GlobalDB.db().engine,))
+        results = []
+        try:
+            for chunk_df, file_row_count in file_chunks:
+                if chunk_failures:
+                    break
+                result = pool.apply_async(
+                    func=self.parallel_process_data_chunk, args=(chunk_df,), error_callback=chunk_failures.append
+                )
+                results.append((result, file_row_count))
+            pool.close()
+
+            # Combine the chunk summaries in the order of the chunks, raising the first failure if there is one
+            sess = GlobalDB.db().session
+            for result, file_row_count in results:
+                while not result.ready() and not chunk_failures:
+                    result.wait(1)
+                if chunk_failures:
+                    raise chunk_failures[0]
+                self.record_chunk_summary(result.get(), file_row_count, sess)
+        except Exception as e:
+            # if one of the chunks fails or a later portion of the file can't be read after starting, make sure the
+            # chunks already handed off are stopped before anything is cleaned up
+            pool.terminate()
+            pool.join()
+            raise e
+        finally:
             self.reader = temp_reader
+        pool.join()
+        self.round_obligation_totals()
 
-    def iterative_data_loading(self, reader_obj, file_row_count):
+    def iterative_data_loading(self, file_chunks):
         """The normal version of data loading that iterates over each chunk
 
         Args:
-            reader_obj: the iterator reader object to iterate over all the chunks
-            file_row_count: the total number of rows in the file
+            file_chunks: iterator of the chunks of the file and the estimated number of rows in the file for each
+        """
+        sess = GlobalDB.db().session
+        for chunk_df, file_row_count in file_chunks:
+            self.record_chunk_summary(self.process_data_chunk(chunk_df, sess=sess), file_row_count, sess)
+        self.round_obligation_totals()
+
+    def record_chunk_summary(self, chunk_summary, file_row_count, sess):
+        """Adds the results of a processed chunk to the running totals for the file and updates the job's progress
+
+        Args:
+            chunk_summary: the summary of the chunk returned by process_data_chunk
+            file_row_count: the estimated total number of rows in the file
+            sess: database connection
         """
-        shared_data = dict(
-            total_rows=self.total_rows,
-            total_data_rows=self.total_data_rows,
-            has_data=self.has_data,
-            error_rows=self.error_rows,
-            error_list=self.error_list,
-            total_proc_obligations=self.total_proc_obligations,
-            total_asst_obligations=self.total_asst_obligations,
-            total_obligations=self.total_obligations,
+        self.total_rows += chunk_summary["total_rows"]
+        self.total_data_rows += chunk_summary["total_data_rows"]
+        self.has_data = self.has_data or chunk_summary["total_data_rows"] > 0
+        self.record_error_rows(sess, chunk_summary["error_rows"])
+        self.error_list = merge_error_lists([self.error_list, chunk_summary["error_list"]])
+        self.total_proc_obligations += chunk_summary["total_proc_obligations"]
+        self.total_asst_obligations += chunk_summary["total_asst_obligations"]
+        self.total_obligations += chunk_summary["total_obligations"]
+
+        # Seeing how far into the file we currently are
+        self.basic_val_progress = min(self.total_data_rows / file_row_count * 100, 100)
+        update_val_progress(
+            sess, self.job, self.basic_val_progress, self.tas_progress, self.sql_val_progress, self.final_progress
         )
-        for chunk_df in reader_obj:
-            self.process_data_chunk(chunk_df, shared_data, file_row_count)
-
-        # Resetting these out here as they are used later in the process
-        self.total_proc_obligations = round(shared_data["total_proc_obligations"], 2)
-        self.total_asst_obligations = round(shared_data["total_asst_obligations"], 2)
-        self.total_obligations = round(shared_data["total_obligations"], 2)
-        self.total_rows = shared_data["total_rows"]
-        self.total_data_rows = shared_data["total_data_rows"]
-        self.has_data = shared_data["has_data"]
-        self.error_rows = shared_data["error_rows"]
-        self.error_list = shared_data["error_list"]
-
-    def parallel_process_data_chunk(self, chunk_df, shared_data, file_row_count, m_lock=None):
-        """Wrapper around process_data_chunk for parallelization and error catching
+
+    def round_obligation_totals(self):
+        """Rounds the obligation totals summed up from the chunks once the whole file has been loaded"""
+        self.total_proc_obligations = round(self.total_proc_obligations, 2)
+        self.total_asst_obligations = round(self.total_asst_obligations, 2)
+        self.total_obligations = round(self.total_obligations, 2)
+
+    def parallel_process_data_chunk(self, chunk_df):
+        """Wrapper around process_data_chunk for parallelization, using the worker process's own connection
 
         Args:
             chunk_df: the chunk of the file to process as a dataframe
-            shared_data: dictionary of shared data among the chunks
-            file_row_count: the total number of rows in the file
-            m_lock: manager lock if provided to ensure processes don't override each other
-        """
-        # If one of the processes has errored, we don't want to run any more chunks
-        lockable = m_lock if m_lock else NoLock
-        with lockable:
-            if shared_data["errored"]:
-                return
 
-        if m_lock:
-            # make a new connection per process
-            conn = db_connection()
-            sess = conn.session
+        Returns:
+            the summary of the chunk returned by process_data_chunk
+        """
+        sess = loading_worker_db.session
 
         try:
-            self.process_data_chunk(chunk_df, shared_data, file_row_count, sess=sess, lockable=lockable)
+            return self.process_data_chunk(chunk_df, sess=sess)
         except Exception as e:
             logger.exception(e)
-            with lockable:
-                shared_data["errored"] = True
             raise e
         finally:
             sess.commit()
-            conn.close()
+            # Hand the connection back to the worker's pool for its next chunk
+            sess.close()
             logging.shutdown()
 
-    def process_data_chunk(self, chunk_df, shared_data, file_row_count, sess=None, lockable=None):
+    def process_data_chunk(self, chunk_df, sess=None):
         """Loads in a chunk of the file and performs initial validations
 
         Args:
             chunk_df: the chunk of the file to process as a dataframe
-            shared_data: dictionary of shared data among the chunks
-            file_row_count: the total number of rows in the file
             sess: database connection
-            lockable: manager lock if provided to ensure processes don't override each other
+
+        Returns:
+            dict summarizing the chunk to be added to the totals for the file: the number of rows and of rows with
+            data, the row numbers with errors, the errors found, and the obligation sums
         """
         if not sess:
             sess = GlobalDB.db().session
-        if not lockable:
-            lockable = NoLock()
+        chunk_start = datetime.now()
+
+        chunk_summary = {
+            "total_rows": 0,
+            "total_data_rows": 0,
+            "error_rows": [],
+            "error_list": {},
+            "total_proc_obligations": 0,
+            "total_asst_obligations": 0,
+            "total_obligations": 0,
+        }
 
         if chunk_df.empty:
             logger.warning(
@@ -790,7 +1053,7 @@ class ValidationManager:
                     "status": "end",
                 }
             )
-            return
+            return chunk_summary
 
         # initializing warning/error files and dataframes
         total_errors = pd.DataFrame(columns=self.report_headers)
@@ -798,26 +1061,16 @@ class ValidationManager:
         flex_data = None
         required_list = {}
         type_list = {}
-        office_list = {}
 
         # Replace whatever the user included so we're using the database headers
         chunk_df.rename(columns=self.header_dict, inplace=True)
 
-        # Do a cleanup of any empty/vacuous rows/cells
+        # Do a cleanup of any empty/vacuous rows/cells, leaving the row numbers from the reader as they are
+        row_numbers = chunk_df.pop("row_number")
         chunk_df = clean_frame_vectorized(chunk_df)
+        chunk_df["row_number"] = row_numbers
 
-        # Adding row number
-        chunk_df["index"] = chunk_df.index
-        # index gets reset for each chunk, adding the header, and adding previous rows
-        chunk_df["row_number"] = chunk_df.index + 2
-
-        with lockable:
-            shared_data["total_rows"] += len(chunk_df.index)
-
-        # Increment row numbers if any were ignored being too long
-        # This syncs the row numbers back to their original values
-        for row in sorted(self.long_rows):
-            chunk_df.loc[chunk_df["row_number"] >= row, "row_number"] = chunk_df["row_number"] + 1
+        chunk_summary["total_rows"] = len(chunk_df.index)
 
         logger.info(
             {
@@ -831,12 +1084,6 @@ class ValidationManager:
             }
         )
 
-        # Drop rows that were too short and pandas filled in with Nones
-        chunk_df = chunk_df[~chunk_df["row_number"].isin(self.short_rows)]
-
-        # Drop the index column
-        chunk_df = chunk_df.drop(["index"], axis=1)
-
         # Drop all rows that have 1 or less filled in values (row_number is always filled in so this is how
         # we have to drop all rows that are just empty)
         chunk_df.dropna(thresh=2, inplace=True)
@@ -854,26 +1101,14 @@ class ValidationManager:
                     "status": "end",
                 }
             )
-            return
+            return chunk_summary
 
-        with lockable:
-            shared_data["has_data"] = True
-            shared_data["total_data_rows"] += len(chunk_df.index)
+        chunk_summary["total_data_rows"] = len(chunk_df.index)
         if self.is_fabs:
-            # create a list of all required/type labels for FABS
-            labels = sess.query(ValidationLabel).all()
-            for label in labels:
-                if label.label_type == "requirement":
-                    required_list[label.column_name] = label.label
-                else:
-                    type_list[label.column_name] = label.label
-
-            # Create a list of all offices
-            offices = sess.query(Office.office_code, Office.sub_tier_code).all()
-            for office in offices:
-                office_list[office.office_code] = office.sub_tier_code
-            # Clear out office list to save space
-            del offices
+            # The required/type labels, offices, and agency codes for FABS are loaded once and shared by the chunks
+            reference_data = fabs_reference_data or get_fabs_reference_data(sess)
+            required_list = reference_data["required_labels"]
+            type_list = reference_data["type_labels"]
 
         # Gathering flex data (must be done before chunk limiting)
         if self.flex_fields:
@@ -896,12 +1131,13 @@ class ValidationManager:
 
             if self.is_fabs:
                 chunk_df["is_valid"] = False
-                chunk_df["awarding_sub_tier_agency_c"] = chunk_df.apply(
-                    lambda x: derive_fabs_awarding_sub_tier(x, office_list), axis=1
+                chunk_df["awarding_sub_tier_agency_c"] = derive_fabs_awarding_sub_tier_vectorized(
+                    chunk_df, reference_data["offices"]
+                )
+                chunk_df["afa_generated_unique"] = derive_fabs_afa_generated_unique_vectorized(chunk_df)
+                chunk_df["awarding_agency_code"] = chunk_df["awarding_sub_tier_agency_c"].map(
+                    reference_data["agency_codes"]
                 )
-                chunk_df["afa_generated_unique"] = chunk_df.apply(lambda x: derive_fabs_afa_generated_unique(x), axis=1)
-                agency_codes = self.retrieve_agency_codes(chunk_df, sess)
-                chunk_df = chunk_df.merge(agency_codes, how="left", on="awarding_sub_tier_agency_c")
                 chunk_df["unique_award_key"] = derive_fabs_unique_award_key(chunk_df)
             else:
                 # Updating DEFC QQQ specifically to be a single Q. Only check B and C because they're the only files
@@ -911,10 +1147,10 @@ class ValidationManager:
                         lambda x: re.sub(re.escape("QQQ"), "Q", x, flags=re.IGNORECASE) if x else None
                     )
                 chunk_df["tas"] = concat_tas_dict_vectorized(chunk_df)
-                # display_tas is done with axis=1 (row-wise, where each dict-like row is passed into the given lambda)
-                # because the rendering label is not generated consistently, but will have a different rendered-label
-                # depending on which TAS components were present and which were not present (NULL, NaN, None)
-                chunk_df["display_tas"] = chunk_df.apply(lambda x: concat_display_tas_dict(x), axis=1)
+                # The rendering label will be different depending on which TAS components were present and which
+                # were not present (NULL, NaN, None), the vectorized version handles each case the same as the
+                # row-wise concat_display_tas_dict
+                chunk_df["display_tas"] = concat_display_tas_dict_vectorized(chunk_df)
             chunk_df["unique_id"] = derive_unique_id_vectorized(chunk_df, self.is_fabs)
 
             # Separate each of the checks to their own dataframes, then concat them together
@@ -961,25 +1197,16 @@ class ValidationManager:
             # Converting these to ints because pandas likes to change them to floats randomly
             total_errors[["Row Number", "error_type"]] = total_errors[["Row Number", "error_type"]].astype(int)
 
-            with lockable:
-                shared_data["error_rows"] = shared_data["error_rows"] + [
-                    int(x) for x in total_errors["Row Number"].tolist()
-                ]
-
-            with lockable:
-                for index, row in total_errors.iterrows():
-                    shared_data["error_list"] = record_row_error(
-                        shared_data["error_list"],
-                        self.job_id,
-                        self.file_name,
-                        row["Field Name"],
-                        row["error_type"],
-                        row["Row Number"],
-                        row["Rule Label"],
-                        self.file_type_id,
-                        None,
-                        RULE_SEVERITY_DICT["fatal"],
-                    )
+            chunk_summary["error_rows"] = [int(x) for x in total_errors["Row Number"].tolist()]
+            record_row_errors(
+                chunk_summary["error_list"],
+                self.job_id,
+                self.file_name,
+                total_errors,
+                self.file_type_id,
+                None,
+                RULE_SEVERITY_DICT["fatal"],
+            )
 
             total_errors.drop(["error_type"], axis=1, inplace=True, errors="ignore")
 
@@ -1021,14 +1248,13 @@ class ValidationManager:
         # Update running totals
         if self.file_type_name == "award_financial":
             chunk_df["transaction_obligated_amou"] = chunk_df["transaction_obligated_amou"].astype(float).fillna(0)
-            with lockable:
-                shared_data["total_proc_obligations"] += chunk_df.loc[
-                    chunk_df["piid"].notna(), "transaction_obligated_amou"
-                ].sum()
-                shared_data["total_asst_obligations"] += chunk_df.loc[
-                    (chunk_df["fain"].notna()) | (chunk_df["uri"].notna()), "transaction_obligated_amou"
-                ].sum()
-                shared_data["total_obligations"] += chunk_df["transaction_obligated_amou"].sum()
+            chunk_summary["total_proc_obligations"] = float(
+                chunk_df.loc[chunk_df["piid"].notna(), "transaction_obligated_amou"].sum()
+            )
+            chunk_summary["total_asst_obligations"] = float(
+                chunk_df.loc[(chunk_df["fain"].notna()) | (chunk_df["uri"].notna()), "transaction_obligated_amou"].sum()
+            )
+            chunk_summary["total_obligations"] = float(chunk_df["transaction_obligated_amou"].sum())
 
         # Flex Fields
         if flex_data is not None:
@@ -1061,13 +1287,16 @@ class ValidationManager:
                 }
             )
 
-        with lockable:
-            sess.commit()
-            # Seeing how far into the file we currently are
-            self.basic_val_progress = shared_data["total_data_rows"] / file_row_count * 100
-            update_val_progress(
-                sess, self.job, self.basic_val_progress, self.tas_progress, self.sql_val_progress, self.final_progress
-            )
+        record_validation_timing(
+            sess,
+            "chunk_load",
+            chunk_start,
+            self.job_id,
+            self.submission_id,
+            self.file_type_id,
+            row_count=chunk_summary["total_rows"],
+        )
+        sess.commit()
         if not chunk_df.empty:
             logger.info(
                 {
@@ -1080,20 +1309,7 @@ class ValidationManager:
                     "status": "end",
                 }
             )
-
-    @staticmethod
-    def retrieve_agency_codes(chunk_df, sess):
-        return pd.read_sql(
-            sess.query(
-                SubTierAgency.sub_tier_agency_code.label("awarding_sub_tier_agency_c"),
-                case((SubTierAgency.is_frec, FREC.frec_code), else_=CGAC.cgac_code).label("awarding_agency_code"),
-            )
-            .join(CGAC, SubTierAgency.cgac_id == CGAC.cgac_id)
-            .join(FREC, SubTierAgency.frec_id == FREC.frec_id)
-            .filter(SubTierAgency.sub_tier_agency_code.in_(chunk_df["awarding_sub_tier_agency_c"]))
-            .statement,
-            sess.connection(),
-        )
+        return chunk_summary
 
     def run_sql_validations(self, short_colnames, writer, warning_writer):
         """Run all SQL rules for this file type
@@ -1103,61 +1319,53 @@ class ValidationManager:
             writer: CsvWriter object for error file
             warning_writer: CsvWriter object for warning file
 
-        Returns:
-            a list of the row numbers that failed one of the sql-based validations
         """
-        for failure in validate_file_by_sql(
+        sess = GlobalDB.db().session
+        for failure_batch in validate_file_by_sql(
             self.job,
             self.file_type.name,
             self.short_to_long_dict[self.file_type.file_type_id],
             batch_results=BATCH_SQL_VAL_RESULTS,
+            num_workers=SQL_VAL_WORKERS if PARALLEL_SQL_VAL else 1,
         ):
             # convert shorter, machine friendly column names used in the
             # SQL validation queries back to their long names
-            if failure.field_name in short_colnames:
-                field_name = short_colnames[failure.field_name]
+            if failure_batch.field_name in short_colnames:
+                field_name = short_colnames[failure_batch.field_name]
             else:
-                field_name = failure.field_name
-
-            if failure.severity_id == RULE_SEVERITY_DICT["fatal"]:
-                self.error_rows.append(failure.row)
+                field_name = failure_batch.field_name
 
             try:
                 # If error is an int, it's one of our prestored messages
-                error_type = int(failure.error)
+                error_type = int(failure_batch.error)
                 error_msg = ValidationError.get_error_message(error_type)
             except ValueError:
                 # If not, treat it literally
-                error_msg = failure.error
-
-            if failure.severity_id == RULE_SEVERITY_DICT["fatal"]:
-                writer.writerow(
-                    [
-                        failure.unique_id,
-                        field_name,
-                        error_msg,
-                        failure.failed_value,
-                        failure.expected_value,
-                        failure.difference,
-                        failure.flex_fields,
-                        str(failure.row),
-                        failure.original_label,
-                    ]
-                )
-            elif failure.severity_id == RULE_SEVERITY_DICT["warning"]:
+                error_msg = failure_batch.error
+
+            if failure_batch.severity_id == RULE_SEVERITY_DICT["fatal"]:
+                report_writer = writer
+                # Some rules check the file as a whole and don't return a row number, those don't make any row invalid
+                self.record_error_rows(sess, [row for row in failure_batch.rows if row != ""])
+            elif failure_batch.severity_id == RULE_SEVERITY_DICT["warning"]:
                 # write to warnings file
-                warning_writer.writerow(
-                    [
-                        failure.unique_id,
-                        field_name,
-                        error_msg,
-                        failure.failed_value,
-                        failure.expected_value,
-                        failure.difference,
-                        failure.flex_fields,
-                        str(failure.row),
-                        failure.original_label,
-                    ]
+                report_writer = warning_writer
+            else:
+                report_writer = None
+            if report_writer:
+                # The whole batch is written at once, the fields shared by every failure are repeated for each row
+                report_writer.writerows(
+                    zip(
+                        failure_batch.unique_ids,
+                        repeat(field_name),
+                        repeat(error_msg),
+                        failure_batch.failed_values,
+                        failure_batch.expected_values,
+                        failure_batch.differences,
+                        failure_batch.flex_fields,
+                        map(str, failure_batch.rows),
+                        repeat(failure_batch.original_label),
+                    )
                 )
             # labeled errors
             record_row_error(
@@ -1165,13 +1373,82 @@ class ValidationManager:
                 self.job.job_id,
                 self.file_name,
                 field_name,
-                failure.error,
+                failure_batch.error,
                 self.total_rows,
-                failure.original_label,
-                failure.file_type_id,
-                failure.target_file_id,
-                failure.severity_id,
+                failure_batch.original_label,
+                failure_batch.file_type_id,
+                failure_batch.target_file_id,
+                failure_batch.severity_id,
+                num_errors=len(failure_batch.rows),
+            )
+
+    def create_error_row_table(self, sess):
+        """Creates the table the row numbers of the rows with fatal errors in the file are recorded to, so the valid
+        rows can be counted and marked in the database instead of from a list of every failing row number.
+
+        Args:
+            sess: the database connection
+        """
+        sess.execute(
+            "DROP TABLE IF EXISTS {0}; CREATE UNLOGGED TABLE {0} (row_number INTEGER NOT NULL)".format(
+                self.error_row_table
+            )
+        )
+        sess.commit()
+
+    def drop_error_row_table(self, sess):
+        """Drops the table the row numbers of the rows with fatal errors were recorded to
+
+        Args:
+            sess: the database connection
+        """
+        sess.execute("DROP TABLE IF EXISTS {}".format(self.error_row_table))
+        sess.commit()
+
+    def record_error_rows(self, sess, row_numbers):
+        """Adds the row numbers of rows with fatal errors to the job's error row table. A row can be recorded more than
+        once if it has multiple errors.
+
+        Args:
+            sess: the database connection
+            row_numbers: a list of the row numbers with fatal errors
+        """
+        if row_numbers:
+            insert_dataframe(
+                pd.DataFrame({"row_number": row_numbers}), self.error_row_table, sess.connection(), method="copy"
+            )
+
+    def count_error_rows(self, sess):
+        """Counts the rows in the file that have at least one fatal error
+
+        Args:
+            sess: the database connection
+
+        Returns:
+            The number of distinct row numbers recorded to the job's error row table
+        """
+        return sess.execute("SELECT COUNT(DISTINCT row_number) FROM {}".format(self.error_row_table)).scalar()
+
+    def mark_valid_fabs_rows(self, sess):
+        """Marks every FABS row in the submission without a recorded fatal error as valid
+
+        Args:
+            sess: the database connection
+        """
+        sess.execute(
+            """
+            UPDATE {0}
+            SET is_valid = TRUE
+            WHERE submission_id = {1}
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM {2} AS error_rows
+                    WHERE error_rows.row_number = {0}.row_number
+                )
+            """.format(
+                FABS.__table__.name, self.submission_id, self.error_row_table
             )
+        )
 
     def run_cross_validation(self, job):
         """Cross file validation job. Test all rules with matching rule_timing. Run each cross-file rule and create
@@ -1184,8 +1461,6 @@ class ValidationManager:
         job_id = job.job_id
         # Create File Status object
         create_file_if_needed(job_id)
-        # Create list of errors
-        error_list = {}
 
         submission_id = job.submission_id
         job_start = datetime.now()
@@ -1200,14 +1475,6 @@ class ValidationManager:
                 "status": "start",
             }
         )
-        # Delete existing cross file errors for this submission
-        sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id).delete()
-        sess.commit()
-
-        # get all cross file rules from db
-        cross_file_rules = sess.query(RuleSql).filter_by(rule_cross_file_flag=True)
-        pairs_finished = 0
-
         # for each cross-file combo, run associated rules and create error report
         cross_list = {
             "program_activity": "appropriations",
@@ -1215,75 +1482,78 @@ class ValidationManager:
             "award_procurement": "award_financial",
             "award": "award_financial",
         }
-        for first_file, second_file in cross_list.items():
-            first_file_id = FILE_TYPE_DICT[first_file]
-            second_file_id = FILE_TYPE_DICT[second_file]
-            combo_rules = cross_file_rules.filter(
-                or_(
-                    and_(RuleSql.file_id == first_file_id, RuleSql.target_file_id == second_file_id),
-                    and_(RuleSql.file_id == second_file_id, RuleSql.target_file_id == first_file_id),
-                )
-            )
-
-            # get error file name/path
-            error_file_name = report_file_name(submission_id, False, second_file, first_file)
-            error_file_path = "".join([CONFIG_SERVICES["error_report_path"], error_file_name])
-            warning_file_name = report_file_name(submission_id, True, second_file, first_file)
-            warning_file_path = "".join([CONFIG_SERVICES["error_report_path"], warning_file_name])
-
-            # open error report and gather failed rules within it
-            with (
-                open(error_file_path, "w", newline="") as error_file,
-                open(warning_file_path, "w", newline="") as warning_file,
-            ):
-                error_csv = csv.writer(error_file, delimiter=",", quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
-                warning_csv = csv.writer(warning_file, delimiter=",", quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+        # Pairs whose files and rules haven't changed since the last cross-file validation keep their results
+        rules_fingerprint = get_rules_fingerprint(sess)
+        validation_jobs = (
+            sess.query(Job)
+            .filter(Job.submission_id == submission_id, Job.job_type_id == JOB_TYPE_DICT["csv_record_validation"])
+            .all()
+        )
+        reused_pairs = self.reusable_cross_file_pairs(sess, job, cross_list, validation_jobs, rules_fingerprint)
+        changed_pairs = {
+            first_file: second_file for first_file, second_file in cross_list.items() if first_file not in reused_pairs
+        }
 
-                # write headers to file
-                error_csv.writerow(self.cross_file_report_headers)
-                warning_csv.writerow(self.cross_file_report_headers)
-
-                # send comboRules to validator.crossValidate sql
-                current_cols_short_to_long = self.short_to_long_dict[first_file_id].copy()
-                current_cols_short_to_long.update(self.short_to_long_dict[second_file_id].copy())
-                cross_validate_sql(
-                    combo_rules.all(),
-                    submission_id,
-                    current_cols_short_to_long,
-                    job_id,
-                    error_csv,
-                    warning_csv,
-                    error_list,
-                    pairs_finished,
-                    job,
-                    batch_results=BATCH_SQL_VAL_RESULTS,
+        # Delete existing cross file errors of the pairs being rerun and the timings for this submission
+        if changed_pairs:
+            error_query = sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id)
+            if reused_pairs:
+                error_query = error_query.filter(
+                    or_(
+                        *[
+                            cross_file_pair_filter(ErrorMetadata.file_type_id, ErrorMetadata.target_file_type_id, *pair)
+                            for pair in changed_pairs.items()
+                        ]
+                    )
                 )
-            # close files
-            error_file.close()
-            warning_file.close()
-
-            # upload file to S3 when not local
-            if not self.is_local:
-                region_name = CONFIG_BROKER["aws_region"]
-                bucket_name = CONFIG_BROKER["aws_bucket"]
-                s3 = boto3.client("s3", region_name=region_name)
-
-                s3.upload_file(error_file_path, bucket_name, self.get_file_name(error_file_name))
-                os.remove(error_file_path)
-
-                s3.upload_file(warning_file_path, bucket_name, self.get_file_name(warning_file_name))
-                os.remove(warning_file_path)
+            error_query.delete(synchronize_session=False)
+        sess.query(ValidationTiming).filter(ValidationTiming.job_id == job_id).delete()
+        job.rules_fingerprint = None
+        sess.commit()
 
-            pairs_finished += 1
+        pair_error_lists = []
+        if changed_pairs:
+            # Build the tables shared by the rules once for the whole job, every pair reads the same copy of them
+            cross_rules = (
+                sess.query(RuleSql.rule_sql)
+                .filter(
+                    RuleSql.rule_cross_file_flag.is_(True),
+                    or_(
+                        *[
+                            cross_file_pair_filter(RuleSql.file_id, RuleSql.target_file_id, *pair)
+                            for pair in changed_pairs.items()
+                        ]
+                    ),
+                )
+                .all()
+            )
+            staging_conn = GlobalDB.db().connection
+            staging_start = datetime.now()
+            staging_tables = prepare_cross_file_staging(
+                staging_conn, [rule.rule_sql for rule in cross_rules], submission_id
+            )
+            record_validation_timing(sess, "cross_file_staging", staging_start, job_id, submission_id, None)
+            sess.commit()
+            try:
+                pair_error_lists = self.run_cross_file_pairs(job, changed_pairs, reused_pairs)
+            finally:
+                drop_cross_file_staging(staging_conn, staging_tables, submission_id)
+        error_list = merge_error_lists(pair_error_lists)
 
         # write all recorded errors to database
         write_all_row_errors(error_list, job_id)
         # Update error info for submission
         populate_job_error_info(job)
 
+        # Record what the stored results came from so the pairs can be reused while none of it changes
+        job.rules_fingerprint = rules_fingerprint
+        for validation_job in validation_jobs:
+            validation_job.cross_file_fingerprint = validation_job.file_fingerprint
+        job_duration = record_validation_timing(sess, "cross_file_validations", job_start, job_id, submission_id, None)
+        sess.commit()
+
         # mark job status as 'finished'
         mark_job_status(job_id, "finished")
-        job_duration = (datetime.now() - job_start).total_seconds()
         logger.info(
             {
                 "message": "Completed cross-file validations on submission_id: " + str(submission_id),
@@ -1310,6 +1580,185 @@ class ValidationManager:
         # Mark validation complete
         mark_file_complete(job_id)
 
+    def reusable_cross_file_pairs(self, sess, job, cross_list, validation_jobs, rules_fingerprint):
+        """Finds the cross-file pairs whose results from the last cross-file validation can be kept because neither of
+        their files nor the cross-file rules have changed since
+
+        Args:
+            sess: the database session
+            job: the cross-file job being run
+            cross_list: dict of the first file type to the second file type in each pair
+            validation_jobs: the submission's single-file validation jobs
+            rules_fingerprint: the fingerprint of the cross-file rules
+
+        Returns:
+            set of the first file types of the pairs that don't have to be run again
+        """
+        if rules_fingerprint != job.rules_fingerprint or not validation_results_current(sess, job):
+            return set()
+
+        unchanged_files = {
+            FILE_TYPE_DICT_ID[validation_job.file_type_id]
+            for validation_job in validation_jobs
+            if validation_job.file_fingerprint
+            and validation_job.file_fingerprint == validation_job.cross_file_fingerprint
+        }
+        return {
+            first_file
+            for first_file, second_file in cross_list.items()
+            if first_file in unchanged_files
+            and second_file in unchanged_files
+            and self.reports_exist(
+                report_file_name(job.submission_id, False, second_file, first_file),
+                report_file_name(job.submission_id, True, second_file, first_file),
+            )
+        }
+
+    def run_cross_file_pairs(self, job, cross_list, reused_pairs=()):
+        """Run the cross-file rules for every pair of files, one after the other or all at once
+
+        Args:
+            job: the cross-file job being run
+            cross_list: dict of the first file type to the second file type in each pair to run
+            reused_pairs: the first file types of the pairs that keep their last results, counted as finished for the
+                progress updates
+
+        Returns:
+            list of the dicts keeping track of the errors found for each pair, in the order of the pairs
+        """
+        sess = GlobalDB.db().session
+        job_id = job.job_id
+        if PARALLEL_CROSS_VAL:
+            # Each pair writes its own reports and runs its own rules so they can all run at once, each on its own
+            # connection. Make sure nothing is left open on the job before the pairs start updating its progress.
+            sess.commit()
+            pair_progress = CrossFilePairProgress()
+            for first_file in reused_pairs:
+                pair_progress.pairs_finished(first_file, 1)
+            # Once one pair fails the job is going to fail anyway, so the other pairs stop at their next rule
+            stop_pairs = threading.Event()
+            worker_sessions = scoped_session(sessionmaker(bind=GlobalDB.db().engine))
+
+            def run_pair(first_file, second_file):
+                worker_sess = worker_sessions()
+                try:
+                    worker_job = worker_sess.query(Job).filter_by(job_id=job_id).one()
+                    return self.run_cross_file_pair(
+                        worker_job,
+                        first_file,
+                        second_file,
+                        0,
+                        worker_sess,
+                        pair_progress=partial(pair_progress.pairs_finished, first_file),
+                        stop_event=stop_pairs,
+                    )
+                except Exception:
+                    stop_pairs.set()
+                    raise
+                finally:
+                    worker_sessions.remove()
+
+            with ThreadPoolExecutor(max_workers=len(cross_list), thread_name_prefix="cross_validation") as executor:
+                futures = [
+                    executor.submit(run_pair, first_file, second_file) for first_file, second_file in cross_list.items()
+                ]
+                # Gather the results in the pair order so the merge is always the same. Pairs that stopped early
+                # return normally, so this raises the error of the pair that actually failed
+                pair_error_lists = [future.result() for future in futures]
+            sess.refresh(job)
+        else:
+            pair_error_lists = []
+            for pairs_finished, (first_file, second_file) in enumerate(cross_list.items(), start=len(reused_pairs)):
+                pair_error_lists.append(self.run_cross_file_pair(job, first_file, second_file, pairs_finished, sess))
+        return pair_error_lists
+
+    def run_cross_file_pair(
+        self, job, first_file, second_file, pairs_finished, sess, pair_progress=None, stop_event=None
+    ):
+        """Run the cross-file rules for a single pair of files and write the pair's error and warning reports.
+
+        Args:
+            job: the cross-file job being run, bound to the provided session
+            first_file: the name of the first file type in the pair
+            second_file: the name of the second file type in the pair
+            pairs_finished: the number of pairs finished before this one, used for the progress update
+            sess: the database session to run the rules on
+            pair_progress: when pairs are run concurrently, a callable that records this pair's progress and returns
+                the progress of the other pairs
+            stop_event: when pairs are run concurrently, an event set once another pair has failed so this pair stops
+                at its next rule and doesn't upload its incomplete reports
+
+        Returns:
+            dict keeping track of the errors found for this pair
+        """
+        error_list = {}
+        submission_id = job.submission_id
+        first_file_id = FILE_TYPE_DICT[first_file]
+        second_file_id = FILE_TYPE_DICT[second_file]
+        combo_rules = sess.query(RuleSql).filter(
+            RuleSql.rule_cross_file_flag.is_(True),
+            cross_file_pair_filter(RuleSql.file_id, RuleSql.target_file_id, first_file, second_file),
+        )
+
+        # get error file name/path
+        error_file_name = report_file_name(submission_id, False, second_file, first_file)
+        error_file_path = "".join([CONFIG_SERVICES["error_report_path"], error_file_name])
+        warning_file_name = report_file_name(submission_id, True, second_file, first_file)
+        warning_file_path = "".join([CONFIG_SERVICES["error_report_path"], warning_file_name])
+
+        # open error report and gather failed rules within it
+        with (
+            open(error_file_path, "w", newline="") as error_file,
+            open(warning_file_path, "w", newline="") as warning_file,
+        ):
+            error_csv = csv.writer(error_file, delimiter=",", quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+            warning_csv = csv.writer(warning_file, delimiter=",", quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+
+            # write headers to file
+            error_csv.writerow(self.cross_file_report_headers)
+            warning_csv.writerow(self.cross_file_report_headers)
+
+            # send comboRules to validator.crossValidate sql
+            current_cols_short_to_long = self.short_to_long_dict[first_file_id].copy()
+            current_cols_short_to_long.update(self.short_to_long_dict[second_file_id].copy())
+            cross_validate_sql(
+                combo_rules.all(),
+                submission_id,
+                current_cols_short_to_long,
+                job.job_id,
+                error_csv,
+                warning_csv,
+                error_list,
+                pairs_finished,
+                job,
+                batch_results=BATCH_SQL_VAL_RESULTS,
+                sess=sess,
+                pair_progress=pair_progress,
+                stop_event=stop_event,
+            )
+        # close files
+        error_file.close()
+        warning_file.close()
+
+        if stop_event is not None and stop_event.is_set():
+            return error_list
+
+        # upload file to S3 when not local
+        if not self.is_local:
+            region_name = CONFIG_BROKER["aws_region"]
+            bucket_name = CONFIG_BROKER["aws_bucket"]
+            # Pairs may be uploading at the same time, clients from the default boto3 session aren't safe to create
+            # from multiple threads so each pair gets its own session
+            s3 = boto3.session.Session().client("s3", region_name=region_name)
+
+            s3.upload_file(error_file_path, bucket_name, self.get_file_name(error_file_name))
+            os.remove(error_file_path)
+
+            s3.upload_file(warning_file_path, bucket_name, self.get_file_name(warning_file_name))
+            os.remove(warning_file_path)
+
+        return error_list
+
     def validate_job(self, job_id):
         """Gets file for job, validates each row, and sends valid rows to a staging table
 
@@ -1388,13 +1837,41 @@ class ValidationManager:
                 spawn_of_job.kill()
 
 
+def cross_file_pair_filter(file_column, target_file_column, first_file, second_file):
+    """Builds a filter matching the rules or errors of a cross-file pair, in either direction
+
+    Args:
+        file_column: the column holding the ID of the file type a rule or error is for
+        target_file_column: the column holding the ID of the file type a rule or error compares against
+        first_file: the name of the first file type in the pair
+        second_file: the name of the second file type in the pair
+
+    Returns:
+        the filter clause
+    """
+    first_file_id = FILE_TYPE_DICT[first_file]
+    second_file_id = FILE_TYPE_DICT[second_file]
+    return or_(
+        and_(file_column == first_file_id, target_file_column == second_file_id),
+        and_(file_column == second_file_id, target_file_column == first_file_id),
+    )
+
+
 def update_account_nums(model_class, submission_id):
+    """Link the TAS of a submission's rows to their CARS history entries, using the precomputed links in
+    tas_period_account when they cover the submission and aggregating tas_lookup directly when they don't
+
+    Args:
+        model_class: the staging model of the file whose rows are linked
+        submission_id: the ID of the submission whose rows are linked
+    """
     sess = GlobalDB.db().session
 
     submission = sess.query(Submission).filter_by(submission_id=submission_id).one()
     start_date = submission.reporting_start_date
     end_date = submission.reporting_end_date
     day_after_end = end_date + timedelta(days=1)
+    last_period_start = end_date.replace(day=1)
 
     logger.info(
         {
@@ -1406,29 +1883,68 @@ def update_account_nums(model_class, submission_id):
     )
     start = time.time()
 
-    update_query = """
-        WITH relevant_tas AS  (
-            SELECT
-                min(tas_lookup.account_num) AS min_account_num,
-                tas
-            FROM
-                tas_lookup
-            WHERE
-                (('{start}'::date, '{end}'::date) OVERLAPS
-                    (tas_lookup.internal_start_date, coalesce(tas_lookup.internal_end_date, '{day_after_end}'::date)))
-            GROUP BY
-                tas
-        )
-        UPDATE {model}
-        SET account_num = min_account_num
-        FROM relevant_tas
-        WHERE {model}.submission_id = {submission_id}
-            AND relevant_tas.tas = {model}.tas;
-    """
+    # The links are by month, so they only stand in for submissions running from the first of a month through the
+    # last day of a month and only when all of those months have been precomputed
+    covered_from, covered_through = sess.query(
+        func.min(TASPeriodAccount.period_start), func.max(TASPeriodAccount.period_start)
+    ).one()
+    use_period_accounts = (
+        covered_from is not None
+        and start_date.day == 1
+        and day_after_end.day == 1
+        and covered_from <= start_date
+        and last_period_start <= covered_through
+    )
+    if use_period_accounts:
+        update_query = """
+            WITH relevant_tas AS (
+                SELECT
+                    MIN(CASE WHEN period_start = '{last_period_start}'::date
+                        THEN account_num
+                        ELSE full_period_account_num
+                        END) AS min_account_num,
+                    tas
+                FROM
+                    tas_period_account
+                WHERE
+                    period_start BETWEEN '{start}'::date AND '{last_period_start}'::date
+                    AND tas IN (SELECT tas FROM {model} WHERE submission_id = {submission_id})
+                GROUP BY
+                    tas
+            )
+            UPDATE {model}
+            SET account_num = min_account_num
+            FROM relevant_tas
+            WHERE {model}.submission_id = {submission_id}
+                AND relevant_tas.tas = {model}.tas
+                AND min_account_num IS NOT NULL;
+        """
+    else:
+        update_query = """
+            WITH relevant_tas AS  (
+                SELECT
+                    min(tas_lookup.account_num) AS min_account_num,
+                    tas
+                FROM
+                    tas_lookup
+                WHERE
+                    (('{start}'::date, '{end}'::date) OVERLAPS
+                        (tas_lookup.internal_start_date, coalesce(tas_lookup.internal_end_date,
+                                                                  '{day_after_end}'::date)))
+                GROUP BY
+                    tas
+            )
+            UPDATE {model}
+            SET account_num = min_account_num
+            FROM relevant_tas
+            WHERE {model}.submission_id = {submission_id}
+                AND relevant_tas.tas = {model}.tas;
+        """
     full_query = update_query.format(
         start=start_date,
         end=end_date,
         day_after_end=day_after_end,
+        last_period_start=last_period_start,
         submission_id=submission_id,
         model=model_class.__table__.name,
     )
@@ -1441,6 +1957,7 @@ def update_account_nums(model_class, submission_id):
             "submission_id": submission_id,
             "model_class": str(model_class),
             "duration": time.time() - start,
+            "precomputed_links": use_period_accounts,
         }
     )
 
@@ -1,6 +1,13 @@
-from collections import defaultdict, namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 import logging
+import os
+import queue
+import threading
+
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.models.lookups import FILE_TYPE_DICT, RULE_SEVERITY_DICT
@@ -8,7 +15,12 @@ from dataactcore.models.validationModels import RuleSql
 from dataactcore.models.jobModels import Submission
 from dataactcore.interfaces.db import GlobalDB
 from dataactbroker.helpers.generic_helper import batch as batcher
-from dataactbroker.helpers.validation_helper import update_val_progress, update_cross_val_progress
+from dataactbroker.helpers.validation_helper import (
+    record_validation_timing,
+    update_val_progress,
+    update_cross_val_progress,
+)
+from dataactvalidator.filestreaming.sqlLoader import SQLLoader
 from dataactvalidator.validation_handlers.errorInterface import record_row_error
 
 logger = logging.getLogger(__name__)
@@ -32,8 +44,71 @@ ValidationFailure = namedtuple(
     ],
 )
 
+# The failures of one SQL rule, formatted for the error and warning reports a column at a time. The fields that are the
+# same for every failure of a rule hold a single value, the rest hold a list with one value per failure.
+ValidationFailureBatch = namedtuple(
+    "ValidationFailureBatch",
+    [
+        "unique_ids",
+        "field_name",
+        "error",
+        "failed_values",
+        "expected_values",
+        "differences",
+        "flex_fields",
+        "rows",
+        "original_label",
+        "file_type_id",
+        "target_file_id",
+        "severity_id",
+    ],
+)
+
+# How the columns returned by a SQL rule are used in the reports, worked out once per rule
+FailureColumns = namedtuple(
+    "FailureColumns", ["value_cols", "value_headers", "expected_cols", "difference_col", "unique_id_cols"]
+)
+
 SQL_VALIDATION_BATCH_SIZE = CONFIG_BROKER["validator_batch_size"]
 
+# How many batches of failures a rule running ahead in parallel can hold before waiting on the report writer
+RULE_QUEUE_BATCHES = 2
+# Marks the end of a rule's failures in its queue when running rules in parallel
+RULE_FINISHED = object()
+
+# Per-submission tables shared by the cross-file rules, each built from the matching .sql file in
+# sqlrules/cross_file_staging. A rule reads one by referencing "<table name>_{0}" in its SQL. The award sums are only
+# used by the C23 rules. C8, C9, C11 and C12 also match on UPPER(piid)/UPPER(fain) but check individual rows for a
+# match rather than comparing sums, so they keep reading the staging tables directly.
+CROSS_FILE_STAGING_DIR = "cross_file_staging"
+CROSS_FILE_STAGING_TABLES = [
+    "award_financial_award_sums",
+    "award_procurement_award_sums",
+    "award_financial_assistance_award_sums",
+]
+
+
+class CrossFilePairProgress:
+    """Keeps track of how far along each cross-file pair is when the pairs are being run concurrently"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pair_fractions = {}
+
+    def pairs_finished(self, pair, fraction_complete):
+        """Record how far along a pair is and get how much of the other pairs is done
+
+        Args:
+            pair: the key identifying the pair being updated
+            fraction_complete: the fraction of the pair's rules that have completed
+
+        Returns:
+            How many pairs' worth of rules have been completed by all the other pairs
+        """
+        with self._lock:
+            self._pair_fractions[pair] = fraction_complete
+            return sum(fraction for key, fraction in self._pair_fractions.items() if key != pair)
+
 
 def cross_validate_sql(
     rules,
@@ -46,8 +121,12 @@ def cross_validate_sql(
     pairs_finished,
     job,
     batch_results=False,
+    sess=None,
+    pair_progress=None,
+    stop_event=None,
 ):
-    """Evaluate all sql-based rules for cross file validation
+    """Evaluate all sql-based rules for cross file validation. The staging tables the rules share have to be built
+    with prepare_cross_file_staging beforehand.
 
     Args:
         rules: list of Rule objects
@@ -60,15 +139,157 @@ def cross_validate_sql(
         pairs_finished: the number of pairs finished, used for the progress update
         job: the job being processed, used for the progress update
         batch_results: instead of storing the results in memory, batch the results (for memory)
+        sess: the database session to run the rules on, defaults to the global session
+        pair_progress: when pairs are run concurrently, a callable that records the fraction of this pair's rules
+            that are done and returns how many pairs' worth of rules are done elsewhere, used in place of
+            pairs_finished for the progress update
+        stop_event: when pairs are run concurrently, an event set once another pair has failed so the remaining rules
+            are skipped
+    """
+    own_conn = sess is not None
+    if own_conn:
+        # Streamed results have to stay on one connection across the commits made for each rule, unlike the session's
+        # connection which is handed back on every commit
+        conn = sess.get_bind().connect()
+        # Connections aren't reset when they're handed back to the pool, so the rules are read in a transaction that's
+        # always ended here. Otherwise its locks would block dropping the staging tables once all the pairs are done.
+        trans = conn.begin()
+    else:
+        conn = GlobalDB.db().connection
+        sess = GlobalDB.db().session
+    try:
+        run_cross_file_rules(
+            rules,
+            submission_id,
+            short_to_long_dict,
+            job_id,
+            error_csv,
+            warning_csv,
+            error_list,
+            pairs_finished,
+            job,
+            conn,
+            sess,
+            batch_results=batch_results,
+            pair_progress=pair_progress,
+            stop_event=stop_event,
+        )
+    finally:
+        if own_conn:
+            trans.close()
+            conn.close()
+
+
+def prepare_cross_file_staging(conn, rule_sqls, submission_id):
+    """Build the per-submission staging tables read by a set of cross-file rules.
+
+    Several cross-file rules group the same staging data by the same normalized keys. Instead of each rule scanning
+    the staging tables again, the grouped data is built once per cross-file job into an indexed, unlogged table that
+    the rules of every pair read from, whichever connection they run on. Only the tables referenced by the provided
+    rules are built.
+
+    Args:
+        conn: the database connection to build the tables on
+        rule_sqls: the unformatted SQL of the rules that are about to be run
+        submission_id: ID of the submission the rules are being run on
+
+    Returns:
+        A list of the names of the staging tables that were built
+    """
+    staging_tables = [
+        table
+        for table in CROSS_FILE_STAGING_TABLES
+        if any("{}_{{0}}".format(table) in rule_sql for rule_sql in rule_sqls)
+    ]
+    for table in staging_tables:
+        table_start = datetime.now()
+        table_sql = SQLLoader.read_sql_str(os.path.join(CROSS_FILE_STAGING_DIR, table)).format(submission_id)
+        conn.execution_options(autocommit=True).execute(table_sql)
+        logger.info(
+            {
+                "message": "Built cross-file staging table {} on submission_id: {}".format(table, str(submission_id)),
+                "message_type": "ValidatorInfo",
+                "submission_id": submission_id,
+                "table": table,
+                "action": "prepare_cross_file_staging",
+                "start": table_start,
+                "duration": (datetime.now() - table_start).total_seconds(),
+            }
+        )
+    return staging_tables
+
+
+def drop_cross_file_staging(conn, staging_tables, submission_id):
+    """Drop the per-submission staging tables built for a set of cross-file rules.
+
+    Args:
+        conn: the database connection the tables were built on
+        staging_tables: the names of the staging tables to drop
+        submission_id: ID of the submission the tables were built for
+    """
+    for table in staging_tables:
+        conn.execution_options(autocommit=True).execute("DROP TABLE IF EXISTS {}_{}".format(table, submission_id))
+
+
+def run_cross_file_rules(
+    rules,
+    submission_id,
+    short_to_long_dict,
+    job_id,
+    error_csv,
+    warning_csv,
+    error_list,
+    pairs_finished,
+    job,
+    conn,
+    sess,
+    batch_results=False,
+    pair_progress=None,
+    stop_event=None,
+):
+    """Run a set of cross-file rules and record their failures
+
+    Args:
+        rules: list of Rule objects
+        submission_id: ID of submission to run cross-file validation on
+        short_to_long_dict: mapping of short to long schema column names
+        job_id: the id of the cross-file job
+        error_csv: the csv to write errors to
+        warning_csv: the csv to write warnings to
+        error_list: dict to keep track of errors
+        pairs_finished: the number of pairs finished, used for the progress update
+        job: the job being processed, used for the progress update
+        conn: the database connection to run the rules on
+        sess: the database session used for the flex data and progress updates
+        batch_results: instead of storing the results in memory, batch the results (for memory)
+        pair_progress: when pairs are run concurrently, a callable that records the fraction of this pair's rules
+            that are done and returns how many pairs' worth of rules are done elsewhere
+        stop_event: when pairs are run concurrently, an event set once another pair has failed so the remaining rules
+            are skipped
     """
-    conn = GlobalDB.db().connection
-    sess = GlobalDB.db().session
     rules_start = datetime.now()
     num_rules = len(rules)
     rules_finished = 0
+    # The flex fields of each source file are gathered the first time one of its rules fails and shared by the rest
+    flex_data_by_file = {}
 
     # Put each rule through evaluate, appending all failures into list
     for rule in rules:
+        if stop_event is not None and stop_event.is_set():
+            logger.info(
+                {
+                    "message": "Stopping cross-file rules on submission_id: {} after another pair failed".format(
+                        str(submission_id)
+                    ),
+                    "message_type": "ValidatorInfo",
+                    "job_id": job_id,
+                    "submission_id": submission_id,
+                    "action": "run_cross_validation_rule",
+                    "status": "stopped",
+                    "rules_finished": rules_finished,
+                }
+            )
+            break
         rule_start = datetime.now()
         logger.info(
             {
@@ -85,7 +306,11 @@ def cross_validate_sql(
             }
         )
 
+        rows_returned = 0
+
         def process_failures(failures, columns):
+            nonlocal rows_returned
+            rows_returned += len(failures)
             # get list of fields involved in this validation
             source_len = len("source_value_")
             target_len = len("target_value_")
@@ -99,27 +324,29 @@ def cross_validate_sql(
             source_headers = [short_to_long_dict.get(field[source_len:], field[source_len:]) for field in source_cols]
             target_headers = [short_to_long_dict.get(field[target_len:], field[target_len:]) for field in target_cols]
 
-            logger.info(
-                {
-                    "message": "Starting flex field gathering for cross-file rule "
-                    + "{} on submission_id: {}".format(rule.query_name, str(submission_id)),
-                    "message_type": "ValidatorInfo",
-                    "rule": rule.query_name,
-                    "job_id": job_id,
-                    "submission_id": submission_id,
-                }
-            )
-            source_flex_data = relevant_cross_flex_data(failures, submission_id, rule.file_id)
-            logger.info(
-                {
-                    "message": "Finished flex field gathering for cross-file rule "
-                    + "{} on submission_id: {}".format(rule.query_name, str(submission_id)),
-                    "message_type": "ValidatorInfo",
-                    "rule": rule.query_name,
-                    "job_id": job_id,
-                    "submission_id": submission_id,
-                }
-            )
+            if rule.file_id not in flex_data_by_file:
+                logger.info(
+                    {
+                        "message": "Starting flex field gathering for cross-file rule "
+                        + "{} on submission_id: {}".format(rule.query_name, str(submission_id)),
+                        "message_type": "ValidatorInfo",
+                        "rule": rule.query_name,
+                        "job_id": job_id,
+                        "submission_id": submission_id,
+                    }
+                )
+                flex_data_by_file[rule.file_id] = cross_file_flex_data(submission_id, rule.file_id, sess=sess)
+                logger.info(
+                    {
+                        "message": "Finished flex field gathering for cross-file rule "
+                        + "{} on submission_id: {}".format(rule.query_name, str(submission_id)),
+                        "message_type": "ValidatorInfo",
+                        "rule": rule.query_name,
+                        "job_id": job_id,
+                        "submission_id": submission_id,
+                    }
+                )
+            source_flex_data = flex_data_by_file[rule.file_id]
 
             for row in failures:
                 # Getting row numbers
@@ -141,14 +368,6 @@ def cross_validate_sql(
                     for c in target_cols
                 ]
 
-                # Getting all flex fields organized
-                source_flex_list = []
-                if source_flex_data:
-                    source_flex_list = [
-                        "{}: {}".format(flex_field.header, flex_field.cell if flex_field.cell is not None else "")
-                        for flex_field in source_flex_data[source_row_number]
-                    ]
-
                 # Getting the difference and unique IDs
                 difference = ""
                 diff_start = "difference_"
@@ -187,7 +406,7 @@ def cross_validate_sql(
                     ", ".join(sorted(source_values)),
                     ", ".join(sorted(target_values)),
                     difference,
-                    ", ".join(sorted(source_flex_list)),
+                    source_flex_data.get(source_row_number, ""),
                     source_row_number,
                     str(rule.rule_label),
                     rule.file_id,
@@ -198,18 +417,22 @@ def cross_validate_sql(
                     error_csv.writerow(failure[0:12])
                 if failure[14] == RULE_SEVERITY_DICT["warning"]:
                     warning_csv.writerow(failure[0:12])
-                record_row_error(
-                    error_list,
-                    job_id,
-                    "cross_file",
-                    failure[1],
-                    failure[5],
-                    failure[10],
-                    failure[11],
-                    failure[12],
-                    failure[13],
-                    severity_id=failure[14],
-                )
+
+            # Every failure of a rule counts toward the same error, so they're recorded all at once
+            first_row_number = failures[0]["source_row_number"] if "source_row_number" in columns else ""
+            record_row_error(
+                error_list,
+                job_id,
+                "cross_file",
+                rule.file.name,
+                str(rule.rule_error_message),
+                first_row_number,
+                str(rule.rule_label),
+                rule.file_id,
+                rule.target_file_id,
+                severity_id=rule.rule_severity_id,
+                num_errors=len(failures),
+            )
 
         sub_rule_sql = rule.rule_sql.format(submission_id)
         if batch_results:
@@ -225,15 +448,27 @@ def cross_validate_sql(
             # Run the full SQL and fetch the results
             failures = conn.execute(sub_rule_sql)
             if failures.rowcount:
-                # python batching to ensure the flex data calls are safe
+                # python batching to match the batches the streamed results are processed in
                 for failure_batch in batcher(list(failures), n=SQL_VALIDATION_BATCH_SIZE):
                     process_failures(failure_batch, failures.keys())
+        rule_duration = record_validation_timing(
+            sess,
+            "cross_file_rule",
+            rule_start,
+            job_id,
+            submission_id,
+            rule.file_id,
+            rule=rule.query_name,
+            row_count=rows_returned,
+            target_file_type_id=rule.target_file_id,
+        )
         sess.commit()
 
         rules_finished += 1
+        if pair_progress:
+            pairs_finished = pair_progress(rules_finished / num_rules)
         update_cross_val_progress(sess, job, pairs_finished, num_rules, rules_finished)
 
-        rule_duration = (datetime.now() - rule_start).total_seconds()
         logger.info(
             {
                 "message": "Finished processing cross-file rule {} on submission_id: {}.".format(
@@ -264,7 +499,7 @@ def cross_validate_sql(
     )
 
 
-def validate_file_by_sql(job, file_type, short_to_long_dict, batch_results=False):
+def validate_file_by_sql(job, file_type, short_to_long_dict, batch_results=False, num_workers=1):
     """Check all SQL rules
 
     Args:
@@ -272,12 +507,19 @@ def validate_file_by_sql(job, file_type, short_to_long_dict, batch_results=False
         file_type: file type being checked
         short_to_long_dict: mapping of short to long schema column names
         batch_results: instead of storing the results in memory, batch the results (for memory)
+        num_workers: how many rules to run at the same time, each on its own database connection. Failures are
+            still yielded in rule order regardless of which rule finishes first
 
     Yields:
-        ValidationFailures
+        ValidationFailureBatches
     """
 
     sql_val_start = datetime.now()
+    log_data = {
+        "submission_id": job.submission_id,
+        "job_id": job.job_id,
+        "file_type": job.file_type.name,
+    }
     log_string = "on submission_id: {}, job_id: {}, file_type: {}".format(
         str(job.submission_id), str(job.job_id), job.file_type.name
     )
@@ -285,12 +527,11 @@ def validate_file_by_sql(job, file_type, short_to_long_dict, batch_results=False
         {
             "message": "Beginning SQL validations {}".format(log_string),
             "message_type": "ValidatorInfo",
-            "submission_id": job.submission_id,
-            "job_id": job.job_id,
-            "file_type": job.file_type.name,
+            **log_data,
             "action": "run_sql_validations",
             "status": "start",
             "start_time": sql_val_start,
+            "num_workers": num_workers,
         }
     )
     sess = GlobalDB.db().session
@@ -302,242 +543,414 @@ def validate_file_by_sql(job, file_type, short_to_long_dict, batch_results=False
     # Only run non-sensitive rules for CGAC 999
     if sess.query(Submission).filter_by(submission_id=job.submission_id, cgac_code="999").one_or_none():
         rules = rules.filter_by(sensitive=False)
+    rules = rules.order_by(RuleSql.rule_sql_id).all()
 
     errors = []
     rules_run = 0
     # Checking every 2 rules for DABS and every 5 for FABS because FABS has so many more rules per job
     progress_check = 2 if file_type != "fabs" else 5
-    num_rules = rules.count()
-
-    # For each rule, execute sql for rule
-    for rule in rules:
-        rule_start = datetime.now()
-        logger.info(
-            {
-                "message": "Beginning SQL validation rule {} {}".format(rule.query_name, log_string),
-                "message_type": "ValidatorInfo",
-                "submission_id": job.submission_id,
-                "job_id": job.job_id,
-                "rule": rule.query_name,
-                "file_type": job.file_type.name,
-                "action": "run_sql_validation_rule",
-                "status": "start",
-                "start_time": rule_start,
-                "batch_results": batch_results,
-            }
-        )
+    num_rules = len(rules)
 
-        def process_batch(failures, columns):
-            # Create column list (exclude row_number)
-            cols = []
-            exact_names = ["row_number", "difference"]
-            starting = ("expected_value_", "uniqueid_")
-            for col in columns:
-                if col not in exact_names and not col.startswith(starting):
-                    cols.append(col)
-            col_headers = [short_to_long_dict.get(field, field) for field in cols]
+    # Gathered once for the whole file instead of for every rule that fails
+    flex_data = job_flex_data(job.job_id, sess=sess)
 
-            # materialize as we'll iterate over the failures twice
-            failures = list(failures)
-            flex_data = relevant_flex_data(failures, job.job_id)
+    if num_workers > 1:
+        rule_results = run_rules_in_parallel(
+            rules, num_workers, log_data, log_string, short_to_long_dict, file_id, flex_data, batch_results
+        )
+    else:
+        rule_results = (
+            run_file_rule(rule, sess, log_data, log_string, short_to_long_dict, file_id, flex_data, batch_results)
+            for rule in rules
+        )
 
-            for failure in failures:
-                yield failure_row_to_tuple(rule, flex_data, cols, col_headers, file_id, failure)
+    # For each rule, gather the failures in the order the rules were pulled
+    for failure_batches in rule_results:
+        for failure_batch in failure_batches:
+            yield failure_batch
 
-        sub_rule_sql = rule.rule_sql.format(job.submission_id)
-        if batch_results:
-            # Only run the SQL in batches to save on memory
-            proxy = sess.connection().execution_options(stream_results=True).execute(sub_rule_sql)
-            while True:
-                failures = proxy.fetchmany(SQL_VALIDATION_BATCH_SIZE)
-                if not failures:
-                    break
-                for failure in process_batch(failures, failures[0].keys()):
-                    yield failure
-            proxy.close()
-        else:
-            # Run the full SQL and fetch the results
-            failures = sess.execute(sub_rule_sql)
-            if failures.rowcount:
-                for failure in process_batch(failures, failures.keys()):
-                    yield failure
-        sess.commit()
-
-        rule_duration = (datetime.now() - rule_start).total_seconds()
-        logger.info(
-            {
-                "message": "Completed SQL validation rule {} {}".format(rule.query_name, log_string),
-                "message_type": "ValidatorInfo",
-                "submission_id": job.submission_id,
-                "job_id": job.job_id,
-                "rule": rule.query_name,
-                "file_type": job.file_type.name,
-                "action": "run_sql_validation_rule",
-                "status": "finish",
-                "start_time": rule_start,
-                "end_time": datetime.now(),
-                "duration": rule_duration,
-                "batch_results": batch_results,
-            }
-        )
         rules_run += 1
         if rules_run % progress_check == 0:
             # If we're here we can assume the previous parts are done so we can just set those to 100 and the next step
             # to 0
             update_val_progress(sess, job, 100, 100, rules_run / num_rules, 0)
 
-    sql_val_duration = (datetime.now() - sql_val_start).total_seconds()
+    sql_val_duration = record_validation_timing(
+        sess, "sql_validations", sql_val_start, job.job_id, job.submission_id, file_id
+    )
+    sess.commit()
     logger.info(
         {
             "message": "Completed SQL validations {}".format(log_string),
             "message_type": "ValidatorInfo",
-            "submission_id": job.submission_id,
-            "job_id": job.job_id,
-            "file_type": job.file_type.name,
+            **log_data,
             "action": "run_sql_validations",
             "status": "finish",
             "start_time": sql_val_start,
             "end_time": datetime.now(),
             "duration": sql_val_duration,
+            "num_workers": num_workers,
         }
     )
     return errors
 
 
-def relevant_flex_data(failures, job_id):
-    """Create a dictionary mapping row numbers of failures to lists of FlexFields
+def run_file_rule(rule, sess, log_data, log_string, short_to_long_dict, file_id, flex_data, batch_results=False):
+    """Run a single SQL rule for a file and convert its results into failures
+
+    Args:
+        rule: the RuleSql object to run
+        sess: the database session to run the rule on
+        log_data: the submission, job, and file type information to include in the logs
+        log_string: a string representation of the log data to include in the log messages
+        short_to_long_dict: mapping of short to long schema column names
+        file_id: the ID of the file type being validated
+        flex_data: the formatted flex fields of the file, keyed by row number
+        batch_results: instead of storing the results in memory, batch the results (for memory)
+
+    Yields:
+        ValidationFailureBatches of at most SQL_VALIDATION_BATCH_SIZE failures
+    """
+    rule_start = datetime.now()
+    logger.info(
+        {
+            "message": "Beginning SQL validation rule {} {}".format(rule.query_name, log_string),
+            "message_type": "ValidatorInfo",
+            **log_data,
+            "rule": rule.query_name,
+            "action": "run_sql_validation_rule",
+            "status": "start",
+            "start_time": rule_start,
+            "batch_results": batch_results,
+        }
+    )
+
+    sub_rule_sql = rule.rule_sql.format(log_data["submission_id"])
+    rows_returned = 0
+    if batch_results:
+        # Only run the SQL in batches to save on memory
+        proxy = sess.connection().execution_options(stream_results=True).execute(sub_rule_sql)
+        failure_columns = classify_failure_columns(list(proxy.keys()), short_to_long_dict)
+        while True:
+            failures = proxy.fetchmany(SQL_VALIDATION_BATCH_SIZE)
+            if not failures:
+                break
+            rows_returned += len(failures)
+            yield failures_to_batch(rule, flex_data, failure_columns, file_id, failures)
+        proxy.close()
+    else:
+        # Run the full SQL and fetch the results
+        failures = sess.execute(sub_rule_sql)
+        if failures.rowcount:
+            rows_returned = failures.rowcount
+            failure_columns = classify_failure_columns(list(failures.keys()), short_to_long_dict)
+            # python batching so no single batch of reports rows gets too big
+            for failure_batch in batcher(list(failures), n=SQL_VALIDATION_BATCH_SIZE):
+                yield failures_to_batch(rule, flex_data, failure_columns, file_id, failure_batch)
+    rule_duration = record_validation_timing(
+        sess,
+        "sql_rule",
+        rule_start,
+        log_data["job_id"],
+        log_data["submission_id"],
+        file_id,
+        rule=rule.query_name,
+        row_count=rows_returned,
+    )
+    sess.commit()
+
+    logger.info(
+        {
+            "message": "Completed SQL validation rule {} {}".format(rule.query_name, log_string),
+            "message_type": "ValidatorInfo",
+            **log_data,
+            "rule": rule.query_name,
+            "action": "run_sql_validation_rule",
+            "status": "finish",
+            "start_time": rule_start,
+            "end_time": datetime.now(),
+            "duration": rule_duration,
+            "batch_results": batch_results,
+        }
+    )
+
+
+def run_rules_in_parallel(
+    rules, num_workers, log_data, log_string, short_to_long_dict, file_id, flex_data, batch_results=False
+):
+    """Run the SQL rules for a file concurrently over a bounded set of database connections.
+
+    SQL rules for a single file only read from the staging tables, so they don't depend on each other and can run in
+    any order. Each worker thread runs one rule at a time on its own session and hands its failures back in batches of
+    SQL_VALIDATION_BATCH_SIZE through a small per-rule queue. The queues are drained in the original rule order so the
+    error and warning reports are written the same way no matter which rule finishes first. A worker that gets ahead
+    of the rule currently being written waits once its queue is full, so with batch_results at most
+    num_workers * (RULE_QUEUE_BATCHES + 1) batches of failures are held in memory at a time.
+
+    Args:
+        rules: list of RuleSql objects to run
+        num_workers: the number of rules to run at the same time (and the number of database connections used)
+        log_data: the submission, job, and file type information to include in the logs
+        log_string: a string representation of the log data to include in the log messages
+        short_to_long_dict: mapping of short to long schema column names
+        file_id: the ID of the file type being validated
+        flex_data: the formatted flex fields of the file, keyed by row number and shared by all the rules
+        batch_results: instead of storing the results in memory, batch the results (for memory)
+
+    Yields:
+        A generator of ValidationFailureBatches for each rule, in the order the rules were provided. Each one has to
+        be consumed before moving on to the next.
+    """
+    # The rules are read in the parent thread's session, detach them so they can be read safely from the workers
+    sess = GlobalDB.db().session
+    for rule in rules:
+        sess.expunge(rule)
+    # Scoped sessions are thread-local, each worker gets its own session/connection from the shared engine
+    worker_sessions = scoped_session(sessionmaker(bind=GlobalDB.db().engine))
+    # Set when the consumer stops reading so workers waiting on a full queue give up instead of blocking forever
+    stopped = threading.Event()
+
+    def put(rule_queue, item):
+        while not stopped.is_set():
+            try:
+                rule_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run_rule(rule, rule_queue):
+        worker_sess = worker_sessions()
+        try:
+            failure_batches = run_file_rule(
+                rule, worker_sess, log_data, log_string, short_to_long_dict, file_id, flex_data, batch_results
+            )
+            for failure_batch in failure_batches:
+                if not put(rule_queue, failure_batch):
+                    failure_batches.close()
+                    return
+            put(rule_queue, RULE_FINISHED)
+        except Exception as e:
+            worker_sess.rollback()
+            put(rule_queue, e)
+        finally:
+            worker_sessions.remove()
+
+    def drain(rule_queue):
+        while True:
+            item = rule_queue.get()
+            if item is RULE_FINISHED:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def submit(rule):
+        rule_queue = queue.Queue(maxsize=RULE_QUEUE_BATCHES)
+        return executor.submit(run_rule, rule, rule_queue), rule_queue
+
+    # Only as many rules as there are workers are started ahead, every started rule always has a thread to finish on
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="sql_validation") as executor:
+        pending = deque()
+        rule_iter = iter(rules)
+        try:
+            for rule in islice(rule_iter, num_workers):
+                pending.append(submit(rule))
+            while pending:
+                future, rule_queue = pending.popleft()
+                yield drain(rule_queue)
+                future.result()
+                next_rule = next(rule_iter, None)
+                if next_rule is not None:
+                    pending.append(submit(next_rule))
+        finally:
+            # Don't start any more rules if something went wrong or the consumer stopped early
+            stopped.set()
+            for future, _ in pending:
+                future.cancel()
+
+
+def job_flex_data(job_id, sess=None):
+    """Gather the flex fields for every row of a file once, so all the SQL rules run on it can share them
 
     Args:
-        failures: list of failure rows from the SQL validations
         job_id: the current job_id
+        sess: the database session to use, defaults to the global session
 
     Returns:
-        a dictionary of row numbers as keys and a list of flex_field objects as the values
+        a dictionary of row numbers as keys and the flex fields of the row, formatted for the error and warning
+        reports, as the values
     """
-    sess = GlobalDB.db().session
-    flex_data = defaultdict(list)
-    fail_string = "), (".join(str(f["row_number"]) for f in failures if f["row_number"])
-    # only do the rest of this gathering if there's any rows to search in the first place, there is at least
-    # one rule that returns NULL for row_number
-    if fail_string:
-        # VALUES and EXISTS are ridiculous in sqlalchemy, using raw sql for this
-        query = (
-            """
-            WITH all_values AS (SELECT * FROM (VALUES ({})) as all_flexs (row_number))
-            SELECT *
-            FROM flex_field
-            WHERE job_id={}
-                AND EXISTS (
-                    SELECT *
-                    FROM all_values
-                    WHERE flex_field.row_number = all_values.row_number
-                )
-            ORDER BY flex_field.header
-            """
-        ).format(fail_string, str(job_id))
-        query_result = sess.execute(query)
-        for flex_field in query_result:
-            flex_data[flex_field.row_number].append(flex_field)
-    return flex_data
+    return formatted_flex_data("job_id = {}".format(job_id), sess=sess)
 
 
-def relevant_cross_flex_data(failed_rows, submission_id, file_id):
-    """Create a dictionary mapping row numbers of cross-file failures to lists of FlexFields
+def cross_file_flex_data(submission_id, file_id, sess=None):
+    """Gather the flex fields for every row of the source file of a cross-file rule once, so all the rules with that
+    source file can share them
 
     Args:
-        failed_rows: the subset of rows to get flex fields for
         submission_id: ID of the submission to get flex fields for
         file_id: the source file type ID of the cross-file rule for which to get flex fields
+        sess: the database session to use, defaults to the global session
 
     Returns:
-        A dict containing flex data for the source file in a cross-file validation
+        a dictionary of row numbers as keys and the flex fields of the row, formatted for the error and warning
+        reports, as the values
     """
-    sess = GlobalDB.db().session
-    flex_data = defaultdict(list)
-
-    fail_string = "), (".join(str(f["source_row_number"]) for f in failed_rows if f["source_row_number"])
-    # Only do this if we have any row numbers to check
-    if fail_string:
-        # VALUES and EXISTS are ridiculous in sqlalchemy, using raw sql for this
-        query = """
-            WITH all_values AS(SELECT * FROM(VALUES ({})) as all_flexs(row_number))
-            SELECT *
+    return formatted_flex_data("submission_id = {} AND file_type_id = {}".format(submission_id, file_id), sess=sess)
+
+
+def formatted_flex_data(flex_filter, sess=None):
+    """Join the flex fields of each row into the string used in the error and warning reports. The fields are sorted
+    by code point (the "C" collation) to match how they were sorted in Python.
+
+    Args:
+        flex_filter: the SQL condition picking which flex fields to gather
+        sess: the database session to use, defaults to the global session
+
+    Returns:
+        a dictionary of row numbers as keys and the joined flex fields as the values
+    """
+    if not sess:
+        sess = GlobalDB.db().session
+    query = """
+        SELECT row_number,
+            STRING_AGG(flex_string, ', ' ORDER BY flex_string COLLATE "C") AS flex_fields
+        FROM (
+            SELECT row_number, header || ': ' || COALESCE(cell, '') AS flex_string
             FROM flex_field
-            WHERE submission_id = {}
-            AND file_type_id = {}
-            AND EXISTS (SELECT * FROM all_values WHERE flex_field.row_number = all_values.row_number)
-        """
-        query_result = sess.execute(query.format(fail_string, submission_id, file_id))
-        for flex_field in query_result:
-            flex_data[flex_field.row_number].append(flex_field)
+            WHERE {}
+        ) AS flex_strings
+        GROUP BY row_number
+    """
+    return {row.row_number: row.flex_fields for row in sess.execute(query.format(flex_filter))}
 
-    return flex_data
 
+def classify_failure_columns(columns, short_to_long_dict):
+    """Work out how each column returned by a SQL rule is used in the error and warning reports
 
-def failure_row_to_tuple(rule, flex_data, cols, col_headers, file_id, sql_failure):
-    """Convert a failure SQL row into a ValidationFailure.
+    Args:
+        columns: the column names returned by the rule, in order
+        short_to_long_dict: mapping of short to long schema column names
+
+    Returns:
+        A FailureColumns tuple listing the columns holding the failed values (with their long headers), the expected
+        values, the difference and the unique ID of each failure
+    """
+    value_cols = []
+    expected_cols = []
+    unique_id_cols = []
+    difference_col = None
+    for col in columns:
+        if col == "row_number":
+            continue
+        elif col == "difference":
+            difference_col = col
+        elif col.startswith("expected_value_"):
+            expected_cols.append(col)
+        elif col.startswith("uniqueid_"):
+            unique_id_cols.append(col)
+        else:
+            value_cols.append(col)
+    value_headers = [short_to_long_dict.get(field, field) for field in value_cols]
+    return FailureColumns(value_cols, value_headers, expected_cols, difference_col, unique_id_cols)
+
+
+def failures_to_batch(rule, flex_data, failure_columns, file_id, sql_failures):
+    """Convert a batch of failure SQL rows into a ValidationFailureBatch, formatting a column at a time
 
     Args:
         rule: the RuleSql object representing the rule failed
-        flex_data: the flex data for the subset of failures currently being converted into errors
-        cols: the column values for the columns that are relevant to the error failed
-        col_headers: the column names for the columns that are relevant to the error failed
+        flex_data: the formatted flex fields of the file, keyed by row number
+        failure_columns: the FailureColumns of the rule, from classify_failure_columns
         file_id: the ID number of the file being validated
-        sql_failure: the failure returned from the SQL
+        sql_failures: the failure rows returned from the SQL, at least one
 
     Returns:
-        A ValidationFailure tuple that contains all values needed to write the row to the error report
+        A ValidationFailureBatch that contains all values needed to write the rows to the error report
     """
-    row = sql_failure["row_number"] or ""
-
-    # Determine the extra value for a rule
-    expected_value = rule.expected_value
-    difference = ""
-    unique_id_start = "uniqueid_"
-    expect_start = "expected_value_"
-
-    unique_id_fields = []
-    for failure_key in sql_failure.keys():
-        # Expected value
-        if failure_key.startswith(expect_start):
-            fail_header = failure_key[len(expect_start) :]
-            expected_value = "{}: {}".format(
-                fail_header, (str(sql_failure[failure_key] if sql_failure[failure_key] is not None else ""))
-            )
-        # Difference
-        elif failure_key == "difference":
-            difference = str(sql_failure[failure_key] if sql_failure[failure_key] is not None else "")
-        elif failure_key.startswith(unique_id_start):
-            fail_header = failure_key[len(unique_id_start) :]
-            unique_id_fields.append(
-                "{}: {}".format(
-                    fail_header, str(sql_failure[failure_key] if sql_failure[failure_key] is not None else "")
-                )
-            )
-
-    # Create strings for fields and values
-    values_list = [
-        "{}: {}".format(header, str(sql_failure[field] if sql_failure[field] is not None else ""))
-        for field, header in zip(cols, col_headers)
-    ]
-    flex_list = [
-        "{}: {}".format(flex_field.header, flex_field.cell if flex_field.cell is not None else "")
-        for flex_field in flex_data[row]
-    ]
-    # Create unique id string
-    unique_id = ", ".join(unique_id_fields)
-
-    return ValidationFailure(
-        unique_id,
-        ", ".join(sorted(col_headers)),
+    num_failures = len(sql_failures)
+    columns = dict(zip(sql_failures[0].keys(), zip(*sql_failures)))
+
+    def labeled_values(header, col):
+        return ["{}: {}".format(header, str(value) if value is not None else "") for value in columns[col]]
+
+    def join_columns(formatted_cols, sort_values=False):
+        if not formatted_cols:
+            return [""] * num_failures
+        if sort_values:
+            return [", ".join(sorted(values)) for values in zip(*formatted_cols)]
+        return [", ".join(values) for values in zip(*formatted_cols)]
+
+    rows = [row or "" for row in columns["row_number"]]
+
+    # Failed values are listed in sorted order, with unique headers that's always the order of the headers
+    value_headers = failure_columns.value_headers
+    formatted_values = [labeled_values(header, col) for col, header in zip(failure_columns.value_cols, value_headers)]
+    if len(set(value_headers)) == len(value_headers):
+        header_order = sorted(range(len(value_headers)), key=lambda index: value_headers[index] + ": ")
+        failed_values = join_columns([formatted_values[index] for index in header_order])
+    else:
+        failed_values = join_columns(formatted_values, sort_values=True)
+
+    # Only the last expected value column is used if the rule has more than one
+    if failure_columns.expected_cols:
+        expected_col = failure_columns.expected_cols[-1]
+        expected_values = labeled_values(expected_col[len("expected_value_") :], expected_col)
+    else:
+        expected_values = [rule.expected_value] * num_failures
+
+    if failure_columns.difference_col:
+        differences = [str(value) if value is not None else "" for value in columns[failure_columns.difference_col]]
+    else:
+        differences = [""] * num_failures
+
+    unique_ids = join_columns([labeled_values(col[len("uniqueid_") :], col) for col in failure_columns.unique_id_cols])
+
+    return ValidationFailureBatch(
+        unique_ids,
+        ", ".join(sorted(value_headers)),
         rule.rule_error_message,
-        ", ".join(sorted(values_list)),
-        expected_value,
-        difference,
-        ", ".join(sorted(flex_list)),
-        row,
+        failed_values,
+        expected_values,
+        differences,
+        [flex_data.get(row, "") for row in rows],
+        rows,
         rule.rule_label,
         file_id,
         rule.target_file_id,
         rule.rule_severity_id,
     )
+
+
+def split_failure_batch(failure_batch):
+    """Split a ValidationFailureBatch back into the ValidationFailures of each failed row
+
+    Args:
+        failure_batch: the ValidationFailureBatch to split
+
+    Yields:
+        ValidationFailures, in the order of the rows in the batch
+    """
+    for unique_id, failed_value, expected_value, difference, flex_fields, row in zip(
+        failure_batch.unique_ids,
+        failure_batch.failed_values,
+        failure_batch.expected_values,
+        failure_batch.differences,
+        failure_batch.flex_fields,
+        failure_batch.rows,
+    ):
+        yield ValidationFailure(
+            unique_id,
+            failure_batch.field_name,
+            failure_batch.error,
+            failed_value,
+            expected_value,
+            difference,
+            flex_fields,
+            row,
+            failure_batch.original_label,
+            failure_batch.file_type_id,
+            failure_batch.target_file_id,
+            failure_batch.severity_id,
+        )
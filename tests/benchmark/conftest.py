@@ -0,0 +1,2 @@
+# The benchmarks run against the same freshly migrated database the unit tests use
+from tests.unit.conftest import database, full_database_setup, job_constants, validation_constants  # noqa: F401
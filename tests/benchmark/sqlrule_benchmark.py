@@ -0,0 +1,316 @@
+import csv
+import json
+import os
+import random
+import re
+import time
+from datetime import date, timedelta
+
+import factory
+from sqlalchemy import inspect
+
+from dataactvalidator.filestreaming.sqlLoader import SQLLoader
+from dataactvalidator.validation_handlers.validator import drop_cross_file_staging, prepare_cross_file_staging
+
+from tests.unit.dataactcore.factories.domain import SAMRecipientFactory
+from tests.unit.dataactcore.factories.staging import (
+    AppropriationFactory,
+    AwardFinancialAssistanceFactory,
+    AwardFinancialFactory,
+    AwardProcurementFactory,
+    DetachedAwardProcurementFactory,
+    FABSFactory,
+    ObjectClassProgramActivityFactory,
+    PublishedFABSFactory,
+)
+
+# How many rows of each file are loaded for the submission the rules are run on
+BENCHMARK_SCALE = int(os.environ.get("SQL_RULE_BENCHMARK_SCALE", 200))
+# The published tables are far bigger than any one submission, they get this many rows for every submission row
+PUBLISHED_MULTIPLIER = int(os.environ.get("SQL_RULE_BENCHMARK_PUBLISHED_MULTIPLIER", 50))
+# Other submissions loaded alongside the benchmarked one so the rules have to find their own submission's rows
+OTHER_SUBMISSIONS = 3
+
+# A rule has regressed once it takes this many times as long as it did in the baseline...
+RUNTIME_THRESHOLD = float(os.environ.get("SQL_RULE_BENCHMARK_THRESHOLD", 2))
+# ...and at least this many more seconds, so the fast rules don't fail on noise
+MIN_RUNTIME_INCREASE = float(os.environ.get("SQL_RULE_BENCHMARK_MIN_INCREASE", 0.5))
+
+# Text columns holding dates, which have to be valid dates for the rules that cast them
+DATE_COLUMN = re.compile(r"date|period_of_perf")
+
+# Tables too big to read in full for a single submission
+GUARDED_TABLES = {"published_fabs", "detached_award_procurement"}
+
+STAGING_FACTORIES = {
+    "appropriations": AppropriationFactory,
+    "program_activity": ObjectClassProgramActivityFactory,
+    "award_financial": AwardFinancialFactory,
+    "award": AwardFinancialAssistanceFactory,
+    "award_procurement": AwardProcurementFactory,
+    "fabs": FABSFactory,
+}
+
+
+def build_rows(model_factory, count, **kwargs):
+    """Build rows for a table from one of the model factories
+
+    Args:
+        model_factory: the factory of the model to build the rows for
+        count: how many rows to build
+        kwargs: values to use for every row instead of the factory's values
+
+    Returns:
+        list of dicts of the column values of each row, without the primary key so the database assigns it
+    """
+    rows = []
+    for model in model_factory.build_batch(count, **kwargs):
+        mapper = inspect(model).mapper
+        row = {}
+        for column in mapper.column_attrs:
+            if column.columns[0] in mapper.primary_key:
+                continue
+            value = getattr(model, column.key)
+            # Dates are stored as text in the staging tables, by the time the rules run they've passed the format checks
+            if isinstance(value, str) and DATE_COLUMN.search(column.key):
+                value = random_date().strftime("%Y%m%d")
+            row[column.key] = value
+        rows.append(row)
+    return rows
+
+
+def random_date():
+    """Pick a date in the range the rules usually check against
+
+    Returns:
+        a random date between fiscal years 2010 and 2030
+    """
+    return date(2009, 10, 1) + timedelta(days=random.randint(0, 20 * 365))
+
+
+def load_benchmark_data(conn, jobs, scale=BENCHMARK_SCALE, published_multiplier=PUBLISHED_MULTIPLIER):
+    """Load synthetic staging and published data for the rules to run against and gather the table statistics.
+
+    Some of the published FABS and SAM rows share their keys with the FABS rows of the first submission so the rules
+    joining on them have something to join.
+
+    Args:
+        conn: the database connection to load the data on
+        jobs: the jobs to load staging data for, one for each submission. The rules are run on the first one
+        scale: how many rows of each file to load for each submission
+        published_multiplier: how many published rows to load for each row of a submission
+    """
+    benchmark_fabs = []
+    for job in jobs:
+        for model_factory in STAGING_FACTORIES.values():
+            rows = build_rows(
+                model_factory,
+                scale,
+                submission_id=job.submission_id,
+                job_id=job.job_id,
+                row_number=factory_row_numbers(scale),
+            )
+            conn.execute(model_factory._meta.model.__table__.insert(), rows)
+            if model_factory is FABSFactory and job is jobs[0]:
+                benchmark_fabs = rows
+
+    published_fabs = build_rows(PublishedFABSFactory, scale * published_multiplier, is_active=True)
+    for published_row, fabs_row in zip(published_fabs, benchmark_fabs[: scale // 2]):
+        published_row["afa_generated_unique"] = fabs_row["afa_generated_unique"]
+        published_row["unique_award_key"] = fabs_row["unique_award_key"]
+        published_row["fain"] = fabs_row["fain"]
+    conn.execute(PublishedFABSFactory._meta.model.__table__.insert(), published_fabs)
+    conn.execute(
+        DetachedAwardProcurementFactory._meta.model.__table__.insert(),
+        build_rows(DetachedAwardProcurementFactory, scale * published_multiplier),
+    )
+    sam_rows = build_rows(SAMRecipientFactory, scale * published_multiplier)
+    for sam_row, fabs_row in zip(sam_rows, benchmark_fabs[: scale // 2]):
+        sam_row["uei"] = fabs_row["uei"]
+    conn.execute(SAMRecipientFactory._meta.model.__table__.insert(), sam_rows)
+    conn.execute("ANALYZE")
+
+
+def factory_row_numbers(count):
+    """Row numbers counting up from 2 like the rows of a file after its header, handed out in order
+
+    Args:
+        count: how many row numbers to hand out
+
+    Returns:
+        a factory iterator of the row numbers
+    """
+    return factory.Iterator(range(2, count + 2))
+
+
+def read_rules():
+    """Read every rule listed in the SQL rules file
+
+    Returns:
+        list of dicts of each rule's query name, file type, target file type and SQL
+    """
+    with open(os.path.join(SQLLoader.sql_rules_path, "sqlRules.csv"), newline="") as rules_file:
+        return [
+            {
+                "query_name": rule["query_name"],
+                "file_type": rule["file_type"],
+                "target_file": rule["target_file"] or None,
+                "rule_sql": SQLLoader.read_sql_str(rule["query_name"]),
+            }
+            for rule in csv.DictReader(rules_file)
+        ]
+
+
+def plan_nodes(plan):
+    """Walk every node of a query plan
+
+    Args:
+        plan: a plan node from EXPLAIN's JSON output
+
+    Yields:
+        the node and every node under it
+    """
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def plan_shape(plan):
+    """Describe the shape of a query plan, its node types and which tables they read, leaving out costs and timings
+    so two plans can be compared
+
+    Args:
+        plan: a plan node from EXPLAIN's JSON output
+
+    Returns:
+        a string like "Hash Join(Seq Scan[fabs], Hash(Index Scan[published_fabs]))"
+    """
+    shape = plan["Node Type"]
+    if "Relation Name" in plan:
+        shape += "[{}]".format(plan["Relation Name"])
+    if plan.get("Plans"):
+        shape += "({})".format(", ".join(plan_shape(child) for child in plan["Plans"]))
+    return shape
+
+
+def benchmark_rule(conn, rule, submission_id):
+    """Run a rule and then explain it with its actual run statistics
+
+    Args:
+        conn: the database connection to run the rule on
+        rule: the rule as returned by read_rules
+        submission_id: the ID of the submission to run the rule on
+
+    Returns:
+        dict of the rule's runtime, rows returned, buffer usage, plan shape and the guarded tables it reads in full
+    """
+    rule_sql = rule["rule_sql"].format(submission_id)
+    start = time.perf_counter()
+    rows_returned = len(conn.execute(rule_sql).fetchall())
+    runtime = time.perf_counter() - start
+
+    explained = conn.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {}".format(rule_sql)).scalar()[0]
+    plan = explained["Plan"]
+    nodes = list(plan_nodes(plan))
+    return {
+        "query_name": rule["query_name"],
+        "file_type": rule["file_type"],
+        "target_file": rule["target_file"],
+        "runtime": round(runtime, 4),
+        "execution_time": round(explained["Execution Time"] / 1000, 4),
+        "planning_time": round(explained["Planning Time"] / 1000, 4),
+        "rows_returned": rows_returned,
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "plan_shape": plan_shape(plan),
+        "seq_scans": sorted(
+            {
+                node["Relation Name"]
+                for node in nodes
+                if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in GUARDED_TABLES
+            }
+        ),
+    }
+
+
+def benchmark_rules(conn, rules, submission_id):
+    """Benchmark a set of rules on a submission, building the cross-file staging tables they read from first
+
+    Args:
+        conn: the database connection to run the rules on
+        rules: the rules as returned by read_rules
+        submission_id: the ID of the submission to run the rules on
+
+    Returns:
+        list of the results of benchmark_rule for each rule, in the order of the rules
+    """
+    staging_tables = prepare_cross_file_staging(conn, [rule["rule_sql"] for rule in rules], submission_id)
+    conn.execute("ANALYZE")
+    try:
+        return [benchmark_rule(conn, rule, submission_id) for rule in rules]
+    finally:
+        drop_cross_file_staging(conn, staging_tables, submission_id)
+
+
+def find_regressions(results, baseline, allowed_seq_scans):
+    """Compare the benchmark results against a baseline run and the tables the rules may read in full
+
+    Args:
+        results: the results of benchmark_rules
+        baseline: the results of an earlier benchmark_rules run keyed by query name, empty if there isn't one
+        allowed_seq_scans: dict of query name to the guarded tables that rule is already known to read in full
+
+    Returns:
+        list of messages describing each regression, empty if there are none
+    """
+    regressions = []
+    for result in results:
+        query_name = result["query_name"]
+        new_seq_scans = set(result["seq_scans"]) - set(allowed_seq_scans.get(query_name, []))
+        if new_seq_scans:
+            regressions.append(
+                "{} reads all of {} with a sequential scan: {}".format(
+                    query_name, ", ".join(sorted(new_seq_scans)), result["plan_shape"]
+                )
+            )
+
+        previous = baseline.get(query_name)
+        if previous is None:
+            continue
+        runtime_increase = result["runtime"] - previous["runtime"]
+        if result["runtime"] > previous["runtime"] * RUNTIME_THRESHOLD and runtime_increase > MIN_RUNTIME_INCREASE:
+            message = "{} took {}s, up from {}s".format(query_name, result["runtime"], previous["runtime"])
+            if result["plan_shape"] != previous["plan_shape"]:
+                message += ". Its plan changed from {} to {}".format(previous["plan_shape"], result["plan_shape"])
+            regressions.append(message)
+    return regressions
+
+
+def read_baseline(path):
+    """Read the results of an earlier benchmark run
+
+    Args:
+        path: the path of the JSON file the results were written to, None if there isn't one
+
+    Returns:
+        dict of the earlier results keyed by query name, empty if there isn't a baseline
+    """
+    if not path:
+        return {}
+    with open(path) as baseline_file:
+        return {result["query_name"]: result for result in json.load(baseline_file)["rules"]}
+
+
+def write_results(path, results, scale, published_multiplier):
+    """Write the benchmark results so they can be used as the baseline of a later run
+
+    Args:
+        path: the path of the JSON file to write
+        results: the results of benchmark_rules
+        scale: how many rows of each file were loaded for each submission
+        published_multiplier: how many published rows were loaded for each row of a submission
+    """
+    with open(path, "w") as results_file:
+        json.dump(
+            {"scale": scale, "published_multiplier": published_multiplier, "rules": results}, results_file, indent=2
+        )
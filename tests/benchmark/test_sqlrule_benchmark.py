@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from tests.benchmark.sqlrule_benchmark import (
+    BENCHMARK_SCALE,
+    PUBLISHED_MULTIPLIER,
+    OTHER_SUBMISSIONS,
+    benchmark_rules,
+    find_regressions,
+    load_benchmark_data,
+    plan_shape,
+    read_baseline,
+    read_rules,
+    write_results,
+)
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+# Rules that already read all of a guarded table, new rules shouldn't be added here without a good reason
+ALLOWED_SEQ_SCANS = {}
+
+
+def benchmark_result(query_name, runtime, plan_shape="Seq Scan[fabs]", seq_scans=None):
+    return {"query_name": query_name, "runtime": runtime, "plan_shape": plan_shape, "seq_scans": seq_scans or []}
+
+
+def test_plan_shape():
+    """The plan shape keeps the node types and tables but none of the costs"""
+    plan = {
+        "Node Type": "Hash Join",
+        "Total Cost": 12.5,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "fabs", "Actual Rows": 3},
+            {"Node Type": "Hash", "Plans": [{"Node Type": "Index Scan", "Relation Name": "published_fabs"}]},
+        ],
+    }
+    assert plan_shape(plan) == "Hash Join(Seq Scan[fabs], Hash(Index Scan[published_fabs]))"
+
+
+def test_find_regressions():
+    """Only rules that got a lot slower or started reading all of a guarded table are regressions"""
+    baseline = {
+        "slower": benchmark_result("slower", 1, "Index Scan[published_fabs]"),
+        "noisy": benchmark_result("noisy", 0.01),
+        "steady": benchmark_result("steady", 1),
+    }
+    results = [
+        benchmark_result("slower", 5, "Seq Scan[published_fabs]", ["published_fabs"]),
+        benchmark_result("noisy", 0.1),
+        benchmark_result("steady", 1.2),
+        benchmark_result("allowed", 1, seq_scans=["detached_award_procurement"]),
+        benchmark_result("new", 10),
+    ]
+
+    regressions = find_regressions(results, baseline, {"allowed": ["detached_award_procurement"]})
+    assert regressions == [
+        "slower reads all of published_fabs with a sequential scan: Seq Scan[published_fabs]",
+        "slower took 5s, up from 1s. Its plan changed from Index Scan[published_fabs] to Seq Scan[published_fabs]",
+    ]
+    assert find_regressions(results[1:], {}, {"allowed": ["detached_award_procurement"]}) == []
+
+
+def test_write_and_read_baseline(tmp_path):
+    """Results written by one run are read back keyed by rule as the baseline of the next"""
+    path = str(tmp_path / "baseline.json")
+    results = [benchmark_result("a", 1), benchmark_result("b", 2)]
+    write_results(path, results, 10, 5)
+
+    assert read_baseline(path) == {"a": results[0], "b": results[1]}
+    assert read_baseline(None) == {}
+
+
+@pytest.mark.skipif(
+    not os.environ.get("SQL_RULE_BENCHMARK"), reason="SQL rule benchmarks only run when SQL_RULE_BENCHMARK is set"
+)
+def test_sqlrule_benchmark(database, job_constants):
+    """No SQL rule got much slower than in the baseline run or started reading all of a published table"""
+    sess = database.session
+    submissions = [SubmissionFactory() for _ in range(OTHER_SUBMISSIONS + 1)]
+    jobs = [JobFactory(submission=submission) for submission in submissions]
+    sess.add_all(submissions + jobs)
+    sess.commit()
+
+    conn = database.connection
+    load_benchmark_data(conn, jobs)
+    results = benchmark_rules(conn, read_rules(), jobs[0].submission_id)
+
+    if os.environ.get("SQL_RULE_BENCHMARK_OUTPUT"):
+        write_results(os.environ["SQL_RULE_BENCHMARK_OUTPUT"], results, BENCHMARK_SCALE, PUBLISHED_MULTIPLIER)
+    regressions = find_regressions(
+        results, read_baseline(os.environ.get("SQL_RULE_BENCHMARK_BASELINE")), ALLOWED_SEQ_SCANS
+    )
+    assert not regressions, "\n".join(regressions)
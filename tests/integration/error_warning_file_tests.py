@@ -2,15 +2,17 @@ import os
 import csv
 import logging
 import itertools
-import pandas as pd
 import psutil as ps
+import pyarrow.parquet as pq
+import shutil
+import tempfile
 from _pytest.monkeypatch import MonkeyPatch
 
 from dataactcore.interfaces.db import GlobalDB
 from dataactcore.config import CONFIG_SERVICES
 from dataactcore.models.domainModels import concat_tas_dict
 from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_TYPE_DICT, JOB_STATUS_DICT, RULE_SEVERITY_DICT
-from dataactcore.models.jobModels import Submission, Job, FileType
+from dataactcore.models.jobModels import Submission, Job, FileType, ValidationTiming
 from dataactcore.models.userModel import User
 from dataactcore.models.errorModels import ErrorMetadata
 from dataactcore.models.stagingModels import (
@@ -385,6 +387,11 @@ class ErrorWarningTests(BaseTestValidator):
         self.session.query(FlexField).delete(synchronize_session="fetch")
         self.session.commit()
 
+    def tearDown(self):
+        """Put back any validator settings a test changed."""
+        self.monkeypatch.undo()
+        super(ErrorWarningTests, self).tearDown()
+
     def test_single_file_warnings(self):
         for chunk_size, parallel, batch_sql in self.CONFIGS:
             self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "CHUNK_SIZE", chunk_size)
@@ -480,6 +487,20 @@ class ErrorWarningTests(BaseTestValidator):
             )
             self.single_file_errors()
 
+    def test_single_file_errors_parallel_rules(self):
+        try:
+            self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "PARALLEL_SQL_VAL", True)
+            self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "SQL_VAL_WORKERS", 3)
+            self.monkeypatch.setattr(dataactvalidator.validation_handlers.validator, "SQL_VALIDATION_BATCH_SIZE", 1)
+            for batch_sql in self.BATCH_SQL_OPTIONS:
+                self.monkeypatch.setattr(
+                    dataactvalidator.validation_handlers.validationManager, "BATCH_SQL_VAL_RESULTS", batch_sql
+                )
+                self.single_file_warnings()
+                self.single_file_errors()
+        finally:
+            self.monkeypatch.undo()
+
     def single_file_errors(self):
         self.cleanup()
 
@@ -1027,6 +1048,10 @@ class ErrorWarningTests(BaseTestValidator):
             )
             self.cross_file_errors()
 
+    def test_cross_file_errors_parallel_pairs(self):
+        self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "PARALLEL_CROSS_VAL", True)
+        self.cross_file_errors()
+
     def cross_file_errors(self):
         self.cleanup()
 
@@ -1121,6 +1146,122 @@ class ErrorWarningTests(BaseTestValidator):
         assert report_content == expected_values
         self.cleanup()
 
+    def test_revalidation_reuses_unchanged_results(self):
+        self.cleanup()
+        self.session.query(Job).delete(synchronize_session="fetch")
+        a_job, b_job = [
+            insert_job(
+                self.session,
+                FILE_TYPE_DICT[file_type],
+                JOB_STATUS_DICT["ready"],
+                JOB_TYPE_DICT["csv_record_validation"],
+                self.submission_id,
+                filename=file,
+            )
+            for file, file_type in [(INVALID_CROSS_A, "appropriations"), (INVALID_CROSS_B, "program_activity")]
+        ]
+        cross_job = insert_job(
+            self.session, None, JOB_STATUS_DICT["ready"], JOB_TYPE_DICT["validation"], self.submission_id
+        )
+        self.session.commit()
+
+        def validate_submission():
+            for job in (a_job, b_job, cross_job):
+                self.validator.validate_job(job.job_id)
+
+        def job_errors(job):
+            errors = self.session.query(ErrorMetadata).filter_by(job_id=job.job_id).all()
+            return sorted((error.original_rule_label, error.occurrences, error.first_row) for error in errors)
+
+        def timing_ids(job):
+            return {
+                timing.validation_timing_id
+                for timing in self.session.query(ValidationTiming).filter_by(job_id=job.job_id)
+            }
+
+        def ran_a_b_pair():
+            pair_rules = (
+                self.session.query(ValidationTiming)
+                .filter(
+                    ValidationTiming.job_id == cross_job.job_id,
+                    ValidationTiming.phase == "cross_file_rule",
+                    ValidationTiming.file_type_id == FILE_TYPE_DICT["appropriations"],
+                    ValidationTiming.target_file_type_id == FILE_TYPE_DICT["program_activity"],
+                )
+                .count()
+            )
+            return pair_rules > 0
+
+        validate_submission()
+        a_errors, cross_errors = job_errors(a_job), job_errors(cross_job)
+        a_timings, b_timings = timing_ids(a_job), timing_ids(b_job)
+        assert len(cross_errors) == 4
+        assert ran_a_b_pair()
+
+        # Nothing changed, so neither file is validated again and the cross-file results of their pair are kept
+        validate_submission()
+        assert timing_ids(a_job) == a_timings
+        assert timing_ids(b_job) == b_timings
+        assert job_errors(a_job) == a_errors
+        assert job_errors(cross_job) == cross_errors
+        assert not ran_a_b_pair()
+        assert os.path.exists(self.get_report_path("appropriations", cross_type="program_activity"))
+
+        # A new B is validated and its pair is run again, A is still left alone
+        b_job.filename = CROSS_FILE_B
+        self.session.commit()
+        validate_submission()
+        assert timing_ids(a_job) == a_timings
+        assert timing_ids(b_job) != b_timings
+        assert ran_a_b_pair()
+        assert job_errors(cross_job) != cross_errors
+        self.cleanup()
+
+    def test_staging_snapshot(self):
+        # The loaded rows are written to a snapshot next to the reports once the file has been validated
+        self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "STAGING_SNAPSHOTS", True)
+        try:
+            self.generate_file_report(APPROP_FILE, "appropriations", warning=True)
+            self.session.refresh(self.val_job)
+            snapshot = pq.read_table(os.path.join(CONFIG_SERVICES["error_report_path"], self.val_job.staging_snapshot))
+            assert snapshot.num_rows == 10
+            assert set(snapshot.column("submission_id").to_pylist()) == {self.submission_id}
+            assert set(snapshot.column("job_id").to_pylist()) == {self.val_job.job_id}
+        finally:
+            self.monkeypatch.undo()
+            self.cleanup()
+
+    def test_single_file_encoding_error_mid_file(self):
+        # A non-UTF8 character late in the file is only found once the earlier chunks are loaded, those get cleared out
+        with open(READ_ERROR, "rb") as read_error_file:
+            file_contents = read_error_file.read()
+        bad_file_dir = tempfile.mkdtemp()
+        bad_file = os.path.join(bad_file_dir, "appropEncodingError.csv")
+        with open(bad_file, "wb") as encoding_error_file:
+            encoding_error_file.write(file_contents + b",49,2016,2017,,100,0,3.03,\xff\n")
+
+        try:
+            for parallel in self.PARALLEL_OPTIONS:
+                self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "CHUNK_SIZE", 2)
+                self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "PARALLEL", parallel)
+                self.setup_csv_record_validation(bad_file, "appropriations")
+                with self.assertRaises(UnicodeDecodeError):
+                    self.validator.validate_job(self.val_job.job_id)
+
+                appro_count = self.session.query(Appropriation).filter_by(submission_id=self.submission_id).count()
+                assert appro_count == 0
+                flex_count = self.session.query(FlexField).filter_by(submission_id=self.submission_id).count()
+                assert flex_count == 0
+                report_headers, report_content = self.get_report_content(
+                    self.get_report_path("appropriations", warning=False)
+                )
+                assert report_headers == self.validator.report_headers
+                assert report_content == []
+                self.cleanup()
+        finally:
+            self.monkeypatch.undo()
+            shutil.rmtree(bad_file_dir)
+
     def test_validation_parallelize_error(self):
         # Test the parallelize function with a broken call to see if the process is properly cleaned up
         self.monkeypatch.setattr(dataactvalidator.validation_handlers.validationManager, "MULTIPROCESSING_POOLS", 2)
@@ -1135,7 +1276,9 @@ class ErrorWarningTests(BaseTestValidator):
         self.validator.is_fabs = False
         self.validator.reader = CsvReader()
         self.validator.error_list = {}
-        self.validator.error_rows = []
+        self.validator.job = self.val_job
+        self.validator.error_row_table = "error_rows_{}".format(self.val_job.job_id)
+        self.validator.create_error_row_table(self.session)
         self.validator.total_rows = 1
         self.validator.total_data_rows = 0
         self.validator.short_rows = []
@@ -1188,11 +1331,7 @@ class ErrorWarningTests(BaseTestValidator):
             is_local=self.validator.is_local,
         )
 
-        # Going back to reprocess the header row
-        self.validator.reader.file.seek(0)
-        reader_obj = pd.read_csv(
-            self.validator.reader.file, dtype=str, delimiter=",", on_bad_lines="skip", na_filter=False, chunksize=2
-        )
+        reader_obj = self.validator.reader.read_chunks(2)
         # Setting this outside of reader/file type objects which may not be used during processing
         self.validator.flex_fields = ["flex_field_a", "flex_field_b"]
         self.validator.header_dict = self.validator.reader.header_dict
@@ -1202,16 +1341,17 @@ class ErrorWarningTests(BaseTestValidator):
 
         # Making a broken list of chunks (one that should process fine, another with an error, another fine)
         # This way we can tell that the latter chunks processed later are ignored due to the error
-        normal_chunks = list(reader_obj)
-        broken_chunks = [normal_chunks[0], "BREAK", normal_chunks[1], normal_chunks[2]]
         file_row_count = 100
+        normal_chunks = [(file_chunk.data, file_row_count) for file_chunk in reader_obj]
+        broken_chunks = [normal_chunks[0], ("BREAK", file_row_count), normal_chunks[1], normal_chunks[2]]
 
         with self.assertRaises(Exception) as val_except:
             # making the reader object a list of strings instead, causing the inner function to break
-            self.validator.parallel_data_loading(broken_chunks, file_row_count)
+            self.validator.parallel_data_loading(broken_chunks)
         self.assertTrue(isinstance(val_except.exception, AttributeError))
         self.assertTrue(str(val_except.exception) == "'str' object has no attribute 'empty'")
 
         # Check to see the processes are killed
         job = ps.Process(os.getpid())
         assert len(job.children(recursive=True)) == 0
+        self.validator.drop_error_row_table(self.session)
@@ -48,6 +48,8 @@ def database(full_database_setup):
     db.session.expire_all()
     # rollback all open transactions
     db.scoped_session_maker.rollback()
+    # forget the instances loaded by this test so the next one can't try to refresh them after they're deleted
+    db.session.expunge_all()
     for table in tables_in_drop_order:
         db.session.query(table).delete(synchronize_session=False)
 
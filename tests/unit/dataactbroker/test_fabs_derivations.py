@@ -1,4 +1,20 @@
-from dataactbroker.helpers.fabs_derivations_helper import fabs_derivations
+from datetime import timedelta
+
+import pytest
+
+from dataactbroker.helpers import fabs_derivations_helper, fabs_reference_cache
+from dataactbroker.helpers.fabs_derivations_helper import (
+    fabs_derivations,
+    derivation_pass_query,
+    schedule_derivations,
+    schedule_indexes,
+    split_derivations,
+    FABSDerivation,
+    FABS_DERIVATIONS,
+    FABS_SQL_DERIVATIONS_AFTER_CACHE,
+    FABS_SQL_DERIVATIONS_BEFORE_CACHE,
+    TMP_FABS_INDEXES,
+)
 from dataactcore.models.lookups import (
     ACTION_TYPE_DICT,
     ASSISTANCE_TYPE_DICT,
@@ -34,6 +50,16 @@ from tests.unit.dataactcore.factories.domain import (
 from tests.unit.dataactcore.factories.staging import PublishedFABSFactory
 
 
+@pytest.fixture(autouse=True, params=["sql", "reference_cache"])
+def derivation_backend(request, monkeypatch):
+    """Run every test with the derivations in SQL and with the location and office ones from the reference cache,
+    reloading the cache each time so it sees the test's reference data and deriving a couple of rows at a time"""
+    monkeypatch.setattr(fabs_derivations_helper, "FABS_REFERENCE_CACHE", request.param == "reference_cache")
+    monkeypatch.setattr(fabs_derivations_helper, "REFERENCE_CACHE_BATCH_SIZE", 2)
+    monkeypatch.setattr(fabs_reference_cache, "REFERENCE_CACHE_TTL", timedelta(0))
+    return request.param
+
+
 def initialize_db_values(db):
     """Initialize the values in the DB that can be used throughout the tests"""
     # Zips
@@ -1407,3 +1433,138 @@ def test_derive_ppop_scope(database):
     database.session.commit()
     fabs_obj = get_derived_fabs(database, submission_id)
     assert fabs_obj.place_of_performance_scope == "City-wide"
+
+
+def test_schedule_derivations():
+    """Derivations only wait on the ones setting columns they read, while the ones setting the same columns or columns
+    read earlier keep their order"""
+    zip5 = FABSDerivation(
+        "zip5", {"legal_entity_zip5": "LEFT(legal_entity_zip_last4, 5)"}, inputs=["legal_entity_zip_last4"]
+    )
+    funding = FABSDerivation(
+        "funding", {"total_funding_amount": "federal_action_obligation"}, inputs=["federal_action_obligation"]
+    )
+    city = FABSDerivation("city", {"legal_entity_city_name": "legal_entity_zip5"}, inputs=["legal_entity_zip5"])
+    later_zip5 = FABSDerivation("later zip5", {"legal_entity_zip5": "'00000'"}, inputs=[])
+    later_funding = FABSDerivation("later funding", {"total_funding_amount": "0"}, inputs=["uri"], where="uri IS NULL")
+    passes = schedule_derivations([zip5, funding, city, later_zip5, later_funding])
+    assert passes == [[zip5, funding, later_funding], [city, later_zip5]]
+
+    # every derivation in a pass can be run together
+    assert len(schedule_derivations(FABS_DERIVATIONS)) < len(FABS_DERIVATIONS)
+
+
+def test_schedule_derivations_checks_declarations():
+    """Derivations have to declare every column their SQL reads and only set or read tmp_fabs columns"""
+    undeclared = FABSDerivation("undeclared", {"legal_entity_zip5": "legal_entity_zip_last4"}, inputs=[])
+    with pytest.raises(ValueError, match="reads undeclared columns: legal_entity_zip_last4"):
+        schedule_derivations([undeclared])
+
+    unused = FABSDerivation("unused", {"legal_entity_zip5": "'00000'"}, inputs=["uri"])
+    with pytest.raises(ValueError, match="declares unused inputs: uri"):
+        schedule_derivations([unused])
+
+    unknown = FABSDerivation("unknown", {"not_a_column": "uri"}, inputs=["uri"])
+    with pytest.raises(ValueError, match="tmp_fabs doesn't have: not_a_column"):
+        schedule_derivations([unknown])
+
+    bad_index = FABSDerivation("bad index", {"uri": "fain"}, inputs=["fain"], indexes=["not_an_index"])
+    with pytest.raises(ValueError, match="declares unknown indexes: not_an_index"):
+        schedule_derivations([bad_index])
+
+    twice = FABSDerivation("twice", {"uri": "fain"}, inputs=["fain"])
+    with pytest.raises(ValueError, match="declared more than once"):
+        schedule_derivations([twice, twice])
+
+
+def test_derivation_pass_query(database):
+    """Derivations in a pass read the values from before the pass and the last one matching a row sets its columns"""
+    initialize_db_values(database)
+    submission_id = initialize_test_row(database, fain="FAIN", le_zip5="12345", submission_id=2)
+    derivations = [
+        FABSDerivation("fain", {"uri": "fain"}, inputs=["fain"]),
+        FABSDerivation("no match", {"uri": "'no match'"}, inputs=["fain"], where="fain IS NULL"),
+        FABSDerivation("zip", {"legal_entity_zip5": "'54321'"}, inputs=[]),
+        FABSDerivation("old zip", {"legal_entity_city_name": "legal_entity_zip5"}, inputs=["legal_entity_zip5"]),
+        FABSDerivation(
+            "zip city",
+            {"legal_entity_state_code": "state_code"},
+            inputs=["legal_entity_zip5"],
+            source="zip_city",
+            where="zip_code = legal_entity_zip5",
+        ),
+    ]
+    database.session.execute(derivation_pass_query(derivations).format(submission_id=submission_id))
+    database.session.commit()
+
+    fabs_obj = get_derived_fabs(database, submission_id)
+    assert fabs_obj.uri == "FAIN"
+    assert fabs_obj.legal_entity_zip5 == "54321"
+    assert fabs_obj.legal_entity_city_name == "12345"
+    assert fabs_obj.legal_entity_state_code == "NY"
+
+
+def test_split_derivations():
+    """Derivations run before the cached ones unless they depend on them or on a derivation already running after"""
+    cached = FABSDerivation("cached", {"legal_entity_city_name": "'CITY'"}, inputs=[])
+    independent = FABSDerivation("independent", {"uri": "fain"}, inputs=["fain"])
+    dependent = FABSDerivation("dependent", {"fain": "legal_entity_city_name"}, inputs=["legal_entity_city_name"])
+    indirect = FABSDerivation("indirect", {"uri": "fain"}, inputs=["fain"])
+    before, cached_derivations, after = split_derivations([cached, independent, dependent, indirect], {"cached"})
+    assert [derivation.name for derivation in before] == ["independent"]
+    assert [derivation.name for derivation in cached_derivations] == ["cached"]
+    assert [derivation.name for derivation in after] == ["dependent", "indirect"]
+
+    with pytest.raises(ValueError, match="both before and after the cached derivations"):
+        split_derivations(
+            [cached, dependent, FABSDerivation("later", {"fain": "uri"}, inputs=["uri"])], {"cached", "later"}
+        )
+
+    with pytest.raises(ValueError, match="Unknown cached derivations: missing"):
+        split_derivations([cached], {"cached", "missing"})
+
+    # Every location and office derivation can be computed from the cache, leaving the SQL ones around them
+    assert set(fabs_reference_cache.CACHED_DERIVATIONS) <= {derivation.name for derivation in FABS_DERIVATIONS}
+    assert [derivation.name for derivation in FABS_SQL_DERIVATIONS_AFTER_CACHE] == [
+        "PII redacted USA records",
+        "PII redacted non-USA records",
+        "ppop scope with non-null zip",
+        "ppop scope with null zip",
+    ]
+
+
+def test_schedule_indexes():
+    """Indexes are built before the first of a run of passes using them and dropped after its last one"""
+    uei = FABSDerivation("uei", {"uri": "uei"}, inputs=["uei"], indexes=["uei_upper", "record_type"])
+    fain = FABSDerivation("fain", {"fain": "uri"}, inputs=["uri"], indexes=["record_type"])
+    no_index = FABSDerivation("no index", {"total_funding_amount": "0"}, inputs=[])
+    later_uei = FABSDerivation("later uei", {"uri": "LOWER(uei)"}, inputs=["uei"], indexes=["uei_upper"])
+    builds, drops = schedule_indexes([[uei], [fain], [no_index], [later_uei]])
+    assert builds == [["record_type", "uei_upper"], [], [], ["uei_upper"]]
+    assert drops == [["uei_upper"], ["record_type"], [], ["uei_upper"]]
+
+
+def test_fabs_derivations_index_report(database, derivation_backend):
+    """Every declared index of the derivations run in SQL is built and dropped during the derivations, reporting its
+    build time and usage"""
+    initialize_db_values(database)
+    submission_id = initialize_test_row(database, submission_id=2)
+    index_report = fabs_derivations(database.session, submission_id)
+    database.session.commit()
+
+    sql_derivations = FABS_DERIVATIONS
+    if derivation_backend == "reference_cache":
+        sql_derivations = FABS_SQL_DERIVATIONS_BEFORE_CACHE + FABS_SQL_DERIVATIONS_AFTER_CACHE
+    declared_indexes = {name for derivation in sql_derivations for name in derivation.indexes}
+    assert set(index_report) == declared_indexes
+    assert declared_indexes <= set(TMP_FABS_INDEXES)
+    # Built for each run of passes using it, once before and once after the cached derivations with the reference cache
+    assert index_report["record_type"]["builds"] == (3 if derivation_backend == "sql" else 2)
+    for usage in index_report.values():
+        assert usage["build_seconds"] >= 0
+        assert usage["scans"] >= 0
+
+    remaining_indexes = database.session.execute(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'tmp_fabs_{}'".format(submission_id)
+    ).fetchall()
+    assert [index.indexname for index in remaining_indexes] == ["tmp_fabs_{}_pkey".format(submission_id)]
@@ -0,0 +1,106 @@
+from dataactbroker.helpers.fabs_publish_helper import (
+    create_tmp_fabs,
+    derive_fabs_partitions,
+    drop_fabs_partitions,
+    insert_published_fabs,
+)
+from dataactbroker.helpers.fabs_derivations_helper import fabs_derivations
+from dataactcore.models.stagingModels import PublishedFABS
+
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import FABSFactory
+
+
+def add_fabs_rows(sess, submission_id):
+    """Add valid, invalid and delete rows to a submission, returning the afa_generated_unique of the publishable ones"""
+    rows = [
+        FABSFactory(
+            submission_id=submission_id,
+            afa_generated_unique="AWARD_{}".format(number),
+            action_date="20230105",
+            correction_delete_indicatr=None,
+            federal_action_obligation=number,
+            non_federal_funding_amount=1,
+            is_valid=True,
+        )
+        for number in range(20)
+    ]
+    rows.append(
+        FABSFactory(submission_id=submission_id, afa_generated_unique="INVALID", action_date="20230105", is_valid=False)
+    )
+    rows.append(
+        FABSFactory(
+            submission_id=submission_id,
+            afa_generated_unique="DELETED",
+            action_date="20230105",
+            correction_delete_indicatr="d",
+            is_valid=True,
+        )
+    )
+    sess.add_all(rows)
+    sess.commit()
+    return {"AWARD_{}".format(number) for number in range(20)}
+
+
+def published_rows(sess, submission_id):
+    """The afa_generated_unique and total funding amount of each published record of a submission"""
+    rows = sess.query(PublishedFABS).filter_by(submission_id=submission_id)
+    return {row.afa_generated_unique: row.total_funding_amount for row in rows}
+
+
+def test_derive_fabs_partitions(database):
+    """Every publishable record is derived in exactly one partition, and publishing from the partitions gives the same
+    records as publishing from a single tmp_fabs table"""
+    sess = database.session
+    partitioned_submission = SubmissionFactory(is_fabs=True)
+    single_submission = SubmissionFactory(is_fabs=True)
+    sess.add_all([partitioned_submission, single_submission])
+    sess.commit()
+    partitioned_id = partitioned_submission.submission_id
+    single_id = single_submission.submission_id
+    publishable = add_fabs_rows(sess, partitioned_id)
+    add_fabs_rows(sess, single_id)
+
+    source_tables = derive_fabs_partitions(sess, partitioned_id, 3)
+    assert len(source_tables) == 3
+    partition_keys = [
+        {row.afa_generated_unique for row in sess.execute("SELECT afa_generated_unique FROM {}".format(table))}
+        for table in source_tables
+    ]
+    assert set().union(*partition_keys) == publishable
+    assert sum(len(keys) for keys in partition_keys) == len(publishable)
+
+    insert_published_fabs(sess, partitioned_id, source_tables)
+    drop_fabs_partitions(sess, partitioned_id, 3)
+    sess.commit()
+
+    create_tmp_fabs(sess, single_id)
+    fabs_derivations(sess, single_id)
+    insert_published_fabs(sess, single_id, ["tmp_fabs_{}".format(single_id)])
+    sess.commit()
+
+    assert set(published_rows(sess, partitioned_id)) == publishable
+    assert published_rows(sess, partitioned_id) == published_rows(sess, single_id)
+    remaining_tables = sess.execute(
+        "SELECT tablename FROM pg_tables WHERE tablename LIKE 'fabs_publish_{}_part_%'".format(partitioned_id)
+    ).fetchall()
+    assert remaining_tables == []
+
+
+def test_drop_fabs_partitions_rolled_back(database):
+    """Dropping the partitions is part of the publishing transaction, they're kept until it's committed"""
+    sess = database.session
+    submission = SubmissionFactory(is_fabs=True)
+    sess.add(submission)
+    sess.commit()
+    add_fabs_rows(sess, submission.submission_id)
+
+    source_tables = derive_fabs_partitions(sess, submission.submission_id, 2)
+    drop_fabs_partitions(sess, submission.submission_id, 2)
+    sess.rollback()
+    for table in source_tables:
+        assert sess.execute("SELECT COUNT(*) FROM {}".format(table)).scalar() >= 0
+
+    drop_fabs_partitions(sess, submission.submission_id, 2)
+    sess.commit()
+    assert sess.execute("SELECT to_regclass('{}')".format(source_tables[0])).scalar() is None
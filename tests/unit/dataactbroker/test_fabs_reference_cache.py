@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from dataactbroker.helpers import fabs_reference_cache
+from dataactbroker.helpers.fabs_reference_cache import ReferenceTable, get_fabs_reference_cache
+from dataactcore.models.domainModels import Zips
+
+from tests.unit.dataactcore.factories.domain import StatesFactory, ZipsFactory
+
+
+def test_reference_table_lookup():
+    """Rows are found by all their key columns, keeping the first row of a repeated key and leaving out NULL keys"""
+    table = ReferenceTable(
+        {
+            "zip5": pd.Categorical(["12345", "12345", "12345", None]),
+            "zip_last4": pd.Categorical(["6789", "0000", "6789", "6789"]),
+            "county_number": pd.Categorical(["001", "002", "003", "004"]),
+        },
+        ["zip5", "zip_last4"],
+    )
+    assert len(table) == 2
+
+    positions = table.lookup(
+        pd.Series(["12345", "12345", None, "12345"], dtype=object),
+        pd.Series(["6789", "0000", "6789", None], dtype=object),
+    )
+    assert list(positions) == [0, 1, -1, -1]
+    counties = table.values("county_number", positions)
+    assert list(counties[:2]) == ["001", "002"]
+    assert all(pd.isna(county) for county in counties[2:])
+
+
+def test_load_reference_table(database, monkeypatch):
+    """Tables are loaded in chunks into Categoricals, the same as one read all at once"""
+    monkeypatch.setattr(fabs_reference_cache, "REFERENCE_CHUNK_SIZE", 2)
+    sess = database.session
+    sess.add_all(
+        [
+            ZipsFactory(zip5="12345", zip_last4="6789", county_number="001"),
+            ZipsFactory(zip5="12345", zip_last4="0000", county_number="001"),
+            ZipsFactory(zip5="54321", zip_last4="6789", county_number="002"),
+        ]
+    )
+    sess.commit()
+
+    query, key_columns = fabs_reference_cache.reference_table_queries()["zips"]
+    table = fabs_reference_cache.load_reference_table(sess.connection(), query.order_by(Zips.zip5), key_columns)
+    assert len(table) == 3
+    assert isinstance(table.columns["county_number"], pd.Categorical)
+    assert list(table.columns["county_number"].categories) == ["001", "002"]
+    positions = table.lookup(pd.Series(["54321"], dtype=object), pd.Series(["6789"], dtype=object))
+    assert list(table.values("county_number", positions)) == ["002"]
+
+    empty_query, empty_keys = fabs_reference_cache.reference_table_queries()["cd_state_grouped"]
+    empty_table = fabs_reference_cache.load_reference_table(sess.connection(), empty_query, empty_keys)
+    assert len(empty_table) == 0
+    assert list(empty_table.lookup(pd.Series(["NY"], dtype=object))) == [-1]
+
+
+def test_get_fabs_reference_cache(database, monkeypatch):
+    """The cache is loaded once per worker and only loaded again once it's stale"""
+    monkeypatch.setattr(fabs_reference_cache, "_reference_cache", None)
+    sess = database.session
+    sess.add(StatesFactory(state_code="NY", state_name="New York"))
+    sess.commit()
+
+    reference_cache = get_fabs_reference_cache(sess)
+    assert get_fabs_reference_cache(sess) is reference_cache
+    states = reference_cache.tables["states"]
+    assert list(states.values("state_name", states.lookup(pd.Series(["NY"], dtype=object)))) == ["New York"]
+    assert set(reference_cache.tables) == set(fabs_reference_cache.reference_table_queries())
+
+    monkeypatch.setattr(fabs_reference_cache, "REFERENCE_CACHE_TTL", timedelta(0))
+    assert get_fabs_reference_cache(sess) is not reference_cache
+
+
+def test_derive_ppop_zip():
+    """The ppop zip is only split when it's a valid 5 or 9 digit zip, like the SQL derivation's regex"""
+    frame = pd.DataFrame(
+        {
+            "place_of_performance_zip4a": ["12345", "12345-6789", "123456789", "12345\n", "city-wide", None],
+            "place_of_performance_zip5": [None] * 6,
+            "place_of_perform_zip_last4": [None] * 6,
+        },
+        dtype=object,
+    )
+    fabs_reference_cache.CACHED_DERIVATIONS["place of performance zip5 and zip last4"](None, frame, None)
+    assert list(frame["place_of_performance_zip5"]) == ["12345", "12345", "12345", None, None, None]
+    assert list(frame["place_of_perform_zip_last4"].replace({np.nan: None})) == [None, "6789", "6789", None, None, None]
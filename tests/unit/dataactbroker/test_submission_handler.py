@@ -50,6 +50,7 @@ from dataactcore.models.stagingModels import (
     TotalObligations,
     PublishedTotalObligations,
 )
+from dataactcore.utils import staging_snapshot
 from dataactcore.utils.ResponseError import ResponseError
 
 from tests.unit.dataactcore.factories.domain import CGACFactory, FRECFactory
@@ -1643,3 +1644,52 @@ def test_move_published_data(database):
         approp_query = sess.query(PublishedAppropriation).filter_by(submission_id=sub_1.submission_id).all()
         assert len(approp_query) == 1
         assert approp_query[0].spending_authority_from_of_cpe == 2
+
+
+@pytest.mark.usefixtures("job_constants")
+def test_move_published_data_from_snapshot(database, monkeypatch, tmp_path):
+    """Staging tables with a snapshot are published from it, the others are still copied from staging"""
+    monkeypatch.setattr(staging_snapshot, "CONFIG_SERVICES", {"error_report_path": str(tmp_path)})
+    with Flask("test-app").app_context():
+        sess = database.session
+
+        sub = SubmissionFactory()
+        approp_job = JobFactory(
+            submission=sub,
+            job_type_id=JOB_TYPE_DICT["csv_record_validation"],
+            file_type_id=FILE_TYPE_DICT["appropriations"],
+        )
+        ocpa_job = JobFactory(
+            submission=sub,
+            job_type_id=JOB_TYPE_DICT["csv_record_validation"],
+            file_type_id=FILE_TYPE_DICT["program_activity"],
+        )
+        sess.add_all([sub, approp_job, ocpa_job])
+        sess.commit()
+
+        approp = Appropriation(
+            submission_id=sub.submission_id, job_id=approp_job.job_id, row_number=2, spending_authority_from_of_cpe=2
+        )
+        ocpa = ObjectClassProgramActivity(submission_id=sub.submission_id, job_id=ocpa_job.job_id, row_number=2)
+        sess.add_all([approp, ocpa])
+        sess.commit()
+
+        snapshot_name = staging_snapshot.snapshot_file_name(sub.submission_id, approp_job.job_id, "appropriation")
+        staging_snapshot.write_staging_snapshot(
+            sess.connection(), Appropriation, sub.submission_id, str(tmp_path / snapshot_name)
+        )
+        approp_job.staging_snapshot = snapshot_name
+        # Only the snapshot is read for the appropriation rows, not the staging table
+        approp.spending_authority_from_of_cpe = 5
+        sess.commit()
+
+        move_published_data(sess, sub.submission_id)
+        # Republishing replaces the rows loaded from the snapshot
+        move_published_data(sess, sub.submission_id)
+        sess.commit()
+
+        approp_query = sess.query(PublishedAppropriation).filter_by(submission_id=sub.submission_id).all()
+        assert len(approp_query) == 1
+        assert approp_query[0].spending_authority_from_of_cpe == 2
+        assert approp_query[0].job_id == approp_job.job_id
+        assert sess.query(PublishedObjectClassProgramActivity).filter_by(submission_id=sub.submission_id).count() == 1
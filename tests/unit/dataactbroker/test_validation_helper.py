@@ -1,23 +1,27 @@
+from datetime import datetime
+
 import pandas as pd
 from pandas.testing import assert_frame_equal
 import numpy as np
-import os
 
 import pytest
 
 from dataactbroker.helpers import validation_helper
 from dataactvalidator.app import ValidationManager, ValidationError
-from dataactvalidator.filestreaming.csvReader import CsvReader
-from dataactcore.models.domainModels import CGAC, FREC, SubTierAgency
-from dataactcore.models.validationModels import FileColumn
-from dataactcore.models.lookups import FIELD_TYPE_DICT, JOB_STATUS_DICT, JOB_TYPE_DICT, FILE_TYPE_DICT
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.models.domainModels import concat_display_tas_dict, concat_display_tas_dict_vectorized
+from dataactcore.models.jobModels import RevalidationThreshold, SubmissionWindowSchedule
+from dataactcore.models.validationModels import FileColumn, RuleSql
+from dataactcore.models.lookups import (
+    FIELD_TYPE_DICT,
+    JOB_STATUS_DICT,
+    JOB_TYPE_DICT,
+    FILE_TYPE_DICT,
+    RULE_SEVERITY_DICT,
+)
 
 from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
 
-FILES_DIR = os.path.join("tests", "integration", "data")
-READ_ERROR = os.path.join(FILES_DIR, "appropReadError.csv")
-BLANK_C = os.path.join(FILES_DIR, "awardFinancialBlank.csv")
-
 
 def test_is_valid_type():
     assert validation_helper.is_valid_type(None, "STRING") is True
@@ -260,53 +264,58 @@ def test_derive_fabs_afa_generated_unique():
     assert validation_helper.derive_fabs_afa_generated_unique(row) == "-none-_-none-_-none-_-none-_-none-"
 
 
-def test_retrieve_agency_codes(database):
-    sess = database.session
-    cgac = CGAC(cgac_code="0000", agency_name="Example Agency")
-    sess.add(cgac)
-    sess.commit()
-
-    frec = FREC(frec_code="0001", cgac_id=cgac.cgac_id, agency_name="Example FREC")
-    sess.add(frec)
-    sess.commit()
-
-    sub_tiers = [
-        SubTierAgency(
-            cgac_id=cgac.cgac_id,
-            frec_id=frec.frec_id,
-            sub_tier_agency_code="0123",
-            sub_tier_agency_name="Example Sub Tier",
-            is_frec=True,
-        ),
-        SubTierAgency(
-            cgac_id=cgac.cgac_id,
-            frec_id=frec.frec_id,
-            sub_tier_agency_code="0124",
-            sub_tier_agency_name="Another Example Sub Tier",
-            is_frec=False,
-        ),
-    ]
-    sess.add_all(sub_tiers)
-    sess.commit()
-    df = pd.DataFrame(
+def test_derive_fabs_awarding_sub_tier_vectorized():
+    """The vectorized derivation matches the row-wise one for every row"""
+    frame = pd.DataFrame(
         {
-            "awarding_sub_tier_agency_c": ["0123", None, "0124", None],
-            "fain": ["FAIN", "FAIN", "FAIN", None],
-            "uri": ["URI", None, "URI", "URI"],
-            "record_type": ["1", "1", "2", "2"],
+            "awarding_sub_tier_agency_c": ["9876", None, None, None],
+            "awarding_office_code": ["4567", "4567", "0000", None],
         }
     )
-    result = ValidationManager().retrieve_agency_codes(df, sess)
-    expected_df = pd.DataFrame(
+    office_list = {"4567": "0123"}
+    expected = [validation_helper.derive_fabs_awarding_sub_tier(row, office_list) for _, row in frame.iterrows()]
+    assert validation_helper.derive_fabs_awarding_sub_tier_vectorized(frame, office_list).tolist() == expected
+    assert expected == ["9876", "0123", None, None]
+
+
+def test_derive_fabs_afa_generated_unique_vectorized():
+    """The vectorized derivation matches the row-wise one for every row"""
+    frame = pd.DataFrame(
         {
-            "awarding_sub_tier_agency_c": ["0123", "0124"],
-            "awarding_agency_code": ["0001", "0000"],
+            "awarding_sub_tier_agency_c": ["0123", "0123", None],
+            "fain": ["FAIN", None, None],
+            "uri": ["URI", "URI", None],
+            "assistance_listing_number": ["4567", "4567", None],
+            "award_modification_amendme": ["0", None, None],
         }
     )
-    pd.testing.assert_frame_equal(
-        result.sort_values(by="awarding_sub_tier_agency_c"),
-        expected_df.sort_values(by="awarding_sub_tier_agency_c"),
-    )
+    expected = [validation_helper.derive_fabs_afa_generated_unique(row) for _, row in frame.iterrows()]
+    assert validation_helper.derive_fabs_afa_generated_unique_vectorized(frame).tolist() == expected
+    assert expected == ["0123_FAIN_URI_4567_0", "0123_-none-_URI_4567_-none-", "-none-_-none-_-none-_-none-_-none-"]
+
+
+def test_concat_display_tas_dict_vectorized():
+    """The vectorized display TAS matches the row-wise one for every combination of missing components"""
+    components = {
+        "allocation_transfer_agency": "011",
+        "agency_identifier": "097",
+        "beginning_period_of_availa": "2020",
+        "ending_period_of_availabil": "2021",
+        "availability_type_code": "X",
+        "main_account_code": "1234",
+        "sub_account_code": "000",
+    }
+    rows = []
+    for missing in range(2 ** len(components)):
+        rows.append(
+            {col: (None if missing & (1 << index) else value) for index, (col, value) in enumerate(components.items())}
+        )
+    frame = pd.DataFrame(rows)
+    expected = [concat_display_tas_dict(row) for _, row in frame.iterrows()]
+    assert concat_display_tas_dict_vectorized(frame).tolist() == expected
+    assert expected[0] == "011-097-X-1234-000"
+    assert expected[16] == "011-097-2020/2021-1234-000"
+    assert expected[-1] == ""
 
 
 def test_derive_fabs_unique_award_key(database):
@@ -342,6 +351,14 @@ def test_apply_label():
     assert validation_helper.apply_label(row, labels, is_fabs=False) == ""
 
 
+def test_apply_label_vectorized():
+    labels = {"field_name": "field_label"}
+    field_names = pd.Series(["field_name", "other_field_name"])
+    assert validation_helper.apply_label_vectorized(field_names, labels, is_fabs=True).tolist() == ["field_label", ""]
+    assert validation_helper.apply_label_vectorized(field_names, labels, is_fabs=False).tolist() == ["", ""]
+    assert validation_helper.apply_label_vectorized(field_names, {}, is_fabs=True).tolist() == ["", ""]
+
+
 def test_gather_flex_fields():
     flex_data = pd.DataFrame({"row_number": ["1", "2", "3", "4", "5"], "concatted": ["A", "B", "C", "D", "E"]})
     row = {"Row Number": "4"}
@@ -349,6 +366,15 @@ def test_gather_flex_fields():
     assert validation_helper.gather_flex_fields(row, None) == ""
 
 
+def test_gather_flex_fields_vectorized():
+    flex_data = pd.DataFrame({"row_number": ["1", "2", "3", "4", "5"], "concatted": ["A", "B", "C", "D", "E"]})
+    row_numbers = pd.Series(["4", "2", "4"], index=[7, 8, 9])
+    flex_fields = validation_helper.gather_flex_fields_vectorized(row_numbers, flex_data)
+    assert flex_fields.tolist() == ["D", "B", "D"]
+    assert flex_fields.index.tolist() == [7, 8, 9]
+    assert validation_helper.gather_flex_fields_vectorized(row_numbers, None).tolist() == ["", "", ""]
+
+
 def test_valid_type():
     str_field = FileColumn(field_types_id=FIELD_TYPE_DICT["STRING"])
     int_field = FileColumn(field_types_id=FIELD_TYPE_DICT["INT"])
@@ -372,6 +398,19 @@ def test_expected_type():
     assert validation_helper.expected_type(row, csv_schema) == "This field must be a decimal"
 
 
+def test_expected_type_vectorized():
+    bool_field = FileColumn(field_types_id=FIELD_TYPE_DICT["BOOLEAN"])
+    dec_field = FileColumn(field_types_id=FIELD_TYPE_DICT["DECIMAL"])
+    csv_schema = {"bool_field": bool_field, "dec_field": dec_field}
+
+    field_names = pd.Series(["bool_field", "dec_field", "bool_field"])
+    assert validation_helper.expected_type_vectorized(field_names, csv_schema).tolist() == [
+        "This field must be a boolean",
+        "This field must be a decimal",
+        "This field must be a boolean",
+    ]
+
+
 def test_valid_length():
     length_field = FileColumn(length=5)
     non_length_field = FileColumn()
@@ -396,6 +435,18 @@ def test_expected_length():
     assert validation_helper.expected_length(row, csv_schema) == "Max length: None"
 
 
+def test_expected_length_vectorized():
+    length_field = FileColumn(length=5)
+    non_length_field = FileColumn()
+    csv_schema = {"length_field": length_field, "non_length_field": non_length_field}
+
+    field_names = pd.Series(["length_field", "non_length_field"])
+    assert validation_helper.expected_length_vectorized(field_names, csv_schema).tolist() == [
+        "Max length: 5",
+        "Max length: None",
+    ]
+
+
 def test_update_field_name():
     short_cols = {"short_field_name": "sfn"}
 
@@ -405,11 +456,29 @@ def test_update_field_name():
     assert validation_helper.update_field_name(row, short_cols) == "long_field_name"
 
 
+def test_update_field_name_vectorized():
+    short_cols = {"short_field_name": "sfn"}
+
+    field_names = pd.Series(["short_field_name", "long_field_name"])
+    assert validation_helper.update_field_name_vectorized(field_names, short_cols).tolist() == [
+        "sfn",
+        "long_field_name",
+    ]
+
+
 def test_add_field_name_to_value():
     row = {"Field Name": "field_name", "Value Provided": "value_provided"}
     assert validation_helper.add_field_name_to_value(row) == "field_name: value_provided"
 
 
+def test_add_field_name_to_value_vectorized():
+    errors = pd.DataFrame({"Field Name": ["field_name", "other_name"], "Value Provided": ["value_provided", "other"]})
+    assert validation_helper.add_field_name_to_value_vectorized(errors).tolist() == [
+        "field_name: value_provided",
+        "other_name: other",
+    ]
+
+
 def test_check_required():
     data = pd.DataFrame(
         {
@@ -646,12 +715,6 @@ def test_process_formatting_errors():
     )
 
 
-def test_simple_file_scan():
-    # Note: only testing locally
-    assert validation_helper.simple_file_scan(CsvReader(), None, None, READ_ERROR) == (11, [5], [2, 3, 7], [], [])
-    assert validation_helper.simple_file_scan(CsvReader(), None, None, BLANK_C) == (5, [], [], [3], [4])
-
-
 @pytest.mark.usefixtures("job_constants")
 def test_update_val_progress(database):
     sess = database.session
@@ -697,3 +760,85 @@ def test_update_cross_val_progress(database):
 
     validation_helper.update_cross_val_progress(sess, job, 2, 4, 1)
     assert job.progress == 56.25
+
+
+def test_get_file_fingerprint(tmp_path, monkeypatch):
+    """Files with the same content have the same fingerprint wherever they are"""
+    monkeypatch.setitem(CONFIG_BROKER, "use_aws", False)
+    first_file = tmp_path / "first.csv"
+    first_file.write_text("a,b\n1,2\n")
+    same_file = tmp_path / "same.csv"
+    same_file.write_text("a,b\n1,2\n")
+    changed_file = tmp_path / "changed.csv"
+    changed_file.write_text("a,b\n1,3\n")
+
+    fingerprint = validation_helper.get_file_fingerprint(str(first_file))
+    assert fingerprint == validation_helper.get_file_fingerprint(str(same_file))
+    assert fingerprint != validation_helper.get_file_fingerprint(str(changed_file))
+    assert validation_helper.get_file_fingerprint(str(tmp_path / "missing.csv")) is None
+
+
+@pytest.mark.usefixtures("job_constants", "validation_constants")
+def test_get_rules_fingerprint(database):
+    """The fingerprint of a file's rules only changes when its own rules do, not when they're reloaded as they were"""
+    sess = database.session
+
+    def make_rule(label, file_type, cross_file=False, rule_sql="SELECT 1 AS row_number"):
+        return RuleSql(
+            rule_sql=rule_sql,
+            rule_label=label,
+            rule_error_message="rule {}".format(label),
+            query_name=label.lower(),
+            file_id=FILE_TYPE_DICT[file_type],
+            target_file_id=FILE_TYPE_DICT["program_activity"] if cross_file else None,
+            rule_severity_id=RULE_SEVERITY_DICT["fatal"],
+            rule_cross_file_flag=cross_file,
+        )
+
+    sess.add_all([make_rule("A1", "appropriations"), make_rule("A2", "appropriations", cross_file=True)])
+    sess.commit()
+    a_fingerprint = validation_helper.get_rules_fingerprint(sess, FILE_TYPE_DICT["appropriations"])
+    b_fingerprint = validation_helper.get_rules_fingerprint(sess, FILE_TYPE_DICT["program_activity"])
+    cross_fingerprint = validation_helper.get_rules_fingerprint(sess)
+    assert len({a_fingerprint, b_fingerprint, cross_fingerprint}) == 3
+
+    # Reloading the same rules gives them new IDs but the same fingerprint
+    sess.query(RuleSql).delete()
+    sess.add_all([make_rule("A2", "appropriations", cross_file=True), make_rule("A1", "appropriations")])
+    sess.commit()
+    assert validation_helper.get_rules_fingerprint(sess, FILE_TYPE_DICT["appropriations"]) == a_fingerprint
+    assert validation_helper.get_rules_fingerprint(sess) == cross_fingerprint
+
+    # Changing a file's rule only changes that file's fingerprint
+    sess.add(make_rule("B1", "program_activity", rule_sql="SELECT 2 AS row_number"))
+    sess.commit()
+    assert validation_helper.get_rules_fingerprint(sess, FILE_TYPE_DICT["appropriations"]) == a_fingerprint
+    assert validation_helper.get_rules_fingerprint(sess, FILE_TYPE_DICT["program_activity"]) != b_fingerprint
+    assert validation_helper.get_rules_fingerprint(sess) == cross_fingerprint
+
+
+@pytest.mark.usefixtures("job_constants")
+def test_validation_results_current(database):
+    """Results are only current if they're newer than the revalidation threshold and the start of the window"""
+    sess = database.session
+    sub = SubmissionFactory(reporting_fiscal_year=2020, reporting_fiscal_period=3)
+    fabs_sub = SubmissionFactory(reporting_fiscal_year=2020, reporting_fiscal_period=3, is_fabs=True)
+    job = JobFactory(submission=sub, last_validated=datetime(2020, 2, 1))
+    fabs_job = JobFactory(submission=fabs_sub, last_validated=datetime(2020, 2, 1))
+    never_validated = JobFactory(submission=sub)
+    sess.add_all([sub, fabs_sub, job, fabs_job, never_validated])
+    sess.commit()
+    never_validated.last_validated = None
+    sess.commit()
+
+    assert validation_helper.validation_results_current(sess, job) is True
+    assert validation_helper.validation_results_current(sess, never_validated) is False
+
+    sess.add(SubmissionWindowSchedule(year=2020, period=3, period_start=datetime(2020, 3, 1)))
+    sess.commit()
+    assert validation_helper.validation_results_current(sess, job) is False
+    assert validation_helper.validation_results_current(sess, fabs_job) is True
+
+    sess.add(RevalidationThreshold(revalidation_date=datetime(2020, 2, 15)))
+    sess.commit()
+    assert validation_helper.validation_results_current(sess, fabs_job) is False
@@ -4,9 +4,10 @@ from unittest.mock import Mock
 
 import pandas as pd
 
-from dataactcore.models.domainModels import TAS_COMPONENTS, TASLookup
+from dataactcore.models.domainModels import TAS_COMPONENTS, TASLookup, TASPeriodAccount
 from dataactcore.scripts.setup import load_tas
 from tests.unit.dataactcore.factories.domain import TASFactory
+from tests.unit.dataactcore.factories.job import SubmissionFactory
 
 
 def write_then_read_tas(tmpdir, *rows):
@@ -267,3 +268,41 @@ def test_only_fill_missing(database, monkeypatch):
     assert t333.display_tas == "333-333-333-333-333"
     for tas_field in blank_tas_fields:
         assert getattr(t333, tas_field) == "populated-333"
+
+
+def test_refresh_tas_period_accounts(database):
+    """Each TAS gets the lowest account number overlapping each month from the earliest submission on, both up to the
+    month's last day and through to the next month"""
+    sess = database.session
+    sess.add_all(
+        [
+            SubmissionFactory(reporting_start_date=date(2010, 10, 1), reporting_end_date=date(2010, 12, 31)),
+            TASFactory(account_num=1, tas="ABC", internal_start_date=date(2010, 9, 1), internal_end_date=None),
+            # Starts on the last day of October, so only a submission running into November links to it in October
+            TASFactory(account_num=2, tas="DEF", internal_start_date=date(2010, 10, 31), internal_end_date=None),
+            TASFactory(account_num=3, tas="DEF", internal_start_date=date(2010, 11, 15), internal_end_date=None),
+            # Ended before the earliest submission
+            TASFactory(
+                account_num=4, tas="GHI", internal_start_date=date(2009, 1, 1), internal_end_date=date(2010, 1, 1)
+            ),
+        ]
+    )
+    sess.commit()
+
+    assert load_tas.refresh_tas_period_accounts(sess) > 0
+
+    links = {
+        (link.tas, link.period_start): (link.account_num, link.full_period_account_num)
+        for link in sess.query(TASPeriodAccount)
+    }
+    assert links[("ABC", date(2010, 10, 1))] == (1, 1)
+    assert links[("ABC", date(2010, 12, 1))] == (1, 1)
+    assert links[("DEF", date(2010, 10, 1))] == (None, 2)
+    assert links[("DEF", date(2010, 11, 1))] == (2, 2)
+    assert ("ABC", date(2010, 9, 1)) not in links
+    assert not any(tas == "GHI" for tas, _ in links)
+
+    # Refreshing replaces the links rather than adding to them
+    link_count = len(links)
+    assert load_tas.refresh_tas_period_accounts(sess) == link_count
+    assert sess.query(TASPeriodAccount).count() == link_count
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from dataactcore.models.jobModels import ValidationTiming
+from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_TYPE_DICT
+from dataactcore.scripts.ad_hoc.validation_hot_spots import get_validation_hot_spots
+
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def add_timing(sess, job, file_type, rule, duration, days_ago=1, phase="sql_rule", target_file_type=None):
+    sess.add(
+        ValidationTiming(
+            job_id=job.job_id,
+            submission_id=job.submission_id,
+            file_type_id=FILE_TYPE_DICT[file_type],
+            target_file_type_id=FILE_TYPE_DICT[target_file_type] if target_file_type else None,
+            phase=phase,
+            rule=rule,
+            start_time=datetime.now() - timedelta(days=days_ago),
+            duration=duration,
+            row_count=2,
+        )
+    )
+
+
+def test_get_validation_hot_spots(database, job_constants):
+    """The rules that took the longest in total over the recent validations are reported for each file type"""
+    sess = database.session
+    sub = SubmissionFactory()
+    job = JobFactory(
+        submission=sub, job_type_id=JOB_TYPE_DICT["csv_record_validation"], file_type_id=FILE_TYPE_DICT["award"]
+    )
+    sess.add_all([sub, job])
+    sess.flush()
+
+    add_timing(sess, job, "award", "d2_slow", 3)
+    add_timing(sess, job, "award", "d2_slow", 2)
+    add_timing(sess, job, "award", "d2_fast", 4)
+    add_timing(sess, job, "award", "d2_old", 100, days_ago=60)
+    add_timing(sess, job, "award", None, 200, phase="data_loading")
+    add_timing(sess, job, "appropriations", "a1_rule", 1)
+    add_timing(sess, job, "award", "c_cross", 0.5, phase="cross_file_rule", target_file_type="award_financial")
+    sess.commit()
+
+    hot_spots = get_validation_hot_spots(sess, days=30, limit=2)
+    assert [(row.file_type, row.rule, row.runs) for row in hot_spots] == [
+        ("appropriations", "a1_rule", 1),
+        ("award", "d2_slow", 2),
+        ("award", "d2_fast", 1),
+    ]
+    assert float(hot_spots[1].total_duration) == 5
+    assert float(hot_spots[1].avg_duration) == 2.5
+    assert float(hot_spots[1].max_duration) == 3
+
+    hot_spots = get_validation_hot_spots(sess, days=90, limit=5, file_type="award")
+    assert [row.rule for row in hot_spots] == ["d2_old", "d2_slow", "d2_fast", "c_cross"]
+    assert hot_spots[-1].target_file_type == "award_financial"
@@ -0,0 +1,139 @@
+from datetime import date
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+import pytest
+
+from dataactcore.models.jobModels import Job
+from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_TYPE_DICT
+from dataactcore.models.stagingModels import (
+    AwardFinancial,
+    AwardProcurement,
+    PublishedAwardFinancial,
+    PublishedAwardProcurement,
+)
+from dataactcore.utils import staging_snapshot
+
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def snapshot_round_trip(sess, tmp_path, model, published_model, submission_id):
+    """Snapshot a submission's staging rows and load the snapshot into the published table"""
+    snapshot_path = str(tmp_path / "snapshot.parquet")
+    written = staging_snapshot.write_staging_snapshot(sess.connection(), model, submission_id, snapshot_path)
+    loaded = staging_snapshot.load_staging_snapshot(sess.connection(), snapshot_path, published_model.__table__.name)
+    sess.commit()
+    return snapshot_path, written, loaded
+
+
+def test_staging_snapshot_round_trip(database, tmp_path):
+    """Only the submission's rows are snapshotted and they're loaded back with the same values, keeping numeric scale,
+    dates and the difference between empty strings and NULLs"""
+    sess = database.session
+    submission = SubmissionFactory()
+    other_submission = SubmissionFactory()
+    sess.add_all([submission, other_submission])
+    sess.flush()
+    sess.add_all(
+        [
+            AwardFinancial(
+                submission_id=submission.submission_id,
+                job_id=1,
+                row_number=2,
+                tas="ABC",
+                fain="",
+                gross_outlay_amount_by_awa_cpe=Decimal("12.50"),
+                gross_outlay_amount_by_awa_fyb=None,
+                general_ledger_post_date=date(2024, 1, 31),
+                display_tas='quoted "tas", with comma\nand newline',
+            ),
+            AwardFinancial(submission_id=submission.submission_id, job_id=1, row_number=3),
+            AwardFinancial(submission_id=other_submission.submission_id, job_id=2, row_number=2),
+        ]
+    )
+    sess.commit()
+
+    snapshot_path, written, loaded = snapshot_round_trip(
+        sess, tmp_path, AwardFinancial, PublishedAwardFinancial, submission.submission_id
+    )
+
+    assert written == loaded == 2
+    snapshot_columns = pq.ParquetFile(snapshot_path).schema_arrow.names
+    assert "award_financial_id" not in snapshot_columns and "created_at" not in snapshot_columns
+    published = sess.query(PublishedAwardFinancial).order_by(PublishedAwardFinancial.row_number).all()
+    assert [row.row_number for row in published] == [2, 3]
+    assert published[0].submission_id == submission.submission_id
+    assert published[0].tas == "ABC"
+    assert published[0].fain == ""
+    assert published[1].fain is None
+    assert str(published[0].gross_outlay_amount_by_awa_cpe) == "12.50"
+    assert published[0].gross_outlay_amount_by_awa_fyb is None
+    assert published[0].general_ledger_post_date == date(2024, 1, 31)
+    assert published[0].display_tas == 'quoted "tas", with comma\nand newline'
+    assert published[0].created_at is not None
+
+
+def test_staging_snapshot_booleans_and_empty(database, tmp_path):
+    """Booleans survive the round trip and a submission without rows gets an empty snapshot"""
+    sess = database.session
+    submission = SubmissionFactory()
+    empty_submission = SubmissionFactory()
+    sess.add_all([submission, empty_submission])
+    sess.flush()
+    sess.add_all(
+        [
+            AwardProcurement(
+                submission_id=submission.submission_id, job_id=1, row_number=2, small_business_competitive=True
+            ),
+            AwardProcurement(
+                submission_id=submission.submission_id, job_id=1, row_number=3, small_business_competitive=False
+            ),
+        ]
+    )
+    sess.commit()
+
+    _, written, loaded = snapshot_round_trip(
+        sess, tmp_path, AwardProcurement, PublishedAwardProcurement, submission.submission_id
+    )
+    assert written == loaded == 2
+    published = sess.query(PublishedAwardProcurement).order_by(PublishedAwardProcurement.row_number).all()
+    assert [row.small_business_competitive for row in published] == [True, False]
+
+    _, written, loaded = snapshot_round_trip(
+        sess, tmp_path, AwardProcurement, PublishedAwardProcurement, empty_submission.submission_id
+    )
+    assert written == loaded == 0
+
+
+@pytest.mark.usefixtures("job_constants")
+def test_get_staging_snapshots(database):
+    """Only the validation jobs with snapshots are found, keyed by the staging table they loaded"""
+    sess = database.session
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    jobs = [
+        JobFactory(
+            submission=submission,
+            job_type_id=JOB_TYPE_DICT["csv_record_validation"],
+            file_type_id=FILE_TYPE_DICT["appropriations"],
+            staging_snapshot="a.parquet",
+        ),
+        JobFactory(
+            submission=submission,
+            job_type_id=JOB_TYPE_DICT["csv_record_validation"],
+            file_type_id=FILE_TYPE_DICT["award_financial"],
+            staging_snapshot=None,
+        ),
+        JobFactory(
+            submission=submission,
+            job_type_id=JOB_TYPE_DICT["file_upload"],
+            file_type_id=FILE_TYPE_DICT["program_activity"],
+            staging_snapshot="b.parquet",
+        ),
+    ]
+    sess.add_all(jobs)
+    sess.commit()
+
+    assert sess.query(Job).count() == 3
+    assert staging_snapshot.get_staging_snapshots(sess, submission.submission_id) == {"appropriation": "a.parquet"}
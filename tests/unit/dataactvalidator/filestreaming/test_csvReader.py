@@ -1,6 +1,25 @@
+import io
+import os
+import re
+from functools import partial
 from unittest.mock import Mock
 
-from dataactvalidator.filestreaming import csvReader
+import pytest
+from botocore.exceptions import ClientError, IncompleteReadError
+
+from dataactvalidator.filestreaming import csvReader, s3RangeReader
+
+FILES_DIR = os.path.join("tests", "integration", "data")
+READ_ERROR = os.path.join(FILES_DIR, "appropReadError.csv")
+BLANK_C = os.path.join(FILES_DIR, "awardFinancialBlank.csv")
+
+
+def open_local_file(file_path):
+    """Open a local file with a reader that doesn't expect any particular headers"""
+    reader = csvReader.CsvReader()
+    reader.get_filename(None, None, file_path)
+    reader.open_file(None, None, file_path, [], None, None, {}, {}, is_local=True)
+    return reader
 
 
 def test_count_and_set_headers_flex():
@@ -77,3 +96,131 @@ def test_normalize_headers():
 
     result = csvReader.normalize_headers(headers, False, mapping, {})
     assert list(result) == headers
+
+
+def test_dedupe_headers():
+    """Verify repeated headers are renamed the same way pandas renames them"""
+    headers = ["a", "b", "a", "a.1", "a", ""]
+    assert csvReader.dedupe_headers(headers) == ["a", "b", "a.1", "a.1.1", "a.2", ""]
+
+
+def test_read_chunks():
+    """Verify the file is split into chunks of well-formed rows while the malformed rows are recorded"""
+    reader = open_local_file(READ_ERROR)
+    chunks = list(reader.read_chunks(4))
+    reader.close()
+
+    assert reader.row_count == 11
+    assert reader.short_pop_rows == [5]
+    assert reader.long_pop_rows == [2, 3, 7]
+    assert reader.short_null_rows == []
+    assert reader.long_null_rows == []
+
+    assert [chunk.short_rows for chunk in chunks] == [[5], [], []]
+    assert [chunk.long_rows for chunk in chunks] == [[2, 3], [7], []]
+    assert [chunk.data["row_number"].tolist() for chunk in chunks] == [[4], [6, 8, 9], [10, 11]]
+    assert list(chunks[0].data.columns) == reader.file_headers + ["row_number"]
+    assert chunks[0].data["agencyidentifier"].tolist() == ["28"]
+    assert chunks[0].data["allocationtransferagencyidentifier"].tolist() == [""]
+    # The whole file has been read by the last chunk
+    assert chunks[-1].estimated_row_count == 11
+
+    reader = open_local_file(BLANK_C)
+    chunks = list(reader.read_chunks(10))
+    reader.close()
+
+    assert reader.row_count == 5
+    assert reader.short_null_rows == [3]
+    assert reader.long_null_rows == [4]
+    assert chunks[0].data["row_number"].tolist() == [2, 5]
+
+
+def test_read_chunks_many_long_rows(tmp_path):
+    """Rows keep their original row numbers no matter how many long rows come before them or which chunk they're in"""
+    file_path = tmp_path / "many_long_rows.csv"
+    lines = ["a,b"]
+    for row_number in range(2, 1002):
+        lines.append("1,2,3" if row_number % 3 == 0 else "1,2")
+    file_path.write_text("\n".join(lines) + "\n")
+
+    reader = open_local_file(str(file_path))
+    chunks = list(reader.read_chunks(7))
+    reader.close()
+
+    assert reader.row_count == 1001
+    assert reader.long_pop_rows == [row_number for row_number in range(2, 1002) if row_number % 3 == 0]
+    row_numbers = [row_number for chunk in chunks for row_number in chunk.data["row_number"].tolist()]
+    assert row_numbers == [row_number for row_number in range(2, 1002) if row_number % 3 != 0]
+
+
+class FakeS3Client:
+    """Serves ranged reads of one file the way S3 does, failing the first read of each range when asked to"""
+
+    def __init__(self, key, contents, fail_first_reads=False):
+        self.key = key
+        self.contents = contents
+        self.fail_first_reads = fail_first_reads
+        self.ranges = []
+
+    def head_object(self, **kwargs):
+        if kwargs["Key"] != self.key:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.contents)}
+
+    def get_object(self, **kwargs):
+        start, end = (int(byte) for byte in re.match(r"bytes=(\d+)-(\d+)", kwargs["Range"]).groups())
+        self.ranges.append((start, end))
+        body = Mock()
+        if self.fail_first_reads and self.ranges.count((start, end)) == 1:
+            body.read.side_effect = IncompleteReadError(actual_bytes=0, expected_bytes=end - start + 1)
+        else:
+            body.read.return_value = self.contents[start : end + 1]
+        return {"Body": body}
+
+
+def test_read_chunks_s3(monkeypatch):
+    """Files in S3 are read in ranges as they're parsed, giving the same chunks as reading the file locally"""
+    with open(READ_ERROR, "rb") as local_file:
+        # A multibyte character to be split across ranges
+        contents = local_file.read().replace(b"28", "\u00e9".encode("utf-8"), 1)
+    client = FakeS3Client("appropReadError.csv", contents, fail_first_reads=True)
+    monkeypatch.setattr(s3RangeReader.boto3, "client", Mock(return_value=client))
+    monkeypatch.setattr(csvReader, "open_s3_text", partial(s3RangeReader.open_s3_text, range_size=7))
+
+    reader = csvReader.CsvReader()
+    reader.get_filename("region", "bucket", "appropReadError.csv")
+    reader.open_file("region", "bucket", "appropReadError.csv", [], None, None, {}, {}, is_local=True)
+    chunks = list(reader.read_chunks(4))
+    reader.close()
+
+    assert reader.file_size == len(contents)
+    assert reader.row_count == 11
+    assert reader.long_pop_rows == [2, 3, 7]
+    assert [chunk.data["row_number"].tolist() for chunk in chunks] == [[4], [6, 8, 9], [10, 11]]
+    assert chunks[0].data["agencyidentifier"].tolist() == ["\u00e9"]
+    assert chunks[-1].estimated_row_count == 11
+    # Every range was requested again after its first read failed, and none were skipped
+    assert sorted(set(client.ranges))[0][0] == 0
+    assert sorted(set(client.ranges))[-1][1] == len(contents) - 1
+    assert len(client.ranges) == 2 * len(set(client.ranges))
+
+
+def test_open_file_s3_missing(monkeypatch):
+    """A file missing from S3 is reported the same way as a missing local file"""
+    monkeypatch.setattr(s3RangeReader.boto3, "client", Mock(return_value=FakeS3Client("other.csv", b"")))
+
+    reader = csvReader.CsvReader()
+    reader.get_filename("region", "bucket", "missing.csv")
+    with pytest.raises(ValueError, match="missing.csv"):
+        reader.open_file("region", "bucket", "missing.csv", [], None, None, {}, {}, is_local=True)
+
+
+def test_s3_range_reader():
+    """The file is read through to its end in ranges no bigger than the range size"""
+    contents = bytes(range(256)) * 10
+    client = FakeS3Client("file", contents)
+    raw_reader = s3RangeReader.S3RangeReader(client, "bucket", "file", range_size=1000)
+
+    assert io.BufferedReader(raw_reader).read() == contents
+    assert client.ranges == [(0, 999), (1000, 1999), (2000, 2559)]
+    raw_reader.close()
@@ -3,6 +3,7 @@ from random import randint
 
 from dataactcore.models.jobModels import Submission
 from dataactvalidator.filestreaming.sqlLoader import SQLLoader
+from dataactvalidator.validation_handlers.validator import drop_cross_file_staging, prepare_cross_file_staging
 from dataactcore.models.jobModels import PublishStatus
 from dataactcore.models.lookups import PUBLISH_STATUS
 
@@ -24,14 +25,14 @@ def error_rows(rule_file, staging_db, submission=None, models=None, assert_num=N
         models = []
 
     submission_id = insert_submission(staging_db, submission)
-    sql = SQLLoader.read_sql_str(rule_file).format(submission_id)
+    rule_sql = SQLLoader.read_sql_str(rule_file)
 
     for model in models:
         model.submission_id = submission_id
         staging_db.session.add(model)
 
     staging_db.session.commit()
-    result = staging_db.connection.execute(sql).fetchall()
+    result = run_rule_sql(rule_sql, staging_db, submission_id).fetchall()
 
     if assert_num is not None:
         assert len(result) == assert_num
@@ -44,8 +45,17 @@ def number_of_errors(rule_file, staging_db, submission=None, models=None, assert
 
 
 def query_columns(rule_file, staging_db):
-    sql = SQLLoader.read_sql_str(rule_file).format(randint(1, 9999))
-    return staging_db.connection.execute(sql).keys()
+    rule_sql = SQLLoader.read_sql_str(rule_file)
+    return run_rule_sql(rule_sql, staging_db, randint(1, 9999)).keys()
+
+
+def run_rule_sql(rule_sql, staging_db, submission_id):
+    """Run the rule SQL for the submission, building any cross-file staging tables it reads from first"""
+    staging_tables = prepare_cross_file_staging(staging_db.connection, [rule_sql], submission_id)
+    try:
+        return staging_db.connection.execute(rule_sql.format(submission_id))
+    finally:
+        drop_cross_file_staging(staging_db.connection, staging_tables, submission_id)
 
 
 def populate_publish_status(database):
@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.lookups import ERROR_TYPE_DICT, FILE_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactvalidator.validation_handlers.errorInterface import (
+    record_row_error,
+    record_row_errors,
+    write_all_row_errors,
+)
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def test_record_row_errors():
+    """Recording a dataframe of errors matches recording each of its errors one at a time"""
+    errors = pd.DataFrame(
+        {
+            "Field Name": ["a", "b", "a", "a", "b"],
+            "error_type": [1, 1, 1, 2, 1],
+            "Row Number": [5, 3, 2, 9, 7],
+            "Rule Label": ["", "", "", "", "X1"],
+        }
+    )
+    error_list = record_row_error({}, 1, "file", "a", 1, 1, "", 2, None, 1)
+    expected_list = {key: dict(error_dict) for key, error_dict in error_list.items()}
+    for _, row in errors.iterrows():
+        record_row_error(
+            expected_list,
+            1,
+            "file",
+            row["Field Name"],
+            row["error_type"],
+            row["Row Number"],
+            row["Rule Label"],
+            2,
+            None,
+            1,
+        )
+
+    assert record_row_errors(error_list, 1, "file", errors, 2, None, 1) == expected_list
+    assert list(error_list.keys()) == list(expected_list.keys())
+    assert record_row_errors({}, 1, "file", errors.iloc[0:0]) == {}
+
+
+@pytest.mark.usefixtures("job_constants", "error_constants", "validation_constants")
+def test_write_all_row_errors(database):
+    """Only the job's errors are written, keeping empty rule labels apart from missing ones"""
+    sess = database.session
+    sub = SubmissionFactory()
+    job = JobFactory(submission=sub, file_type_id=FILE_TYPE_DICT["award"])
+    other_job = JobFactory(submission=sub, file_type_id=FILE_TYPE_DICT["award"])
+    sess.add_all([sub, job, other_job])
+    sess.commit()
+
+    error_list = {}
+    record_row_error(
+        error_list,
+        job.job_id,
+        "file",
+        "field",
+        ValidationError.type_error,
+        3,
+        "",
+        FILE_TYPE_DICT["award"],
+        None,
+        RULE_SEVERITY_DICT["fatal"],
+        num_errors=4,
+    )
+    record_row_error(
+        error_list,
+        job.job_id,
+        "cross_file",
+        "award",
+        "A tab\tand a back\\slash",
+        None,
+        None,
+        FILE_TYPE_DICT["award"],
+        FILE_TYPE_DICT["award_financial"],
+        RULE_SEVERITY_DICT["warning"],
+    )
+    record_row_error(error_list, other_job.job_id, "file", "field", ValidationError.type_error, 1)
+    write_all_row_errors(error_list, job.job_id)
+
+    errors = sess.query(ErrorMetadata).filter_by(job_id=job.job_id).order_by(ErrorMetadata.first_row).all()
+    assert sess.query(ErrorMetadata).filter_by(job_id=other_job.job_id).count() == 0
+    assert len(errors) == 2
+
+    assert errors[0].error_type_id == ERROR_TYPE_DICT["type_error"]
+    assert errors[0].rule_failed == ValidationError.get_error_message(ValidationError.type_error)
+    assert errors[0].occurrences == 4
+    assert errors[0].first_row == 3
+    assert errors[0].original_rule_label == ""
+    assert errors[0].target_file_type_id is None
+    assert errors[0].severity_id == RULE_SEVERITY_DICT["fatal"]
+    assert errors[0].created_at is not None
+
+    assert errors[1].error_type_id == ERROR_TYPE_DICT["rule_failed"]
+    assert errors[1].rule_failed == "A tab\tand a back\\slash"
+    assert errors[1].first_row is None
+    assert errors[1].original_rule_label is None
+    assert errors[1].target_file_type_id == FILE_TYPE_DICT["award_financial"]
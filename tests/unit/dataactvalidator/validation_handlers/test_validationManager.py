@@ -1,16 +1,27 @@
-from datetime import date
+from datetime import date, datetime
+from unittest.mock import Mock
 
+import pyarrow.parquet as pq
 import pytest
 
 from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.function_bag import update_external_data_load_date
+from dataactcore.models.domainModels import CGAC, FREC, Office, SubTierAgency, ExternalDataType, TASPeriodAccount
+from dataactcore.models.jobModels import ValidationTiming
+from dataactcore.models.lookups import EXTERNAL_DATA_TYPE_DICT, FILE_TYPE_DICT
+from dataactcore.models.stagingModels import FABS, Appropriation
+from dataactcore.models.validationModels import ValidationLabel
+from dataactcore.scripts.setup import load_tas
 from dataactcore.utils.ResponseError import ResponseError
 from dataactvalidator.validation_handlers import validationManager
+from dataactvalidator.validation_handlers.errorInterface import record_row_error
 
 from tests.unit.dataactcore.factories.domain import TASFactory
-from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
 from tests.unit.dataactcore.factories.staging import (
     AppropriationFactory,
     AwardFinancialFactory,
+    FABSFactory,
     ObjectClassProgramActivityFactory,
 )
 
@@ -96,6 +107,61 @@ def test_update_account_nums_bad_dates(database, factory):
     assert model.account_num is None
 
 
+@pytest.mark.parametrize(
+    "start_date,end_date", [(date(2010, 10, 1), date(2010, 10, 31)), (date(2010, 10, 1), date(2010, 12, 31))]
+)
+def test_update_account_nums_period_accounts(database, monkeypatch, start_date, end_date):
+    """Linking through the precomputed TAS/month links gives the same account numbers as aggregating tas_lookup"""
+    sess = database.session
+    submission = SubmissionFactory(reporting_start_date=start_date, reporting_end_date=end_date)
+    sess.add(submission)
+    sess.flush()
+    tas_dates = [
+        (date(2010, 9, 1), None),
+        (date(2010, 9, 1), date(2010, 10, 1)),
+        (date(2010, 10, 31), None),
+        (date(2010, 10, 31), date(2010, 10, 31)),
+        (date(2010, 11, 1), date(2010, 11, 1)),
+        (date(2010, 11, 15), date(2010, 12, 1)),
+        (date(2010, 12, 31), None),
+        (date(2011, 1, 1), None),
+        (date(2011, 2, 1), date(2010, 11, 20)),
+        (date(2010, 12, 15), date(2010, 6, 1)),
+    ]
+    tas_entries = [
+        TASFactory(account_num=index + 1, tas="TAS{}".format(index), internal_start_date=start, internal_end_date=end)
+        for index, (start, end) in enumerate(tas_dates)
+    ]
+    # A TAS with several history entries links to the lowest one overlapping the submission
+    tas_entries.append(TASFactory(account_num=100, tas="TAS2", internal_start_date=date(2010, 11, 20)))
+    models = [
+        AppropriationFactory(submission_id=submission.submission_id, tas=tas.tas, account_num=None)
+        for tas in tas_entries
+    ]
+    sess.add_all(tas_entries + models)
+    sess.commit()
+
+    def linked_account_nums():
+        validationManager.update_account_nums(models[0].__class__, submission.submission_id)
+        links = {model.tas: model.account_num for model in sess.query(models[0].__class__)}
+        sess.query(models[0].__class__).update({"account_num": None})
+        sess.commit()
+        return links
+
+    expected = linked_account_nums()
+    assert expected["TAS0"] == 1
+
+    load_tas.refresh_tas_period_accounts(sess)
+    assert sess.query(TASPeriodAccount).count() > 0
+    assert linked_account_nums() == expected
+
+    # Links that don't reach the end of the submission aren't used
+    sess.query(TASPeriodAccount).filter(TASPeriodAccount.period_start >= end_date.replace(day=1)).delete()
+    sess.query(TASPeriodAccount).filter(TASPeriodAccount.tas == "TAS0").delete()
+    sess.commit()
+    assert linked_account_nums() == expected
+
+
 @pytest.mark.usefixtures("database")
 def test_attempt_validate_deleted_job():
     error = None
@@ -107,3 +173,188 @@ def test_attempt_validate_deleted_job():
 
     assert error is not None
     assert str(error) == "Job ID 12345678901234567890 not found in database"
+
+
+@pytest.mark.usefixtures("job_constants")
+def test_write_staging_snapshot(database, monkeypatch, tmp_path):
+    """The job's rows are written to a snapshot next to its error reports, failing to write it leaves the job without
+    one"""
+    sess = database.session
+    monkeypatch.setattr(validationManager, "CONFIG_SERVICES", {"error_report_path": str(tmp_path) + "/"})
+    submission = SubmissionFactory()
+    sess.add(submission)
+    sess.flush()
+    job = JobFactory(submission=submission, file_type_id=FILE_TYPE_DICT["appropriations"])
+    sess.add(job)
+    sess.flush()
+    sess.add_all(AppropriationFactory.build_batch(3, submission_id=submission.submission_id, job_id=job.job_id))
+    sess.commit()
+
+    validation_manager = validationManager.ValidationManager(is_local=True, directory=str(tmp_path))
+    validation_manager.job = job
+    validation_manager.submission_id = submission.submission_id
+    validation_manager.model = Appropriation
+    validation_manager.file_type = Mock(file_type_id=FILE_TYPE_DICT["appropriations"])
+    validation_manager.file_type.name = "appropriations"
+
+    snapshot_name = validation_manager.write_staging_snapshot(sess, None, None)
+    sess.commit()
+
+    assert snapshot_name == "submission_{}_job_{}_appropriation.parquet".format(submission.submission_id, job.job_id)
+    assert pq.ParquetFile(str(tmp_path / snapshot_name)).metadata.num_rows == 3
+    timing = sess.query(ValidationTiming).filter_by(job_id=job.job_id, phase="staging_snapshot").one()
+    assert timing.row_count == 3
+
+    monkeypatch.setattr(validationManager, "write_staging_snapshot", Mock(side_effect=OSError("disk full")))
+    assert validation_manager.write_staging_snapshot(sess, None, None) is None
+
+
+def test_record_chunk_summary(database, monkeypatch):
+    """Chunk summaries are added to the file's totals in the order they're recorded"""
+    sess = database.session
+    update_val_progress = Mock()
+    monkeypatch.setattr(validationManager, "update_val_progress", update_val_progress)
+    validation_manager = validationManager.ValidationManager(is_local=CONFIG_BROKER["local"])
+    validation_manager.job = Mock()
+    validation_manager.total_rows = 1
+    validation_manager.total_data_rows = 0
+    validation_manager.has_data = False
+    validation_manager.error_row_table = "error_rows_test"
+    validation_manager.create_error_row_table(sess)
+    validation_manager.error_list = {}
+    validation_manager.total_proc_obligations = 0
+    validation_manager.total_asst_obligations = 0
+    validation_manager.total_obligations = 0
+    validation_manager.basic_val_progress = 0
+    validation_manager.tas_progress = validation_manager.sql_val_progress = validation_manager.final_progress = 0
+
+    empty_summary = {
+        "total_rows": 2,
+        "total_data_rows": 0,
+        "error_rows": [],
+        "error_list": {},
+        "total_proc_obligations": 0,
+        "total_asst_obligations": 0,
+        "total_obligations": 0,
+    }
+    validation_manager.record_chunk_summary(empty_summary, 10, sess)
+    assert validation_manager.has_data is False
+
+    for first_row in (4, 7):
+        error_list = record_row_error({}, 1, "file", "field", 1, first_row)
+        chunk_summary = {
+            "total_rows": 3,
+            "total_data_rows": 3,
+            "error_rows": [first_row, first_row + 1],
+            "error_list": error_list,
+            "total_proc_obligations": 1.111,
+            "total_asst_obligations": 2.222,
+            "total_obligations": 3.333,
+        }
+        validation_manager.record_chunk_summary(chunk_summary, 10, sess)
+    validation_manager.round_obligation_totals()
+
+    assert validation_manager.total_rows == 9
+    assert validation_manager.total_data_rows == 6
+    assert validation_manager.has_data is True
+    assert validation_manager.count_error_rows(sess) == 4
+    assert list(validation_manager.error_list.values())[0]["numErrors"] == 2
+    assert list(validation_manager.error_list.values())[0]["firstRow"] == 4
+    assert validation_manager.total_proc_obligations == 2.22
+    assert validation_manager.total_asst_obligations == 4.44
+    assert validation_manager.total_obligations == 6.67
+    assert validation_manager.basic_val_progress == 60
+    assert update_val_progress.call_count == 3
+    validation_manager.drop_error_row_table(sess)
+
+
+def test_mark_valid_fabs_rows(database):
+    """Only the FABS rows in the submission without a recorded error are marked valid"""
+    sess = database.session
+    submission = SubmissionFactory(is_fabs=True)
+    other_submission = SubmissionFactory(is_fabs=True)
+    sess.add_all([submission, other_submission])
+    sess.commit()
+    sess.add_all(
+        [
+            FABSFactory(submission_id=submission.submission_id, row_number=row_number, is_valid=False)
+            for row_number in (2, 3, 4)
+        ]
+        + [FABSFactory(submission_id=other_submission.submission_id, row_number=2, is_valid=False)]
+    )
+    sess.commit()
+    validation_manager = validationManager.ValidationManager(is_local=CONFIG_BROKER["local"])
+    validation_manager.submission_id = submission.submission_id
+    validation_manager.error_row_table = "error_rows_test"
+    validation_manager.create_error_row_table(sess)
+    validation_manager.record_error_rows(sess, [3])
+    validation_manager.record_error_rows(sess, [3, 5])
+
+    assert validation_manager.count_error_rows(sess) == 2
+    validation_manager.mark_valid_fabs_rows(sess)
+    sess.commit()
+    valid_rows = sess.query(FABS.submission_id, FABS.row_number).filter(FABS.is_valid.is_(True)).all()
+    assert sorted(valid_rows) == [(submission.submission_id, 2), (submission.submission_id, 4)]
+
+    validation_manager.drop_error_row_table(sess)
+    assert sess.execute("SELECT to_regclass('error_rows_test')").scalar() is None
+
+
+def test_get_fabs_reference_data(database, monkeypatch):
+    """The FABS reference data is only reloaded once the office or agency data has been loaded again"""
+    sess = database.session
+    monkeypatch.setattr(validationManager, "fabs_reference_data", None)
+    cgac = CGAC(cgac_code="0000", agency_name="Example Agency")
+    sess.add(cgac)
+    sess.commit()
+    frec = FREC(frec_code="0001", cgac_id=cgac.cgac_id, agency_name="Example FREC")
+    sess.add(frec)
+    sess.commit()
+    sess.add_all(
+        [
+            SubTierAgency(
+                cgac_id=cgac.cgac_id,
+                frec_id=frec.frec_id,
+                sub_tier_agency_code="0123",
+                sub_tier_agency_name="Example Sub Tier",
+                is_frec=True,
+            ),
+            SubTierAgency(
+                cgac_id=cgac.cgac_id,
+                frec_id=frec.frec_id,
+                sub_tier_agency_code="0124",
+                sub_tier_agency_name="Another Example Sub Tier",
+                is_frec=False,
+            ),
+            Office(office_code="OFFICE1", sub_tier_code="0123", agency_code="0000"),
+            ValidationLabel(label="FABSREQ1", column_name="fain", label_type="requirement"),
+            ValidationLabel(label="FABS1", column_name="uri", label_type="type"),
+        ]
+    )
+    sess.commit()
+
+    # Without recorded load dates the data is always reloaded
+    reference_data = validationManager.get_fabs_reference_data(sess)
+    assert reference_data["agency_codes"] == {"0123": "0001", "0124": "0000"}
+    assert reference_data["offices"] == {"OFFICE1": "0123"}
+    assert reference_data["required_labels"] == {"fain": "FABSREQ1"}
+    assert reference_data["type_labels"] == {"uri": "FABS1"}
+    assert validationManager.get_fabs_reference_data(sess) is not reference_data
+
+    # With both load dates recorded it's kept until one of them changes
+    for data_type in ["office", "agency"]:
+        sess.merge(
+            ExternalDataType(
+                external_data_type_id=EXTERNAL_DATA_TYPE_DICT[data_type], name=data_type, description="lorem ipsum"
+            )
+        )
+    sess.commit()
+    for data_type in ["office", "agency"]:
+        update_external_data_load_date(datetime(2024, 1, 1), datetime(2024, 1, 2), data_type)
+    reference_data = validationManager.get_fabs_reference_data(sess)
+    sess.add(Office(office_code="OFFICE2", sub_tier_code="0124", agency_code="0000"))
+    sess.commit()
+    assert validationManager.get_fabs_reference_data(sess) is reference_data
+
+    update_external_data_load_date(datetime(2024, 2, 1), datetime(2024, 2, 2), "office")
+    assert validationManager.get_fabs_reference_data(sess)["offices"] == {"OFFICE1": "0123", "OFFICE2": "0124"}
@@ -1,17 +1,19 @@
+import threading
+
 import pytest
 
 from unittest.mock import Mock
 
 from dataactcore.models.stagingModels import FlexField
 from dataactcore.models.validationModels import RuleSql
-from dataactcore.models.jobModels import FileType
+from dataactcore.models.jobModels import FileType, ValidationTiming
 from dataactcore.models.lookups import FILE_TYPE_DICT_LETTER_ID, RULE_SEVERITY_DICT
 from dataactvalidator.validation_handlers import validator
 from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
 
 
 @pytest.mark.usefixtures("job_constants")
-def test_relevant_flex_data(database):
+def test_job_flex_data(database):
     """Verify that we can retrieve multiple flex fields from our data"""
     sess = database.session
     subs = [SubmissionFactory() for _ in range(3)]
@@ -37,29 +39,107 @@ def test_relevant_flex_data(database):
     )
     sess.commit()
 
-    failures = [{"row_number": 3}, {"row_number": 7}]
-    result = validator.relevant_flex_data(failures, jobs[0].job_id)
-    assert {3, 7} == set(result.keys())
-    assert len(result[3]) == 3
-    # spot check some of the values
-    assert result[3][0].header == "0"
-    assert result[3][1].cell == "cell" * 3
-    assert result[3][2].job_id == jobs[0].job_id
-    assert result[7][1].header == "1"
-    assert result[7][0].cell == "cell" * 7
-
-
-def test_failure_row_to_tuple_flex():
-    """Verify that flex data gets included in the failure row info"""
-    flex_data = {
-        2: [FlexField(header="A", cell="a"), FlexField(header="B", cell="b"), FlexField(header="C", cell=None)],
-        4: [FlexField(header="A", cell="c"), FlexField(header="B", cell="d"), FlexField(header="C", cell="g")],
-    }
-
-    result = validator.failure_row_to_tuple(Mock(), flex_data, [], [], Mock(), {"row_number": 2})
+    result = validator.job_flex_data(jobs[0].job_id)
+    assert set(range(1, 11)) == set(result.keys())
+    assert result[3] == "0: cellcellcell, 1: cellcellcell, 2: cellcellcell"
+    assert result[7] == ", ".join("{}: {}".format(idx, "cell" * 7) for idx in range(3))
+
+
+@pytest.mark.usefixtures("job_constants")
+def test_cross_file_flex_data(database):
+    """Verify that the flex fields are gathered for the source file and sorted the way Python sorts them"""
+    sess = database.session
+    sub = SubmissionFactory()
+    jobs = [JobFactory(submission=sub) for _ in range(2)]
+    sess.add_all([sub] + jobs)
+    sess.commit()
+    sess.add_all(
+        [
+            FlexField(
+                submission_id=sub.submission_id,
+                job_id=jobs[0].job_id,
+                row_number=2,
+                header=header,
+                cell=cell,
+                file_type_id=FILE_TYPE_DICT_LETTER_ID["A"],
+            )
+            for header, cell in [("b", "x"), ("B", None), ("a", "y")]
+        ]
+        + [
+            FlexField(
+                submission_id=sub.submission_id,
+                job_id=jobs[1].job_id,
+                row_number=2,
+                header="other",
+                cell="z",
+                file_type_id=FILE_TYPE_DICT_LETTER_ID["B"],
+            )
+        ]
+    )
+    sess.commit()
+
+    result = validator.cross_file_flex_data(sub.submission_id, FILE_TYPE_DICT_LETTER_ID["A"])
+    assert result == {2: ", ".join(sorted(["b: x", "B: ", "a: y"]))}
+    assert result[2] == "B: , a: y, b: x"
+
+
+def test_failures_to_batch(database):
+    """Verify that each column of the report is built for every failure in the batch"""
+    sql_failures = database.session.execute(
+        """
+        SELECT *
+        FROM (
+            VALUES (2, 'b', NULL, 'exp 1', 1.50, 'id 1', 'exp 2'),
+                (NULL, 'd', 3, NULL, NULL, NULL, 'exp 3')
+        ) AS failures (row_number, zeta, alpha, expected_value_first, difference, uniqueid_fain, expected_value_last)
+        """
+    ).fetchall()
+    rule = Mock(rule_error_message="message", rule_label="LABEL", target_file_id=None, rule_severity_id=1)
+    failure_columns = validator.classify_failure_columns(list(sql_failures[0].keys()), {"alpha": "long_alpha"})
+    assert failure_columns.value_cols == ["zeta", "alpha"]
+    assert failure_columns.value_headers == ["zeta", "long_alpha"]
+
+    flex_data = {2: "A: a, B: b, C: ", 4: "A: c, B: d, C: g"}
+    result = validator.failures_to_batch(rule, flex_data, failure_columns, 5, sql_failures)
+    assert result.field_name == "long_alpha, zeta"
+    assert result.failed_values == ["long_alpha: , zeta: b", "long_alpha: 3, zeta: d"]
+    assert result.expected_values == ["last: exp 2", "last: exp 3"]
+    assert result.differences == ["1.50", ""]
+    assert result.unique_ids == ["fain: id 1", "fain: "]
+    assert result.flex_fields == ["A: a, B: b, C: ", ""]
+    assert result.rows == [2, ""]
+    assert (result.error, result.original_label, result.file_type_id) == ("message", "LABEL", 5)
+
+    failures = list(validator.split_failure_batch(result))
+    assert len(failures) == 2
+    assert failures[1] == validator.ValidationFailure(
+        "fain: ",
+        "long_alpha, zeta",
+        "message",
+        "long_alpha: 3, zeta: d",
+        "last: exp 3",
+        "",
+        "",
+        "",
+        "LABEL",
+        5,
+        None,
+        1,
+    )
+
+
+def test_failures_to_batch_defaults(database):
+    """Rules without expected values, differences, unique IDs or failed values still fill in every column"""
+    sql_failures = database.session.execute("SELECT generate_series(1, 3) AS row_number").fetchall()
+    rule = Mock(expected_value="expected")
+    failure_columns = validator.classify_failure_columns(list(sql_failures[0].keys()), {})
+    result = validator.failures_to_batch(rule, {}, failure_columns, 5, sql_failures)
     assert result.field_name == ""
-    assert result.flex_fields == "A: a, B: b, C: "
-    assert result.failed_value == ""
+    assert result.failed_values == ["", "", ""]
+    assert result.expected_values == ["expected", "expected", "expected"]
+    assert result.differences == ["", "", ""]
+    assert result.unique_ids == ["", "", ""]
+    assert result.rows == [1, 2, 3]
 
 
 @pytest.mark.usefixtures("job_constants")
@@ -99,8 +179,8 @@ def test_run_only_sensitive_rules(database):
     sess.add_all([normal_fabs_sub, normal_fabs_job])
 
     failures = []
-    for failure in validator.validate_file_by_sql(normal_fabs_job, "fabs", {}, batch_results=False):
-        failures.append(failure)
+    for failure_batch in validator.validate_file_by_sql(normal_fabs_job, "fabs", {}, batch_results=False):
+        failures.extend(validator.split_failure_batch(failure_batch))
     assert len(failures) == 2
 
     # Excluding Sensitive Rules
@@ -111,6 +191,132 @@ def test_run_only_sensitive_rules(database):
     sess.add_all([sensitive_fabs_sub, sensitive_fabs_job])
 
     failures = []
-    for failure in validator.validate_file_by_sql(sensitive_fabs_job, "fabs", {}, batch_results=False):
-        failures.append(failure)
+    for failure_batch in validator.validate_file_by_sql(sensitive_fabs_job, "fabs", {}, batch_results=False):
+        failures.extend(validator.split_failure_batch(failure_batch))
     assert len(failures) == 1
+
+
+@pytest.mark.usefixtures("job_constants")
+@pytest.mark.usefixtures("validation_constants")
+def test_validate_file_by_sql_parallel(database):
+    """Running the rules concurrently should yield the same failures in the same order as running them one by one"""
+    sess = database.session
+
+    fabs_file_type = sess.query(FileType).filter_by(letter_name="FABS").one()
+    rules = [
+        RuleSql(
+            rule_sql="SELECT generate_series(1, {num}) AS row_number, 'a' AS field_{num}".format(num=num),
+            rule_label="FABS{}".format(num),
+            rule_error_message="rule {}".format(num),
+            query_name="fabs{}".format(num),
+            file_id=FILE_TYPE_DICT_LETTER_ID["FABS"],
+            rule_severity_id=RULE_SEVERITY_DICT["fatal"],
+            rule_cross_file_flag=False,
+            category="completeness",
+        )
+        for num in range(1, 8)
+    ]
+    sub = SubmissionFactory(submission_id="3", cgac_code="097")
+    job = JobFactory(job_id="3", submission_id=sub.submission_id, file_type=fabs_file_type)
+    sess.add_all(rules + [sub, job])
+    sess.commit()
+
+    sequential = [
+        failure
+        for failure_batch in validator.validate_file_by_sql(job, "fabs", {}, batch_results=True)
+        for failure in validator.split_failure_batch(failure_batch)
+    ]
+    parallel = [
+        failure
+        for failure_batch in validator.validate_file_by_sql(job, "fabs", {}, batch_results=True, num_workers=3)
+        for failure in validator.split_failure_batch(failure_batch)
+    ]
+
+    assert len(sequential) == sum(range(1, 8))
+    assert parallel == sequential
+    assert [failure.original_label for failure in parallel[:3]] == ["FABS1", "FABS2", "FABS2"]
+
+    # Every rule's timing is recorded for both runs, along with the SQL validations as a whole
+    rule_timings = sess.query(ValidationTiming).filter_by(job_id=job.job_id, phase="sql_rule").all()
+    assert sorted((timing.rule, timing.row_count) for timing in rule_timings) == sorted(
+        [("fabs{}".format(num), num) for num in range(1, 8)] * 2
+    )
+    assert sess.query(ValidationTiming).filter_by(job_id=job.job_id, phase="sql_validations").count() == 2
+
+
+@pytest.mark.usefixtures("job_constants")
+@pytest.mark.usefixtures("validation_constants")
+def test_validate_file_by_sql_parallel_error(database, monkeypatch):
+    """A rule failing on a worker raises in the caller once the rules before it have been written"""
+    sess = database.session
+    monkeypatch.setattr(validator, "SQL_VALIDATION_BATCH_SIZE", 1)
+
+    fabs_file_type = sess.query(FileType).filter_by(letter_name="FABS").one()
+    rule_sqls = ["SELECT generate_series(1, 5) AS row_number, 'a' AS field", "SELECT 1 / 0 AS row_number"]
+    rule_sqls += ["SELECT generate_series(1, 5) AS row_number, 'a' AS field"] * 4
+    rules = [
+        RuleSql(
+            rule_sql=rule_sql,
+            rule_label="FABS{}".format(num),
+            rule_error_message="rule {}".format(num),
+            query_name="fabs{}".format(num),
+            file_id=FILE_TYPE_DICT_LETTER_ID["FABS"],
+            rule_severity_id=RULE_SEVERITY_DICT["fatal"],
+            rule_cross_file_flag=False,
+            category="completeness",
+        )
+        for num, rule_sql in enumerate(rule_sqls)
+    ]
+    sub = SubmissionFactory(submission_id="4", cgac_code="097")
+    job = JobFactory(job_id="4", submission_id=sub.submission_id, file_type=fabs_file_type)
+    sess.add_all(rules + [sub, job])
+    sess.commit()
+
+    failures = []
+    with pytest.raises(Exception, match="division by zero"):
+        for failure_batch in validator.validate_file_by_sql(job, "fabs", {}, batch_results=True, num_workers=2):
+            failures.extend(validator.split_failure_batch(failure_batch))
+    assert [failure.original_label for failure in failures] == ["FABS0"] * 5
+
+
+def test_prepare_cross_file_staging(database):
+    """Only the staging tables referenced by the rules are built, and they're gone once dropped"""
+    conn = database.connection
+    submission_id = 1
+    rule_sqls = [
+        "SELECT piid FROM award_financial_award_sums_{0} JOIN award_procurement_award_sums_{0} USING (piid)",
+        "SELECT 1 FROM award_financial WHERE submission_id = {0}",
+    ]
+
+    staging_tables = validator.prepare_cross_file_staging(conn, rule_sqls, submission_id)
+    assert staging_tables == ["award_financial_award_sums", "award_procurement_award_sums"]
+    for table in staging_tables:
+        assert conn.execute("SELECT COUNT(*) FROM {}_{}".format(table, submission_id)).scalar() == 0
+
+    validator.drop_cross_file_staging(conn, staging_tables, submission_id)
+    for table in staging_tables:
+        assert conn.execute("SELECT to_regclass('pg_temp.{}_{}')".format(table, submission_id)).scalar() is None
+
+
+def test_run_cross_file_rules_stop_event(database):
+    """Once the stop event is set by another pair, the remaining cross-file rules are skipped"""
+    stop_event = threading.Event()
+    rules = [Mock(rule_sql="SELECT 1 AS row_number WHERE FALSE", query_name="rule_{}".format(num)) for num in range(3)]
+    pair_progress = Mock(side_effect=lambda fraction_complete: stop_event.set() or 0)
+
+    validator.run_cross_file_rules(
+        rules,
+        1,
+        {},
+        1,
+        Mock(),
+        Mock(),
+        {},
+        0,
+        Mock(),
+        database.connection,
+        Mock(),
+        pair_progress=pair_progress,
+        stop_event=stop_event,
+    )
+    pair_progress.assert_called_once_with(1 / 3)